@@ -0,0 +1,229 @@
+# Archive (tar) Implementation
+import os
+import io
+import bz2
+import stat
+import errno
+import shutil
+import posixpath
+import gzip
+import lzma
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Uncompressed bytes per independently compressed block
+PARALLEL_BLOCK_SIZE = 1024 * 1024
+MAX_COMPRESS_WORKERS = os.cpu_count() or 1
+
+# Each block becomes a complete gzip member / bzip2 stream / xz stream. The
+# formats allow concatenation, so the result reads back as one ordinary file.
+COMPRESSORS = {
+    'gz': lambda data: gzip.compress(data, compresslevel=6, mtime=0),
+    'bz2': lambda data: bz2.compress(data, compresslevel=9),
+    'xz': lambda data: lzma.compress(data, preset=6),
+}
+
+# Archive name suffixes used by -a to pick a compression
+SUFFIX_COMPRESSION = {
+    '.tgz': 'gz', '.gz': 'gz',
+    '.tbz': 'bz2', '.tbz2': 'bz2', '.bz2': 'bz2',
+    '.txz': 'xz', '.xz': 'xz',
+}
+
+
+def compression_for_name(name):
+    """Guess the compression of an archive from its file name, or None"""
+    return SUFFIX_COMPRESSION.get(os.path.splitext(name)[1].lower())
+
+
+class ParallelCompressWriter(io.RawIOBase):
+    """Write-only stream that compresses fixed-size blocks on a thread pool (pigz-style).
+
+    Blocks are compressed independently and written to fileobj in order. zlib,
+    bz2 and lzma release the GIL while compressing, so blocks use several cores.
+    At most two blocks per worker are buffered, keeping memory bounded.
+    """
+
+    def __init__(self, fileobj, compression, workers=MAX_COMPRESS_WORKERS, block_size=PARALLEL_BLOCK_SIZE):
+        super().__init__()
+        self.fileobj = fileobj
+        self.compress = COMPRESSORS[compression]
+        self.block_size = block_size
+        self.max_pending = max(1, workers) * 2
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.pending = []
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            block = bytes(self.buffer[:self.block_size])
+            del self.buffer[:self.block_size]
+            self._submit(block)
+        return len(data)
+
+    def _submit(self, block):
+        self.pending.append(self.pool.submit(self.compress, block))
+        while len(self.pending) >= self.max_pending:
+            self.fileobj.write(self.pending.pop(0).result())
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self.buffer or not self.pending:
+                self._submit(bytes(self.buffer))
+                self.buffer.clear()
+            for future in self.pending:
+                self.fileobj.write(future.result())
+            self.pending.clear()
+        finally:
+            self.pool.shutdown()
+            self.fileobj.close()
+            super().close()
+
+
+def open_for_writing(fileobj, compression=None, workers=MAX_COMPRESS_WORKERS):
+    """Start a tar archive streamed into the binary file fileobj, compressing in parallel if requested.
+
+    Returns (tar, stream); close tar, then stream (which also closes fileobj).
+    """
+    if not compression:
+        return tarfile.open(fileobj=fileobj, mode='w|'), fileobj
+    writer = ParallelCompressWriter(fileobj, compression, workers)
+    return tarfile.open(fileobj=writer, mode='w|'), writer
+
+
+# Leading bytes identifying each compressed format
+MAGIC_NUMBERS = (
+    (b'\x1f\x8b', lambda f: gzip.GzipFile(fileobj=f, mode='rb')),
+    (b'BZh', lambda f: bz2.BZ2File(f, 'rb')),
+    (b'\xfd7zXZ\x00', lambda f: lzma.LZMAFile(f, 'rb')),
+)
+
+
+def open_for_reading(fileobj):
+    """Open a tar archive for streaming from a binary file, detecting any compression.
+
+    Returns (tar, file); closing file releases fileobj. The stdlib
+    decompressing file classes are used instead of tarfile's own stream
+    decoder because they also read multi-member files such as those written
+    by ParallelCompressWriter.
+    """
+    raw = fileobj if hasattr(fileobj, 'peek') else io.BufferedReader(fileobj)
+    try:
+        head = raw.peek(6)[:6]
+        stream = raw
+        for magic, opener in MAGIC_NUMBERS:
+            if head.startswith(magic):
+                stream = opener(raw)
+                break
+        return tarfile.open(fileobj=stream, mode='r|'), raw
+    except Exception:
+        raw.close()
+        raise
+
+
+def add_path(tar, fs, path, arcname, skip=None):
+    """Add a file system entry (recursively for directories) to a streaming tar.
+
+    fs is a VirtualFileSystem. skip(path) may return True to leave an entry
+    out. Returns the names added.
+    """
+    if skip and skip(path):
+        return []
+    st = fs.lstat(path)
+    info = tarfile.TarInfo(arcname)
+    info.mtime = int(st.st_mtime)
+    info.mode = stat.S_IMODE(st.st_mode)
+    info.uid = getattr(st, 'st_uid', 0)
+    info.gid = getattr(st, 'st_gid', 0)
+    if stat.S_ISDIR(st.st_mode):
+        info.type = tarfile.DIRTYPE
+        tar.addfile(info)
+        added = [arcname + '/']
+        for name in sorted(fs.listdir(path)):
+            added += add_path(tar, fs, posixpath.join(path, name), posixpath.join(arcname, name), skip)
+        return added
+    if stat.S_ISLNK(st.st_mode):
+        info.type = tarfile.SYMTYPE
+        info.linkname = fs.readlink(path)
+        tar.addfile(info)
+        return [arcname]
+    stream, error = fs.open_stream(path, 'rb')
+    if error:
+        raise OSError(errno.EIO, error.split(': ', 1)[-1], path)
+    with stream:
+        info.size = st.st_size
+        tar.addfile(info, stream)
+    return [arcname]
+
+
+def _escapes(relative):
+    """True if a relative POSIX path climbs above its starting directory"""
+    relative = posixpath.normpath(relative)
+    return relative == '..' or relative.startswith('../')
+
+
+def member_error(member, dest, contains):
+    """Return why member must not be extracted into the virtual directory dest, or None if it is safe.
+
+    contains(path) decides whether a virtual directory really lies inside the
+    file system (it may not, when a link on disk points outside it).
+    """
+    name = member.name.lstrip('/')
+    if _escapes(name):
+        return "path escapes the extraction directory"
+    target = posixpath.join(dest, posixpath.normpath(name))
+    # An earlier member may have been a symlink pointing outside the sandbox
+    if not contains(posixpath.dirname(target)):
+        return "path passes through a link leaving the sandbox"
+    if member.issym():
+        if member.linkname.startswith('/') or _escapes(posixpath.join(posixpath.dirname(target).lstrip('/'),
+                                                                      member.linkname)):
+            return f"symbolic link to '{member.linkname}' leaves the sandbox"
+    elif member.islnk():
+        if _escapes(member.linkname.lstrip('/')):
+            return f"hard link to '{member.linkname}' leaves the extraction directory"
+    elif not (member.isfile() or member.isdir()):
+        return "special files are not extracted"
+    return None
+
+
+def extract_member(tar, member, fs, dest):
+    """Extract one member of a streaming archive into the virtual directory dest of fs.
+
+    Ownership is dropped and permissions are limited as tarfile's 'data'
+    filter does. Returns an error message, or "" on success.
+    """
+    target = posixpath.join(dest, posixpath.normpath(member.name.lstrip('/')))
+    try:
+        fs.makedirs(posixpath.dirname(target))
+        if member.isdir():
+            fs.makedirs(target)
+            return ""
+        try:
+            fs.lstat(target)
+            fs.remove_file(target)
+        except OSError:
+            pass
+        if member.issym():
+            fs.symlink(member.linkname, target)
+            return ""
+        if member.islnk():
+            fs.link(posixpath.join(dest, member.linkname.lstrip('/')), target)
+            return ""
+        stream, error = fs.open_stream(target, 'wb')
+        if error:
+            return error.split(': ', 1)[-1]
+        with stream:
+            shutil.copyfileobj(tar.extractfile(member), stream, PARALLEL_BLOCK_SIZE)
+        fs.chmod(target, (member.mode & 0o755) | 0o600)
+        fs.utime(target, member.mtime)
+        return ""
+    except OSError as e:
+        return e.strerror or str(e)
@@ -0,0 +1,1520 @@
+# Awk Implementation (programs compiled to Python closures)
+import math
+import operator
+import random
+import re
+import time
+
+from posix_regex import translate_ere, substitute as regex_substitute
+
+
+class AwkError(Exception):
+    """Raised for syntax errors, unsupported features and fatal runtime errors"""
+
+
+class StrNum(str):
+    """A string from input (fields, split() elements, -v values).
+
+    Compares numerically against numbers when it looks like a number.
+    """
+    __slots__ = ()
+
+
+UNINIT = StrNum('')
+# Returned by an update to leave its target untouched
+UNCHANGED = object()
+
+NUMBER_PREFIX = re.compile(r'\s*[-+]?(?:\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)')
+NUMERIC_STRING = re.compile(r'\s*[-+]?(?:\d+\.?\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?)\s*$')
+ASSIGNMENT = re.compile(r'^([A-Za-z_][A-Za-z0-9_]*)=(.*)$', re.S)
+
+STRING_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '\\': '\\', '"': '"', '/': '/',
+                  'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v'}
+
+
+def to_num(v):
+    if type(v) is float:
+        return v
+    if v.isdigit() and v.isascii():
+        return float(v)
+    m = NUMBER_PREFIX.match(v)
+    return float(m.group()) if m else 0.0
+
+
+def is_numeric(v):
+    if type(v) is float:
+        return True
+    return type(v) is StrNum and (v == '' or v.isdigit() and v.isascii() or NUMERIC_STRING.match(v) is not None)
+
+
+def to_bool(v):
+    if type(v) is float:
+        return v != 0.0
+    if type(v) is StrNum and NUMERIC_STRING.match(v):
+        return to_num(v) != 0.0
+    return v != ''
+
+
+def unescape(text):
+    """Process backslash escapes as in an awk string literal (used for -v and -F)"""
+    if '\\' not in text:
+        return text
+    out = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == '\\' and i + 1 < len(text):
+            i += 1
+            c = text[i]
+            if c in '01234567':
+                j = i
+                while j < len(text) and j < i + 3 and text[j] in '01234567':
+                    j += 1
+                out.append(chr(int(text[i:j], 8)))
+                i = j
+                continue
+            out.append(STRING_ESCAPES.get(c, '\\' + c))
+        else:
+            out.append(c)
+        i += 1
+    return ''.join(out)
+
+
+# ---------------- Lexer ----------------
+
+KEYWORDS = {'BEGIN', 'END', 'function', 'func', 'if', 'else', 'while', 'for', 'do', 'break',
+            'continue', 'next', 'nextfile', 'exit', 'return', 'delete', 'in', 'getline',
+            'print', 'printf'}
+BUILTINS = {'length', 'substr', 'index', 'split', 'sub', 'gsub', 'match', 'sprintf', 'tolower',
+            'toupper', 'int', 'sqrt', 'exp', 'log', 'sin', 'cos', 'atan2', 'rand', 'srand',
+            'close', 'system', 'fflush'}
+OPERATORS = ('**=', '+=', '-=', '*=', '/=', '%=', '^=', '==', '<=', '>=', '!=', '++', '--',
+             '&&', '||', '>>', '!~', '**',
+             '{', '}', '(', ')', '[', ']', ';', ',', '+', '-', '*', '/', '%', '^', '!',
+             '>', '<', '|', '?', ':', '~', '$', '=')
+TOKEN_PATTERN = re.compile(r'''
+    (?P<space>[ \t\r]+|\\\r?\n|\#[^\n]*)
+  | (?P<newline>\n)
+  | (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<str>"(?:[^"\\\n]|\\.)*")
+  | (?P<op>''' + '|'.join(re.escape(op) for op in OPERATORS) + r''')
+''', re.X)
+# After these tokens a '/' divides; anywhere else it starts a regular expression
+OPERAND_END = {'num', 'str', 'ere', 'name', 'func_length', ')', ']', '$', '++', '--'}
+
+
+def tokenize(source):
+    """Split awk source into (type, value, line) tokens"""
+    tokens = []
+    pos = 0
+    line = 1
+    last = None
+    while pos < len(source):
+        if source[pos] == '/' and last not in OPERAND_END:
+            end = pos + 1
+            in_bracket = False
+            while end < len(source) and (source[end] != '/' or in_bracket):
+                if source[end] == '\\':
+                    end += 1
+                elif source[end] == '[':
+                    in_bracket = True
+                elif source[end] == ']':
+                    in_bracket = False
+                elif source[end] == '\n':
+                    break
+                end += 1
+            if end >= len(source) or source[end] != '/':
+                raise AwkError(f"unterminated regexp at source line {line}")
+            tokens.append(('ere', source[pos + 1:end].replace('\\/', '/'), line))
+            last = 'ere'
+            pos = end + 1
+            continue
+        m = TOKEN_PATTERN.match(source, pos)
+        if not m:
+            raise AwkError(f"syntax error at source line {line}: invalid character '{source[pos]}'")
+        pos = m.end()
+        kind = m.lastgroup
+        text = m.group()
+        if kind == 'space':
+            line += text.count('\n')
+            continue
+        if kind == 'newline':
+            tokens.append(('newline', text, line))
+            line += 1
+            last = 'newline'
+            continue
+        if kind == 'num':
+            tokens.append(('num', float(text), line))
+        elif kind == 'str':
+            tokens.append(('str', unescape(text[1:-1]), line))
+        elif kind == 'name':
+            if text in KEYWORDS:
+                kind = 'keyword'
+            elif text in BUILTINS:
+                kind = 'func'
+            elif source.startswith('(', pos):
+                # A name directly followed by '(' is a call, not a concatenation
+                kind = 'funcname'
+            tokens.append((kind, text, line))
+            if kind == 'func' and text == 'length':
+                kind = 'func_length'
+        else:
+            if text == '**':
+                text = '^'
+            elif text == '**=':
+                text = '^='
+            tokens.append(('op', text, line))
+            kind = text
+        last = kind
+    tokens.append(('eof', None, line))
+    return tokens
+
+
+# ---------------- Parser (source -> tuple tree) ----------------
+
+ASSIGN_OPS = {'=', '+=', '-=', '*=', '/=', '%=', '^='}
+LVALUES = {'var', 'field', 'index'}
+# Tokens that may start the right-hand operand of a concatenation
+CONCAT_START_OPS = {'$', '(', '++', '--'}
+
+
+class Parser:
+    """Recursive-descent parser producing nested tuples"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    # ---- token helpers ----
+    def peek(self, offset=0):
+        return self.tokens[min(self.pos + offset, len(self.tokens) - 1)]
+
+    def at(self, kind, value=None):
+        token = self.tokens[self.pos]
+        return token[0] == kind and (value is None or token[1] == value)
+
+    def at_op(self, *values):
+        token = self.tokens[self.pos]
+        return token[0] == 'op' and token[1] in values
+
+    def advance(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect_op(self, value):
+        if not self.at_op(value):
+            self.error(f"expected '{value}'")
+        return self.advance()
+
+    def error(self, message=None):
+        kind, value, line = self.peek()
+        found = 'end of program' if kind == 'eof' else 'newline' if kind == 'newline' else f"'{value}'"
+        raise AwkError(f"syntax error at source line {line}: {message or 'unexpected ' + found}"
+                       + (f" near {found}" if message else ''))
+
+    def newlines(self):
+        while self.at('newline'):
+            self.advance()
+
+    def terminators(self):
+        while self.at('newline') or self.at_op(';'):
+            self.advance()
+
+    # ---- program structure ----
+    def program(self):
+        begin, rules, end = [], [], []
+        self.terminators()
+        while not self.at('eof'):
+            if self.at('keyword', 'BEGIN') or self.at('keyword', 'END'):
+                target = begin if self.advance()[1] == 'BEGIN' else end
+                self.newlines()
+                target.append(self.block())
+            elif self.at('keyword', 'function') or self.at('keyword', 'func'):
+                raise AwkError("user-defined functions are not supported")
+            else:
+                first = second = None
+                if not self.at_op('{'):
+                    first = self.expr()
+                    if self.at_op(','):
+                        self.advance()
+                        self.newlines()
+                        second = self.expr()
+                action = self.block() if self.at_op('{') else None
+                rules.append((first, second, action))
+            self.terminators()
+        return begin, rules, end
+
+    def block(self):
+        self.expect_op('{')
+        statements = []
+        self.terminators()
+        while not self.at_op('}'):
+            if self.at('eof'):
+                self.error("missing '}'")
+            statements.append(self.statement())
+            self.terminators()
+        self.advance()
+        return ('block', statements)
+
+    def body(self):
+        """The statement controlled by if/while/for; a lone ';' is an empty body"""
+        if self.at_op(';'):
+            self.advance()
+            return ('block', [])
+        self.newlines()
+        return self.statement()
+
+    def statement(self):
+        if self.at_op('{'):
+            return self.block()
+        if self.at_op(';'):
+            self.advance()
+            return ('block', [])
+        if self.at('keyword', 'if'):
+            self.advance()
+            self.expect_op('(')
+            cond = self.expr()
+            self.expect_op(')')
+            then = self.body()
+            saved = self.pos
+            self.terminators()
+            if self.at('keyword', 'else'):
+                self.advance()
+                return ('if', cond, then, self.body())
+            self.pos = saved
+            return ('if', cond, then, None)
+        if self.at('keyword', 'while'):
+            self.advance()
+            self.expect_op('(')
+            cond = self.expr()
+            self.expect_op(')')
+            return ('while', cond, self.body())
+        if self.at('keyword', 'do'):
+            self.advance()
+            self.newlines()
+            body = self.statement()
+            self.terminators()
+            if not self.at('keyword', 'while'):
+                self.error("expected 'while'")
+            self.advance()
+            self.expect_op('(')
+            cond = self.expr()
+            self.expect_op(')')
+            self.end_simple()
+            return ('do', body, cond)
+        if self.at('keyword', 'for'):
+            self.advance()
+            self.expect_op('(')
+            if (self.at('name') and self.peek(1)[:2] == ('keyword', 'in')
+                    and self.peek(2)[0] == 'name' and self.peek(3)[:2] == ('op', ')')):
+                var = self.advance()[1]
+                self.advance()
+                array = self.advance()[1]
+                self.advance()
+                return ('forin', var, array, self.body())
+            init = None if self.at_op(';') else self.simple_statement()
+            self.expect_op(';')
+            self.newlines()
+            cond = None if self.at_op(';') else self.expr()
+            self.expect_op(';')
+            self.newlines()
+            step = None if self.at_op(')') else self.simple_statement()
+            self.expect_op(')')
+            return ('for', init, cond, step, self.body())
+        statement = self.simple_statement()
+        self.end_simple()
+        return statement
+
+    def end_simple(self):
+        if not (self.at_op(';', '}') or self.at('newline') or self.at('eof')):
+            self.error()
+
+    def simple_statement(self):
+        if self.at('keyword', 'print') or self.at('keyword', 'printf'):
+            kind = self.advance()[1]
+            args = []
+            if not (self.at_op(';', '}', '>', '>>', '|') or self.at('newline') or self.at('eof')):
+                args = self.expr_list(no_gt=True)
+                if len(args) == 1 and args[0][0] == 'grouping':
+                    args = args[0][1]
+            if kind == 'printf' and not args:
+                self.error("printf: no format")
+            redirect = None
+            if self.at_op('>', '>>'):
+                op = self.advance()[1]
+                redirect = (op, self.concatenation(no_gt=True))
+            elif self.at_op('|'):
+                raise AwkError("output to commands is not supported")
+            return (kind, args, redirect)
+        if self.at('keyword'):
+            word = self.peek()[1]
+            if word in ('next', 'nextfile', 'break', 'continue'):
+                self.advance()
+                return (word,)
+            if word == 'exit':
+                self.advance()
+                code = None
+                if not (self.at_op(';', '}') or self.at('newline') or self.at('eof')):
+                    code = self.expr()
+                return ('exit', code)
+            if word == 'delete':
+                self.advance()
+                if not self.at('name'):
+                    self.error("expected array name")
+                name = self.advance()[1]
+                keys = None
+                if self.at_op('['):
+                    self.advance()
+                    keys = self.expr_list()
+                    self.expect_op(']')
+                return ('delete', name, keys)
+            if word == 'getline':
+                raise AwkError("getline is not supported")
+            if word == 'return':
+                raise AwkError("return outside function")
+        return ('expr', self.expr())
+
+    # ---- expressions, lowest precedence first ----
+    def expr_list(self, no_gt=False):
+        items = [self.expr(no_gt)]
+        while self.at_op(','):
+            self.advance()
+            self.newlines()
+            items.append(self.expr(no_gt))
+        return items
+
+    def expr(self, no_gt=False):
+        left = self.ternary(no_gt)
+        if self.at('op') and self.peek()[1] in ASSIGN_OPS and left[0] in LVALUES:
+            op = self.advance()[1]
+            self.newlines()
+            return ('assign', op, left, self.expr(no_gt))
+        return left
+
+    def ternary(self, no_gt):
+        cond = self.logical_or(no_gt)
+        if not self.at_op('?'):
+            return cond
+        self.advance()
+        self.newlines()
+        then = self.expr(no_gt)
+        self.newlines()
+        self.expect_op(':')
+        self.newlines()
+        return ('cond', cond, then, self.expr(no_gt))
+
+    def logical_or(self, no_gt):
+        left = self.logical_and(no_gt)
+        while self.at_op('||'):
+            self.advance()
+            self.newlines()
+            left = ('or', left, self.logical_and(no_gt))
+        return left
+
+    def logical_and(self, no_gt):
+        left = self.membership(no_gt)
+        while self.at_op('&&'):
+            self.advance()
+            self.newlines()
+            left = ('and', left, self.membership(no_gt))
+        return left
+
+    def membership(self, no_gt):
+        left = self.matching(no_gt)
+        while self.at('keyword', 'in'):
+            self.advance()
+            if not self.at('name'):
+                self.error("expected array name")
+            left = ('in', [left], self.advance()[1])
+        return left
+
+    def matching(self, no_gt):
+        left = self.comparison(no_gt)
+        while self.at_op('~', '!~'):
+            negate = self.advance()[1] == '!~'
+            left = ('match', negate, left, self.comparison(no_gt))
+        return left
+
+    def comparison(self, no_gt):
+        left = self.concatenation(no_gt)
+        if self.at_op('<', '<=', '==', '!=', '>=') or (self.at_op('>') and not no_gt):
+            op = self.advance()[1]
+            return ('cmp', op, left, self.concatenation(no_gt))
+        return left
+
+    def starts_operand(self):
+        kind, value, _ = self.peek()
+        if kind in ('num', 'str', 'ere', 'name', 'func', 'funcname'):
+            return True
+        return kind == 'op' and value in CONCAT_START_OPS
+
+    def concatenation(self, no_gt=False):
+        parts = [self.additive()]
+        while self.starts_operand():
+            parts.append(self.additive())
+        return parts[0] if len(parts) == 1 else ('concat', parts)
+
+    def additive(self):
+        left = self.multiplicative()
+        while self.at_op('+', '-'):
+            op = self.advance()[1]
+            left = ('binop', op, left, self.multiplicative())
+        return left
+
+    def multiplicative(self):
+        left = self.unary()
+        while self.at_op('*', '/', '%'):
+            op = self.advance()[1]
+            left = ('binop', op, left, self.unary())
+        return left
+
+    def unary(self):
+        if self.at_op('!'):
+            self.advance()
+            return ('not', self.unary())
+        if self.at_op('-', '+'):
+            op = self.advance()[1]
+            return ('unary', op, self.unary())
+        return self.power()
+
+    def power(self):
+        base = self.postfix()
+        if self.at_op('^'):
+            self.advance()
+            # Right associative, and the exponent may carry a sign: 2^-1
+            return ('binop', '^', base, self.unary())
+        return base
+
+    def postfix(self):
+        node = self.primary()
+        if node[0] in LVALUES and self.at_op('++', '--'):
+            return ('incdec', self.advance()[1], False, node)
+        return node
+
+    def primary(self):
+        kind, value, _ = self.peek()
+        if kind == 'num':
+            self.advance()
+            return ('num', value)
+        if kind == 'str':
+            self.advance()
+            return ('str', value)
+        if kind == 'ere':
+            self.advance()
+            return ('regex', value)
+        if kind == 'func':
+            self.advance()
+            args = []
+            if self.at_op('('):
+                self.advance()
+                if not self.at_op(')'):
+                    args = self.expr_list()
+                self.expect_op(')')
+            elif value != 'length':
+                self.error(f"expected '(' after {value}")
+            return ('call', value, args)
+        if kind == 'name':
+            self.advance()
+            if self.at_op('['):
+                self.advance()
+                keys = self.expr_list()
+                self.expect_op(']')
+                return ('index', value, keys)
+            return ('var', value)
+        if kind == 'funcname':
+            raise AwkError(f"calling undefined function {value}")
+        if kind == 'keyword' and value == 'getline':
+            raise AwkError("getline is not supported")
+        if kind != 'op':
+            self.error()
+        if value == '$':
+            self.advance()
+            if self.at_op('++', '--'):
+                op = self.advance()[1]
+                return ('field', ('incdec', op, True, self.primary()))
+            if self.at_op('-', '+', '!'):
+                return ('field', self.unary())
+            return ('field', self.primary())
+        if value in ('++', '--'):
+            self.advance()
+            target = self.primary()
+            if target[0] not in LVALUES:
+                self.error(f"'{value}' needs a variable")
+            return ('incdec', value, True, target)
+        if value in ('-', '+', '!'):
+            return self.unary()
+        if value == '(':
+            self.advance()
+            items = self.expr_list()
+            self.expect_op(')')
+            if len(items) > 1:
+                if self.at('keyword', 'in'):
+                    self.advance()
+                    if not self.at('name'):
+                        self.error("expected array name")
+                    return ('in', items, self.advance()[1])
+                return ('grouping', items)
+            return ('group', items[0])
+        self.error()
+
+
+# ---------------- Runtime ----------------
+
+class NextRecord(Exception):
+    pass
+
+
+class NextFile(Exception):
+    pass
+
+
+class LoopBreak(Exception):
+    pass
+
+
+class LoopContinue(Exception):
+    pass
+
+
+class ExitProgram(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+class Runtime:
+    """Variables, the current record and collected output of a running program"""
+
+    def __init__(self):
+        self.vars = {
+            'FS': ' ', 'OFS': ' ', 'ORS': '\n', 'RS': '\n', 'NR': 0.0, 'FNR': 0.0,
+            'FILENAME': '', 'SUBSEP': '\x1c', 'RSTART': 0.0, 'RLENGTH': -1.0,
+            'CONVFMT': '%.6g', 'OFMT': '%.6g', 'ENVIRON': {},
+        }
+        self.record = ''
+        self.fields = []
+        self.record_fs = ' '
+        self.output = []
+        # Output sent to /dev/stderr, reported after the program's output like its errors
+        self.errors = []
+        # Redirected output: file name -> [append?, chunks]
+        self.files = {}
+        self.regex_cache = {}
+        self.random = random.Random(0)
+        self.seed = 0.0
+
+    # ---- conversions ----
+    def tostr(self, v):
+        if type(v) is float:
+            if v.is_integer() and abs(v) < 1e16:
+                return str(int(v))
+            return self.vars['CONVFMT'] % v
+        return v
+
+    def outstr(self, v):
+        if type(v) is float:
+            if v.is_integer() and abs(v) < 1e16:
+                return str(int(v))
+            return self.vars['OFMT'] % v
+        return v
+
+    def regex(self, source):
+        pattern = self.regex_cache.get(source)
+        if pattern is None:
+            try:
+                pattern = re.compile(translate_ere(source))
+            except re.error as e:
+                raise AwkError(f"invalid regex /{source}/: {e}")
+            self.regex_cache[source] = pattern
+        return pattern
+
+    # ---- records and fields ----
+    def set_record(self, text):
+        self.record = text
+        self.fields = None
+        self.record_fs = self.vars['FS']
+
+    def split(self, text, fs):
+        if fs == ' ':
+            return text.split()
+        if not text:
+            return []
+        if len(fs) == 1 and fs != '\\':
+            return text.split(fs)
+        return self.regex(fs).split(text)
+
+    def _split_record(self):
+        self.fields = list(map(StrNum, self.split(self.record, self.record_fs)))
+        return self.fields
+
+    def get_field(self, i):
+        fields = self.fields
+        if fields is None:
+            fields = self._split_record()
+        if 0 < i <= len(fields):
+            return fields[i - 1]
+        if i == 0:
+            return StrNum(self.record)
+        if i < 0:
+            raise AwkError(f"trying to access out of range field {i}")
+        return UNINIT
+
+    def set_field(self, i, value):
+        text = StrNum(self.tostr(value))
+        if i == 0:
+            self.set_record(text)
+            return
+        if i < 0:
+            raise AwkError(f"trying to access out of range field {i}")
+        if self.fields is None:
+            self._split_record()
+        if i > len(self.fields):
+            self.fields.extend([UNINIT] * (i - len(self.fields)))
+        self.fields[i - 1] = text
+        self.record = self.tostr(self.vars['OFS']).join(self.fields)
+
+    def get_nf(self):
+        if self.fields is None:
+            self._split_record()
+        return float(len(self.fields))
+
+    def set_nf(self, value):
+        n = int(to_num(value))
+        if self.fields is None:
+            self._split_record()
+        if n < len(self.fields):
+            del self.fields[n:]
+        else:
+            self.fields.extend([UNINIT] * (n - len(self.fields)))
+        self.record = self.tostr(self.vars['OFS']).join(self.fields)
+
+    # ---- arrays ----
+    def array(self, name):
+        value = self.vars.get(name)
+        if type(value) is dict:
+            return value
+        if value is None or value is UNINIT:
+            value = self.vars[name] = {}
+            return value
+        raise AwkError(f"can't use scalar {name} as array")
+
+    # ---- output ----
+    def redirect(self, name, append):
+        # The standard streams are the command's own output, never files in the sandbox
+        if name in ('/dev/stdout', '-'):
+            return self.output
+        if name == '/dev/stderr':
+            return self.errors
+        entry = self.files.get(name)
+        if entry is None:
+            entry = self.files[name] = [append, []]
+        return entry[1]
+
+
+def format_printf(rt, fmt, values):
+    """awk sprintf: C-style conversions applied to awk values"""
+    out = []
+    pos = 0
+    index = 0
+
+    def next_value():
+        nonlocal index
+        index += 1
+        return values[index - 1] if index <= len(values) else UNINIT
+
+    for m in PRINTF_SPEC.finditer(fmt):
+        out.append(fmt[pos:m.start()])
+        pos = m.end()
+        flags, width, precision, conv = m.groups()
+        if conv == '%':
+            out.append('%')
+            continue
+        if width == '*':
+            width = str(int(to_num(next_value())))
+        if precision == '*':
+            precision = str(int(to_num(next_value())))
+        spec = '%' + flags + (width or '') + ('.' + precision if precision is not None else '')
+        value = next_value()
+        if conv in 'dic':
+            number = to_num(value) if conv != 'c' or type(value) is float else None
+            if conv == 'c':
+                text = chr(int(number)) if number is not None else rt.tostr(value)[:1]
+                out.append((spec + 's') % text)
+            elif math.isfinite(number):
+                out.append((spec + 'd') % int(number))
+            else:
+                out.append((spec + 'f') % number)
+        elif conv in 'ouxX':
+            number = to_num(value)
+            out.append((spec + conv) % int(number) if math.isfinite(number) else str(number))
+        elif conv == 's':
+            out.append((spec + 's') % rt.tostr(value))
+        else:
+            out.append((spec + conv) % to_num(value))
+    out.append(fmt[pos:])
+    return ''.join(out)
+
+
+PRINTF_SPEC = re.compile(r'%([-+ #0]*)(\*|\d+)?(?:\.(\*|\d*))?([cdiouxXeEfFgGs%])')
+
+
+# ---------------- Compiler (tuple tree -> closures) ----------------
+
+ARITHMETIC = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul,
+}
+COMPARISONS = {
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    '==': operator.eq, '!=': operator.ne,
+}
+
+
+def _divide(a, b):
+    if b == 0.0:
+        raise AwkError("division by zero")
+    return a / b
+
+
+def _modulo(a, b):
+    if b == 0.0:
+        raise AwkError("division by zero in %")
+    return math.fmod(a, b)
+
+
+def _power(a, b):
+    try:
+        return float(a ** b) if not (a < 0 and not b.is_integer()) else math.nan
+    except OverflowError:
+        return math.inf
+    except ZeroDivisionError:
+        raise AwkError("division by zero in ^")
+
+
+ARITHMETIC.update({'/': _divide, '%': _modulo, '^': _power})
+
+
+class Compiler:
+    """Turns the parse tree into Python closures bound to one Runtime"""
+
+    def __init__(self, rt):
+        self.rt = rt
+
+    # ---- expressions ----
+    def expr(self, node):
+        return getattr(self, 'e_' + node[0])(node)
+
+    def e_num(self, node):
+        value = node[1]
+        return lambda: value
+
+    def e_str(self, node):
+        value = node[1]
+        return lambda: value
+
+    def e_regex(self, node):
+        search = self.rt.regex(node[1]).search
+        rt = self.rt
+        return lambda: 1.0 if search(rt.record) else 0.0
+
+    def e_group(self, node):
+        return self.expr(node[1])
+
+    def e_grouping(self, node):
+        raise AwkError("parenthesized list is only allowed with 'in' or print")
+
+    def e_var(self, node):
+        name = node[1]
+        rt = self.rt
+        if name == 'NF':
+            return rt.get_nf
+        get = rt.vars.get
+        return lambda: get(name, UNINIT)
+
+    def e_field(self, node):
+        rt = self.rt
+        if node[1][0] == 'num':
+            i = int(node[1][1])
+            return lambda: rt.get_field(i)
+        index = self.expr(node[1])
+        return lambda: rt.get_field(int(to_num(index())))
+
+    def subscript(self, keys):
+        rt = self.rt
+        if len(keys) == 1:
+            key = self.expr(keys[0])
+            return lambda: rt.tostr(key())
+        parts = [self.expr(k) for k in keys]
+        return lambda: rt.tostr(rt.vars['SUBSEP']).join(rt.tostr(p()) for p in parts)
+
+    def e_index(self, node):
+        name = node[1]
+        key = self.subscript(node[2])
+        array = self.rt.array
+
+        def get():
+            a = array(name)
+            k = key()
+            value = a.get(k)
+            if value is None:
+                # Referencing an element creates it, as in awk
+                value = a[k] = UNINIT
+            return value
+        return get
+
+    def modify(self, target, compute, return_old=False):
+        """Closure that replaces target's value with compute(old value).
+
+        The target's subscript or field number is evaluated once. The closure
+        returns the new value, or the old one with return_old. compute may
+        return UNCHANGED to leave the target alone.
+        """
+        rt = self.rt
+        kind = target[0]
+        if kind == 'var' and target[1] != 'NF':
+            name = target[1]
+            variables = rt.vars
+
+            def update_var():
+                old = variables.get(name, UNINIT)
+                if type(old) is dict:
+                    raise AwkError(f"can't assign to {name}; it's an array name.")
+                new = compute(old)
+                if new is not UNCHANGED:
+                    variables[name] = new
+                return old if return_old else new
+            return update_var
+        if kind == 'index':
+            name = target[1]
+            key = self.subscript(target[2])
+            array = rt.array
+
+            def update_element():
+                a = array(name)
+                k = key()
+                old = a.get(k, UNINIT)
+                new = compute(old)
+                if new is not UNCHANGED:
+                    a[k] = new
+                return old if return_old else new
+            return update_element
+        if kind == 'var':
+            get, put = rt.get_nf, rt.set_nf
+        else:
+            index = self.expr(target[1])
+            field = [0]
+
+            def get():
+                field[0] = int(to_num(index()))
+                return rt.get_field(field[0])
+
+            def put(value):
+                rt.set_field(field[0], value)
+
+        def update():
+            old = get()
+            new = compute(old)
+            if new is not UNCHANGED:
+                put(new)
+            return old if return_old else new
+        return update
+
+    def e_assign(self, node):
+        op, target, source = node[1], node[2], node[3]
+        value = self.expr(source)
+        if op == '=':
+            return self.modify(target, lambda old: value())
+        arith = ARITHMETIC[op[0]]
+        return self.modify(target, lambda old: arith(to_num(old), to_num(value())))
+
+    def e_incdec(self, node):
+        op, prefix, target = node[1], node[2], node[3]
+        step = 1.0 if op == '++' else -1.0
+        changed = self.modify(target, lambda old: to_num(old) + step, return_old=not prefix)
+        if prefix:
+            return changed
+        return lambda: to_num(changed())
+
+    def e_cond(self, node):
+        cond, then, other = self.expr(node[1]), self.expr(node[2]), self.expr(node[3])
+        return lambda: then() if to_bool(cond()) else other()
+
+    def e_or(self, node):
+        a, b = self.expr(node[1]), self.expr(node[2])
+        return lambda: 1.0 if to_bool(a()) or to_bool(b()) else 0.0
+
+    def e_and(self, node):
+        a, b = self.expr(node[1]), self.expr(node[2])
+        return lambda: 1.0 if to_bool(a()) and to_bool(b()) else 0.0
+
+    def e_not(self, node):
+        a = self.expr(node[1])
+        return lambda: 0.0 if to_bool(a()) else 1.0
+
+    def e_unary(self, node):
+        a = self.expr(node[2])
+        if node[1] == '-':
+            return lambda: -to_num(a())
+        return lambda: to_num(a())
+
+    def e_binop(self, node):
+        arith = ARITHMETIC[node[1]]
+        a, b = self.expr(node[2]), self.expr(node[3])
+        return lambda: arith(to_num(a()), to_num(b()))
+
+    def e_concat(self, node):
+        parts = [self.expr(p) for p in node[1]]
+        tostr = self.rt.tostr
+        if len(parts) == 2:
+            a, b = parts
+            return lambda: tostr(a()) + tostr(b())
+        return lambda: ''.join([tostr(p()) for p in parts])
+
+    def e_cmp(self, node):
+        compare = COMPARISONS[node[1]]
+        a, b = self.expr(node[2]), self.expr(node[3])
+        tostr = self.rt.tostr
+
+        def cmp():
+            x, y = a(), b()
+            if is_numeric(x) and is_numeric(y):
+                return 1.0 if compare(to_num(x), to_num(y)) else 0.0
+            return 1.0 if compare(tostr(x), tostr(y)) else 0.0
+        return cmp
+
+    def regex_operand(self, node):
+        """A function returning a compiled pattern for a regex-valued operand"""
+        if node[0] == 'regex':
+            pattern = self.rt.regex(node[1])
+            return lambda: pattern
+        value = self.expr(node)
+        rt = self.rt
+        return lambda: rt.regex(rt.tostr(value()))
+
+    def e_match(self, node):
+        negate = node[1]
+        text = self.expr(node[2])
+        pattern = self.regex_operand(node[3])
+        tostr = self.rt.tostr
+        if negate:
+            return lambda: 0.0 if pattern().search(tostr(text())) else 1.0
+        return lambda: 1.0 if pattern().search(tostr(text())) else 0.0
+
+    def e_in(self, node):
+        name = node[2]
+        key = self.subscript(node[1])
+        array = self.rt.array
+        return lambda: 1.0 if key() in array(name) else 0.0
+
+    def e_call(self, node):
+        name, args = node[1], node[2]
+        builtin = getattr(self, 'b_' + name, None)
+        if builtin is None:
+            raise AwkError(f"function {name} is not supported")
+        return builtin(args)
+
+    # ---- builtin functions ----
+    def _args(self, name, args, low, high):
+        if not low <= len(args) <= high:
+            raise AwkError(f"{name}: wrong number of arguments")
+        return [self.expr(a) for a in args]
+
+    def b_length(self, args):
+        rt = self.rt
+        if not args:
+            return lambda: float(len(rt.record))
+        if len(args) > 1:
+            raise AwkError("length: wrong number of arguments")
+        if args[0][0] == 'var':
+            name = args[0][1]
+            value = self.expr(args[0])
+
+            def length():
+                v = rt.vars.get(name)
+                return float(len(v)) if type(v) is dict else float(len(rt.tostr(value())))
+            return length
+        value = self.expr(args[0])
+        return lambda: float(len(rt.tostr(value())))
+
+    def b_substr(self, args):
+        fs = self._args('substr', args, 2, 3)
+        tostr = self.rt.tostr
+
+        def substr():
+            s = tostr(fs[0]())
+            start = to_num(fs[1]())
+            if math.isnan(start):
+                return ''
+            first = round(start)
+            if len(fs) == 3:
+                length = to_num(fs[2]())
+                if math.isnan(length):
+                    return ''
+                last = first + round(length) if math.isfinite(length) else len(s) + 1
+            else:
+                last = len(s) + 1
+            first = max(first, 1)
+            last = min(last, len(s) + 1)
+            return s[first - 1:last - 1] if last > first else ''
+        return substr
+
+    def b_index(self, args):
+        s, t = self._args('index', args, 2, 2)
+        tostr = self.rt.tostr
+        return lambda: float(tostr(s()).find(tostr(t())) + 1)
+
+    def b_split(self, args):
+        if not 2 <= len(args) <= 3 or args[1][0] != 'var':
+            raise AwkError("split: second argument must be an array name")
+        rt = self.rt
+        text = self.expr(args[0])
+        name = args[1][1]
+        if len(args) == 3:
+            sep = args[2]
+            if sep[0] == 'regex':
+                pattern = rt.regex(sep[1])
+                splitter = lambda s: pattern.split(s) if s else []
+            else:
+                sep_value = self.expr(sep)
+                splitter = lambda s: rt.split(s, rt.tostr(sep_value()))
+        else:
+            splitter = lambda s: rt.split(s, rt.tostr(rt.vars['FS']))
+
+        def split():
+            parts = splitter(rt.tostr(text()))
+            array = rt.array(name)
+            array.clear()
+            for i, part in enumerate(parts, 1):
+                array[str(i)] = StrNum(part)
+            return float(len(parts))
+        return split
+
+    def _substitute(self, args, count):
+        if not 2 <= len(args) <= 3:
+            raise AwkError("sub/gsub: wrong number of arguments")
+        rt = self.rt
+        pattern = self.regex_operand(args[0])
+        replacement = self.expr(args[1])
+        target = args[2] if len(args) == 3 else ('field', ('num', 0.0))
+        if target[0] not in LVALUES:
+            raise AwkError("sub/gsub: third argument must be a variable, field or array element")
+        replaced = [0]
+
+        def compute(old):
+            template = rt.tostr(replacement())
+            if '&' in template or '\\' in template:
+                pieces = REPLACEMENT_TOKEN.split(template)
+
+                def repl(m):
+                    return ''.join(m.group() if p == '&' else p[1] if p in ('\\&', '\\\\') else p
+                                   for p in pieces)
+            else:
+                repl = lambda m: template
+            new, replaced[0] = regex_substitute(pattern(), repl, rt.tostr(old), count=count)
+            return new if replaced[0] else UNCHANGED
+
+        substitute = self.modify(target, compute)
+
+        def run():
+            substitute()
+            return float(replaced[0])
+        return run
+
+    def b_sub(self, args):
+        return self._substitute(args, 1)
+
+    def b_gsub(self, args):
+        return self._substitute(args, 0)
+
+    def b_match(self, args):
+        if len(args) != 2:
+            raise AwkError("match: wrong number of arguments")
+        rt = self.rt
+        text = self.expr(args[0])
+        pattern = self.regex_operand(args[1])
+
+        def match():
+            m = pattern().search(rt.tostr(text()))
+            start, length = (float(m.start() + 1), float(m.end() - m.start())) if m else (0.0, -1.0)
+            rt.vars['RSTART'] = start
+            rt.vars['RLENGTH'] = length
+            return start
+        return match
+
+    def b_sprintf(self, args):
+        if not args:
+            raise AwkError("sprintf: no format")
+        fs = [self.expr(a) for a in args]
+        rt = self.rt
+        return lambda: format_printf(rt, rt.tostr(fs[0]()), [f() for f in fs[1:]])
+
+    def b_tolower(self, args):
+        (s,) = self._args('tolower', args, 1, 1)
+        tostr = self.rt.tostr
+        return lambda: tostr(s()).lower()
+
+    def b_toupper(self, args):
+        (s,) = self._args('toupper', args, 1, 1)
+        tostr = self.rt.tostr
+        return lambda: tostr(s()).upper()
+
+    def b_int(self, args):
+        (x,) = self._args('int', args, 1, 1)
+
+        def to_int():
+            v = to_num(x())
+            return float(math.trunc(v)) if math.isfinite(v) else v
+        return to_int
+
+    def b_sqrt(self, args):
+        return self._math_call('sqrt', args, math.sqrt)
+
+    def b_exp(self, args):
+        return self._math_call('exp', args, math.exp)
+
+    def b_log(self, args):
+        return self._math_call('log', args, math.log)
+
+    def b_sin(self, args):
+        return self._math_call('sin', args, math.sin)
+
+    def b_cos(self, args):
+        return self._math_call('cos', args, math.cos)
+
+    def b_atan2(self, args):
+        return self._math_call('atan2', args, math.atan2, 2)
+
+    def _math_call(self, name, args, func, nargs=1):
+        fs = self._args(name, args, nargs, nargs)
+
+        def call():
+            try:
+                return float(func(*[to_num(f()) for f in fs]))
+            except (ValueError, OverflowError):
+                return math.nan
+        return call
+
+    def b_rand(self, args):
+        self._args('rand', args, 0, 0)
+        rng = self.rt.random
+        return lambda: rng.random()
+
+    def b_srand(self, args):
+        fs = self._args('srand', args, 0, 1)
+        rt = self.rt
+
+        def srand():
+            previous = rt.seed
+            rt.seed = to_num(fs[0]()) if fs else float(int(time.time()))
+            rt.random.seed(rt.seed)
+            return previous
+        return srand
+
+    def b_close(self, args):
+        self._args('close', args, 1, 1)
+        return lambda: 0.0
+
+    def b_fflush(self, args):
+        self._args('fflush', args, 0, 1)
+        return lambda: 0.0
+
+    def b_system(self, args):
+        raise AwkError("system() is not supported")
+
+    # ---- statements ----
+    def stmt(self, node):
+        return getattr(self, 's_' + node[0])(node)
+
+    def s_block(self, node):
+        statements = [self.stmt(s) for s in node[1]]
+        if len(statements) == 1:
+            return statements[0]
+
+        def block():
+            for statement in statements:
+                statement()
+        return block
+
+    def s_expr(self, node):
+        return self.expr(node[1])
+
+    def _output(self, redirect):
+        """Function returning the list that output chunks go to"""
+        rt = self.rt
+        if redirect is None:
+            return lambda: rt.output
+        append = redirect[0] == '>>'
+        target = self.expr(redirect[1])
+        return lambda: rt.redirect(rt.tostr(target()), append)
+
+    def s_print(self, node):
+        rt = self.rt
+        variables = rt.vars
+        sink = self._output(node[2])
+        if not node[1]:
+            return lambda: sink().append(rt.record + variables['ORS'])
+        values = [self.expr(a) for a in node[1]]
+        outstr = rt.outstr
+        if len(values) == 1:
+            value = values[0]
+            return lambda: sink().append(outstr(value()) + variables['ORS'])
+
+        def print_():
+            sink().append(variables['OFS'].join([outstr(v()) for v in values]) + variables['ORS'])
+        return print_
+
+    def s_printf(self, node):
+        rt = self.rt
+        sink = self._output(node[2])
+        values = [self.expr(a) for a in node[1]]
+        fmt, rest = values[0], values[1:]
+        return lambda: sink().append(format_printf(rt, rt.tostr(fmt()), [v() for v in rest]))
+
+    def s_if(self, node):
+        cond = self.expr(node[1])
+        then = self.stmt(node[2])
+        if node[3] is None:
+            def if_():
+                if to_bool(cond()):
+                    then()
+            return if_
+        other = self.stmt(node[3])
+
+        def if_else():
+            if to_bool(cond()):
+                then()
+            else:
+                other()
+        return if_else
+
+    def s_while(self, node):
+        cond = self.expr(node[1])
+        body = self.stmt(node[2])
+
+        def while_():
+            while to_bool(cond()):
+                try:
+                    body()
+                except LoopBreak:
+                    break
+                except LoopContinue:
+                    continue
+        return while_
+
+    def s_do(self, node):
+        body = self.stmt(node[1])
+        cond = self.expr(node[2])
+
+        def do():
+            while True:
+                try:
+                    body()
+                except LoopBreak:
+                    break
+                except LoopContinue:
+                    pass
+                if not to_bool(cond()):
+                    break
+        return do
+
+    def s_for(self, node):
+        init = self.stmt(node[1]) if node[1] else None
+        cond = self.expr(node[2]) if node[2] else (lambda: 1.0)
+        step = self.stmt(node[3]) if node[3] else None
+        body = self.stmt(node[4])
+
+        def for_():
+            if init:
+                init()
+            while to_bool(cond()):
+                try:
+                    body()
+                except LoopBreak:
+                    break
+                except LoopContinue:
+                    pass
+                if step:
+                    step()
+        return for_
+
+    def s_forin(self, node):
+        var, name = node[1], node[2]
+        body = self.stmt(node[3])
+        rt = self.rt
+
+        def forin():
+            for key in list(rt.array(name)):
+                rt.vars[var] = StrNum(key)
+                try:
+                    body()
+                except LoopBreak:
+                    break
+                except LoopContinue:
+                    continue
+        return forin
+
+    def s_delete(self, node):
+        name, keys = node[1], node[2]
+        array = self.rt.array
+        if keys is None:
+            return lambda: array(name).clear()
+        key = self.subscript(keys)
+        return lambda: array(name).pop(key(), None)
+
+    def s_next(self, node):
+        def next_():
+            raise NextRecord()
+        return next_
+
+    def s_nextfile(self, node):
+        def nextfile():
+            raise NextFile()
+        return nextfile
+
+    def s_break(self, node):
+        def break_():
+            raise LoopBreak()
+        return break_
+
+    def s_continue(self, node):
+        def continue_():
+            raise LoopContinue()
+        return continue_
+
+    def s_exit(self, node):
+        code = self.expr(node[1]) if node[1] else None
+
+        def exit_():
+            raise ExitProgram(int(to_num(code())) if code else None)
+        return exit_
+
+    # ---- rules ----
+    def rule(self, first, second, action):
+        rt = self.rt
+        body = self.stmt(action) if action is not None else (
+            lambda: rt.output.append(rt.record + rt.vars['ORS']))
+        if first is None:
+            return body
+        start = self.expr(first)
+        if second is None:
+            def rule():
+                if to_bool(start()):
+                    body()
+            return rule
+        stop = self.expr(second)
+        active = [False]
+
+        def range_rule():
+            if not active[0]:
+                if not to_bool(start()):
+                    return
+                active[0] = True
+            if to_bool(stop()):
+                active[0] = False
+            body()
+        return range_rule
+
+
+REPLACEMENT_TOKEN = re.compile(r'(\\\\|\\&|&)')
+
+
+class Program:
+    """A compiled awk program. Each Program runs once; compile again to rerun."""
+
+    def __init__(self, source):
+        begin, rules, end = Parser(tokenize(source)).program()
+        self.rt = Runtime()
+        compiler = Compiler(self.rt)
+        self.begin = [compiler.stmt(b) for b in begin]
+        self.rules = [compiler.rule(*r) for r in rules]
+        self.end = [compiler.stmt(e) for e in end]
+        self.exit_code = 0
+
+    def assign(self, name, value):
+        """Set a variable from -v or a NAME=VALUE operand"""
+        self.rt.vars[name] = StrNum(unescape(value))
+
+    def _run_actions(self, actions):
+        for action in actions:
+            action()
+
+    def run(self, operands, open_input, stdin=None):
+        """Run the program over the files named in operands.
+
+        open_input(name) returns (line iterable, error); NAME=VALUE operands
+        are assignments made when reached. With no file operands the lines of
+        stdin, if given, are read. Returns the text written to standard output.
+        """
+        rt = self.rt
+        try:
+            try:
+                self._run_actions(self.begin)
+                if self.rules or self.end:
+                    self._run_input(operands, open_input, stdin)
+            except ExitProgram as e:
+                self._exit(e)
+            # END actions run even after exit, unless exit is called inside them
+            try:
+                self._run_actions(self.end)
+            except ExitProgram as e:
+                self._exit(e)
+        except (NextRecord, NextFile):
+            raise AwkError("next used in BEGIN or END action")
+        except RecursionError:
+            raise AwkError("expression nested too deeply")
+        return ''.join(rt.output)
+
+    def _exit(self, e):
+        if e.code is not None:
+            self.exit_code = e.code
+
+    def _run_input(self, operands, open_input, stdin):
+        files = [op for op in operands if not ASSIGNMENT.match(op)]
+        if not files:
+            operands = list(operands) + ['-']
+        for operand in operands:
+            m = ASSIGNMENT.match(operand)
+            if m:
+                self.assign(m.group(1), m.group(2))
+                continue
+            if operand == '-' and not files:
+                lines, error = stdin or (), ''
+            else:
+                lines, error = open_input(operand)
+            if error:
+                raise AwkError(error)
+            self._run_file(operand, lines)
+
+    def _run_file(self, name, lines):
+        rt = self.rt
+        variables = rt.vars
+        variables['FILENAME'] = name
+        variables['FNR'] = 0.0
+        rules = self.rules
+        try:
+            for line in lines:
+                if line.endswith('\n'):
+                    line = line[:-1]
+                variables['NR'] += 1.0
+                variables['FNR'] += 1.0
+                rt.set_record(line)
+                try:
+                    for rule in rules:
+                        rule()
+                except NextRecord:
+                    pass
+        except NextFile:
+            pass
+        finally:
+            close = getattr(lines, 'close', None)
+            if close:
+                close()
+
+
+def compile_program(source):
+    """Parse and compile awk source. Raises AwkError on syntax errors."""
+    try:
+        return Program(source)
+    except RecursionError:
+        raise AwkError("program nested too deeply")
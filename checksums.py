@@ -0,0 +1,73 @@
+# Checksum Implementation
+import os
+import re
+import zlib
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Bytes read per step while hashing; large enough that hashlib drops the GIL
+HASH_CHUNK_SIZE = 1024 * 1024
+MAX_HASH_WORKERS = min(32, (os.cpu_count() or 1) * 2)
+
+# Command name -> hashlib algorithm
+DIGEST_COMMANDS = {
+    'md5sum': 'md5',
+    'sha1sum': 'sha1',
+    'sha256sum': 'sha256',
+    'b2sum': 'blake2b',
+}
+
+# "DIGEST  NAME" or "DIGEST *NAME" (binary mode marker), as written by *sum
+CHECK_LINE = re.compile(r'^\\?([0-9a-fA-F]+) [ *](.+)$')
+
+
+def _chunks(stream, chunk_size=HASH_CHUNK_SIZE):
+    """Yield views of fixed-size chunks read from a binary stream into one reused buffer"""
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    while True:
+        n = stream.readinto(buf)
+        if not n:
+            break
+        yield view[:n]
+
+
+def digest_stream(stream, algorithm):
+    """Hex digest of everything remaining in a binary stream"""
+    h = hashlib.new(algorithm)
+    for chunk in _chunks(stream):
+        h.update(chunk)
+    return h.hexdigest()
+
+
+def crc32_stream(stream):
+    """(CRC-32, byte count) of everything remaining in a binary stream"""
+    crc = 0
+    length = 0
+    for chunk in _chunks(stream):
+        crc = zlib.crc32(chunk, crc)
+        length += len(chunk)
+    return crc & 0xffffffff, length
+
+
+def map_parallel(func, items, workers=MAX_HASH_WORKERS):
+    """Apply func to every item on a thread pool, returning results in input order"""
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(func, items))
+
+
+def parse_check_line(line):
+    """Split a checksum file line into (digest, name), or None if it is malformed"""
+    m = CHECK_LINE.match(line.rstrip('\r\n'))
+    if not m:
+        return None
+    return m.group(1).lower(), m.group(2)
+
+
+def digest_length(algorithm):
+    """Number of hex digits in a digest of algorithm"""
+    return hashlib.new(algorithm).digest_size * 2
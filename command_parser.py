@@ -6,13 +6,107 @@ import re
 import os
 import shutil
 import calendar
-import zlib
+import io
+import mmap
+import stat
+import posixpath
+import contextlib
+import shlex
+from itertools import chain, islice
+
+
+# Buffer size used when streaming file contents into an output sink
+COPY_BUFFER_SIZE = 64 * 1024
+# cmp compares mapped files this many bytes at a time
+CMP_CHUNK_SIZE = 1024 * 1024
+# Most text a lazily produced output may put on the terminal
+MAX_TERMINAL_OUTPUT = 4 * 1024 * 1024
+# Most text a lazily produced output may write through > or >> (yes > f would never end)
+MAX_REDIRECT_OUTPUT = 64 * 1024 * 1024
+# ls shows directories with more entries than this a page at a time on the terminal
+LS_PAGE_THRESHOLD = 5000
+# Numbers per chunk produced by seq
+SEQ_CHUNK_NUMBERS = 8192
+# Seconds inotifywait waits when no -t is given and its output is piped or redirected
+# (it then runs like any other command, blocking the terminal until it returns)
+INOTIFYWAIT_TIMEOUT = 10
+# inotifywait -e names -> watcher event kinds
+INOTIFY_EVENTS = {
+    'create': ('CREATE',), 'modify': ('MODIFY',), 'attrib': ('ATTRIB',), 'delete': ('DELETE',),
+    'moved_from': ('MOVED_FROM',), 'moved_to': ('MOVED_TO',), 'move': ('MOVED_FROM', 'MOVED_TO'),
+}
+# strings -t argument -> format() spec for offsets
+STRINGS_RADIX = {'d': 'd', 'o': 'o', 'x': 'x'}
+
+# tr [:class:] names -> test applied to each ASCII character
+TR_CLASSES = {
+    'alpha': str.isalpha, 'digit': str.isdigit, 'alnum': str.isalnum,
+    'upper': str.isupper, 'lower': str.islower, 'space': str.isspace,
+    'blank': lambda c: c in ' \t', 'xdigit': lambda c: c in '0123456789abcdefABCDEF',
+    'cntrl': lambda c: ord(c) < 32 or ord(c) == 127, 'print': lambda c: 32 <= ord(c) < 127,
+    'graph': lambda c: 32 < ord(c) < 127, 'punct': lambda c: 32 < ord(c) < 127 and not c.isalnum(),
+}
+# tr backslash escapes
+TR_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'a': '\a', 'b': '\b', 'f': '\f', 'v': '\v', '\\': '\\'}
+
+
+class ShellOperator(str):
+    """An unquoted '>', '>>' or '|' on a command line, as opposed to a quoted argument"""
+
+
+class BackgroundJob:
+    """Output of a command that keeps running after parse_command returns.
+
+    The terminal calls run(emit) on a worker thread; run passes each piece
+    of output to emit as it is produced and returns when the command is
+    done. cancel() (Ctrl+C) may be called from any thread to make it return.
+    """
+
+    def __init__(self, run, cancel):
+        self.run = run
+        self.cancel = cancel
+
+
+class PipeReader(io.RawIOBase):
+    """Read end of a pipe: a byte stream over the text chunks produced by the previous command.
+
+    Chunks are pulled only as the reader asks for data, so a lazy producer
+    such as seq or yes runs just as far as its consumer reads.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b""
+        self._offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self._offset >= len(self._pending):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = chunk.encode('utf-8')
+            self._offset = 0
+        n = min(len(buffer), len(self._pending) - self._offset)
+        buffer[:n] = self._pending[self._offset:self._offset + n]
+        self._offset += n
+        return n
 
 
 class CommandParser:
     def __init__(self, terminal_ui):
         self.terminal_ui = terminal_ui
         self.filesystem = terminal_ui.filesystem
+        # Output of the previous command in a pipeline, read by commands given '-' or no file
+        self.stdin = None
+        # True while the running command's output goes to the terminal (not a pipe or file)
+        self.to_terminal = False
+        # Sorted directory indexes ls pages through (a listing.ListingCache once needed)
+        self.listing_cache = None
+        # File systems hidden by mount, most recent last; umount returns to them
+        self.mounts = []
         
         # Simple process table
         self.process_table = [
@@ -40,6 +134,7 @@ class CommandParser:
             'rmdir': self.cmd_rmdir,
             'cp': self.cmd_cp,
             'mv': self.cmd_mv,
+            'rsync': self.cmd_rsync,
             'head': self.cmd_head,
             'tail': self.cmd_tail,
             'wc': self.cmd_wc,
@@ -57,6 +152,7 @@ class CommandParser:
             'find': self.cmd_find,
                 'ln': self.cmd_ln,
                 'locate': self.cmd_locate,
+                'inotifywait': self.cmd_inotifywait,
                 'whereis': self.cmd_whereis,
                 'whatis': self.cmd_whatis,
                 'lsof': self.cmd_lsof,
@@ -82,10 +178,17 @@ class CommandParser:
             'uniq': self.cmd_uniq,
             'cmp': self.cmd_cmp,
             'cksum': self.cmd_cksum,
+            'awk': self.cmd_awk,
+            'sed': self.cmd_sed,
+            'md5sum': self.cmd_md5sum,
+            'sha1sum': self.cmd_sha1sum,
+            'sha256sum': self.cmd_sha256sum,
+            'b2sum': self.cmd_b2sum,
             'fold': self.cmd_fold,
             'tee': self.cmd_tee,
                 'iconv': self.cmd_iconv,
                 'join': self.cmd_join,
+                'csvq': self.cmd_csvq,
                 'paste': self.cmd_paste,
                 'ex': self.cmd_ex,
             'banner': self.cmd_banner,
@@ -94,6 +197,12 @@ class CommandParser:
             'dirname': self.cmd_dirname,
             'basename': self.cmd_basename,
             'seq': self.cmd_seq,
+            'tar': self.cmd_tar,
+            'mkimage': self.cmd_mkimage,
+            'mount': self.cmd_mount,
+            'umount': self.cmd_umount,
+            'snapshot': self.cmd_snapshot,
+            'overlay': self.cmd_overlay,
             'download': self.cmd_download,
             'inputmode': self.cmd_inputmode,
             'man': self.cmd_man,
@@ -116,13 +225,27 @@ SYNOPSIS
 DESCRIPTION
     List information about the FILEs (the current directory by default).
 
+    Names are laid out in columns that fit the terminal window, or one per
+    line when the output goes to a pipe or a file. A directory of more than
+    5000 entries is shown a page at a time on the terminal; its sorted
+    listing is remembered, so the following pages come back at once.
+
 OPTIONS
-    -l     use a long listing format
-    -a     do not ignore entries starting with .
+    -l         use a long listing format
+    -a         do not ignore entries starting with .
+    -h         with -l, print sizes like 1.0K 234M
+    -S         sort by file size, largest first
+    -t         sort by modification time, newest first
+    -r         reverse the order of the sort
+    -R         list subdirectories recursively
+    -1         list one file per line
+    --page=N   show page N of a large directory
 
 EXAMPLES
     ls          list current directory
     ls -l       detailed list with permissions and dates
+    ls -lhS     largest files first, with readable sizes
+    ls --page=2 second page of a large directory
     ls /home    list /home directory""",
 
             'cd': """NAME
@@ -218,10 +341,22 @@ DESCRIPTION
     cp - copy files and directories
 
 SYNOPSIS
-    cp [-r] SOURCE DEST
+    cp [-r] [--reflink[=WHEN]] [--progress] SOURCE... DEST
 
 DESCRIPTION
-    Copy SOURCE to DEST. When copying directories, use -r.""",
+    Copy SOURCE to DEST, or multiple SOURCEs into directory DEST.
+    Large files are copied inside the kernel (copy_file_range/sendfile) and
+    directory trees copy many files at once.
+
+OPTIONS
+    -r, -R             copy directories recursively
+    --reflink[=WHEN]   clone file data instead of copying it; WHEN is
+                       'auto' (default, fall back to a copy), 'always' or 'never'
+    --progress         report progress and throughput while copying
+
+EXAMPLES
+    cp a.txt b.txt                 copy a file
+    cp -r --progress data backup   copy a tree and show throughput""",
 
             'mv': """NAME
     mv - move (rename) files
@@ -230,34 +365,73 @@ SYNOPSIS
     mv SOURCE DEST
 
 DESCRIPTION
-    Move SOURCE to DEST (rename or move into directory).""",
+    Move SOURCE to DEST (rename or move into directory). Moves within one
+    filesystem are a rename; otherwise data is copied like cp and removed.""",
+
+            'rsync': """NAME
+    rsync - fast incremental file copy
+
+SYNOPSIS
+    rsync [-avcn] [--delete] [--stats] SOURCE... DEST
+
+DESCRIPTION
+    Copy SOURCE to DEST, skipping files whose size and modification time
+    already match. Large changed files are compared block by block and only
+    the differing blocks are rewritten. New files are written to a hidden
+    .NAME.partial file first, so an interrupted run resumes where it stopped.
+    A directory SOURCE ending in '/' copies its contents rather than itself.
+
+OPTIONS
+    -r, -a         recurse into directories
+    -c             compare file checksums instead of size and time
+    -n, --dry-run  show what would be transferred without changing anything
+    -v             list transferred files and print a summary
+    --delete       delete files in DEST that are not in SOURCE
+    --stats        print a transfer summary
+
+EXAMPLES
+    rsync -av data/ backup        mirror the contents of data into backup
+    rsync -an --delete src/ dst   preview a mirror including deletions""",
 
             'head': """NAME
     head - output the first part of files
 
 SYNOPSIS
-    head [-n NUM] FILE
+    head [-n NUM] FILE...
 
 DESCRIPTION
-    Print the first NUM lines (default 10) of FILE.""",
+    Print the first NUM lines (default 10) of each FILE.
+    With more than one FILE, precede each with a header giving the file name.
+
+EXAMPLES
+    head -n 5 log.txt         first 5 lines of log.txt
+    head -3 a.txt b.txt       first 3 lines of each file with ==> name <== headers""",
 
             'tail': """NAME
     tail - output the last part of files
 
 SYNOPSIS
-    tail [-n NUM] FILE
+    tail [-n NUM] FILE...
 
 DESCRIPTION
-    Print the last NUM lines (default 10) of FILE.""",
+    Print the last NUM lines (default 10) of each FILE.
+    With more than one FILE, precede each with a header giving the file name.
+    Only the end of each file is read, so large files are handled quickly.""",
 
             'wc': """NAME
     wc - print newline, word, and byte counts for each file
 
 SYNOPSIS
-    wc FILE...
+    wc [-l] [-w] [-c] FILE...
 
 DESCRIPTION
-    Print line, word, and byte counts for each FILE.""",
+    Print newline, word, and byte counts for each FILE, and a total line if
+    more than one FILE is specified.
+
+OPTIONS
+    -l     print the newline counts
+    -w     print the word counts
+    -c     print the byte counts""",
 
             'grep': """NAME
     grep - print lines matching a pattern
@@ -326,10 +500,17 @@ DESCRIPTION
     file - determine file type
 
 SYNOPSIS
-    file FILE
+    file [-b] [-r] FILE...
 
 DESCRIPTION
-    Determines and prints file type. Prints 'directory' for directories, 'ASCII text' for text files, otherwise 'data'.""",
+    Determines and prints the type of each FILE from its leading bytes, using
+    a table of magic numbers (ELF, PNG, JPEG, GIF, PDF, gzip, bzip2, xz, zip,
+    tar, SQLite, ...) and text sniffing (ASCII, UTF-8, UTF-16, JSON, XML,
+    HTML, scripts). Wildcards such as * are expanded, and many files are
+    examined in parallel.
+
+    -b             do not prefix output lines with file names
+    -r             examine the contents of directories recursively""",
 
             'ln': """NAME
     ln - link files
@@ -358,14 +539,53 @@ SYNOPSIS
 DESCRIPTION
     Searches the filesystem for names containing PATTERN.""",
 
+            'inotifywait': """NAME
+    inotifywait - wait for changes to files
+
+SYNOPSIS
+    inotifywait [-mrq] [-t SECONDS] [-e EVENT[,EVENT...]] [PATH...]
+
+DESCRIPTION
+    Report changes to the files and directories PATH (the current directory
+    by default), including those made by other programs. Each change is
+    printed as 'DIRECTORY/ EVENT NAME' as soon as it happens. Without -m,
+    inotifywait exits after the first matching change. Press Ctrl+C to stop
+    it early.
+
+    When its output is piped or redirected, the terminal waits for it to
+    finish, so it stops after 10 seconds unless -t says otherwise, and
+    -t 0 is refused.
+
+    Changes come from inotify where the kernel supports it and from
+    rescanning the working directory every few seconds elsewhere. Only file
+    systems backed by a directory on disk can be watched.
+
+OPTIONS
+    -m          keep reporting changes until Ctrl+C or the timeout (monitor)
+    -r          also report changes in subdirectories of PATH
+    -t SECONDS  stop after SECONDS (0, the default on the terminal, waits
+                without a limit)
+    -e EVENTS   only report these events: create, modify, attrib, delete,
+                moved_from, moved_to, move
+
+EXAMPLES
+    inotifywait -m -r .                report every change until Ctrl+C
+    inotifywait -m -t 30 . > changes   record changes for 30 seconds
+    inotifywait -e create,delete logs  wait until a log is added or removed""",
+
             'strings': """NAME
     strings - print text strings from files
 
 SYNOPSIS
-    strings FILE
+    strings [-n MIN] [-t d|o|x] FILE...
 
 DESCRIPTION
-    Prints sequences of printable characters of length >= 4.""",
+    Prints sequences of printable ASCII characters found in the raw bytes of
+    each FILE. Files are memory-mapped and scanned with a single regular
+    expression.
+
+    -n MIN         print only sequences of at least MIN characters (default 4)
+    -t d|o|x       precede each string with its offset in decimal, octal or hex""",
 
             'find': """NAME
     find - search for files in a directory hierarchy
@@ -470,10 +690,28 @@ DESCRIPTION
     cut - remove sections from each line
 
 SYNOPSIS
-    cut -d DELIM -f LIST FILE
+    cut -b LIST [--complement] FILE...
+    cut -c LIST [--complement] FILE...
+    cut -f LIST [-d DELIM] [-s] [--complement] FILE...
 
 DESCRIPTION
-    Prints the selected 1-based field numbers using the delimiter.""",
+    Print the selected parts of each line. LIST is a comma-separated list of
+    1-based positions and ranges: N, N-M, N- (to the end) or -M (from the
+    start). Parts are printed in input order, each at most once. Lines are
+    only split as far as the highest selected field.
+
+    -b LIST               Select bytes
+    -c LIST               Select characters
+    -f LIST               Select fields
+    -d DELIM              Field delimiter (default: TAB)
+    -s                    Skip lines without the delimiter
+    --complement          Select everything not in LIST
+    --output-delimiter=S  Join the selected parts with S
+
+EXAMPLES
+    cut -d, -f1,3 data.csv         First and third columns
+    cut -c1-10 log                 First ten characters of each line
+    cut -d: -f2- --output-delimiter=' ' /etc/passwd""",
 
             'diff': """NAME
     diff - compare files line by line (simple)
@@ -503,13 +741,32 @@ DESCRIPTION
     Removes adjacent duplicate lines and prints result.""",
 
             'tr': """NAME
-    tr - translate characters
+    tr - translate, squeeze and delete characters
 
 SYNOPSIS
-    tr SET1 SET2 FILE
+    tr [-c] [-d] [-s] SET1 [SET2] [FILE...]
+    COMMAND | tr [-c] [-d] [-s] SET1 [SET2]
 
 DESCRIPTION
-    One-to-one character mapping up to min(len(SET1), len(SET2)).""",
+    Copy the input, replacing characters of SET1 with the matching
+    characters of SET2. SET2 is extended with its last character if it is
+    shorter than SET1. Without FILE, tr reads the output piped into it.
+
+    Sets may contain ranges (a-z), classes ([:alpha:], [:digit:],
+    [:upper:], [:lower:], [:space:], [:punct:], ...), escapes (\\n, \\t,
+    \\NNN) and, in SET2, repeats ([c*n], or [c*] to fill).
+
+    Sets of ASCII characters are applied to the raw input bytes through a
+    256-entry translation table, one buffer at a time.
+
+    -c    Use the complement of SET1
+    -d    Delete characters in SET1
+    -s    Squeeze runs of a repeated character from the last set into one
+
+EXAMPLES
+    tr a-z A-Z notes.txt            Upper-case a file
+    cat log | tr -s ' '             Collapse runs of spaces
+    tr -cd '[:alnum:]\\n' data     Keep only letters, digits and newlines""",
 
             'cksum': """NAME
     cksum - checksum and count the bytes of a file
@@ -518,34 +775,105 @@ SYNOPSIS
     cksum FILE...
 
 DESCRIPTION
-    Prints CRC32 and byte length for each FILE.""",
+    Prints CRC32 and byte length for each FILE. Files are read as raw bytes
+    in fixed-size chunks, and several files are processed at once.""",
+
+            'md5sum': """NAME
+    md5sum - compute and check MD5 message digests
+
+SYNOPSIS
+    md5sum [-c] [--quiet] FILE...
+
+DESCRIPTION
+    Prints the MD5 digest and name of each FILE. Files are hashed
+    concurrently, reading raw bytes in fixed-size chunks.
+
+    -c, --check    read DIGEST  NAME lines from each FILE and verify them
+    --quiet        with -c, only report files that fail""",
+
+            'sha1sum': """NAME
+    sha1sum - compute and check SHA-1 message digests
+
+SYNOPSIS
+    sha1sum [-c] [--quiet] FILE...
+
+DESCRIPTION
+    Prints the SHA-1 digest and name of each FILE. Files are hashed
+    concurrently, reading raw bytes in fixed-size chunks.
+
+    -c, --check    read DIGEST  NAME lines from each FILE and verify them
+    --quiet        with -c, only report files that fail""",
+
+            'sha256sum': """NAME
+    sha256sum - compute and check SHA-256 message digests
+
+SYNOPSIS
+    sha256sum [-c] [--quiet] FILE...
+
+DESCRIPTION
+    Prints the SHA-256 digest and name of each FILE. Files are hashed
+    concurrently, reading raw bytes in fixed-size chunks.
+
+    -c, --check    read DIGEST  NAME lines from each FILE and verify them
+    --quiet        with -c, only report files that fail""",
+
+            'b2sum': """NAME
+    b2sum - compute and check BLAKE2b message digests
+
+SYNOPSIS
+    b2sum [-c] [--quiet] FILE...
+
+DESCRIPTION
+    Prints the BLAKE2b digest and name of each FILE. Files are hashed
+    concurrently, reading raw bytes in fixed-size chunks.
+
+    -c, --check    read DIGEST  NAME lines from each FILE and verify them
+    --quiet        with -c, only report files that fail""",
 
             'cmp': """NAME
     cmp - compare two files (simple)
 
 SYNOPSIS
-    cmp FILE1 FILE2
+    cmp [-l] [-n LIMIT] FILE1 FILE2
 
 DESCRIPTION
-    Prints 'files differ' if content differs; silent otherwise.""",
+    Compares the raw bytes of two files, stopping at the first difference.
+    Prints its byte and line number, or reports EOF on the shorter file;
+    silent if the files are identical.
+
+    -l             print the offset and octal values of every differing byte
+    -n LIMIT       compare at most LIMIT bytes""",
 
             'fold': """NAME
     fold - wrap each input line to fit in specified width
 
 SYNOPSIS
-    fold [-w WIDTH] FILE
+    fold [-s] [-w WIDTH] [FILE]...
 
 DESCRIPTION
-    Prints lines wrapped at WIDTH (default 80).""",
+    Prints lines wrapped at WIDTH (default 80). Reads standard input when
+    no FILE is given, and wraps lines as they arrive.
+
+    -w, --width=WIDTH    Use WIDTH columns instead of 80
+    -s, --spaces         Break after the last blank before the limit
+    -b, --bytes          Accepted for compatibility
+
+EXAMPLES
+    fold -s -w 40 notes.txt""",
 
             'tee': """NAME
     tee - read from standard input and write to files
 
 SYNOPSIS
-    tee FILE...
+    COMMAND | tee [-a] FILE...
 
 DESCRIPTION
-    Writes to FILE(s).""",
+    Copy the output piped into tee to each FILE and pass it on unchanged.
+
+    -a, --append    Append to the files instead of overwriting them
+
+EXAMPLES
+    ls | tee listing.txt | wc -l""",
 
             'download': """NAME
     download - save session transcript
@@ -576,52 +904,165 @@ EXAMPLES
     inputmode bottom     Switch to bottom input box""",
 
             'awk': """NAME
-    awk - pattern scanning and processing
+    awk - pattern scanning and processing language
 
 SYNOPSIS
-    awk '{print $N}' FILE
+    awk [-F FS] [-v VAR=VALUE] 'PROGRAM' [FILE...]
+    awk [-F FS] [-v VAR=VALUE] -f PROGFILE [FILE...]
 
 DESCRIPTION
-    Simple awk-like support. Only '{print $N}' pattern is supported.
+    Runs PROGRAM over each input line. The program is compiled once before
+    any input is read, and files are streamed line by line.
+
+    Supported: pattern { action } rules, BEGIN and END, /regex/ and range
+    patterns, fields ($0, $1, $NF, assignment to fields and NF), variables,
+    associative arrays (arr[k], (i,j) in arr, delete, for (k in arr)), if/
+    else, while, do, for, break, continue, next, nextfile, exit, print and
+    printf (with > and >> redirection into files), the usual arithmetic,
+    comparison, regex-match and logical operators, and the built-ins length,
+    substr, index, split, sub, gsub, match, sprintf, tolower, toupper, int,
+    sqrt, exp, log, sin, cos, atan2, rand and srand. Special variables: NR,
+    NF, FNR, FS, OFS, ORS, FILENAME, SUBSEP, RSTART, RLENGTH, OFMT, CONVFMT.
+
+    Not supported: user-defined functions, getline, output to commands.
+
+    -F FS          set the input field separator ('t' means tab)
+    -v VAR=VALUE   set a variable before the program starts
+    -f PROGFILE    read the program from PROGFILE
+
+    VAR=VALUE operands between file names are assignments made when reached.
 
 EXAMPLES
-    awk '{print $1}' file.txt    Print first field of each line""",
+    awk '{print $1}' file.txt
+    awk -F, '$3 > 100 {n++; s += $3} END {print n, s/n}' data.csv
+    awk '{count[$1]++} END {for (k in count) printf "%s %d\\n", k, count[k]}' log""",
 
             'sed': """NAME
-    sed - stream editor
+    sed - stream editor for filtering and transforming text
 
 SYNOPSIS
-    sed 's/old/new/g' FILE
+    sed [OPTION]... SCRIPT [FILE]...
+    sed [OPTION]... -e SCRIPT... [-f SCRIPTFILE] [FILE]...
 
 DESCRIPTION
-    Basic sed substitution. Only simple s/old/new/g pattern is supported.
+    Apply an editing script to each input line. The script is compiled once,
+    with its regular expressions, before any input is read, and files are
+    streamed rather than loaded whole.
+
+    -n, --quiet       Suppress automatic printing of the pattern space
+    -e SCRIPT         Add SCRIPT to the commands to run (may be repeated)
+    -f FILE           Add the commands in FILE
+    -E, -r            Use extended regular expressions
+    -i[SUFFIX]        Edit files in place, keeping a backup if SUFFIX is given;
+                      each file is written to a temporary file and renamed
+    -s, --separate    Treat files as separate rather than one long stream
+
+ADDRESSES
+    N  $  /RE/  \cREc  FIRST~STEP  ADDR1,ADDR2  ADDR1,+N  ADDR1,~N  0,/RE/
+    A trailing ! selects the lines that do not match. I after a regex
+    ignores case.
+
+COMMANDS
+    s/RE/REPL/FLAGS   Substitute (flags: g p N i m w FILE)
+    d D p P n N       Delete, print, read next line
+    a i c TEXT        Append, insert, change
+    h H g G x z       Hold space operations
+    y/SRC/DST/        Transliterate
+    b t T LABEL, :LABEL   Branching
+    = l q Q r w { }   Line number, list, quit, read/write files, blocks
 
 EXAMPLES
-    sed 's/old/new/g' file.txt    Replace 'old' with 'new' in file""",
+    sed 's/old/new/g' file.txt       Replace 'old' with 'new'
+    sed -n '/error/p' log            Print matching lines
+    sed -i.bak '1,3d' notes.txt      Delete lines 1-3, keeping notes.txt.bak
+    sed -e '$!N' -e 's/\n/ /' f     Join pairs of lines""",
 
             'join': """NAME
-    join - join lines of two files
+    join - join lines of two files on a common field
+
+SYNOPSIS
+    join [OPTION]... FILE1 FILE2
+
+DESCRIPTION
+    For each pair of lines with identical join fields, print the join field
+    followed by the other fields of both lines. Every matching pair is
+    printed, so repeated keys give all combinations.
+
+    Inputs sorted on the join field are merged in a single streaming pass.
+    If either file turns out not to be sorted, the smaller file is loaded
+    into a hash table and the larger one is streamed past it instead.
+    Either FILE (but not both) may be -, to read standard input.
+
+    -1 FIELD      Join on this field of file 1 (default 1)
+    -2 FIELD      Join on this field of file 2 (default 1)
+    -j FIELD      Same as -1 FIELD -2 FIELD
+    -t CHAR       Field separator (default: runs of blanks)
+    -a FILENUM    Also print unpairable lines from file 1 or 2
+    -v FILENUM    Print only unpairable lines from file 1 or 2
+    -e EMPTY      Replace missing -o fields with EMPTY
+    -o LIST       Output fields: 0 (join field) or FILENUM.FIELD, or 'auto'
+    -i            Ignore case when comparing fields
+
+EXAMPLES
+    join users.txt groups.txt             Join on the first field
+    join -t, -1 2 -2 1 a.csv b.csv        Join column 2 of a.csv to column 1 of b.csv
+    join -a1 -e NULL -o 0,1.2,2.2 a b     Left outer join with explicit columns""",
+
+            'csvq': """NAME
+    csvq - run SQL-like queries over CSV and TSV files
 
 SYNOPSIS
-    join FILE1 FILE2
+    csvq [-d DELIM] [-t] [-H] [-o csv|tsv|table] QUERY [FILE]
 
 DESCRIPTION
-    Join lines of two files on the first field.
+    Evaluate QUERY over a delimited file whose first row names the columns.
+    The file is read in batches of rows held as columns, and only the
+    columns the query uses are extracted. Aggregates are kept in numeric
+    array buffers (updated with NumPy when it is installed), so grouping
+    millions of rows needs memory only per group.
+
+    SELECT expr [AS name], ... | *
+    [FROM FILE] [WHERE cond] [GROUP BY expr, ...] [HAVING cond]
+    [ORDER BY expr [ASC|DESC], ...] [LIMIT n]
+
+    Columns are referenced by name ("quoted" if needed) or as $1, $2, ...
+    Empty cells are NULL. Values compare as numbers when both sides are
+    numeric, otherwise as text.
+
+    Operators:   + - * / %  ||  = != < <= > >=  AND OR NOT
+                 LIKE 'pat%'  IN (...)  IS [NOT] NULL
+    Functions:   lower upper trim length abs round substr coalesce
+    Aggregates:  count(*) count sum avg min max
+
+    -d DELIM      Field delimiter (default: ',' or TAB for .tsv files)
+    -t            Input is tab-separated
+    -H            The file has no header row; columns are named c1, c2, ...
+    -o FORMAT     Output as csv (default), tsv or an aligned table
 
 EXAMPLES
-    join file1.txt file2.txt    Join files on first field""",
+    csvq 'SELECT dept, count(*), avg(salary) FROM staff.csv GROUP BY dept'
+    csvq -o table 'SELECT name, salary WHERE salary > 100000 ORDER BY salary DESC LIMIT 10' staff.csv
+    csvq -H 'SELECT c1, sum(c3) GROUP BY c1 HAVING sum(c3) > 0' data.tsv""",
 
             'paste': """NAME
     paste - merge lines of files
 
 SYNOPSIS
-    paste FILE1 FILE2
+    paste [-s] [-d LIST] [FILE]...
 
 DESCRIPTION
-    Merge lines of files horizontally.
+    Write the lines with the same number from every FILE side by side,
+    separated by tabs. A FILE of - is standard input; naming it more than
+    once takes its lines in turn.
+
+    -d, --delimiters=LIST    Cycle through the characters of LIST instead of
+                             tabs (\\n, \\t, \\\\ and \\0 for none are understood)
+    -s, --serial             Paste each file onto a single line instead
 
 EXAMPLES
-    paste file1.txt file2.txt    Merge files horizontally""",
+    paste file1.txt file2.txt    Merge files horizontally
+    seq 6 | paste - - -          Three numbers per line
+    paste -s -d+ nums.txt        Join a file into a sum expression""",
 
             'ex': """NAME
     ex - line editor
@@ -846,11 +1287,14 @@ SYNOPSIS
     yes [STRING]
 
 DESCRIPTION
-    Output STRING repeatedly (default: "y").
+    Output STRING repeatedly (default: "y"), for as long as the next
+    command in the pipeline keeps reading. Redirected into a file, output
+    stops after 64 MiB, and the terminal shows at most 4 MiB.
 
 EXAMPLES
     yes          Output "y" repeatedly
-    yes Hello    Output "Hello" repeatedly""",
+    yes Hello    Output "Hello" repeatedly
+    yes | head -3""",
 
             'dirname': """NAME
     dirname - extract directory from pathname
@@ -880,28 +1324,176 @@ EXAMPLES
     seq - generate sequence of numbers
 
 SYNOPSIS
-    seq [FIRST] [INCREMENT] LAST
+    seq [-w] [-s SEP] [-f FORMAT] [FIRST [INCREMENT]] LAST
 
 DESCRIPTION
-    Generate a sequence of numbers.
+    Print numbers from FIRST (default 1) to LAST in steps of INCREMENT
+    (default 1). Decimal operands are counted exactly. Numbers are produced
+    as they are read, so long sequences can be piped without limit.
+
+    -w, --equal-width        Pad with leading zeros to equal width
+    -s, --separator=SEP      Separate numbers with SEP instead of newlines
+    -f, --format=FORMAT      Print each number with a printf-style FORMAT
 
 EXAMPLES
     seq 5           Generate 1 to 5
     seq 2 5         Generate 2 to 5
-    seq 1 2 10      Generate 1, 3, 5, 7, 9""",
+    seq 1 2 10      Generate 1, 3, 5, 7, 9
+    seq -w 8 10     Generate 08, 09, 10
+    seq 0 0.5 2     Generate 0.0, 0.5, 1.0, 1.5, 2.0""",
 
             'tar': """NAME
-    tar - create/extract tar archives
+    tar - create, list or extract tar archives
+
+SYNOPSIS
+    tar -c [-zjJav] [-C DIR] -f ARCHIVE FILE...
+    tar -t [-v] -f ARCHIVE
+    tar -x [-v] [-C DIR] -f ARCHIVE [MEMBER]...
+
+DESCRIPTION
+    Create (-c), list (-t) or extract (-x) tar archives. The leading dash may be
+    omitted (tar czf ...). Compressed archives are written as a series of
+    independently compressed blocks produced on all CPU cores; any gzip, bzip2
+    or xz archive is detected automatically when reading. Members that would
+    land outside the extraction directory or the working directory, or that
+    are links pointing out of it, are skipped.
+
+OPTIONS
+    -z     compress with gzip
+    -j     compress with bzip2
+    -J     compress with xz
+    -a     pick the compression from the archive suffix (.tgz, .tar.bz2, .txz ...)
+    -C DIR change to DIR before adding or extracting files
+    -v     list files as they are processed (long format with -t)
+
+EXAMPLES
+    tar czf src.tar.gz src        create a gzip-compressed archive
+    tar tvf src.tar.gz            list its contents in long format
+    tar xf src.tar.gz -C restore  extract into restore/""",
+
+            'mkimage': """NAME
+    mkimage - build a read-only file system image from a directory
+
+SYNOPSIS
+    mkimage [-v] DIRECTORY IMAGE
+
+DESCRIPTION
+    Write the tree under DIRECTORY to IMAGE in a compact binary format: the
+    file contents, then a table of fixed-size entries and their names, with
+    the entries of each directory sorted so they can be binary-searched.
+    Hard-linked files are stored once. An image is memory-mapped when it is
+    opened as the terminal's file system, so it loads without reading the
+    files and every terminal using it shares the same pages.
+
+OPTIONS
+    -v     list each path as it is added
+
+EXAMPLES
+    mkimage samples samples.img   build an image of samples/
+    mount samples.img             browse the image""",
+
+            'mount': """NAME
+    mount, umount - open an image or archive as the terminal's file system
+
+SYNOPSIS
+    mount [IMAGE | ARCHIVE | :memory:]
+    umount
+
+DESCRIPTION
+    Replace the file system the terminal works on with IMAGE (built by
+    mkimage), a zip or tar ARCHIVE, or an empty in-memory file system.
+    IMAGE and ARCHIVE are files in the current working directory tree;
+    both are read-only. An image is memory-mapped, so it opens at once
+    whatever its size, and terminals mounting the same image share its
+    pages. umount closes it and returns to the previous file system.
+
+    Without operands, list what is mounted.
+
+    The application can also start on one of these directly:
+    python main.py samples.img
+
+EXAMPLES
+    mkimage samples samples.img
+    mount samples.img
+    ls -R
+    umount""",
+
+            'umount': """NAME
+    umount - close the file system opened by mount
+
+SYNOPSIS
+    umount
+
+DESCRIPTION
+    Close the image, archive or in-memory file system opened by the most
+    recent mount and return to the one it replaced. Mounts nest, so each
+    umount undoes one mount. An active overlay must be stopped first.
+
+EXAMPLES
+    mount samples.img
+    umount""",
+
+            'overlay': """NAME
+    overlay - copy-on-write layer over the working directory
+
+SYNOPSIS
+    overlay start [--disk]
+    overlay [status]
+    overlay commit
+    overlay discard
+    overlay stop
+
+DESCRIPTION
+    While an overlay is active the working directory is only read: every
+    change goes to a writable upper layer on top of it. A file is copied up
+    the first time it is changed, and deleting something from the directory
+    records a whiteout that hides it. Destructive experiments can therefore
+    run against a large tree without copying it first.
+
+    start     start an overlay. The upper layer is kept in memory, or with
+              --disk in a scratch directory next to the working directory
+              (DIR.overlay), where it survives restarts and is picked up
+              again by the next 'overlay start --disk'
+    status    list the changes: A added, M modified or replaced, D deleted
+    commit    write every change through to the working directory
+    discard   throw every change away
+    stop      leave the overlay; it must have no pending changes
+
+EXAMPLES
+    overlay start
+    rm -r logs
+    sed -i 's/debug/info/' app.conf
+    overlay status
+    overlay discard""",
+
+            'snapshot': """NAME
+    snapshot - point-in-time snapshots of the working directory
 
 SYNOPSIS
-    tar OPERATION ARCHIVE [FILE]...
+    snapshot create [NAME]
+    snapshot list
+    snapshot restore NAME
+    snapshot diff NAME [OTHER]
+    snapshot delete NAME
 
 DESCRIPTION
-    Create or extract tar archives. OPERATION can be 'cf' (create) or 'xf' (extract).
+    Save and restore the whole working directory. Snapshots are kept in
+    /.snapshots as 1 MiB chunks named by their SHA-256, so data shared between
+    files or snapshots is stored once. Files whose size and modification time
+    are unchanged since the last snapshot are not read again, which makes
+    repeated snapshots of a mostly unchanged tree fast and small.
+
+    create    take a snapshot (NAME defaults to the current date and time)
+    list      show snapshots with their size and the new data each stored
+    restore   make the working directory match a snapshot
+    diff      list Added, Deleted and Modified files between two snapshots,
+              or between a snapshot and the working directory
+    delete    remove a snapshot and the chunks only it used
 
 EXAMPLES
-    tar cf archive.tar file1 file2    Create archive
-    tar xf archive.tar                 Extract archive""",
+    snapshot create before-upgrade
+    snapshot diff before-upgrade
+    snapshot restore before-upgrade""",
 
             'nohup': """NAME
     nohup - run command immune to hangups
@@ -972,22 +1564,74 @@ EXAMPLES
     # ============ COMMAND PARSER ============
     
     def parse_command(self, command_line):
-        """Parse and execute a command"""
+        """Parse and execute a command line, which may be a pipeline"""
         if not command_line.strip():
             return ""
         
-        parts = command_line.strip().split()
+        parts = self._split_command_line(command_line.strip())
         if not parts:
             return ""
 
+        stages = [[]]
+        for part in parts:
+            if isinstance(part, ShellOperator) and part == '|':
+                stages.append([])
+            else:
+                stages[-1].append(part)
+        if len(stages) > 1 and not all(stages):
+            return "bash: syntax error near unexpected token '|'"
+
+        # Each command's output becomes the next one's standard input. A command
+        # may return an iterator of text chunks instead of a string; it is only
+        # read as far as the next command (or the terminal) consumes it.
+        output = None
+        try:
+            for index, stage in enumerate(stages):
+                if index:
+                    self.stdin = self._output_chunks(output)
+                self.to_terminal = index == len(stages) - 1
+                output = self._run_command(stage)
+            if output is not None and not isinstance(output, (str, BackgroundJob)):
+                output = self._collect_output(output)
+        finally:
+            self.stdin = None
+            self.to_terminal = False
+        return output
+
+    @staticmethod
+    def _output_chunks(output):
+        """A command's output as an iterator of text chunks ending in a newline"""
+        if output is None or isinstance(output, str):
+            return iter([output + "\n"] if output else [])
+        return output
+
+    @staticmethod
+    def _collect_output(chunks):
+        """Gather lazily produced output for the terminal, up to MAX_TERMINAL_OUTPUT characters"""
+        parts = []
+        size = 0
+        for chunk in chunks:
+            parts.append(chunk)
+            size += len(chunk)
+            if size > MAX_TERMINAL_OUTPUT:
+                if hasattr(chunks, 'close'):
+                    chunks.close()
+                parts.append(f"\n... output truncated after {MAX_TERMINAL_OUTPUT} characters\n")
+                break
+        text = "".join(parts)
+        return text[:-1] if text.endswith("\n") else text
+
+    def _run_command(self, parts):
+        """Run one simple command with an optional trailing > or >> redirection"""
         redirect = None
-        if '>' in parts or '>>' in parts:
+        if any(isinstance(part, ShellOperator) for part in parts):
             for i in range(len(parts) - 1, -1, -1):
-                if parts[i] in ('>', '>>'):
+                if isinstance(parts[i], ShellOperator):
                     if i + 1 >= len(parts):
                         return "bash: syntax error near unexpected token 'newline'"
                     redirect = (parts[i], parts[i + 1])
                     parts = parts[:i]
+                    self.to_terminal = False
                     break
 
         if not parts:
@@ -999,6 +1643,23 @@ EXAMPLES
         if command in self.commands:
             output = self.commands[command](args)
             
+            if redirect and output is not None and not isinstance(output, str):
+                # Stream lazily produced output straight into the file
+                op, path = redirect
+                stream, error = self.filesystem.open_stream(path, 'w' if op == '>' else 'a')
+                if error:
+                    return f"bash: {error}"
+                size = 0
+                with stream:
+                    for chunk in output:
+                        if size + len(chunk) > MAX_REDIRECT_OUTPUT:
+                            stream.write(chunk[:MAX_REDIRECT_OUTPUT - size])
+                            if hasattr(output, 'close'):
+                                output.close()
+                            return f"bash: {path}: output truncated after {MAX_REDIRECT_OUTPUT} characters"
+                        stream.write(chunk)
+                        size += len(chunk)
+                return ""
             if redirect and output is not None:
                 op, path = redirect
                 content = (output + "\n") if output else ""
@@ -1012,64 +1673,212 @@ EXAMPLES
         else:
             return f"bash: {command}: command not found"
     
+    def _split_command_line(self, line):
+        """Split a command line into words the way a shell does.
+
+        Single and double quotes group words and are removed, and a backslash
+        escapes the next character. Unquoted '>', '>>' and '|' become
+        ShellOperator tokens even without spaces around them. A line with
+        unbalanced quotes falls back to splitting on whitespace.
+        """
+        words = []
+        word = []
+        in_word = False
+        i, n = 0, len(line)
+        while i < n:
+            c = line[i]
+            if c in ' \t\n':
+                if in_word:
+                    words.append(''.join(word))
+                    word, in_word = [], False
+            elif c == "'":
+                end = line.find("'", i + 1)
+                if end < 0:
+                    return self._split_unquoted(line)
+                word.append(line[i + 1:end])
+                in_word = True
+                i = end
+            elif c == '"':
+                i += 1
+                while i < n and line[i] != '"':
+                    if line[i] == '\\' and i + 1 < n and line[i + 1] in '"\\$`':
+                        i += 1
+                    word.append(line[i])
+                    i += 1
+                if i >= n:
+                    return self._split_unquoted(line)
+                in_word = True
+            elif c == '\\' and i + 1 < n:
+                i += 1
+                word.append(line[i])
+                in_word = True
+            elif c in '>|':
+                if in_word:
+                    words.append(''.join(word))
+                    word, in_word = [], False
+                op = '>>' if line.startswith('>>', i) else c
+                words.append(ShellOperator(op))
+                i += len(op) - 1
+            else:
+                word.append(c)
+                in_word = True
+            i += 1
+        if in_word:
+            words.append(''.join(word))
+        return words
+
+    def _split_unquoted(self, line):
+        return [ShellOperator(w) if w in ('>', '>>', '|') else w for w in line.split()]
+
     # ============ FILE SYSTEM COMMANDS ============
     
     def cmd_ls(self, args):
         """List directory contents"""
-        show_details = '-l' in args
-        show_all = '-a' in args
+        from listing import DirectoryIndex, ListingCache, lstat_or_none, long_line, column_lines, COLUMN_GAP
         
-        path_args = [arg for arg in args if not arg.startswith('-')]
-        target_path = path_args[0] if path_args else '.'
+        flags = set()
+        paths = []
+        page = None
+        for arg in args:
+            if arg.startswith('--page='):
+                value = arg[len('--page='):]
+                if not value.isdigit() or int(value) < 1:
+                    return f"ls: invalid page number '{value}'"
+                page = int(value)
+            elif arg.startswith('-') and len(arg) > 1:
+                for flag in arg[1:]:
+                    if flag not in 'laSthRr1':
+                        return f"ls: invalid option -- '{flag}'"
+                    flags.add(flag)
+            else:
+                paths.append(arg)
         
-        real_path = self.filesystem._get_real_path(target_path)
-        if not real_path or not os.path.exists(real_path):
-            return f"ls: cannot access '{target_path}': No such file or directory"
+        fs = self.filesystem
+        long_format = 'l' in flags
+        human = 'h' in flags
+        show_all = 'a' in flags
+        sort = 'size' if 'S' in flags else 'time' if 't' in flags else 'name'
+        reverse = 'r' in flags
+        recursive = 'R' in flags
+        # Like ls, one name per line unless the output is going to the terminal
+        one_per_line = '1' in flags or not self.to_terminal
+        width, height = self.terminal_ui.terminal_size()
+        owner = self.terminal_ui.username
         
-        if not os.path.isdir(real_path):
-            return target_path
+        def entry_lines(directory, names, stats):
+            if long_format:
+                lines = []
+                for i, name in enumerate(names):
+                    path = posixpath.join(directory, name)
+                    st = stats[i] if stats else lstat_or_none(fs, path)
+                    target = None
+                    if st is not None and stat.S_ISLNK(st.st_mode):
+                        try:
+                            target = fs.readlink(path)
+                        except OSError:
+                            target = '?'
+                    lines.append(long_line(name, st, owner, human, target))
+                return lines
+            if one_per_line:
+                return list(names)
+            return column_lines(names, width)
         
-        try:
-            entries = os.listdir(real_path)
-            if not show_all:
-                entries = [e for e in entries if not e.startswith('.')]
+        def paged_lines(directory):
+            if self.listing_cache is None:
+                self.listing_cache = ListingCache()
+            index = self.listing_cache.get(fs, directory, show_all, sort, reverse)
+            if page is None and (len(index) <= LS_PAGE_THRESHOLD or not self.to_terminal):
+                return entry_lines(directory, index.names, index.stats)
+            current = page or 1
+            rows = max(1, height - 2)
+            columns = 1 if long_format or one_per_line else max(1, width // (index.longest + COLUMN_GAP))
+            per_page = rows * columns
+            pages = max(1, -(-len(index) // per_page))
+            if current > pages:
+                return [f"ls: page {current} is past the last page ({pages})"]
+            start = (current - 1) * per_page
+            names = index.names[start:start + per_page]
+            stats = index.stats[start:start + per_page] if index.stats else None
+            if columns > 1 and names:
+                lines = column_lines(names, width, rows=-(-len(names) // columns))
+            else:
+                lines = entry_lines(directory, names, stats)
+            footer = f"-- entries {start + 1}-{start + len(names)} of {len(index)}, page {current}/{pages}"
+            if current < pages:
+                # Repeat the command as typed, with only the page moved on
+                next_page = f"--page={current + 1}"
+                words = [next_page if arg.startswith('--page=') else arg for arg in args]
+                if page is None:
+                    words.insert(0, next_page)
+                footer += f"; {shlex.join(['ls'] + words)} for the next"
+            return lines + [footer + " --"]
             
-            entries.sort()
+        def directory_lines(path):
+            directory = fs.normalize_path(path)
+            try:
+                if recursive:
+                    index = DirectoryIndex(fs, directory, show_all, sort, reverse)
+                    return entry_lines(directory, index.names, index.stats), index
+                return paged_lines(directory), None
+            except PermissionError:
+                return [f"ls: cannot open directory '{path}': Permission denied"], None
+            except OSError as e:
+                return [f"ls: cannot open directory '{path}': {e.strerror or e}"], None
             
-            if show_details:
-                lines = []
-                for entry in entries:
-                    entry_path = os.path.join(real_path, entry)
-                    stat = os.stat(entry_path)
+        errors, files, directories = [], [], []
+        for path in paths or ['.']:
+            try:
+                st = fs.stat(path)
+            except OSError:
+                st = lstat_or_none(fs, path)  # a dangling link is still listed
+                if st is None:
+                    errors.append(f"ls: cannot access '{path}': No such file or directory")
+                    continue
+            if stat.S_ISDIR(st.st_mode):
+                directories.append(path)
+            else:
+                files.append(path)
                     
-                    perms = 'drwxr-xr-x' if os.path.isdir(entry_path) else '-rw-r--r--'
-                    size = stat.st_size
-                    mtime = datetime.datetime.fromtimestamp(stat.st_mtime)
-                    time_str = mtime.strftime('%b %d %H:%M')
+        def chunks():
+            first = True
                     
-                    lines.append(f"{perms} 1 {self.terminal_ui.username} {self.terminal_ui.username} {size:>8} {time_str} {entry}")
+            def section(lines):
+                # Sections after the first are set apart by a blank line
+                nonlocal first
+                text = ("" if first else "\n") + "\n".join(lines) + "\n"
+                first = False
+                return text
                 
-                return "\n".join(lines)
-            else:
-                if len(entries) <= 4:
-                    return "  ".join(entries)
-                else:
-                    cols = 3
-                    rows = (len(entries) + cols - 1) // cols
-                    result = []
-                    for row in range(rows):
-                        line = []
-                        for col in range(cols):
-                            idx = col * rows + row
-                            if idx < len(entries):
-                                line.append(f"{entries[idx]:<20}")
-                        result.append("".join(line).rstrip())
-                    return "\n".join(result)
-        
-        except PermissionError:
-            return f"ls: cannot open directory '{target_path}': Permission denied"
-        except Exception as e:
-            return f"ls: error: {e}"
+            if errors:
+                yield "\n".join(errors) + "\n"
+            if files:
+                stats = [lstat_or_none(fs, path) for path in files] if long_format else None
+                yield section(entry_lines('', files, stats))
+            headers = recursive or len(directories) + len(files) + len(errors) > 1
+            for path in directories:
+                if not recursive:
+                    lines, _ = directory_lines(path)
+                    yield section(([f"{path}:"] if headers else []) + lines)
+                    continue
+                # Depth first, each directory's subdirectories in listing order
+                pending = [path]
+                while pending:
+                    current = pending.pop()
+                    lines, index = directory_lines(current)
+                    yield section([f"{current}:"] + lines)
+                    if index is None:
+                        continue
+                    subdirectories = []
+                    for i, name in enumerate(index.names):
+                        child = posixpath.join(current, name)
+                        st = index.stats[i] if index.stats else lstat_or_none(fs, child)
+                        if st is not None and stat.S_ISDIR(st.st_mode):
+                            subdirectories.append(child)
+                    pending.extend(reversed(subdirectories))
+        
+        if recursive:
+            return chunks()
+        return "".join(chunks()).rstrip("\n")
     
     def cmd_cd(self, args):
         """Change directory"""
@@ -1085,18 +1894,24 @@ EXAMPLES
     
     def cmd_cat(self, args):
         """Display file contents"""
-        if not args:
+        files = args or self._default_input()
+        if not files:
             return "cat: missing file operand"
         
-        results = []
-        for filename in args:
-            content, error = self.filesystem.read_file(filename)
+        out = io.StringIO()
+        last = "\n"
+        for filename in files:
+            stream, error = self._open_input(filename)
+            if last != "\n":
+                out.write("\n")
             if error:
-                results.append(error)
-            else:
-                results.append(content)
+                out.write(f"cat: {error}\n")
+                last = "\n"
+                continue
+            with stream:
+                last = self._copy_stream(stream, out) or last
         
-        return "\n".join(results)
+        return self._sink_value(out)
     
     def cmd_touch(self, args):
         """Create empty files"""
@@ -1170,17 +1985,70 @@ EXAMPLES
         if not args or len(args) < 2:
             return "cp: missing file operand"
         
-        recursive = '-r' in args or '-R' in args
-        filtered = [arg for arg in args if not arg.startswith('-')]
+        recursive = False
+        show_progress = False
+        reflink = 'auto'
+        filtered = []
+        for arg in args:
+            if arg.startswith('--reflink'):
+                reflink = arg.split('=', 1)[1] if '=' in arg else 'always'
+                if reflink not in ('auto', 'always', 'never'):
+                    return f"cp: invalid argument '{reflink}' for '--reflink'"
+            elif arg == '--progress':
+                show_progress = True
+            elif arg.startswith('-') and not arg.startswith('--'):
+                recursive = recursive or 'r' in arg or 'R' in arg
+            else:
+                filtered.append(arg)
         
         if len(filtered) < 2:
             return "cp: missing destination file operand"
         
-        src = filtered[0]
-        dst = filtered[1]
+        sources, dst = filtered[:-1], filtered[-1]
+        if len(sources) > 1:
+            node = self.filesystem.get_node(dst)
+            if not node or node['type'] != 'directory':
+                return f"cp: target '{dst}' is not a directory"
         
-        success, error = self.filesystem.copy_path(src, dst, recursive=recursive)
-        return error if not success else ""
+        progress = self._copy_progress_reporter('cp') if show_progress else None
+        results = []
+        for src in sources:
+            success, error = self.filesystem.copy_path(src, dst, recursive=recursive,
+                                                       reflink=reflink, progress=progress)
+            if not success:
+                results.append(error)
+        if progress:
+            results.append(progress.summary())
+        return "\n".join(r for r in results if r)
+
+    def _copy_progress_reporter(self, name):
+        """Build a progress callback that prints copy throughput to the terminal.
+
+        The callback's summary() describes all the copies it has been called for.
+        """
+        ui = self.terminal_ui
+        seen = []
+
+        def describe(files, nbytes, elapsed, total_bytes=0):
+            rate = self._human_readable_size(nbytes / elapsed if elapsed > 0 else 0)
+            done = self._human_readable_size(nbytes)
+            if total_bytes:
+                done += f" of {self._human_readable_size(total_bytes)} ({nbytes * 100 // total_bytes}%)"
+            return f"{name}: {files} files, {done} in {elapsed:.1f}s ({rate}/s)"
+
+        def report(stats):
+            if stats not in seen:
+                seen.append(stats)
+            if hasattr(ui, 'print_to_terminal'):
+                ui.print_to_terminal(describe(stats.files, stats.bytes, stats.elapsed, stats.total_bytes) + "\n", 'info')
+                ui.root.update_idletasks()
+
+        def summary():
+            return describe(sum(s.files for s in seen), sum(s.bytes for s in seen),
+                            sum(s.elapsed for s in seen))
+
+        report.summary = summary
+        return report
     
     def cmd_mv(self, args):
         """Move/rename files"""
@@ -1198,116 +2066,313 @@ EXAMPLES
         success, error = self.filesystem.move_path(src, dst)
         return error if not success else ""
     
+    def cmd_rsync(self, args):
+        """Incrementally copy files, skipping unchanged ones"""
+        recursive = checksum = delete = dry_run = verbose = show_stats = False
+        paths = []
+        for arg in args:
+            if arg == '--delete':
+                delete = True
+            elif arg == '--dry-run':
+                dry_run = True
+            elif arg == '--stats':
+                show_stats = True
+            elif arg == '--checksum':
+                checksum = True
+            elif arg.startswith('--'):
+                return f"rsync: unrecognized option '{arg}'"
+            elif arg.startswith('-') and len(arg) > 1:
+                for flag in arg[1:]:
+                    if flag in 'ra':
+                        recursive = True
+                    elif flag == 'c':
+                        checksum = True
+                    elif flag == 'n':
+                        dry_run = True
+                    elif flag == 'v':
+                        verbose = True
+                    else:
+                        return f"rsync: invalid option -- '{flag}'"
+            else:
+                paths.append(arg)
+
+        if len(paths) < 2:
+            return "rsync: usage: rsync [-avcn] [--delete] [--stats] SRC... DEST"
+
+        out = []
+        totals = []
+        for src in paths[:-1]:
+            stats, error = self.filesystem.sync_path(src, paths[-1], recursive=recursive,
+                                                     checksum=checksum, delete=delete, dry_run=dry_run)
+            if stats:
+                totals.append(stats)
+                if verbose:
+                    out.extend(stats.changed)
+            if error:
+                out.append(error)
+
+        if (verbose or show_stats) and totals:
+            literal = sum(s.literal_bytes for s in totals)
+            matched = sum(s.matched_bytes for s in totals)
+            elapsed = sum(s.elapsed for s in totals)
+            out.append(f"{sum(s.files for s in totals)} files: {sum(s.transferred for s in totals)} transferred, "
+                       f"{sum(s.up_to_date for s in totals)} up to date, {sum(s.deleted for s in totals)} deleted")
+            out.append(f"literal data: {self._human_readable_size(literal)}  matched data: "
+                       f"{self._human_readable_size(matched)}  in {elapsed:.2f}s"
+                       + ("  (DRY RUN)" if dry_run else ""))
+        return "\n".join(out)
+    
     # ============ TEXT PROCESSING ============
     
     def _read_file_lines(self, path):
-        """Helper to read file lines"""
+        """Helper to read file lines; '-' reads standard input"""
+        if path == '-':
+            return "".join(self.stdin or ()).splitlines(), None
         content, error = self.filesystem.read_file(path)
         if error:
             return None, error
         return content.splitlines(), None
     
-    def cmd_head(self, args):
-        """Show first lines of a file"""
-        if not args:
-            return "head: missing file operand"
+    def _open_input(self, path, mode='r'):
+        """open_stream for command input files, where '-' is standard input. Returns (stream, error)."""
+        if path == '-':
+            pipe = io.BufferedReader(PipeReader(self.stdin or ()), COPY_BUFFER_SIZE)
+            return (pipe if 'b' in mode else io.TextIOWrapper(pipe, encoding='utf-8', errors='ignore')), ""
+        return self.filesystem.open_stream(path, mode)
         
+    def _default_input(self):
+        """Operands to use when a command is given no files: standard input if something is piped in"""
+        return ['-'] if self.stdin is not None else []
+
+    def _copy_stream(self, src, sink, buffer_size=COPY_BUFFER_SIZE):
+        """Copy a file object into an output sink in fixed-size buffers.
+
+        Returns the last character (or byte) copied, or an empty value if nothing was copied.
+        """
+        read = src.read
+        write = sink.write
+        last = src.read(0)  # empty str or bytes, matching the stream
+        while True:
+            chunk = read(buffer_size)
+            if not chunk:
+                return last
+            write(chunk)
+            last = chunk[-1:]
+
+    def _sink_value(self, sink):
+        """Return the text collected in an output sink without its final newline"""
+        value = sink.getvalue()
+        return value[:-1] if value.endswith("\n") else value
+
+    def _parse_line_count(self, name, args):
+        """Parse '-n NUM', '-nNUM' and '-NUM' for head/tail. Returns (n, files, error)."""
         n = 10
         files = []
         i = 0
         while i < len(args):
-            if args[i] == '-n' and i + 1 < len(args):
-                try:
+            arg = args[i]
+            try:
+                if arg == '-n' and i + 1 < len(args):
                     n = int(args[i + 1])
-                except ValueError:
-                    return "head: invalid number of lines"
-                i += 2
-            elif args[i].startswith('-n'):
-                try:
-                    n = int(args[i][2:])
-                except ValueError:
-                    return "head: invalid number of lines"
-                i += 1
-            else:
-                files.append(args[i])
-                i += 1
+                    i += 2
+                    continue
+                if arg.startswith('-n'):
+                    n = int(arg[2:])
+                elif arg.startswith('-') and arg[1:].isdigit():
+                    n = int(arg[1:])
+                else:
+                    files.append(arg)
+            except ValueError:
+                return None, None, f"{name}: invalid number of lines"
+            i += 1
+        if n < 0:
+            return None, None, f"{name}: invalid number of lines"
+        return n, files, None
         
+    @staticmethod
+    def _last_lines(data, n):
+        """The last n lines of data, or all of it if it has fewer"""
+        # A final newline terminates the last line rather than starting a new one
+        cut = len(data) - (1 if data.endswith(b"\n") else 0)
+        for _ in range(n):
+            cut = data.rfind(b"\n", 0, cut)
+            if cut < 0:
+                return data
+        return data[cut + 1:]
+
+    def _tail_pipe(self, stream, n, buffer_size=COPY_BUFFER_SIZE):
+        """Last n lines of a stream that cannot seek, keeping only a bounded tail in memory"""
+        tail = b""
+        keep = buffer_size
+        for block in iter(lambda: stream.read(buffer_size), b""):
+            tail += block
+            if len(tail) > 2 * keep:
+                tail = self._last_lines(tail, n)
+                keep = max(len(tail), buffer_size)
+        return self._last_lines(tail, n)
+
+    def _tail_bytes(self, stream, n, buffer_size=COPY_BUFFER_SIZE):
+        """Return the bytes making up the last n lines of a binary stream.
+
+        Reads backwards from the end in fixed-size blocks so only the tail is touched.
+        """
+        if n == 0:
+            return b""
+        if not stream.seekable():
+            return self._tail_pipe(stream, n, buffer_size)
+        end = stream.seek(0, os.SEEK_END)
+        pos = end
+        blocks = []
+        newlines = 0
+        trailing = None
+        while pos > 0:
+            size = min(buffer_size, pos)
+            pos -= size
+            stream.seek(pos)
+            block = stream.read(size)
+            if trailing is None:
+                # A final newline terminates the last line rather than starting a new one
+                trailing = block.endswith(b"\n")
+                newlines -= trailing
+            blocks.append(block)
+            newlines += block.count(b"\n")
+            if newlines >= n:
+                break
+        return self._last_lines(b"".join(reversed(blocks)), n)
+
+    def cmd_head(self, args):
+        """Show first lines of files"""
+        n, files, error = self._parse_line_count('head', args)
+        if error:
+            return error
+        files = files or self._default_input()
         if not files:
             return "head: missing file operand"
         
-        lines, err = self._read_file_lines(files[0])
-        if err:
-            return f"head: {err}"
-        return "\n".join(lines[:n])
+        out = io.StringIO()
+        last = "\n"
+        printed = False
+        for path in files:
+            if last != "\n":
+                out.write("\n")
+            stream, error = self._open_input(path)
+            if error:
+                out.write(f"head: {error}\n")
+                last = "\n"
+                continue
+            if len(files) > 1:
+                if printed:
+                    out.write("\n")
+                out.write(f"==> {path} <==\n")
+            printed = True
+            with stream:
+                last = "\n"
+                for line in islice(stream, n):
+                    out.write(line)
+                    last = line[-1:]
+
+        return self._sink_value(out)
     
     def cmd_tail(self, args):
-        """Show last lines of a file"""
-        if not args:
-            return "tail: missing file operand"
-        
-        n = 10
-        files = []
-        i = 0
-        while i < len(args):
-            if args[i] == '-n' and i + 1 < len(args):
-                try:
-                    n = int(args[i + 1])
-                except ValueError:
-                    return "tail: invalid number of lines"
-                i += 2
-            elif args[i].startswith('-n'):
-                try:
-                    n = int(args[i][2:])
-                except ValueError:
-                    return "tail: invalid number of lines"
-                i += 1
-            else:
-                files.append(args[i])
-                i += 1
-        
+        """Show last lines of files"""
+        n, files, error = self._parse_line_count('tail', args)
+        if error:
+            return error
+        files = files or self._default_input()
         if not files:
             return "tail: missing file operand"
         
-        lines, err = self._read_file_lines(files[0])
-        if err:
-            return f"tail: {err}"
-        return "\n".join(lines[-n:])
+        out = io.StringIO()
+        last = "\n"
+        printed = False
+        for path in files:
+            if last != "\n":
+                out.write("\n")
+            stream, error = self._open_input(path, 'rb')
+            if error:
+                out.write(f"tail: {error}\n")
+                last = "\n"
+                continue
+            if len(files) > 1:
+                if printed:
+                    out.write("\n")
+                out.write(f"==> {path} <==\n")
+            printed = True
+            with stream:
+                text = self._tail_bytes(stream, n).decode('utf-8', errors='ignore')
+            out.write(text)
+            last = text[-1:] or "\n"
+
+        return self._sink_value(out)
+
+    def _count_stream(self, stream, buffer_size=COPY_BUFFER_SIZE):
+        """Count newlines, words and bytes of a binary stream in fixed-size chunks"""
+        lines = words = nbytes = 0
+        in_word = False
+        read = stream.read
+        while True:
+            chunk = read(buffer_size)
+            if not chunk:
+                break
+            nbytes += len(chunk)
+            lines += chunk.count(b"\n")
+            words += len(chunk.split())
+            if in_word and not chunk[:1].isspace():
+                # The first word of this chunk continues the last word of the previous one
+                words -= 1
+            in_word = not chunk[-1:].isspace()
+        return lines, words, nbytes
     
     def cmd_wc(self, args):
         """Word/line/byte counts"""
-        if not args:
+        flags = set()
+        paths = []
+        for arg in args:
+            if arg.startswith('-') and len(arg) > 1:
+                flags.update(arg[1:])
+            else:
+                paths.append(arg)
+
+        unknown = flags - set('lwc')
+        if unknown:
+            return f"wc: invalid option -- '{sorted(unknown)[0]}'"
+        piped = not paths and self.stdin is not None
+        paths = paths or self._default_input()
+        if not paths:
             return "wc: missing file operand"
         
+        selected = [f in flags for f in 'lwc'] if flags else [True, True, True]
+
+        def fmt(counts, name):
+            counts = " ".join(str(c) for c, on in zip(counts, selected) if on)
+            return counts if piped else f"{counts} {name}"
+
         outputs = []
-        total_l = total_w = total_b = 0
+        totals = [0, 0, 0]
         
-        for path in args:
-            content, error = self.filesystem.read_file(path)
+        for path in paths:
+            stream, error = self._open_input(path, 'rb')
             if error:
-                outputs.append(error)
+                outputs.append(f"wc: {error}")
                 continue
             
-            lines = content.splitlines()
-            words = re.findall(r"\S+", content)
-            bytes_count = len(content.encode('utf-8'))
+            with stream:
+                counts = self._count_stream(stream)
             
-            outputs.append(f"{len(lines)} {len(words)} {bytes_count} {path}")
-            total_l += len(lines)
-            total_w += len(words)
-            total_b += bytes_count
+            outputs.append(fmt(counts, path))
+            totals = [t + c for t, c in zip(totals, counts)]
         
-        if len(args) > 1:
-            outputs.append(f"{total_l} {total_w} {total_b} total")
+        if len(paths) > 1:
+            outputs.append(fmt(totals, "total"))
         
         return "\n".join(outputs)
     
     def cmd_grep(self, args):
         """Search for pattern in file"""
-        if len(args) < 2:
-            return "grep: missing operand"
-        
         show_numbers = '-n' in args
         filtered = [a for a in args if not a.startswith('-')]
+        if len(filtered) == 1:
+            filtered += self._default_input()
         
         if len(filtered) < 2:
             return "grep: missing operand"
@@ -1334,41 +2399,162 @@ EXAMPLES
     
     def cmd_sort(self, args):
         """Sort lines of text files"""
-        if not args:
+        files = args or self._default_input()
+        if not files:
             return "sort: missing file operand"
         
-        lines, err = self._read_file_lines(args[0])
+        lines, err = self._read_file_lines(files[0])
         return err if err else "\n".join(sorted(lines))
     
+    def _parse_cut_list(self, spec):
+        """Parse a cut LIST such as '1,3-5,7-' into sorted, merged 0-based (start, stop) pairs.
+
+        stop is None for an open-ended range. Returns (ranges, error).
+        """
+        ranges = []
+        for part in spec.split(','):
+            start, dash, stop = part.partition('-')
+            if not (start or stop) or not (start + stop).isdigit():
+                return None, "cut: invalid byte, character or field list"
+            first = int(start) if start else 1
+            last = int(stop) if stop else (None if dash else first)
+            if first < 1:
+                return None, "cut: fields and positions are numbered from 1"
+            if last is not None and last < first:
+                return None, "cut: invalid decreasing range"
+            ranges.append((first - 1, last))
+        ranges.sort(key=lambda r: r[0])
+        merged = [ranges[0]]
+        for first, last in ranges[1:]:
+            prev_first, prev_last = merged[-1]
+            if prev_last is None or first <= prev_last:
+                merged[-1] = (prev_first, None if prev_last is None or last is None else max(prev_last, last))
+            else:
+                merged.append((first, last))
+        return merged, ""
+
     def cmd_cut(self, args):
-        """Remove sections from each line"""
-        if '-f' not in args or '-d' not in args:
-            return "cut: usage: cut -d DELIM -f LIST FILE"
-        
-        d_idx = args.index('-d')
-        delim = args[d_idx + 1]
-        f_idx = args.index('-f')
-        fields = args[f_idx + 1]
-        file_arg = args[-1]
-        
-        nums = []
-        for part in fields.split(','):
-            try:
-                nums.append(int(part))
-            except ValueError:
-                pass
+        """Remove sections from each line: cut -b LIST | -c LIST | -f LIST [-d DELIM] [-s] FILE..."""
+        mode = None
+        spec = None
+        delim = '\t'
+        out_delim = None
+        only_delimited = complement = False
+        files = []
+        long_options = {'--bytes': '-b', '--characters': '-c', '--fields': '-f',
+                        '--delimiter': '-d', '--output-delimiter': '--output-delimiter'}
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            i += 1
+            name, eq, value = arg.partition('=')
+            if eq and name in long_options:
+                option = long_options[name]
+            elif arg in long_options.values() or arg in long_options:
+                option = long_options.get(arg, arg)
+                if i >= len(args):
+                    return f"cut: option requires an argument -- '{option.lstrip('-')}'"
+                value = args[i]
+                i += 1
+            elif arg[:2] in ('-b', '-c', '-f', '-d') and len(arg) > 2:
+                option, value = arg[:2], arg[2:]
+            elif arg in ('-s', '--only-delimited'):
+                only_delimited = True
+                continue
+            elif arg == '--complement':
+                complement = True
+                continue
+            elif arg == '-n':
+                continue  # multibyte characters are never split by -b anyway
+            elif arg.startswith('-') and len(arg) > 1:
+                return f"cut: invalid option -- '{arg.lstrip('-')}'"
+            else:
+                files.append(arg)
+                continue
+            if option == '-d':
+                if len(value) != 1:
+                    return "cut: the delimiter must be a single character"
+                delim = value
+            elif option == '--output-delimiter':
+                out_delim = value
+            else:
+                if mode is not None:
+                    return "cut: only one type of list may be specified"
+                mode, spec = option[1], value
+        if mode is None:
+            return "cut: you must specify a list of bytes, characters, or fields"
+        files = files or self._default_input()
+        if not files:
+            return "cut: missing file operand"
+        ranges, error = self._parse_cut_list(spec)
+        if error:
+            return error
         
-        lines, err = self._read_file_lines(file_arg)
-        if err:
-            return f"cut: {err}"
+        if mode == 'f':
+            cut_line = self._cut_fields(ranges, delim, delim if out_delim is None else out_delim,
+                                        only_delimited, complement)
+        else:
+            cut_line = self._cut_positions(ranges, mode == 'b', out_delim or '', complement)
         
         out = []
-        for line in lines:
-            cols = line.split(delim)
-            picked = [cols[i-1] for i in nums if 0 < i <= len(cols)]
-            out.append(delim.join(picked))
-        
+        for path in files:
+            stream, err = self._open_input(path)
+            if err:
+                out.append(f"cut: {err}")
+                continue
+            with stream:
+                for line in stream:
+                    result = cut_line(line.rstrip('\n'))
+                    if result is not None:
+                        out.append(result)
         return "\n".join(out)
+        
+    def _cut_fields(self, ranges, delim, out_delim, only_delimited, complement):
+        """Build a function cutting fields out of one line"""
+        open_from = ranges[-1][0] if ranges[-1][1] is None else None
+        closed = [r for r in ranges if r[1] is not None]
+        indices = [n for first, last in closed for n in range(first, last)]
+        selected = set(indices)
+        # Only split as far as the highest field that can be selected
+        max_split = -1 if complement or open_from is not None else indices[-1] + 1
+
+        def cut_line(line):
+            if delim not in line:
+                return None if only_delimited else line
+            parts = line.split(delim, max_split)
+            if complement:
+                picked = [p for n, p in enumerate(parts)
+                          if n not in selected and (open_from is None or n < open_from)]
+            else:
+                picked = [parts[n] for n in indices if n < len(parts)]
+                if open_from is not None:
+                    picked.extend(parts[open_from:])
+            return out_delim.join(picked)
+        return cut_line
+
+    def _cut_positions(self, ranges, as_bytes, out_delim, complement):
+        """Build a function cutting byte (-b) or character (-c) positions out of one line"""
+        if complement:
+            # The gaps between the selected ranges, as ranges of their own
+            gaps = []
+            position = 0
+            for first, last in ranges:
+                if first > position:
+                    gaps.append((position, first))
+                position = last
+                if last is None:
+                    break
+            if position is not None:
+                gaps.append((position, None))
+            ranges = gaps
+        slices = [slice(first, last) for first, last in ranges]
+
+        def cut_line(line):
+            if as_bytes:
+                data = line.encode('utf-8')
+                return out_delim.join(data[s].decode('utf-8', 'ignore') for s in slices if data[s])
+            return out_delim.join(line[s] for s in slices if line[s])
+        return cut_line
     
     def cmd_diff(self, args):
         """Compare files line by line"""
@@ -1402,27 +2588,221 @@ EXAMPLES
         lines, err = self._read_file_lines(args[0])
         return f"less: {err}" if err else "\n".join(lines)
     
+    def _tr_char(self, spec, i):
+        """Read one possibly escaped character of a tr set at spec[i]. Returns (char, next index)."""
+        c = spec[i]
+        if c != '\\' or i + 1 >= len(spec):
+            return c, i + 1
+        d = spec[i + 1]
+        if d in '01234567':
+            j = i + 1
+            while j < len(spec) and j < i + 4 and spec[j] in '01234567':
+                j += 1
+            return chr(int(spec[i + 1:j], 8) & 0xff), j
+        return TR_ESCAPES.get(d, d), i + 2
+
+    def _expand_tr_set(self, spec, fill_to=None):
+        """Expand a tr set (ranges, [:class:], [c*n], escapes) to a list of characters.
+
+        fill_to is the length of SET1, used to size a [c*] repeat in SET2;
+        without it the spec is SET1, where repeats are not allowed.
+        Returns (chars, error).
+        """
+        chars = []
+        fill_at = None
+        i = 0
+        while i < len(spec):
+            if spec.startswith('[:', i) and ':]' in spec[i + 2:]:
+                end = spec.index(':]', i + 2)
+                name = spec[i + 2:end]
+                if name not in TR_CLASSES:
+                    return None, f"tr: invalid character class '{name}'"
+                chars.extend(c for c in map(chr, range(128)) if TR_CLASSES[name](c))
+                i = end + 2
+                continue
+            repeat = re.match(r'\[(\\?.)\*(\d*)\]', spec[i:])
+            if repeat and fill_to is None:
+                return None, "tr: the [c*] repeat construct may not appear in string1"
+            if repeat:
+                c = self._tr_char(repeat.group(1), 0)[0]
+                if repeat.group(2):
+                    chars.extend(c * int(repeat.group(2), 8 if repeat.group(2)[0] == '0' else 10))
+                else:
+                    fill_at = (len(chars), c)
+                i += repeat.end()
+                continue
+            c, i = self._tr_char(spec, i)
+            if i + 1 < len(spec) and spec[i] == '-':
+                high, j = self._tr_char(spec, i + 1)
+                if high < c:
+                    return None, f"tr: range-endpoints of '{c}-{high}' are in reverse collating sequence order"
+                chars.extend(map(chr, range(ord(c), ord(high) + 1)))
+                i = j
+            else:
+                chars.append(c)
+        if fill_at is not None:
+            position, c = fill_at
+            chars[position:position] = c * max(fill_to - len(chars), 0)
+        return chars, ""
+
     def cmd_tr(self, args):
-        """Translate characters"""
-        if len(args) < 3:
-            return "tr: usage: tr SET1 SET2 FILE"
+        """Translate, squeeze or delete characters: tr [-c] [-d] [-s] SET1 [SET2] [FILE...]"""
+        complement = delete = squeeze = False
+        operands = []
+        for arg in args:
+            if arg in ('--complement', '--delete', '--squeeze-repeats'):
+                complement = complement or arg == '--complement'
+                delete = delete or arg == '--delete'
+                squeeze = squeeze or arg == '--squeeze-repeats'
+            elif arg.startswith('-') and len(arg) > 1 and not operands:
+                for flag in arg[1:]:
+                    if flag not in 'cCds':
+                        return f"tr: invalid option -- '{flag}'"
+                complement = complement or 'c' in arg or 'C' in arg
+                delete = delete or 'd' in arg
+                squeeze = squeeze or 's' in arg
+            else:
+                operands.append(arg)
         
-        src, dst, path = args[0], args[1], args[2]
-        table = str.maketrans({src[i]: dst[i] for i in range(min(len(src), len(dst)))})
+        # Sets come first; anything after them names input files
+        if delete:
+            set_count = 2 if squeeze else 1
+        elif squeeze:
+            available = len(operands) - (0 if self.stdin is not None else 1)
+            set_count = 2 if available >= 2 else 1
+        else:
+            set_count = 2
+        if len(operands) < set_count:
+            return "tr: missing operand"
+        files = operands[set_count:] or self._default_input()
+        if not files:
+            return "tr: missing file operand"
         
-        lines, err = self._read_file_lines(path)
-        if err:
-            return f"tr: {err}"
+        set1, error = self._expand_tr_set(operands[0])
+        if error:
+            return error
+        set2 = []
+        if set_count == 2:
+            set2, error = self._expand_tr_set(operands[1], fill_to=len(set1))
+            if error:
+                return error
+            if not set2 and not delete:
+                return "tr: when not truncating set1, string2 must be non-empty"
         
-        content = "\n".join(lines)
-        return content.translate(table)
+        # ASCII sets are applied to raw bytes with a 256-entry table; others to decoded text
+        if all(ord(c) < 128 for c in set1 + set2):
+            convert = self._tr_bytes(set1, set2, complement, delete, squeeze)
+            mode, empty = 'rb', b""
+        else:
+            convert = self._tr_text(set1, set2, complement, delete, squeeze)
+            mode, empty = 'r', ""
+
+        out = []
+        errors = []
+        for path in files:
+            stream, err = self._open_input(path, mode)
+            if err:
+                errors.append(f"tr: {err}")
+                continue
+            with stream:
+                previous = empty
+                for chunk in iter(lambda: stream.read(COPY_BUFFER_SIZE), empty):
+                    chunk = convert(chunk, previous)
+                    if chunk:
+                        out.append(chunk)
+                        previous = chunk[-1:]
+
+        result = empty.join(out)
+        if mode == 'rb':
+            result = result.decode('utf-8', errors='replace')
+        if result.endswith("\n"):
+            result = result[:-1]
+        return "\n".join(filter(None, [result] + errors))
+
+    def _tr_bytes(self, set1, set2, complement, delete, squeeze):
+        """Build convert(chunk, previous_byte) for tr on bytes using bytes.translate"""
+        source = bytes(map(ord, set1))
+        if complement:
+            source = bytes(b for b in range(256) if b not in source)
+        target = bytes(map(ord, set2))
+        if delete:
+            table, deleted = None, source
+            squeezed = target
+        elif set2:
+            # SET2 is padded with its last character to the length of SET1
+            target = (target + target[-1:] * len(source))[:len(source)]
+            table = bytes.maketrans(source, target)
+            deleted = b""
+            squeezed = target
+        else:
+            table, deleted = None, b""
+            squeezed = source
+        squeeze_run = self._squeezer(sorted(set(squeezed))) if squeeze and squeezed else None
+
+        def convert(chunk, previous):
+            chunk = chunk.translate(table, deleted)
+            if squeeze_run is not None:
+                chunk = squeeze_run(chunk)
+                # A run may continue from the end of the previous chunk
+                if previous and chunk[:1] == previous and previous in squeezed:
+                    chunk = chunk.lstrip(previous)
+            return chunk
+        return convert
+
+    @staticmethod
+    def _squeezer(chars):
+        """Function collapsing runs of any of chars (byte values) in a bytes object to one"""
+        if len(chars) == 1:
+            # A literal replacement avoids a Python call per run
+            c = bytes(chars)
+            run = re.compile(re.escape(c) + b'{2,}')
+            return lambda data: run.sub(c, data)
+        run = re.compile(b'|'.join(re.escape(bytes([c])) + b'{2,}' for c in chars))
+        return lambda data: run.sub(lambda m: m.group()[:1], data)
+
+    def _tr_text(self, set1, set2, complement, delete, squeeze):
+        """Build convert(chunk, previous_char) for tr on text with non-ASCII sets"""
+        source = re.compile('[' + ('^' if complement else '') + re.escape(''.join(set1)) + ']')
+        table = substitute = None
+        if delete:
+            substitute = ''
+            squeezed = set2
+        elif set2 and complement:
+            # Every character outside SET1 maps to the last character of SET2
+            substitute = set2[-1]
+            squeezed = set2
+        elif set2:
+            padded = set2 + [set2[-1]] * (len(set1) - len(set2))
+            table = str.maketrans(dict(zip(set1, padded)))
+            squeezed = set2
+        else:
+            squeezed = None  # squeeze SET1 itself
+        squeeze_run = None
+        if squeeze and squeezed != []:
+            members = source.pattern if squeezed is None else '[' + re.escape(''.join(squeezed)) + ']'
+            run = re.compile('(' + members + ')\\1+')
+            squeeze_run = lambda text: run.sub('\\1', text)
+
+        def convert(chunk, previous):
+            if substitute is not None:
+                chunk = source.sub(lambda m: substitute, chunk)
+            elif table is not None:
+                chunk = chunk.translate(table)
+            if squeeze_run is not None:
+                chunk = squeeze_run(chunk)
+                # A run may continue from the end of the previous chunk
+                if previous and chunk[:1] == previous and len(squeeze_run(previous * 2)) == 1:
+                    chunk = chunk.lstrip(previous)
+            return chunk
+        return convert
     
     def cmd_uniq(self, args):
         """Report or omit repeated lines"""
-        if not args:
+        files = args or self._default_input()
+        if not files:
             return "uniq: missing file operand"
         
-        lines, err = self._read_file_lines(args[0])
+        lines, err = self._read_file_lines(files[0])
         if err:
             return f"uniq: {err}"
         
@@ -1436,38 +2816,226 @@ EXAMPLES
         return "\n".join(out)
 
     def cmd_awk(self, args):
-        """Very small awk-like support: awk '{print $N}' FILE"""
-        if len(args) < 2:
-            return "awk: missing operand"
-        script = args[0]
-        file_arg = args[1]
-        m = re.match(r"\{\s*print\s+\$(\d+)\s*\}", script)
-        if not m:
-            return "awk: only simple '{print $N}' supported"
-        field = int(m.group(1))
-        lines, err = self._read_file_lines(file_arg)
-        if err:
-            return f"awk: {err}"
-        out = []
-        for line in lines:
-            parts = re.findall(r"\S+", line)
-            out.append(parts[field-1] if 0 < field <= len(parts) else '')
-        return "\n".join(out)
+        """Pattern scanning and processing language: awk [-F FS] [-v VAR=VAL] 'PROGRAM' FILE..."""
+        import awk
+        field_sep = None
+        assignments = []
+        source = None
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            if arg == '--':
+                i += 1
+                break
+            if arg in ('-F', '-v', '-f'):
+                if i + 1 >= len(args):
+                    return f"awk: option requires an argument -- '{arg[1]}'"
+                value = args[i + 1]
+                i += 2
+            elif arg.startswith(('-F', '-v', '-f')) and len(arg) > 2:
+                value = arg[2:]
+                i += 1
+            elif arg.startswith('-') and len(arg) > 1:
+                return f"awk: invalid option -- '{arg[1]}'"
+            else:
+                break
+            if arg.startswith('-F'):
+                # A lone 't' means tab, as in POSIX awk
+                field_sep = '\t' if value == 't' else awk.unescape(value)
+            elif arg.startswith('-v'):
+                m = awk.ASSIGNMENT.match(value)
+                if not m:
+                    return f"awk: invalid -v argument '{value}'"
+                assignments.append((m.group(1), m.group(2)))
+            else:
+                content, error = self.filesystem.read_file(value)
+                if error:
+                    return f"awk: can't open source file '{value}'"
+                source = (source or '') + content + '\n'
+        if source is None:
+            if i >= len(args):
+                return "usage: awk [-F FS] [-v VAR=VALUE] [-f PROGFILE | 'PROGRAM'] [FILE...]"
+            source = args[i]
+            i += 1
+        operands = args[i:]
+
+        try:
+            program = awk.compile_program(source)
+        except awk.AwkError as e:
+            return f"awk: {e}"
+        if field_sep is not None:
+            program.rt.vars['FS'] = field_sep
+        for name, value in assignments:
+            program.assign(name, value)
+
+        def open_input(path):
+            stream, error = self._open_input(path)
+            return stream, f"can't open file {path}" if error else ""
+
+        stdin = self._open_input('-')[0] if self.stdin is not None else None
+        try:
+            output = program.run(operands, open_input, stdin)
+            error = ""
+        except awk.AwkError as e:
+            output = ''.join(program.rt.output)
+            error = f"awk: {e}"
+
+        # print > "file" output goes into the sandbox once the program finishes
+        for name, (append, chunks) in program.rt.files.items():
+            write = self.filesystem.append_file if append else self.filesystem.write_file
+            ok, write_error = write(name, ''.join(chunks))
+            if not ok:
+                error = "\n".join(filter(None, [error, f"awk: {write_error}"]))
+
+        if program.rt.errors:
+            error = "\n".join(filter(None, [''.join(program.rt.errors).rstrip("\n"), error]))
+        if output.endswith("\n"):
+            output = output[:-1]
+        return "\n".join(filter(None, [output, error])) if error else output
 
     def cmd_sed(self, args):
-        """Basic sed substitution: sed 's/old/new/g' FILE"""
-        if len(args) < 2:
-            return "sed: missing operand"
-        expr = args[0]
-        file_arg = args[1]
-        m = re.match(r"s/(.*?)/(.*?)/g", expr)
-        if not m:
-            return "sed: only simple s/old/new/g supported"
-        old, new = m.group(1), m.group(2)
-        lines, err = self._read_file_lines(file_arg)
-        if err:
-            return f"sed: {err}"
-        return "\n".join([re.sub(old, new, l) for l in lines])
+        """Stream editor: sed [-n] [-E] [-i[SUFFIX]] [-s] {SCRIPT | -e SCRIPT | -f FILE}... [FILE...]"""
+        import sed
+        quiet = extended = separate = False
+        in_place = None
+        scripts = []
+        files = []
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            i += 1
+            if arg == '--':
+                files.extend(args[i:])
+                break
+            if arg in ('--quiet', '--silent'):
+                quiet = True
+            elif arg == '--regexp-extended':
+                extended = True
+            elif arg == '--separate':
+                separate = True
+            elif arg.startswith('--in-place'):
+                in_place = arg.partition('=')[2]
+            elif arg.startswith('--expression='):
+                scripts.append(arg.partition('=')[2])
+            elif arg.startswith('-') and len(arg) > 1 and not arg.startswith('--'):
+                # Clustered short options; -e and -f take the rest or the next argument
+                j = 1
+                while j < len(arg):
+                    flag = arg[j]
+                    j += 1
+                    if flag == 'n':
+                        quiet = True
+                    elif flag in 'Er':
+                        extended = True
+                    elif flag == 's':
+                        separate = True
+                    elif flag == 'i':
+                        in_place = arg[j:]
+                        break
+                    elif flag in 'ef':
+                        value = arg[j:]
+                        if not value:
+                            if i >= len(args):
+                                return f"sed: option requires an argument -- '{flag}'"
+                            value = args[i]
+                            i += 1
+                        if flag == 'f':
+                            name = value
+                            value, error = self.filesystem.read_file(name)
+                            if error:
+                                return f"sed: couldn't open file {name}"
+                            value = value[:-1] if value.endswith('\n') else value
+                        scripts.append(value)
+                        break
+                    else:
+                        return f"sed: invalid option -- '{flag}'"
+            elif arg.startswith('--'):
+                return f"sed: unrecognized option '{arg}'"
+            else:
+                files.append(arg)
+        if not scripts:
+            if not files:
+                return "Usage: sed [OPTION]... {script-only-if-no-other-script} [input-file]..."
+            scripts.append(files.pop(0))
+
+        if in_place is None:
+            files = files or self._default_input()
+        try:
+            script = sed.Script("\n".join(scripts), extended=extended, quiet=quiet)
+        except sed.SedError as e:
+            return f"sed: {e}"
+
+        output = []
+        errors = []
+        written = {}
+
+        def read_file(name):
+            content, error = self.filesystem.read_file(name)
+            return None if error else content
+
+        def open_lines(path):
+            stream, error = self._open_input(path)
+            if error:
+                errors.append(f"sed: can't read {error}")
+            return stream
+
+        def chained(paths):
+            # All inputs form one stream, so line numbers and '$' span every file
+            for path in paths:
+                stream = open_lines(path)
+                if stream is not None:
+                    with stream:
+                        yield from stream
+
+        state = sed.State()
+        try:
+            if in_place is not None:
+                if not files:
+                    return "sed: no input files"
+                for path in files:
+                    if state.quit:
+                        break
+                    stream = open_lines(path)
+                    if stream is None:
+                        continue
+                    target, error = self.filesystem.open_atomic(path)
+                    if error:
+                        stream.close()
+                        errors.append(f"sed: couldn't edit {error}")
+                        continue
+                    if in_place:
+                        directory, name = posixpath.split(path)
+                        backup = in_place.replace('*', name) if '*' in in_place else name + in_place
+                        ok, error = self.filesystem.copy_path(path, posixpath.join(directory, backup))
+                        if not ok:
+                            stream.close()
+                            target.abort()
+                            errors.append(f"sed: {error}")
+                            continue
+                    with stream, target:
+                        state.line_offset = 0
+                        script.run(stream, target.write, state, read_file, written)
+            elif separate:
+                for path in files:
+                    if state.quit:
+                        break
+                    state.line_offset = 0
+                    script.run(chained([path]), output.append, state, read_file, written)
+            elif files:
+                script.run(chained(files), output.append, state, read_file, written)
+        except sed.SedError as e:
+            errors.append(f"sed: {e}")
+
+        # w commands write their files once the script has run
+        for name, lines in written.items():
+            ok, error = self.filesystem.write_file(name, ''.join(lines))
+            if not ok:
+                errors.append(f"sed: {error}")
+
+        result = ''.join(output)
+        if result.endswith("\n"):
+            result = result[:-1]
+        return "\n".join(filter(None, [result] + errors))
 
     def cmd_iconv(self, args):
         """Convert encoding: iconv -f FROM -t TO FILE"""
@@ -1491,40 +3059,322 @@ EXAMPLES
             return f"iconv: {e}"
 
     def cmd_join(self, args):
-        """Join lines of two files on first field: join FILE1 FILE2"""
-        if len(args) < 2:
-            return "join: missing operand"
-        a, b = args[0], args[1]
-        a_lines, e1 = self._read_file_lines(a)
-        b_lines, e2 = self._read_file_lines(b)
-        if e1:
-            return f"join: {e1}"
-        if e2:
-            return f"join: {e2}"
-        a_map = {l.split()[0]: l for l in a_lines if l.split()}
-        b_map = {l.split()[0]: l for l in b_lines if l.split()}
-        out = []
-        for key in sorted(set(a_map.keys()) & set(b_map.keys())):
-            out.append(a_map[key] + ' ' + ' '.join(b_map[key].split()[1:]))
+        """Join lines of two files on a common field: join [-1 F] [-2 F] [-t C] [-a N] [-v N] [-o LIST] FILE1 FILE2"""
+        import tablejoin
+        fields = [0, 0]
+        separator = None
+        unpaired = set()
+        only_unpaired = False
+        empty = ''
+        out_format = None
+        ignore_case = False
+        files = []
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            i += 1
+            if arg in ('-i', '--ignore-case'):
+                ignore_case = True
+                continue
+            if arg[:2] in ('-1', '-2', '-j', '-t', '-a', '-v', '-e', '-o') and arg != '-':
+                option = arg[:2]
+                if len(arg) > 2:
+                    value = arg[2:]
+                elif i < len(args):
+                    value = args[i]
+                    i += 1
+                else:
+                    return f"join: option requires an argument -- '{option[1]}'"
+            elif arg.startswith('-') and len(arg) > 1:
+                return f"join: invalid option -- '{arg.lstrip('-')}'"
+            else:
+                files.append(arg)
+                continue
+
+            if option in ('-1', '-2', '-j'):
+                if not value.isdigit() or int(value) < 1:
+                    return f"join: invalid field number: '{value}'"
+                if option != '-2':
+                    fields[0] = int(value) - 1
+                if option != '-1':
+                    fields[1] = int(value) - 1
+            elif option == '-t':
+                if len(value) != 1:
+                    return f"join: multi-character tab '{value}'"
+                separator = value
+            elif option in ('-a', '-v'):
+                if value not in ('1', '2'):
+                    return f"join: invalid file number: '{value}'"
+                unpaired.add(int(value))
+                only_unpaired = only_unpaired or option == '-v'
+            elif option == '-e':
+                empty = value
+            elif out_format is None or value == 'auto':
+                out_format = value
+            else:
+                out_format += ',' + value
+        if len(files) != 2:
+            return "join: missing operand" if len(files) < 2 else f"join: extra operand '{files[2]}'"
+        if files == ['-', '-']:
+            return "join: both files cannot be standard input"
+
+        streams = []
+        for path in files:
+            stream, err = self._open_input(path)
+            if path == '-' and not err:
+                # -o auto and the unsorted fallback rewind their inputs, so keep standard input
+                with stream:
+                    stream = io.StringIO(stream.read())
+            if err:
+                for opened in streams:
+                    opened.close()
+                return f"join: {err}"
+            streams.append(stream)
+
+        with streams[0], streams[1]:
+            pairs = None
+            if out_format == 'auto':
+                # Field counts come from the first line of each file
+                counts = []
+                for stream in streams:
+                    counts.append(len(tablejoin.split_fields(stream.readline().rstrip('\n'), separator)))
+                    stream.seek(0)
+                pairs = [(0, 0)] + [(side, n) for side in (1, 2)
+                                    for n in range(counts[side - 1]) if n != fields[side - 1]]
+            elif out_format is not None:
+                pairs, error = tablejoin.parse_format(out_format)
+                if error:
+                    return f"join: {error}"
+
+            def records(side):
+                return tablejoin.keyed(streams[side], fields[side], separator, ignore_case)
+
+            try:
+                out = self._join_lines(tablejoin.merge_join(records(0), records(1)),
+                                       fields, separator, unpaired, only_unpaired, pairs, empty)
+            except tablejoin.UnsortedInput:
+                # Unsorted input: hash the smaller file and stream the larger one past it
+                sizes = [len(stream.getvalue()) if path == '-' else self.filesystem.stat(path).st_size
+                         for path, stream in zip(files, streams)]
+                for stream in streams:
+                    stream.seek(0)
+                build = 0 if sizes[0] <= sizes[1] else 1
+                joined = tablejoin.hash_join(records(build), records(1 - build), build_is_left=build == 0)
+                out = self._join_lines(joined, fields, separator, unpaired, only_unpaired, pairs, empty)
         return "\n".join(out)
 
+    def _join_lines(self, joined, fields, separator, unpaired, only_unpaired, pairs, empty):
+        """Format (fields1, fields2) pairs from tablejoin as join output lines"""
+        glue = separator if separator is not None else ' '
+        out = []
+        for left, right in joined:
+            if left is not None and right is not None:
+                if only_unpaired:
+                    continue
+            elif (1 if right is None else 2) not in unpaired:
+                continue
+            sides = (None, left, right)
+            present = 1 if left is not None else 2
+            record = sides[present]
+            key_field = fields[present - 1]
+            key = record[key_field] if key_field < len(record) else ''
+            if pairs is None:
+                parts = [key]
+                for side in (1, 2):
+                    if sides[side] is not None:
+                        parts.extend(f for n, f in enumerate(sides[side]) if n != fields[side - 1])
+            else:
+                parts = []
+                for side, n in pairs:
+                    if side == 0:
+                        parts.append(key)
+                    elif sides[side] is not None and n < len(sides[side]):
+                        parts.append(sides[side][n])
+                    else:
+                        parts.append(empty)
+            out.append(glue.join(parts))
+        return out
+
+    def cmd_csvq(self, args):
+        """Query CSV/TSV files: csvq [-d DELIM] [-t] [-H] [-o csv|tsv|table] 'SELECT ...' [FILE]"""
+        import csv
+        import csvq
+        delimiter = None
+        has_header = True
+        out_format = None
+        operands = []
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            i += 1
+            if arg in ('-d', '-o') or arg.startswith(('-d', '-o')) and len(arg) > 2:
+                if len(arg) > 2:
+                    value = arg[2:]
+                elif i < len(args):
+                    value = args[i]
+                    i += 1
+                else:
+                    return f"csvq: option requires an argument -- '{arg[1]}'"
+                if arg.startswith('-d'):
+                    value = '\t' if value in ('\\t', 'tab') else value
+                    if len(value) != 1:
+                        return "csvq: the delimiter must be a single character"
+                    delimiter = value
+                elif value not in ('csv', 'tsv', 'table'):
+                    return f"csvq: unknown output format '{value}'"
+                else:
+                    out_format = value
+            elif arg in ('-t', '--tsv'):
+                delimiter = '\t'
+            elif arg in ('-H', '--no-header'):
+                has_header = False
+            elif arg.startswith('-') and len(arg) > 1:
+                return f"csvq: invalid option -- '{arg.lstrip('-')}'"
+            else:
+                operands.append(arg)
+        if not operands:
+            return "usage: csvq [-d DELIM] [-t] [-H] [-o csv|tsv|table] 'SELECT ... [FROM FILE] ...' [FILE]"
+
+        try:
+            query = csvq.compile_query(operands[0])
+        except csvq.QueryError as e:
+            return f"csvq: {e}"
+        path = operands[1] if len(operands) > 1 else query.source
+        if path is None and self.stdin is not None:
+            path = '-'
+        if path is None:
+            return "csvq: no input file (give FILE or a FROM clause)"
+        if delimiter is None:
+            delimiter = '\t' if path.lower().endswith(('.tsv', '.tab')) else ','
+
+        stream, err = self._open_input(path)
+        if err:
+            return f"csvq: {err}"
+        with stream:
+            reader = csv.reader(stream, delimiter=delimiter)
+            rows = reader
+            header = None
+            if not has_header:
+                # Peek at the first row for the column count, then put it back
+                first = next(reader, [])
+                header = [f"c{n + 1}" for n in range(len(first))]
+                rows = chain([first], reader)
+            try:
+                names, rows = query.run(rows, header)
+            except csvq.QueryError as e:
+                return f"csvq: {e}"
+            except csv.Error as e:
+                return f"csvq: {path}: line {reader.line_num}: {e}"
+
+        if out_format == 'table':
+            return csvq.format_table(names, rows)
+        sink = io.StringIO()
+        if out_format is not None:
+            delimiter = '\t' if out_format == 'tsv' else ','
+        writer = csv.writer(sink, delimiter=delimiter, lineterminator='\n')
+        writer.writerow(names)
+        writer.writerows(rows)
+        return sink.getvalue().rstrip('\n')
+
     def cmd_paste(self, args):
-        """Merge lines of files horizontally: paste FILE1 FILE2"""
-        if len(args) < 2:
+        """Merge lines of files: paste [-s] [-d LIST] FILE..."""
+        delimiters = "\t"
+        serial = False
+        paths = []
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            i += 1
+            if arg in ('-s', '--serial'):
+                serial = True
+            elif arg in ('-d', '--delimiters') or arg.startswith(('-d', '--delimiters=')) and arg != '-':
+                if arg in ('-d', '--delimiters'):
+                    if i >= len(args):
+                        return "paste: option requires an argument -- 'd'"
+                    arg = args[i]
+                    i += 1
+                else:
+                    arg = arg.split('=', 1)[1] if arg.startswith('--') else arg[2:]
+                delimiters = self._paste_delimiters(arg)
+            else:
+                paths.append(arg)
+
+        paths = paths or self._default_input()
+        if not paths:
             return "paste: missing operand"
-        a, b = args[0], args[1]
-        a_lines, e1 = self._read_file_lines(a)
-        b_lines, e2 = self._read_file_lines(b)
-        if e1:
-            return f"paste: {e1}"
-        if e2:
-            return f"paste: {e2}"
+        streams = []
+        stdin = None
+        for path in paths:
+            # Every '-' operand takes turns reading lines from the one standard input
+            if path == '-' and stdin is not None:
+                streams.append(stdin)
+                continue
+            stream, error = self._open_input(path)
+            if error:
+                for opened in set(streams):
+                    opened.close()
+                return f"paste: {error}"
+            if path == '-':
+                stdin = stream
+            streams.append(stream)
+        if serial:
+            return self._paste_serial(streams, delimiters)
+        return self._paste_parallel(streams, delimiters)
+
+    @staticmethod
+    def _paste_delimiters(spec):
+        """Expand a -d list; '\\0' stands for no delimiter at all"""
+        escapes = {'n': '\n', 't': '\t', '\\': '\\', '0': ''}
         out = []
-        for i in range(max(len(a_lines), len(b_lines))):
-            la = a_lines[i] if i < len(a_lines) else ''
-            lb = b_lines[i] if i < len(b_lines) else ''
-            out.append(la + '\t' + lb)
-        return "\n".join(out)
+        i = 0
+        while i < len(spec):
+            if spec[i] == '\\' and i + 1 < len(spec):
+                out.append(escapes.get(spec[i + 1], spec[i + 1]))
+                i += 2
+            else:
+                out.append(spec[i])
+                i += 1
+        return out or ['']
+
+    @staticmethod
+    def _paste_parallel(streams, delimiters):
+        """Yield one output line per input line number, joining the files side by side"""
+        try:
+            live = len(streams)
+            done = [False] * len(streams)
+            while True:
+                cells = []
+                for index, stream in enumerate(streams):
+                    line = '' if done[index] else stream.readline()
+                    if not line and not done[index]:
+                        done[index] = True
+                        live -= 1
+                    cells.append(line.rstrip('\n'))
+                if not live:
+                    break
+                parts = [cells[0]]
+                for index, cell in enumerate(cells[1:]):
+                    parts.append(delimiters[index % len(delimiters)])
+                    parts.append(cell)
+                yield "".join(parts) + "\n"
+        finally:
+            for stream in set(streams):
+                stream.close()
+
+    @staticmethod
+    def _paste_serial(streams, delimiters):
+        """Yield each file as a single line, its lines joined by the cycling delimiters"""
+        try:
+            for stream in streams:
+                parts = []
+                for index, line in enumerate(stream):
+                    if index:
+                        parts.append(delimiters[(index - 1) % len(delimiters)])
+                    parts.append(line.rstrip('\n'))
+                yield "".join(parts) + "\n"
+        finally:
+            for stream in set(streams):
+                stream.close()
 
     def cmd_ex(self, args):
         """Very small ex mode: ex -p FILE prints file"""
@@ -1535,88 +3385,354 @@ EXAMPLES
             return f"ex: {err}" if err else "\n".join(lines)
         return "ex: only '-p FILE' supported"
 
+    @staticmethod
+    def _first_difference(a, b):
+        """Index of the first differing byte of two equal-length unequal byte strings"""
+        lo, hi = 0, len(a)
+        # Bisect with slice comparisons, which run at memcmp speed
+        while hi - lo > 64:
+            mid = (lo + hi) // 2
+            if a[lo:mid] != b[lo:mid]:
+                hi = mid
+            else:
+                lo = mid
+        return next(i for i in range(lo, hi) if a[i] != b[i])
+
     def cmd_cmp(self, args):
         """Compare two files byte by byte"""
-        if len(args) < 2:
+        list_all = False
+        limit = None
+        files = []
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            if arg in ('-l', '--verbose'):
+                list_all = True
+            elif arg == '-n' or arg.startswith('--bytes='):
+                value = arg.split('=', 1)[1] if '=' in arg else (args[i + 1] if i + 1 < len(args) else None)
+                if arg == '-n':
+                    i += 1
+                if value is None or not value.isdigit():
+                    return f"cmp: invalid --bytes value '{value or ''}'"
+                limit = int(value)
+            elif arg.startswith('-n') and len(arg) > 2:
+                if not arg[2:].isdigit():
+                    return f"cmp: invalid --bytes value '{arg[2:]}'"
+                limit = int(arg[2:])
+            elif arg.startswith('-') and len(arg) > 1:
+                return f"cmp: invalid option -- '{arg.lstrip('-')}'"
+            else:
+                files.append(arg)
+            i += 1
+        if len(files) < 2:
             return "cmp: missing file operand"
         
-        a, b = args[0], args[1]
-        a_lines, e1 = self._read_file_lines(a)
-        b_lines, e2 = self._read_file_lines(b)
-        
+        a, b = files[0], files[1]
+        fa, e1 = self.filesystem.open_stream(a, 'rb', buffering=0)
         if e1:
             return f"cmp: {e1}"
+        fb, e2 = self.filesystem.open_stream(b, 'rb', buffering=0)
         if e2:
+            fa.close()
             return f"cmp: {e2}"
         
-        a_content = "\n".join(a_lines)
-        b_content = "\n".join(b_lines)
+        with fa, fb:
+            size_a = self._stream_size(fa)
+            size_b = self._stream_size(fb)
+            if limit is not None:
+                size_a, size_b = min(size_a, limit), min(size_b, limit)
+            common = min(size_a, size_b)
+            if common == 0:
+                return self._cmp_eof(a, b, size_a, size_b)
+            # Sizes are known up front, so only the common prefix is ever read
+            with self._mapped(fa) as ma, self._mapped(fb) as mb:
+                if list_all:
+                    out = self._cmp_list(ma, mb, common)
+                else:
+                    out = []
+                    line = 1
+                    for start in range(0, common, CMP_CHUNK_SIZE):
+                        end = min(start + CMP_CHUNK_SIZE, common)
+                        ca, cb = ma[start:end], mb[start:end]
+                        if ca != cb:
+                            i = self._first_difference(ca, cb)
+                            line += ca.count(b"\n", 0, i)
+                            return f"{a} {b} differ: byte {start + i + 1}, line {line}"
+                        line += ca.count(b"\n")
         
-        if a_content == b_content:
+        eof = self._cmp_eof(a, b, size_a, size_b)
+        if eof:
+            out.append(eof)
+        return "\n".join(out)
+
+    @staticmethod
+    def _stream_size(stream):
+        """Size of the file behind a binary stream"""
+        try:
+            return os.fstat(stream.fileno()).st_size
+        except (OSError, AttributeError):
+            # Streams from the memory and archive backends have no descriptor
+            position = stream.tell()
+            size = stream.seek(0, io.SEEK_END)
+            stream.seek(position)
+            return size
+
+    @staticmethod
+    @contextlib.contextmanager
+    def _mapped(stream):
+        """Random-access view of a binary stream: mapped when it is a file on disk, read otherwise"""
+        try:
+            fd = stream.fileno()
+        except (OSError, AttributeError):
+            yield stream.read()
+            return
+        if os.fstat(fd).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+    @staticmethod
+    def _cmp_list(ma, mb, common):
+        """cmp -l lines: 1-based offset and octal values of every differing byte"""
+        out = []
+        width = len(str(common))
+        for start in range(0, common, CMP_CHUNK_SIZE):
+            end = min(start + CMP_CHUNK_SIZE, common)
+            ca, cb = ma[start:end], mb[start:end]
+            if ca == cb:
+                continue
+            for i, (x, y) in enumerate(zip(ca, cb)):
+                if x != y:
+                    out.append(f"{start + i + 1:>{width}} {x:3o} {y:3o}")
+        return out
+
+    @staticmethod
+    def _cmp_eof(a, b, size_a, size_b):
+        """Message for the shorter of two files that matched up to its end, if any"""
+        if size_a == size_b:
             return ""
-        return "cmp: files differ"
+        shorter, size = (a, size_a) if size_a < size_b else (b, size_b)
+        if size == 0:
+            return f"cmp: EOF on {shorter} which is empty"
+        return f"cmp: EOF on {shorter} after byte {size}"
+
+    def _checksum_files(self, paths, func):
+        """Apply func to a binary stream of each file, several files at once.
+
+        Returns (path, result, error) tuples in the order of paths.
+        """
+        import checksums
+
+        def work(path):
+            stream, error = self.filesystem.open_stream(path, 'rb')
+            if error:
+                return path, None, error
+            try:
+                with stream:
+                    return path, func(stream), ""
+            except OSError as e:
+                return path, None, f"{path}: {e.strerror or e}"
+
+        return checksums.map_parallel(work, paths)
     
     def cmd_cksum(self, args):
         """Calculate CRC32 checksum and byte count"""
+        import checksums
         if not args:
             return "cksum: missing file operand"
         
         out = []
-        for path in args:
-            content_str, error = self.filesystem.read_file(path)
+        for path, result, error in self._checksum_files(args, checksums.crc32_stream):
             if error:
-                out.append(error)
+                out.append(f"cksum: {error}")
+            else:
+                out.append(f"{result[0]} {result[1]} {path}")
+        return "\n".join(out)
+    
+    def _digest_command(self, name, args):
+        """Shared implementation of md5sum, sha1sum, sha256sum and b2sum"""
+        import checksums
+        algorithm = checksums.DIGEST_COMMANDS[name]
+        check = quiet = False
+        files = []
+        for arg in args:
+            if arg in ('-c', '--check'):
+                check = True
+            elif arg == '--quiet':
+                quiet = True
+            elif arg.startswith('-') and arg != '-':
+                return f"{name}: invalid option -- '{arg.lstrip('-')}'"
+            else:
+                files.append(arg)
+        if not files:
+            return f"{name}: missing file operand"
+        
+        def digest(stream):
+            return checksums.digest_stream(stream, algorithm)
+        
+        if not check:
+            out = []
+            for path, result, error in self._checksum_files(files, digest):
+                out.append(f"{name}: {error}" if error else f"{result}  {path}")
+            return "\n".join(out)
+        
+        # -c: every FILE is a list of "DIGEST  NAME" lines to verify
+        digest_length = checksums.digest_length(algorithm)
+        out = []
+        expected = []
+        malformed = 0
+        for checkfile in files:
+            stream, error = self.filesystem.open_stream(checkfile, 'r')
+            if error:
+                out.append(f"{name}: {error}")
                 continue
-            
-            content = content_str.encode('utf-8')
-            csum = zlib.crc32(content) & 0xffffffff
-            out.append(f"{csum} {len(content)} {path}")
+            with stream:
+                for line in stream:
+                    if not line.strip():
+                        continue
+                    entry = checksums.parse_check_line(line)
+                    if entry is None or len(entry[0]) != digest_length:
+                        malformed += 1
+                    else:
+                        expected.append(entry)
+        
+        failed = unreadable = 0
+        results = self._checksum_files([path for _, path in expected], digest)
+        for (want, _), (path, result, error) in zip(expected, results):
+            if error:
+                unreadable += 1
+                out.append(f"{name}: {error}")
+                out.append(f"{path}: FAILED open or read")
+            elif result != want:
+                failed += 1
+                out.append(f"{path}: FAILED")
+            elif not quiet:
+                out.append(f"{path}: OK")
         
+        if malformed:
+            what = "line is" if malformed == 1 else "lines are"
+            out.append(f"{name}: WARNING: {malformed} {what} improperly formatted")
+        if unreadable:
+            what = "listed file" if unreadable == 1 else "listed files"
+            out.append(f"{name}: WARNING: {unreadable} {what} could not be read")
+        if failed:
+            what = "computed checksum" if failed == 1 else "computed checksums"
+            out.append(f"{name}: WARNING: {failed} {what} did NOT match")
+        if not expected and not malformed and not out:
+            out.append(f"{name}: no properly formatted checksum lines found")
         return "\n".join(out)
     
+    def cmd_md5sum(self, args):
+        """Compute or check MD5 message digests"""
+        return self._digest_command('md5sum', args)
+
+    def cmd_sha1sum(self, args):
+        """Compute or check SHA-1 message digests"""
+        return self._digest_command('sha1sum', args)
+
+    def cmd_sha256sum(self, args):
+        """Compute or check SHA-256 message digests"""
+        return self._digest_command('sha256sum', args)
+
+    def cmd_b2sum(self, args):
+        """Compute or check BLAKE2b message digests"""
+        return self._digest_command('b2sum', args)
+
     def cmd_fold(self, args):
-        """Wrap each input line to fit in specified width"""
+        """Wrap each input line to fit in specified width: fold [-b] [-s] [-w WIDTH] [FILE]..."""
         width = 80
-        path = None
+        spaces = False
+        paths = []
         i = 0
-        
         while i < len(args):
-            if args[i] == '-w' and i + 1 < len(args):
-                try:
-                    width = int(args[i+1])
-                except ValueError:
-                    pass
-                i += 2
+            arg = args[i]
+            i += 1
+            if arg in ('-w', '--width') or arg.startswith(('-w', '--width=')):
+                if arg in ('-w', '--width'):
+                    if i >= len(args):
+                        return "fold: option requires an argument -- 'w'"
+                    value = args[i]
+                    i += 1
+                else:
+                    value = arg.split('=', 1)[1] if arg.startswith('--') else arg[2:]
+                if not value.isdigit() or int(value) < 1:
+                    return f"fold: invalid number of columns: '{value}'"
+                width = int(value)
+            elif arg in ('-s', '--spaces'):
+                spaces = True
+            elif arg in ('-b', '--bytes'):
+                pass  # text is already counted per character; tabs are not expanded
+            elif arg.startswith('-') and arg != '-' and arg[1:].isdigit():
+                width = int(arg[1:])
             else:
-                path = args[i]
-                i += 1
-        
-        if not path:
+                paths.append(arg)
+
+        paths = paths or self._default_input()
+        if not paths:
             return "fold: missing file operand"
-        
-        lines, err = self._read_file_lines(path)
-        if err:
-            return f"fold: {err}"
-        
-        out = []
-        for line in lines:
-            for i in range(0, len(line), width):
-                out.append(line[i:i+width])
-        
-        return "\n".join(out)
+        streams = []
+        for path in paths:
+            stream, error = self._open_input(path)
+            if error:
+                for opened in streams:
+                    opened.close()
+                return f"fold: {error}"
+            streams.append(stream)
+        return self._fold_lines(streams, width, spaces)
+
+    @staticmethod
+    def _fold_lines(streams, width, spaces):
+        """Lazily wrap the lines of each stream to width characters"""
+        try:
+            for stream in streams:
+                for line in stream:
+                    body = line.rstrip('\n')
+                    end = line[len(body):]
+                    pieces = []
+                    while len(body) > width:
+                        cut = width
+                        if spaces:
+                            blank = body.rfind(' ', 0, width)
+                            if blank >= 0:
+                                cut = blank + 1
+                        pieces.append(body[:cut])
+                        body = body[cut:]
+                    pieces.append(body)
+                    yield "\n".join(pieces) + end
+        finally:
+            for stream in streams:
+                stream.close()
     
     def cmd_tee(self, args):
-        """Read from standard input and write to files"""
-        if not args:
-            return ""
-        
-        for path in args:
-            self.filesystem.write_file(path, "")
+        """Copy standard input to files and to standard output: tee [-a] FILE..."""
+        append = '-a' in args or '--append' in args
+        sinks = []
+        errors = []
+        for path in (a for a in args if a not in ('-a', '--append')):
+            stream, error = self.filesystem.open_stream(path, 'a' if append else 'w')
+            if error:
+                errors.append(f"tee: {error}\n")
+            else:
+                sinks.append(stream)
+        return self._tee_chunks(self.stdin or (), sinks, errors)
         
-        return ""
+    @staticmethod
+    def _tee_chunks(chunks, sinks, errors):
+        """Pass chunks through while writing each one to every sink"""
+        try:
+            for chunk in chunks:
+                for sink in sinks:
+                    sink.write(chunk)
+                yield chunk
+            yield from errors
+        finally:
+            for sink in sinks:
+                sink.close()
     
     # ============ SYSTEM INFORMATION ============
     
+    
     def cmd_uname(self, args):
         """Print system information"""
         if args and args[0] == '-a':
@@ -1785,16 +3901,8 @@ EXAMPLES
             return "localedef: missing operand"
         name = args[-1]
         path = f"/usr/lib/locale/{name}"
-        real = self.filesystem._get_real_path(path)
-        if not real:
-            return f"localedef: cannot write to {path}"
-        try:
-            os.makedirs(os.path.dirname(real), exist_ok=True)
-            with open(real, 'w', encoding='utf-8') as f:
-                f.write('locale: ' + name)
-            return ""
-        except Exception as e:
-            return f"localedef: {e}"
+        ok, error = self.filesystem.write_file(path, 'locale: ' + name)
+        return "" if ok else f"localedef: cannot write to {path}"
 
     def cmd_chown(self, args):
         """Change file owner and group: chown [OWNER][:GROUP] FILE"""
@@ -1811,31 +3919,21 @@ EXAMPLES
 
         msgs = []
         for t in targets:
-            real = self.filesystem._get_real_path(t)
-            if not real or not os.path.exists(real):
+            if not self.filesystem.exists(t):
                 msgs.append(f"chown: cannot access '{t}': No such file or directory")
                 continue
-            try:
-                uid = -1
-                gid = -1
-                # only try if running on Unix
-                if hasattr(os, 'chown') and owner:
-                    try:
-                        uid = os.getuid() if owner == self.terminal_ui.username else -1
-                    except Exception:
-                        uid = -1
-                if hasattr(os, 'chown') and group:
-                    try:
-                        gid = os.getgid()
-                    except Exception:
-                        gid = -1
-                if uid != -1 or gid != -1:
-                    try:
-                        os.chown(real, uid if uid != -1 else -1, gid if gid != -1 else -1)
-                    except Exception:
-                        pass
-            except Exception as e:
-                msgs.append(f"chown: {e}")
+            uid = -1
+            gid = -1
+            # only try if running on Unix
+            if hasattr(os, 'getuid') and owner == self.terminal_ui.username:
+                uid = os.getuid()
+            if hasattr(os, 'getgid') and group:
+                gid = os.getgid()
+            if uid != -1 or gid != -1:
+                try:
+                    self.filesystem.chown(t, uid, gid)
+                except OSError:
+                    pass
 
         return "\n".join(msgs) if msgs else ""
 
@@ -1847,24 +3945,14 @@ EXAMPLES
         targets = args[1:]
         msgs = []
         for t in targets:
-            real = self.filesystem._get_real_path(t)
-            if not real or not os.path.exists(real):
+            if not self.filesystem.exists(t):
                 msgs.append(f"chgrp: cannot access '{t}': No such file or directory")
                 continue
-            try:
-                if hasattr(os, 'chown'):
-                    gid = -1
-                    try:
-                        gid = os.getgid()
-                    except Exception:
-                        gid = -1
-                    if gid != -1:
-                        try:
-                            os.chown(real, -1, gid)
-                        except Exception:
-                            pass
-            except Exception as e:
-                msgs.append(f"chgrp: {e}")
+            if hasattr(os, 'getgid'):
+                try:
+                    self.filesystem.chown(t, -1, os.getgid())
+                except OSError:
+                    pass
 
         return "\n".join(msgs) if msgs else ""
     
@@ -1887,36 +3975,21 @@ EXAMPLES
             else:
                 i += 1
         
-        real_path = self.filesystem._get_real_path(start)
-        if not real_path or not os.path.exists(real_path):
+        if not self.filesystem.exists(start):
             return f"find: '{start}': No such file or directory"
         
         results = []
-        try:
-            if os.path.isfile(real_path):
-                basename = os.path.basename(real_path)
-                if name_pat is None or name_pat.replace('*', '') in basename:
-                    results.append(start)
-            else:
-                normalized_start = self.filesystem.normalize_path(start)
-                for root, dirs, files in os.walk(real_path):
-                    for name in dirs + files:
-                        if name_pat is None or name_pat.replace('*', '') in name:
-                            full_path = os.path.join(root, name)
-                            rel_path = os.path.relpath(full_path, real_path)
-                            rel_path_normalized = rel_path.replace('\\', '/')
-                            if rel_path == '.':
-                                virtual_path = normalized_start
-                            else:
-                                virtual_path = normalized_start.rstrip('/') + '/' + rel_path_normalized
-                            if start == '.':
-                                results.append(f"./{rel_path_normalized}")
-                            else:
-                                results.append(virtual_path)
-        except PermissionError:
-            return f"find: '{start}': Permission denied"
-        except Exception as e:
-            return f"find: error: {e}"
+        if not self.filesystem.is_dir(start):
+            if name_pat is None or name_pat.replace('*', '') in posixpath.basename(start):
+                results.append(start)
+        else:
+            normalized_start = self.filesystem.normalize_path(start).rstrip('/')
+            for path, _ in self.filesystem.walk(start):
+                rel_path = path[len(normalized_start) + 1:]
+                if not rel_path:
+                    continue
+                if name_pat is None or name_pat.replace('*', '') in posixpath.basename(path):
+                    results.append(f"./{rel_path}" if start == '.' else path)
         return "\n".join(results) if results else ""
     
     def cmd_which(self, args):
@@ -1928,28 +4001,54 @@ EXAMPLES
     
     def cmd_strings(self, args):
         """Print text strings from files"""
-        if not args:
+        min_len = 4
+        radix = None
+        files = []
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            if arg in ('-n', '-t') or arg.startswith(('-n', '-t', '--bytes=', '--radix=')):
+                if '=' in arg:
+                    value = arg.split('=', 1)[1]
+                elif len(arg) > 2:
+                    value = arg[2:]
+                else:
+                    i += 1
+                    value = args[i] if i < len(args) else ''
+                if arg.startswith(('-n', '--bytes=')):
+                    if not value.isdigit() or int(value) < 1:
+                        return f"strings: invalid minimum string length '{value}'"
+                    min_len = int(value)
+                else:
+                    if value not in STRINGS_RADIX:
+                        return f"strings: invalid radix '{value}'"
+                    radix = STRINGS_RADIX[value]
+            elif arg == '-a':
+                pass  # the whole file is always scanned
+            elif arg.startswith('-') and len(arg) > 1:
+                return f"strings: invalid option -- '{arg.lstrip('-')}'"
+            else:
+                files.append(arg)
+            i += 1
+        if not files:
             return "strings: missing file operand"
         
-        path = args[0]
-        lines, err = self._read_file_lines(path)
-        if err:
-            return f"strings: {err}"
-        
-        content = "\n".join(lines)
+        # Runs of printable ASCII (and tab), matched directly on the mapped file
+        printable = re.compile(rb'[\t\x20-\x7e]{%d,}' % min_len)
         out = []
-        buf = ''
-        
-        for ch in content:
-            if 32 <= ord(ch) <= 126 or ch in '\n\t':
-                buf += ch
-            else:
-                if len(buf) >= 4:
-                    out.append(buf)
-                buf = ''
-        
-        if len(buf) >= 4:
-            out.append(buf)
+        for path in files:
+            stream, err = self.filesystem.open_stream(path, 'rb', buffering=0)
+            if err:
+                out.append(f"strings: {err}")
+                continue
+            with stream, self._mapped(stream) as data:
+                if radix is None:
+                    found = printable.findall(data)
+                    if found:
+                        out.append(b"\n".join(found).decode('ascii'))
+                else:
+                    out.extend(f"{format(m.start(), radix):>7} {m.group().decode('ascii')}"
+                               for m in printable.finditer(data))
         
         return "\n".join(out)
     
@@ -1957,24 +4056,20 @@ EXAMPLES
         """Estimate file space usage"""
         path = args[0] if args else self.filesystem.current_path
 
-        real_path = self.filesystem._get_real_path(path)
-        if not real_path or not os.path.exists(real_path):
+        fs = self.filesystem
+        if not fs.exists(path):
             return f"du: cannot access '{path}': No such file or directory"
 
         total = 0
-        try:
-            if os.path.isfile(real_path):
-                total = os.path.getsize(real_path)
-            else:
-                for root, dirs, files in os.walk(real_path):
-                    for f in files:
-                        fp = os.path.join(root, f)
-                        try:
-                            total += os.path.getsize(fp)
-                        except Exception:
-                            pass
-        except Exception:
-            return f"du: cannot read directory '{path}'"
+        if not fs.is_dir(path):
+            total = fs.stat(path).st_size
+        else:
+            for found, node in fs.walk(path):
+                if node['type'] == 'file':
+                    try:
+                        total += fs.stat(found).st_size
+                    except OSError:
+                        pass
 
         kb_size = (total + 1023) // 1024
         return f"{kb_size}\t{path}"
@@ -1982,25 +4077,8 @@ EXAMPLES
     def cmd_df(self, args):
         """Report file system disk space usage"""
         try:
-            if os.name == 'nt':  # Windows
-                import ctypes
-                free_bytes = ctypes.c_ulonglong(0)
-                total_bytes = ctypes.c_ulonglong(0)
-                ctypes.windll.kernel32.GetDiskFreeSpaceExW(
-                    ctypes.c_wchar_p(self.filesystem.base_path),
-                    None,
-                    ctypes.pointer(total_bytes),
-                    ctypes.pointer(free_bytes)
-                )
-                total = total_bytes.value
-                avail = free_bytes.value
-                used = total - avail
-            else:  # Unix-like
-                stat = os.statvfs(self.filesystem.base_path)
-                total = stat.f_blocks * stat.f_frsize
-                avail = stat.f_bavail * stat.f_frsize
-                used = total - avail
-        except:
+            total, used, avail = self.filesystem.disk_usage()
+        except Exception:
             total = 1024 * 1024 * 10
             used = 5000000
             avail = total - used
@@ -2011,30 +4089,77 @@ EXAMPLES
             total//1024, used//1024, avail//1024, usep
     )
     
+    def _expand_globs(self, patterns):
+        """Expand wildcards in the last component of each pattern, like the shell.
+
+        Patterns that match nothing are kept as they are.
+        """
+        import fnmatch
+        expanded = []
+        for pattern in patterns:
+            if not any(c in pattern for c in '*?['):
+                expanded.append(pattern)
+                continue
+            directory, _, name = pattern.rpartition('/')
+            entries = self.filesystem.list_directory(directory or ('/' if pattern.startswith('/') else '.'))
+            if not name.startswith('.'):
+                entries = [e for e in entries or [] if not e.startswith('.')]
+            matches = [e for e in entries or [] if fnmatch.fnmatchcase(e, name)]
+            if not matches:
+                expanded.append(pattern)
+            else:
+                prefix = directory + '/' if directory or pattern.startswith('/') else ''
+                expanded.extend(prefix + e for e in matches)
+        return expanded
+
     def cmd_filetype(self, args):
         """Determine file type"""
-        if not args:
+        import filemagic
+        recursive = False
+        brief = False
+        patterns = []
+        for arg in args:
+            if arg in ('-r', '-R', '--recursive'):
+                recursive = True
+            elif arg in ('-b', '--brief'):
+                brief = True
+            elif arg.startswith('-') and len(arg) > 1:
+                return f"file: invalid option -- '{arg.lstrip('-')}'"
+            else:
+                patterns.append(arg)
+        if not patterns:
             return "file: missing file operand"
         
-        path = args[0]
+        paths = []
+        for path in self._expand_globs(patterns):
+            node = self.filesystem.get_node(path) if recursive else None
+            paths.append(path)
+            if node and node['type'] == 'directory':
+                # walk() yields absolute paths; show them under the name given
+                start = self.filesystem.normalize_path(path).rstrip('/')
+                shown = path.rstrip('/')
+                for found, _ in self.filesystem.walk(path):
+                    if found.rstrip('/') != start:
+                        paths.append(shown + found[len(start):])
         
-        real_path = self.filesystem._get_real_path(path)
-        if not real_path or not os.path.exists(real_path):
-            return f"file: {path}: cannot open (No such file or directory)"
-        
-        if os.path.isdir(real_path):
-            return f"{path}: directory"
+        def read_header(path):
+            stream, error = self.filesystem.open_stream(path, 'rb', buffering=0)
+            if error:
+                node = self.filesystem.get_node(path)
+                if node and node['type'] == 'directory':
+                    return b'', True, 'directory'
+                # open_stream errors read "PATH: reason"
+                return None, True, f"cannot open ({error[len(path) + 2:]})"
+            with stream:
+                # One read per file; the extra byte tells whether the file was read in full
+                data = stream.read(filemagic.HEADER_SIZE + 1)
+            return data[:filemagic.HEADER_SIZE], len(data) <= filemagic.HEADER_SIZE, ""
         
-        try:
-            with open(real_path, 'rb') as f:
-                header = f.read(512)
-            
-            if all(b < 128 for b in header):
-                return f"{path}: ASCII text"
-            else:
-                return f"{path}: data"
-        except:
-            return f"{path}: cannot open"
+        out = []
+        for path, description, error in filemagic.describe_many(paths, read_header):
+            text = error or description
+            out.append(text if brief else f"{path}: {text}")
+        return "\n".join(out)
 
     # --- Additional file/system commands ---
     def cmd_ln(self, args):
@@ -2045,24 +4170,24 @@ EXAMPLES
         parts = [a for a in args if not a.startswith('-')]
         src, dst = parts[0], parts[1]
 
-        srcp = self.filesystem._get_real_path(src)
-        dstp = self.filesystem._get_real_path(dst)
-        if not srcp or not dstp:
-            return "ln: Access denied"
-        if not os.path.exists(srcp):
+        fs = self.filesystem
+        if not fs.exists(src):
             return f"ln: failed to access '{src}': No such file or directory"
+        if fs.is_dir(dst):
+            dst = posixpath.join(dst, posixpath.basename(fs.normalize_path(src)))
+        try:
+            fs.lstat(dst)
+            fs.remove_file(dst)  # an existing target is replaced
+        except OSError:
+            pass
         try:
             if symbolic:
-                if os.path.exists(dstp):
-                    os.remove(dstp)
-                os.symlink(srcp, dstp)
+                fs.symlink(fs.normalize_path(src), dst)
             else:
-                if os.path.exists(dstp):
-                    os.remove(dstp)
-                os.link(srcp, dstp)
+                fs.link(src, dst)
             return ""
-        except Exception as e:
-            return f"ln: {e}"
+        except OSError as e:
+            return f"ln: failed to create link '{dst}': {e.strerror or e}"
 
     def cmd_locate(self, args):
         """Locate files by name pattern (simple): locate PATTERN"""
@@ -2070,14 +4195,130 @@ EXAMPLES
             return "locate: missing operand"
         pattern = args[0]
         needle = pattern.replace('*', '')
-        results = []
-        for root, dirs, files in os.walk(self.filesystem.base_path):
-            for name in dirs + files:
-                if needle in name:
-                    rel = os.path.relpath(os.path.join(root, name), self.filesystem.base_path)
-                    results.append('/' + rel.replace('\\', '/'))
+        results = [path for path, _ in self.filesystem.walk('/')
+                   if path != '/' and needle in posixpath.basename(path)]
         return "\n".join(results)
 
+    def cmd_inotifywait(self, args):
+        """Wait for changes to files, reported by the file system's watcher"""
+        import queue
+        import time
+
+        # On the terminal the wait runs in the background until Ctrl+C; behind a pipe
+        # or redirect it blocks the terminal, so it must end on its own
+        in_background = self.to_terminal and hasattr(self.terminal_ui, 'start_job')
+        monitor = recursive = False
+        timeout = 0 if in_background else INOTIFYWAIT_TIMEOUT
+        kinds = None
+        paths = []
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            if arg in ('-t', '--timeout', '-e', '--event'):
+                if i + 1 >= len(args):
+                    return f"inotifywait: option requires an argument -- '{arg.lstrip('-')[0]}'"
+                value = args[i + 1]
+                i += 2
+                if arg in ('-t', '--timeout'):
+                    try:
+                        timeout = float(value)
+                    except ValueError:
+                        return f"inotifywait: invalid timeout '{value}'"
+                else:
+                    kinds = set()
+                    for name in value.lower().split(','):
+                        if name not in INOTIFY_EVENTS:
+                            return f"inotifywait: invalid event '{name}'"
+                        kinds.update(INOTIFY_EVENTS[name])
+                continue
+            if arg in ('--monitor', '--recursive'):
+                monitor |= arg == '--monitor'
+                recursive |= arg == '--recursive'
+            elif arg.startswith('-') and len(arg) > 1:
+                for flag in arg[1:]:
+                    if flag == 'm':
+                        monitor = True
+                    elif flag == 'r':
+                        recursive = True
+                    elif flag != 'q':  # -q: there are no setup messages to silence
+                        return f"inotifywait: invalid option -- '{flag}'"
+            else:
+                paths.append(arg)
+            i += 1
+        if timeout <= 0 and not in_background:
+            return "inotifywait: piped or redirected it cannot be interrupted, so -t must give a timeout"
+
+        fs = self.filesystem
+        targets = []
+        for path in paths or ['.']:
+            try:
+                st = fs.stat(path)
+            except OSError:
+                return f"inotifywait: Couldn't watch {path}: No such file or directory"
+            targets.append((fs.normalize_path(path), stat.S_ISDIR(st.st_mode)))
+        watcher = fs.watch()
+        if watcher is None:
+            return "inotifywait: watching needs a working directory on disk"
+
+        def matches(event):
+            if kinds is not None and event.kind not in kinds and event.kind != 'OVERFLOW':
+                return False
+            for target, is_dir in targets:
+                if event.path == target:
+                    return True
+                if is_dir and (posixpath.dirname(event.path) == target or
+                               recursive and event.path.startswith(target.rstrip('/') + '/')):
+                    return True
+            return False
+
+        def describe(event):
+            directory, name = posixpath.split(event.path)
+            kind = event.kind + (',ISDIR' if event.is_dir else '')
+            if event.kind == 'OVERFLOW':
+                return "/ Q_OVERFLOW"
+            return f"{directory.rstrip('/')}/ {kind} {name}"
+
+        received = queue.Queue()
+        callback = received.put
+
+        def changes():
+            # Setting the watches up walks the tree, so this may take a while the first time
+            watcher.ready.wait()
+            if watcher.error:
+                yield f"inotifywait: {watcher.error.strerror or watcher.error}\n"
+                return
+            watcher.subscribe(callback)
+            deadline = time.monotonic() + timeout if timeout > 0 else None
+            try:
+                while True:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return
+                    try:
+                        events = received.get(timeout=remaining)
+                    except queue.Empty:
+                        return
+                    if events is None:
+                        return  # cancelled
+                    lines = [describe(event) + "\n" for event in events if matches(event)]
+                    if not lines:
+                        continue
+                    if not monitor:
+                        yield lines[0]
+                        return
+                    yield "".join(lines)
+            finally:
+                watcher.unsubscribe(callback)
+
+        if in_background:
+            def run(emit):
+                for chunk in changes():
+                    emit(chunk)
+            return BackgroundJob(run, lambda: received.put(None))
+        if monitor:
+            return changes()
+        return "".join(changes()).rstrip("\n")
+
     def cmd_whereis(self, args):
         """Locate binary, source, and manual pages for commands"""
         if not args:
@@ -2107,12 +4348,7 @@ EXAMPLES
     def cmd_lsof(self, args):
         """List open files"""
         out = ["COMMAND PID USER FD TYPE NAME"]
-        files = []
-        for root, dirs, fs in os.walk(self.filesystem.base_path):
-            for f in fs:
-                full_path = os.path.join(root, f)
-                rel_path = os.path.relpath(full_path, self.filesystem.base_path)
-                files.append('/' + rel_path.replace('\\', '/'))
+        files = [path for path, node in self.filesystem.walk('/') if node['type'] == 'file']
         i = 0
         for p in self.process_table:
             if files:
@@ -2130,17 +4366,15 @@ EXAMPLES
         mode = args[0]
         path = args[1]
 
-        real_path = self.filesystem._get_real_path(path)
-        if not real_path or not os.path.exists(real_path):
+        if not self.filesystem.exists(path):
             return f"chmod: cannot access '{path}': No such file or directory"
         try:
-            mode_int = int(mode, 8)
-            os.chmod(real_path, mode_int)
+            self.filesystem.chmod(path, int(mode, 8))
             return ""
         except ValueError:
             return f"chmod: invalid mode: '{mode}'"
-        except Exception as e:
-            return f"chmod: {e}"
+        except OSError as e:
+            return f"chmod: changing permissions of '{path}': {e.strerror or e}"
     
     # ============ UTILITY COMMANDS ============
     
@@ -2164,9 +4398,10 @@ EXAMPLES
         return calendar.month(now.year, now.month)
     
     def cmd_yes(self, args):
-        """Output string repeatedly"""
-        text = " ".join(args) if args else "y"
-        return "\n".join([text] * 20)
+        """Output a string repeatedly until the reader stops"""
+        line = (" ".join(args) if args else "y") + "\n"
+        chunk = line * max(1, COPY_BUFFER_SIZE // len(line))
+        return iter(lambda: chunk, None)
     
     def cmd_dirname(self, args):
         """Extract directory from pathname"""
@@ -2185,74 +4420,447 @@ EXAMPLES
         return path.split('/')[-1] if '/' in path else path
     
     def cmd_seq(self, args):
-        """Generate sequence of numbers"""
-        if not args:
+        """Print a sequence of numbers: seq [-w] [-s SEP] [-f FORMAT] [FIRST [INCREMENT]] LAST"""
+        from decimal import Decimal, InvalidOperation
+        equal_width = False
+        separator = "\n"
+        number_format = None
+        numbers = []
+        i = 0
+        while i < len(args):
+            arg = args[i]
+            i += 1
+            if arg in ('-w', '--equal-width'):
+                equal_width = True
+            elif arg in ('-s', '-f') or arg.startswith(('-s', '-f', '--separator=', '--format=')) and not numbers:
+                if '=' in arg and arg.startswith('--'):
+                    value = arg.split('=', 1)[1]
+                elif len(arg) > 2:
+                    value = arg[2:]
+                elif i < len(args):
+                    value = args[i]
+                    i += 1
+                else:
+                    return f"seq: option requires an argument -- '{arg[1]}'"
+                if arg.startswith(('-s', '--separator')):
+                    separator = value
+                else:
+                    number_format = value
+            else:
+                numbers.append(arg)
+        if not numbers:
             return "seq: missing operand"
+        if len(numbers) > 3:
+            return f"seq: extra operand '{numbers[3]}'"
         
         try:
-            if len(args) == 1:
-                start, end, step = 1, int(args[0]), 1
-            elif len(args) == 2:
-                start, end, step = int(args[0]), int(args[1]), 1
+            values = [Decimal(n) for n in numbers]
+        except InvalidOperation:
+            bad = next(n for n in numbers if not self._is_decimal(n))
+            return f"seq: invalid floating point argument: '{bad}'"
+        for number, value in zip(numbers, values):
+            if not value.is_finite():
+                return f"seq: invalid floating point argument: '{number}'"
+        if len(values) == 1:
+            values = [Decimal(1)] + values
+        if len(values) == 2:
+            values = [values[0], Decimal(1), values[1]]
+        first, step, last = values
+        if step == 0:
+            return f"seq: invalid Zero increment value: '{numbers[1]}'"
+        if number_format is not None:
+            try:
+                number_format % 1.0
+            except (TypeError, ValueError):
+                return f"seq: invalid format string: '{number_format}'"
+
+        # Count in integers scaled by 10**places, so decimal steps never drift
+        places = max(max(-v.as_tuple().exponent, 0) for v in values)
+        scale = 10 ** places
+        start, increment, stop = (int(v * scale) for v in values)
+        stop += 1 if increment > 0 else -1
+        if number_format is not None:
+            fmt = lambda n: number_format % (n / scale)
+        elif places:
+            fmt = lambda n: f"{'-' if n < 0 else ''}{abs(n) // scale}.{abs(n) % scale:0{places}d}"
+        else:
+            fmt = str
+        if equal_width and number_format is None:
+            width = max(len(fmt(start)), len(fmt(stop - (1 if increment > 0 else -1))))
+            plain = fmt
+            fmt = lambda n: plain(n).zfill(width)
+        return self._seq_chunks(range(start, stop, increment), fmt, separator)
+
+    @staticmethod
+    def _is_decimal(text):
+        from decimal import Decimal, InvalidOperation
+        try:
+            Decimal(text)
+            return True
+        except InvalidOperation:
+            return False
+
+    @staticmethod
+    def _seq_chunks(numbers, fmt, separator):
+        """Lazily format numbers SEQ_CHUNK_NUMBERS at a time, ending with a newline"""
+        if not numbers:
+            return
+        lead = ""
+        for begin in range(0, len(numbers), SEQ_CHUNK_NUMBERS):
+            yield lead + separator.join(map(fmt, numbers[begin:begin + SEQ_CHUNK_NUMBERS]))
+            lead = separator
+        yield "\n"
+
+    def _parse_tar_args(self, args):
+        """Parse tar options. Returns (options dict, file operands, error)."""
+        opts = {'mode': None, 'compression': None, 'auto': False, 'verbose': False,
+                'archive': None, 'directory': None}
+        files = []
+        tokens = list(args)
+        # Traditional usage bundles the options into the first word without a dash
+        if tokens and not tokens[0].startswith('-'):
+            tokens[0] = '-' + tokens[0]
+        i = 0
+        while i < len(tokens):
+            arg = tokens[i]
+            if arg.startswith('--directory='):
+                opts['directory'] = arg.split('=', 1)[1]
+            elif arg.startswith('--file='):
+                opts['archive'] = arg.split('=', 1)[1]
+            elif arg.startswith('-') and not arg.startswith('--') and len(arg) > 1:
+                letters = arg[1:]
+                for j, flag in enumerate(letters):
+                    if flag in 'ctx':
+                        if opts['mode'] and opts['mode'] != flag:
+                            return None, None, "tar: You may not specify more than one '-ctx' option"
+                        opts['mode'] = flag
+                    elif flag in 'zjJ':
+                        opts['compression'] = {'z': 'gz', 'j': 'bz2', 'J': 'xz'}[flag]
+                    elif flag == 'a':
+                        opts['auto'] = True
+                    elif flag == 'v':
+                        opts['verbose'] = True
+                    elif flag in 'fC':
+                        value = letters[j + 1:]
+                        if not value:
+                            if i + 1 >= len(tokens):
+                                return None, None, f"tar: option requires an argument -- '{flag}'"
+                            i += 1
+                            value = tokens[i]
+                        opts['archive' if flag == 'f' else 'directory'] = value
+                        break
+                    else:
+                        return None, None, f"tar: invalid option -- '{flag}'"
             else:
-                start, step, end = int(args[0]), int(args[1]), int(args[2])
-        except ValueError:
-            return "seq: invalid number"
+                files.append(arg)
+            i += 1
+        return opts, files, None
         
-        if step == 0:
-            return "seq: step must not be zero"
+    def cmd_tar(self, args):
+        """Create, list or extract tar archives"""
+        import tarfile
+        import archive as tar_archive
+
+        if not args:
+            return "tar: missing operand"
+
+        opts, files, error = self._parse_tar_args(args)
+        if error:
+            return error
+        if not opts['mode']:
+            return "tar: You must specify one of the '-ctx' options"
+        archive = opts['archive']
+        if not archive:
+            return "tar: Refusing to read/write archive without -f ARCHIVE"
+
+        fs = self.filesystem
+        directory = fs.normalize_path(opts['directory'] or '.')
+        if not fs.is_dir(directory):
+            return f"tar: {opts['directory'] or '.'}: Cannot open: No such file or directory"
         
         out = []
-        i = start
+        try:
+            if opts['mode'] == 'c':
+                if not files:
+                    return "tar: Cowardly refusing to create an empty archive"
+                compression = opts['compression']
+                if not compression and opts['auto']:
+                    compression = tar_archive.compression_for_name(archive)
         
-        if step > 0:
-            while i <= end:
-                out.append(str(i))
-                i += step
-        else:
-            while i >= end:
-                out.append(str(i))
-                i += step
-        if len(out) > 1000:
-            return "seq: sequence too large (limit: 1000 numbers)"
-        return "\n".join(out)
+                archive_path = fs.normalize_path(archive)
+                raw, error = fs.open_stream(archive, 'wb')
+                if error:
+                    return f"tar: {error}"
+                tar, stream = tar_archive.open_for_writing(raw, compression)
+                try:
+                    for f in files:
+                        virtual = posixpath.join(directory, f)
+                        try:
+                            fs.lstat(virtual)
+                        except OSError:
+                            out.append(f"tar: {f}: Cannot stat: No such file or directory")
+                            continue
+                        arcname = posixpath.normpath(f).lstrip('/') or '.'
+                        # Never add the archive being written to itself
+                        added = tar_archive.add_path(tar, fs, fs.normalize_path(virtual), arcname,
+                                                     skip=lambda path: path == archive_path)
+                        if opts['verbose']:
+                            out.extend(added)
+                finally:
+                    tar.close()
+                    stream.close()
+                return "\n".join(out)
     
-    def cmd_tar(self, args):
-        """Create/extract tar archives"""
-        import tarfile
-        if not args or len(args) < 2:
-            return "tar: missing operand"
+            raw, error = fs.open_stream(archive, 'rb')
+            if error:
+                return f"tar: {archive}: Cannot open: No such file or directory"
         
-        operation = args[0]
-        archive = args[1]
-        files = args[2:] if len(args) > 2 else []
+            tar, stream = tar_archive.open_for_reading(raw)
+            with stream:
+                if opts['mode'] == 't':
+                    for member in tar:
+                        if opts['verbose']:
+                            out.append(self._tar_long_listing(member))
+                        else:
+                            out.append(member.name + ('/' if member.isdir() else ''))
+                    return "\n".join(out)
         
-        real_archive = self.filesystem._get_real_path(archive)
-        if not real_archive:
-            return f"tar: cannot access '{archive}': Access denied"
+                wanted = set(posixpath.normpath(f).lstrip('/') for f in files)
+                for member in tar:
+                    name = member.name.lstrip('/')
+                    if wanted and not any(name == w or name.startswith(w + '/') for w in wanted):
+                        continue
+                    reason = tar_archive.member_error(member, directory, fs.contains)
+                    if reason:
+                        out.append(f"tar: {member.name}: {reason}; skipped")
+                        continue
+                    error = tar_archive.extract_member(tar, member, fs, directory)
+                    if error:
+                        out.append(f"tar: {member.name}: {error}")
+                        continue
+                    if opts['verbose']:
+                        out.append(name + ('/' if member.isdir() else ''))
+            return "\n".join(out)
+        except (tarfile.TarError, EOFError) as e:
+            return f"tar: {archive}: {e}"
+        except OSError as e:
+            return f"tar: {archive}: {e.strerror or e}"
         
+    def cmd_mkimage(self, args):
+        """Build a read-only file system image from a directory"""
+        from fsimage import build_image
+
+        verbose = False
+        operands = []
+        for arg in args:
+            if arg == '-v':
+                verbose = True
+            elif arg.startswith('-') and arg != '-':
+                return f"mkimage: invalid option -- '{arg.lstrip('-')}'"
+            else:
+                operands.append(arg)
+        if len(operands) != 2:
+            return "mkimage: usage: mkimage [-v] DIRECTORY IMAGE"
+        source, image = operands
+
+        fs = self.filesystem
+        if not fs.is_dir(source):
+            return f"mkimage: {source}: Not a directory"
+        image_path = fs.normalize_path(image)
+        added = []
+
+        def skip(path):
+            # Never add the image being written to itself
+            if path == image_path:
+                return True
+            if verbose:
+                added.append(path)
+            return False
+
+        stream, error = fs.open_stream(image, 'wb')
+        if error:
+            return f"mkimage: {error}"
         try:
-            if operation == '-cf' or operation == 'cf':
-                # Create archive
-                if not files:
-                    return "tar: missing file operand"
-                with tarfile.open(real_archive, 'w') as tar:
-                    for f in files:
-                        real_file = self.filesystem._get_real_path(f)
-                        if real_file and os.path.exists(real_file):
-                            tar.add(real_file, arcname=os.path.basename(real_file))
-                return ""
-            elif operation == '-xf' or operation == 'xf':
-                # Extract archive
-                if not os.path.exists(real_archive):
-                    return f"tar: {archive}: Cannot open: No such file or directory"
-                with tarfile.open(real_archive, 'r') as tar:
-                    tar.extractall(path=self.filesystem.base_path)
-                return ""
+            with stream:
+                entries, files, size = build_image(fs, source, stream, skip)
+        except OSError as e:
+            fs.remove_file(image)
+            return f"mkimage: {e.filename or source}: {e.strerror or e}"
+        summary = (f"mkimage: {image}: {entries} entries, {files} files, "
+                   f"{self._human_readable_size(size)} of data")
+        return "\n".join(added + [summary])
+
+    def cmd_mount(self, args):
+        """Open an image, an archive or a memory file system in place of the current one"""
+        from filesystem import open_filesystem
+
+        if not args:
+            return "\n".join(f"{fs.base_path} on /{' (read-only)' if fs.read_only else ''}"
+                             for fs in self.mounts + [self.filesystem])
+        if len(args) != 1 or (args[0].startswith('-') and args[0] != '-'):
+            return "mount: usage: mount [IMAGE | ARCHIVE | :memory:]"
+        location = args[0]
+        if location != ':memory:':
+            if not self.filesystem.exists(location):
+                return f"mount: {location}: No such file or directory"
+            if self.filesystem.is_dir(location):
+                return f"mount: {location}: Is a directory"
+            location = self.filesystem.real_path(location)
+            if location is None:
+                return f"mount: {args[0]}: only files on disk can be mounted"
+        try:
+            mounted = open_filesystem(location)
+        except (OSError, ValueError) as e:
+            return f"mount: {args[0]}: {getattr(e, 'strerror', None) or e}"
+        self.mounts.append(self.filesystem)
+        self._set_filesystem(mounted)
+        return ""
+
+    def cmd_umount(self, args):
+        """Close the file system opened by mount and return to the previous one"""
+        from overlay import OverlayFileSystem
+
+        if args:
+            return "umount: usage: umount"
+        if not self.mounts:
+            return "umount: nothing is mounted"
+        if isinstance(self.filesystem, OverlayFileSystem):
+            return "umount: an overlay is active; stop it first"
+        mounted = self.filesystem
+        self._set_filesystem(self.mounts.pop())
+        if mounted.watcher is not None:
+            mounted.watcher.close()
+        if hasattr(mounted, 'close'):
+            mounted.close()
+        return ""
+
+    def cmd_overlay(self, args):
+        """Run on a copy-on-write layer over the working directory and commit or discard its changes"""
+        from overlay import OverlayFileSystem
+        from filesystem import LocalFileSystem
+
+        usage = "overlay: usage: overlay start [--disk] | status | commit | discard | stop"
+        action, rest = (args[0], args[1:]) if args else ('status', [])
+        fs = self.filesystem
+        active = isinstance(fs, OverlayFileSystem)
+
+        if action == 'start':
+            if active:
+                return "overlay: already active"
+            if rest not in ([], ['--disk']):
+                return usage
+            if rest:
+                root = fs.real_path('/')
+                if root is None:
+                    return "overlay: --disk needs a working directory on disk"
+                scratch = self._overlay_scratch(root)
+                os.makedirs(os.path.join(scratch, 'upper'), exist_ok=True)
+                overlay = OverlayFileSystem(fs, LocalFileSystem(os.path.join(scratch, 'upper')),
+                                            os.path.join(scratch, 'whiteouts'))
+                where = scratch
             else:
-                return f"tar: unknown operation '{operation}'"
-        except Exception as e:
-            return f"tar: {e}"
+                overlay = OverlayFileSystem(fs)
+                where = "memory"
+            self._set_filesystem(overlay)
+            pending = len(overlay.changes())
+            resumed = f" ({pending} pending changes resumed)" if pending else ""
+            return f"overlay: started; changes now go to {where}{resumed}"
+
+        if not active:
+            return "overlay: not active (start one with 'overlay start')"
+        if rest:
+            return usage
+        try:
+            if action == 'status':
+                changes = fs.changes()
+                if not changes:
+                    return "overlay: no changes"
+                return "\n".join(f"{status}  {path}" for status, path in changes)
+            if action == 'commit':
+                written, removed = fs.commit()
+                return f"overlay: committed {written} paths, removed {removed}"
+            if action == 'discard':
+                count = len(fs.changes())
+                fs.discard()
+                return f"overlay: discarded {count} changes"
+            if action == 'stop':
+                if fs.changes():
+                    return "overlay: there are uncommitted changes; commit or discard them first"
+                lower = fs.lower
+                lower.current_path = fs.current_path if lower.is_dir(fs.current_path) else lower.home
+                self._set_filesystem(lower)
+                root = lower.real_path('/')
+                if fs.whiteout_file and root is not None:
+                    shutil.rmtree(self._overlay_scratch(root), ignore_errors=True)
+                return "overlay: stopped"
+        except OSError as e:
+            return f"overlay: {e.filename or ''}{': ' if e.filename else ''}{e.strerror or e}"
+        return usage
+
+    def _overlay_scratch(self, root):
+        """Scratch directory that keeps an on-disk overlay of the directory root"""
+        return os.path.normpath(root) + '.overlay'
+
+    def _set_filesystem(self, filesystem):
+        self.filesystem = filesystem
+        self.terminal_ui.filesystem = filesystem
+        # Indexes are keyed by id(), which a closed file system can hand on to its successor
+        self.listing_cache = None
+
+    def cmd_snapshot(self, args):
+        """Create, list, restore, compare and delete snapshots of the working directory"""
+        from snapshot_store import SnapshotStore, SnapshotError
+
+        usage = "snapshot: usage: snapshot create [NAME] | list | restore NAME | diff NAME [OTHER] | delete NAME"
+        if not args:
+            return usage
+        action, rest = args[0], args[1:]
+        root = self.filesystem.real_path('/')
+        if root is None:
+            return "snapshot: snapshots are only supported for a directory on disk"
+        store = SnapshotStore(root)
+        try:
+            if action == 'create' and len(rest) <= 1:
+                m = store.create(rest[0] if rest else None)
+                total = sum(f['size'] for f in m['files'].values())
+                return (f"snapshot {m['name']}: {len(m['files'])} files, {self._human_readable_size(total)}; "
+                        f"read {m['read_files']} changed files, stored {self._human_readable_size(m['stored_bytes'])} "
+                        f"new data in {m['seconds']:.2f}s")
+            if action == 'list' and not rest:
+                lines = []
+                for name in store.names():
+                    m = store.load(name)
+                    total = sum(f['size'] for f in m['files'].values())
+                    lines.append(f"{name:<20} {m['created']}  {len(m['files']):>7} files "
+                                 f"{self._human_readable_size(total):>8}  +{self._human_readable_size(m['stored_bytes'])}")
+                return "\n".join(lines) if lines else "snapshot: no snapshots"
+            if action == 'restore' and len(rest) == 1:
+                written, removed = store.restore(rest[0])
+                return f"snapshot {rest[0]} restored: {written} files written, {removed} removed"
+            if action == 'diff' and len(rest) in (1, 2):
+                return "\n".join(f"{status} /{path}" for status, path in store.diff(*rest))
+            if action == 'delete' and len(rest) == 1:
+                freed = store.delete(rest[0])
+                return f"snapshot {rest[0]} deleted, {self._human_readable_size(freed)} freed"
+        except SnapshotError as e:
+            return f"snapshot: {e}"
+        except OSError as e:
+            return f"snapshot: {e.strerror or e}"
+        return usage
+
+    def _tar_long_listing(self, member):
+        """Format a tar member like 'tar -tv'"""
+        import stat as stat_module
+        kind = 'd' if member.isdir() else 'l' if member.issym() else 'h' if member.islnk() else '-'
+        perms = kind + stat_module.filemode(member.mode)[1:]
+        owner = f"{member.uname or member.uid}/{member.gname or member.gid}"
+        mtime = datetime.datetime.fromtimestamp(member.mtime).strftime('%Y-%m-%d %H:%M')
+        name = member.name
+        if member.issym():
+            name += f" -> {member.linkname}"
+        elif member.islnk():
+            name += f" link to {member.linkname}"
+        return f"{perms} {owner:<16} {member.size:>9} {mtime} {name}"
     
     def cmd_nohup(self, args):
         """Run command immune to hangups"""
@@ -2343,7 +4951,7 @@ EXAMPLES
         return """Unix Terminal - Command Help
 
 FILE SYSTEM COMMANDS:
-  ls          List directory contents (-l for details, -a for all)
+  ls          List directory contents (-l details, -a all, -S/-t sort, -R recursive)
   cd          Change directory
   pwd         Print working directory
   cat         Display file contents
@@ -2353,12 +4961,14 @@ FILE SYSTEM COMMANDS:
   rmdir       Remove empty directories
   cp          Copy files/directories (-r for recursive)
   mv          Move/rename files or directories
+  rsync       Incrementally copy files and trees (-a, -c, --delete)
   du          Estimate directory space usage
   df          Report filesystem disk usage
-  file        Determine file type
+  file        Determine file type (-r for directories, wildcards allowed)
   ln          Link files (-s for symbolic)
   find        Search for files (-name support)
   locate      Find paths by name pattern
+  inotifywait Wait for changes to files (-m, -r, -t, -e)
   which       Show path of a command
   whereis     Locate binary/source/manual for command
   whatis      Display one-line manual page description
@@ -2372,22 +4982,27 @@ TEXT PROCESSING COMMANDS:
   egrep       Extended grep (alias for grep)
   fgrep       Fixed string grep (alias for grep)
   sort        Sort lines of text files
-  cut         Remove sections from lines (-d DELIM -f FIELDS)
+  cut         Remove sections from lines (-b, -c, -f LIST, -d, -s)
   diff        Compare files line by line
   less        View file content (no paging)
   more        View file content (alias for less)
   uniq        Remove adjacent duplicate lines
-  tr          Translate or delete characters
+  tr          Translate, squeeze or delete characters (-c, -d, -s)
   cksum       Calculate CRC checksum and byte count
-  cmp         Compare two files byte by byte
-  fold        Wrap lines to specified width (-w WIDTH)
-  tee         Write to files
-  strings     Print text strings from files
-  awk         Pattern scanning (basic support)
-  sed         Stream editor (basic support)
+  md5sum      Compute or check MD5 digests (-c to verify)
+  sha1sum     Compute or check SHA-1 digests (-c to verify)
+  sha256sum   Compute or check SHA-256 digests (-c to verify)
+  b2sum       Compute or check BLAKE2b digests (-c to verify)
+  cmp         Compare two files byte by byte (-l, -n LIMIT)
+  fold        Wrap lines to specified width (-w WIDTH, -s)
+  tee         Copy piped input to files (-a)
+  strings     Print text strings from files (-n MIN, -t d|o|x)
+  awk         Pattern scanning and processing language (-F, -v, -f)
+  sed         Stream editor (-n, -e, -f, -E, -i, -s)
   iconv       Convert character encoding
-  join        Join lines of files
-  paste       Merge lines of files
+  join        Join lines of two files on a field (-1, -2, -t, -a, -v, -o)
+  csvq        SQL-like queries over CSV/TSV files (SELECT/WHERE/GROUP BY)
+  paste       Merge lines of files (-d LIST, -s)
   ex          Line editor (basic support)
 
 PROCESS MANAGEMENT COMMANDS:
@@ -2435,7 +5050,11 @@ PERMISSION COMMANDS:
   chgrp       Change group ownership
 
 ARCHIVE COMMANDS:
-  tar         Create/extract tar archives
+  tar         Create/list/extract tar archives (-z, -j, -J)
+  mkimage     Build a memory-mapped file system image of a directory
+  mount       Open an image or archive as the file system (umount to leave)
+  snapshot    Snapshot and restore the working directory
+  overlay     Copy-on-write layer over the working directory (commit/discard)
 
 UTILITY COMMANDS:
   echo        Display line of text
@@ -2446,7 +5065,7 @@ UTILITY COMMANDS:
   cal         Display calendar
   banner      Display text in large format
   yes         Output string repeatedly
-  seq         Generate sequence of numbers
+  seq         Generate sequence of numbers (-w, -s SEP, -f FMT)
   dirname     Extract directory from pathname
   basename    Extract filename from pathname
 
@@ -2462,6 +5081,8 @@ TIPS & SHORTCUTS:
   • man <cmd>     View detailed manual for any command
   • cmd > file    Redirect output to file
   • cmd >> file   Append output to file
+  • cmd1 | cmd2   Pipe output into the next command (cat, head, tail, wc,
+                  grep, sort, uniq, cut, join, tr, awk, sed, csvq, tee)
 
 EXAMPLES:
   ls -l documents/          List documents with details
@@ -0,0 +1,281 @@
+# Copy Engine Implementation
+import os
+import errno
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# Files at least this large are copied in-kernel (copy_file_range/sendfile)
+ZERO_COPY_THRESHOLD = 1024 * 1024
+# Bytes handed to the kernel per copy_file_range/sendfile call
+ZERO_COPY_CHUNK = 8 * 1024 * 1024
+# Buffer size for the plain read/write fallback
+BUFFERED_CHUNK = 1024 * 1024
+# Worker threads used to copy many files at once in copy_tree
+MAX_COPY_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Linux ioctl that makes the destination share the source's extents (reflink)
+FICLONE = 0x40049409
+
+REFLINK_MODES = ('never', 'auto', 'always')
+
+
+class CopyStats:
+    """Running totals of a copy operation, shared between worker threads"""
+
+    def __init__(self, total_files=0, total_bytes=0):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.cloned = 0
+        self.start = time.monotonic()
+        self.end = None
+        self._lock = threading.Lock()
+
+    def add_bytes(self, nbytes):
+        with self._lock:
+            self.bytes += nbytes
+
+    def add_file(self, cloned=False):
+        with self._lock:
+            self.files += 1
+            if cloned:
+                self.cloned += 1
+
+    def finish(self):
+        self.end = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return (self.end or time.monotonic()) - self.start
+
+    @property
+    def throughput(self):
+        """Bytes per second since the copy started"""
+        elapsed = self.elapsed
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+
+class CopyEngine:
+    """Copies files and trees using the cheapest mechanism the platform offers.
+
+    For each file the engine tries, in order: a reflink clone (when enabled),
+    os.copy_file_range, os.sendfile and finally a buffered read/write loop.
+    Trees are copied with a thread pool so many small files proceed in parallel.
+    The progress callback is always invoked from the calling thread.
+    """
+
+    def __init__(self, reflink='auto', workers=MAX_COPY_WORKERS, progress=None, progress_interval=0.5):
+        if reflink not in REFLINK_MODES:
+            raise ValueError(f"invalid reflink mode: {reflink}")
+        self.reflink = reflink
+        self.workers = max(1, workers)
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.stats = CopyStats()
+        self._last_report = 0.0
+
+    # ---------------- Progress ----------------
+    def _report(self, final=False):
+        if final:
+            self.stats.finish()
+        if self.progress is None:
+            return
+        now = time.monotonic()
+        if final or now - self._last_report >= self.progress_interval:
+            self._last_report = now
+            self.progress(self.stats)
+
+    # ---------------- Single files ----------------
+    def copy_file(self, src, dst, follow_symlinks=True):
+        """Copy file data and metadata from src to dst (like shutil.copy2). Returns dst."""
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        if not follow_symlinks and os.path.islink(src):
+            if os.path.lexists(dst):
+                os.remove(dst)
+            os.symlink(os.readlink(src), dst)
+            self.stats.add_file()
+            return dst
+        if os.path.exists(dst) and os.path.samefile(src, dst):
+            raise shutil.SameFileError(f"'{src}' and '{dst}' are the same file")
+
+        with open(src, 'rb') as fsrc:
+            size = os.fstat(fsrc.fileno()).st_size
+            try:
+                with open(dst, 'wb') as fdst:
+                    cloned = self._copy_data(fsrc, fdst, size)
+            except OSError:
+                # Don't leave a truncated destination behind
+                if os.path.isfile(dst):
+                    os.remove(dst)
+                raise
+        shutil.copystat(src, dst)
+        self.stats.add_file(cloned)
+        return dst
+
+    def _copy_data(self, fsrc, fdst, size):
+        """Copy the contents of fsrc into fdst. Returns True if the data was reflinked."""
+        if self.reflink != 'never':
+            if self._clone(fsrc, fdst):
+                self.stats.add_bytes(size)
+                return True
+            if self.reflink == 'always':
+                raise OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP))
+
+        if size >= ZERO_COPY_THRESHOLD:
+            for method in (self._copy_file_range, self._sendfile):
+                copied = method(fsrc, fdst, size)
+                if copied is not None:
+                    if copied < size:
+                        # File grew or shrank while copying; finish with plain I/O
+                        self._copy_buffered(fsrc, fdst, copied)
+                    return False
+
+        self._copy_buffered(fsrc, fdst, 0)
+        return False
+
+    def _clone(self, fsrc, fdst):
+        if fcntl is None:
+            return False
+        try:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            return True
+        except OSError:
+            return False
+
+    def _copy_file_range(self, fsrc, fdst, size):
+        """Copy with os.copy_file_range. Returns bytes copied, or None if unsupported."""
+        if not hasattr(os, 'copy_file_range'):
+            return None
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        offset = 0
+        try:
+            while offset < size:
+                n = os.copy_file_range(infd, outfd, min(ZERO_COPY_CHUNK, size - offset))
+                if n == 0:
+                    break
+                offset += n
+                self.stats.add_bytes(n)
+                self._report_from_main()
+        except OSError as e:
+            if offset == 0 and e.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                                           errno.EOPNOTSUPP, errno.EBADF):
+                return None
+            raise
+        return offset
+
+    def _sendfile(self, fsrc, fdst, size):
+        """Copy with os.sendfile. Returns bytes copied, or None if unsupported."""
+        if not hasattr(os, 'sendfile') or os.name == 'nt':
+            return None
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        offset = 0
+        try:
+            while offset < size:
+                n = os.sendfile(outfd, infd, offset, min(ZERO_COPY_CHUNK, size - offset))
+                if n == 0:
+                    break
+                offset += n
+                self.stats.add_bytes(n)
+                self._report_from_main()
+        except OSError as e:
+            if offset == 0 and e.errno in (errno.ENOSYS, errno.EINVAL, errno.ENOTSOCK,
+                                           errno.EOPNOTSUPP, errno.EBADF):
+                return None
+            raise
+        return offset
+
+    def _copy_buffered(self, fsrc, fdst, offset):
+        fsrc.seek(offset)
+        fdst.seek(offset)
+        while True:
+            chunk = fsrc.read(BUFFERED_CHUNK)
+            if not chunk:
+                break
+            fdst.write(chunk)
+            self.stats.add_bytes(len(chunk))
+            self._report_from_main()
+        fdst.truncate()
+
+    def _report_from_main(self):
+        if threading.current_thread() is threading.main_thread():
+            self._report()
+
+    # ---------------- Trees ----------------
+    def copy_tree(self, src, dst):
+        """Copy the directory tree src into dst, copying files concurrently.
+
+        Symbolic links are recreated rather than followed. Returns a list of
+        (path, exception) pairs for entries that could not be copied.
+        """
+        src = os.path.abspath(src)
+        dst = os.path.abspath(dst)
+        if dst == src or dst.startswith(src.rstrip(os.sep) + os.sep):
+            raise OSError(errno.EINVAL, f"cannot copy a directory, '{src}', into itself, '{dst}'")
+
+        jobs = []
+        dirs_copied = []
+        errors = []
+        for root, dirs, files in os.walk(src):
+            target_root = os.path.join(dst, os.path.relpath(root, src))
+            try:
+                os.makedirs(target_root, exist_ok=True)
+                dirs_copied.append((root, target_root))
+            except OSError as e:
+                errors.append((root, e))
+                dirs[:] = []
+                continue
+            for name in dirs:
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    jobs.append((path, os.path.join(target_root, name)))
+            for name in files:
+                path = os.path.join(root, name)
+                jobs.append((path, os.path.join(target_root, name)))
+                try:
+                    self.stats.total_bytes += os.lstat(path).st_size
+                except OSError:
+                    pass
+        self.stats.total_files = len(jobs)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {pool.submit(self.copy_file, s, d, False): s for s, d in jobs}
+            while pending:
+                done, _ = wait(pending, timeout=self.progress_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        future.result()
+                    except (OSError, shutil.Error) as e:
+                        errors.append((path, e))
+                self._report()
+
+        # Directory timestamps change as entries are created, so copy them last
+        for root, target_root in reversed(dirs_copied):
+            try:
+                shutil.copystat(root, target_root)
+            except OSError as e:
+                errors.append((root, e))
+
+        self._report(final=True)
+        return errors
+
+    def copy(self, src, dst):
+        """Copy a single file and emit a final progress report. Returns dst."""
+        try:
+            self.stats.total_files = 1
+            self.stats.total_bytes = os.path.getsize(src)
+        except OSError:
+            pass
+        dst = self.copy_file(src, dst)
+        self._report(final=True)
+        return dst
+
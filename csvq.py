@@ -0,0 +1,927 @@
+# CSV Query Implementation (SQL-like queries over columnar batches)
+import re
+import math
+import operator
+from array import array
+from itertools import compress, islice
+
+try:
+    import numpy
+except ImportError:  # aggregates fall back to array('d') buffers and plain loops
+    numpy = None
+
+
+# Rows read from the input and evaluated together
+BATCH_ROWS = 65536
+
+NAN = float('nan')
+
+KEYWORDS = {'SELECT', 'FROM', 'WHERE', 'GROUP', 'BY', 'HAVING', 'ORDER', 'ASC', 'DESC',
+            'LIMIT', 'AND', 'OR', 'NOT', 'AS', 'LIKE', 'IN', 'IS', 'NULL'}
+
+AGGREGATES = {'count', 'sum', 'avg', 'min', 'max'}
+
+TOKEN = re.compile(r"""
+    \s*(?:
+      (?P<num>\d+\.\d*(?:[eE][-+]?\d+)?|\.\d+(?:[eE][-+]?\d+)?|\d+(?:[eE][-+]?\d+)?)
+    | '(?P<str>(?:[^']|'')*)'
+    | "(?P<quoted>(?:[^"]|"")*)"
+    | `(?P<backquoted>[^`]*)`
+    | \$(?P<pos>\d+)
+    | (?P<name>[A-Za-z_]\w*)
+    | (?P<op><=|>=|<>|!=|==|\|\||[-+*/%=<>(),])
+    )""", re.X)
+
+PATH_TOKEN = re.compile(r"""\s*(?:'((?:[^']|'')*)'|"((?:[^"]|"")*)"|(\S+))""")
+
+
+class QueryError(Exception):
+    """Raised for syntax errors and unknown columns or functions"""
+
+
+def tokenize(text):
+    """Split a query into (kind, value, start, end) tuples.
+
+    The word after FROM is read as a file path, so names like data.csv need no quotes.
+    """
+    tokens = []
+    pos = 0
+    text = text.rstrip().rstrip(';')
+    while pos < len(text):
+        if tokens and tokens[-1][:2] == ('kw', 'FROM'):
+            m = PATH_TOKEN.match(text, pos)
+            value = m.group(1) or m.group(2) or m.group(3) or ''
+            tokens.append(('path', value.replace("''", "'"), m.start(), m.end()))
+            pos = m.end()
+            continue
+        m = TOKEN.match(text, pos)
+        if not m or m.end() == pos:
+            if text[pos:].strip() == '':
+                break
+            raise QueryError(f"syntax error at '{text[pos:].strip()[:20]}'")
+        kind = m.lastgroup
+        value = m.group(kind)
+        start = m.start(kind) - (1 if kind in ('str', 'quoted', 'backquoted', 'pos') else 0)
+        if kind == 'num':
+            value = float(value)
+        elif kind == 'str':
+            value = value.replace("''", "'")
+        elif kind in ('quoted', 'backquoted'):
+            kind, value = 'name', value.replace('""', '"')
+        elif kind == 'pos':
+            value = int(value)
+        elif kind == 'name' and value.upper() in KEYWORDS:
+            kind, value = 'kw', value.upper()
+        tokens.append((kind, value, start, m.end()))
+        pos = m.end()
+    tokens.append(('eof', None, len(text), len(text)))
+    return tokens
+
+
+class Parser:
+    """Recursive-descent parser producing tuple expression trees"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.i = 0
+
+    def peek(self):
+        return self.tokens[self.i]
+
+    def next(self):
+        token = self.tokens[self.i]
+        self.i += 1
+        return token
+
+    def at(self, kind, value=None):
+        token = self.tokens[self.i]
+        return token[0] == kind and (value is None or token[1] == value)
+
+    def accept(self, kind, value=None):
+        if self.at(kind, value):
+            return self.next()
+        return None
+
+    def expect(self, kind, value=None):
+        token = self.accept(kind, value)
+        if token is None:
+            found = self.peek()
+            near = 'end of query' if found[0] == 'eof' else f"'{self.text[found[2]:found[3]].strip()}'"
+            raise QueryError(f"expected {value or kind} near {near}")
+        return token
+
+    def parse(self):
+        query = Query()
+        self.expect('kw', 'SELECT')
+        while True:
+            if self.accept('op', '*'):
+                query.select.append((('star',), '*'))
+            else:
+                start = self.peek()[2]
+                node = self.expression()
+                end = self.tokens[self.i - 1][3]
+                name = self.text[start:end].strip()
+                if self.accept('kw', 'AS'):
+                    name = self.expect('name')[1]
+                elif self.at('name'):
+                    name = self.next()[1]
+                query.select.append((node, name))
+            if not self.accept('op', ','):
+                break
+        if self.accept('kw', 'FROM'):
+            query.source = self.expect('path')[1]
+        if self.accept('kw', 'WHERE'):
+            query.where = self.expression()
+        if self.accept('kw', 'GROUP'):
+            self.expect('kw', 'BY')
+            query.group_by = self.expression_list()
+        if self.accept('kw', 'HAVING'):
+            query.having = self.expression()
+        if self.accept('kw', 'ORDER'):
+            self.expect('kw', 'BY')
+            while True:
+                node = self.expression()
+                descending = bool(self.accept('kw', 'DESC'))
+                if not descending:
+                    self.accept('kw', 'ASC')
+                query.order_by.append((node, descending))
+                if not self.accept('op', ','):
+                    break
+        if self.accept('kw', 'LIMIT'):
+            token = self.expect('num')
+            query.limit = int(token[1])
+        self.expect('eof')
+        return query
+
+    def expression_list(self):
+        nodes = [self.expression()]
+        while self.accept('op', ','):
+            nodes.append(self.expression())
+        return nodes
+
+    def expression(self):
+        node = self.conjunction()
+        while self.accept('kw', 'OR'):
+            node = ('or', node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.accept('kw', 'AND'):
+            node = ('and', node, self.negation())
+        return node
+
+    def negation(self):
+        if self.accept('kw', 'NOT'):
+            return ('not', self.negation())
+        return self.comparison()
+
+    def comparison(self):
+        node = self.additive()
+        token = self.peek()
+        if token[0] == 'op' and token[1] in ('=', '==', '!=', '<>', '<', '<=', '>', '>='):
+            self.next()
+            op = {'==': '=', '<>': '!='}.get(token[1], token[1])
+            return ('cmp', op, node, self.additive())
+        if self.accept('kw', 'IS'):
+            negate = bool(self.accept('kw', 'NOT'))
+            self.expect('kw', 'NULL')
+            return ('isnull', node, negate)
+        negate = bool(self.accept('kw', 'NOT'))
+        if self.accept('kw', 'LIKE'):
+            pattern = self.expect('str')[1]
+            return ('like', node, pattern, negate)
+        if self.accept('kw', 'IN'):
+            self.expect('op', '(')
+            items = []
+            while True:
+                token = self.next()
+                if token[0] not in ('num', 'str'):
+                    raise QueryError("IN (...) takes a list of literals")
+                items.append(token[1])
+                if not self.accept('op', ','):
+                    break
+            self.expect('op', ')')
+            return ('in', node, tuple(items), negate)
+        if negate:
+            raise QueryError("expected LIKE or IN after NOT")
+        return node
+
+    def additive(self):
+        node = self.term()
+        while self.peek()[0] == 'op' and self.peek()[1] in ('+', '-', '||'):
+            op = self.next()[1]
+            if op == '||':
+                node = ('concat', node, self.term())
+            else:
+                node = ('arith', op, node, self.term())
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.peek()[0] == 'op' and self.peek()[1] in ('*', '/', '%'):
+            op = self.next()[1]
+            node = ('arith', op, node, self.unary())
+        return node
+
+    def unary(self):
+        if self.accept('op', '-'):
+            return ('neg', self.unary())
+        self.accept('op', '+')
+        return self.primary()
+
+    def primary(self):
+        token = self.next()
+        kind, value = token[0], token[1]
+        if kind == 'num':
+            return ('num', value)
+        if kind == 'str':
+            return ('str', value)
+        if kind == 'pos':
+            if value < 1:
+                raise QueryError("column positions start at $1")
+            return ('pos', value - 1)
+        if kind == 'kw' and value == 'NULL':
+            return ('null',)
+        if kind == 'op' and value == '(':
+            node = self.expression()
+            self.expect('op', ')')
+            return node
+        if kind == 'name':
+            if not self.accept('op', '('):
+                return ('col', value)
+            function = value.lower()
+            if function in AGGREGATES:
+                if function == 'count' and self.accept('op', '*'):
+                    argument = None
+                else:
+                    argument = self.expression()
+                self.expect('op', ')')
+                return ('agg', function, argument)
+            args = [] if self.at('op', ')') else self.expression_list()
+            self.expect('op', ')')
+            return ('call', function, tuple(args))
+        near = 'end of query' if kind == 'eof' else f"'{self.text[token[2]:token[3]].strip()}'"
+        raise QueryError(f"syntax error near {near}")
+
+
+# ---------------- Typed column vectors ----------------
+# Every compiled expression yields (kind, values) for a whole batch:
+#   'text'  raw CSV strings; '' is NULL
+#   'num'   array('d') of floats; NaN is NULL
+#   'bool'  list of bools
+
+def parse_numbers(values):
+    """array('d') of the numbers in a text column, NaN where a value is empty or not a number"""
+    try:
+        return array('d', map(float, values))
+    except ValueError:
+        pass
+    out = array('d', bytes(8 * len(values)))
+    for i, value in enumerate(values):
+        try:
+            out[i] = float(value)
+        except ValueError:
+            out[i] = NAN
+    return out
+
+
+def format_number(x):
+    if x != x:
+        return ''
+    if x.is_integer() and abs(x) < 1e16:
+        return str(int(x))
+    return f"{x:.15g}"
+
+
+def as_numbers(kind, values):
+    if kind == 'num':
+        return values
+    if kind == 'bool':
+        return array('d', map(float, values))
+    return parse_numbers(values)
+
+
+def as_text(kind, values):
+    if kind == 'text':
+        return values
+    if kind == 'num':
+        return [format_number(x) for x in values]
+    return ['true' if v else 'false' for v in values]
+
+
+def as_bools(kind, values):
+    if kind == 'bool':
+        return values
+    if kind == 'num':
+        return [x == x and x != 0 for x in values]
+    return [bool(v) for v in values]
+
+
+def _looks_numeric(text):
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def sort_key(value, descending=False):
+    """Sort key putting numbers (numerically) before text and NULLs last, in either direction"""
+    null = (-1, 0, '') if descending else (2, 0, '')
+    if isinstance(value, float):
+        return null if value != value else (0, value, '')
+    if value == '':
+        return null
+    try:
+        return (0, float(value), '')
+    except ValueError:
+        return (1, 0, value)
+
+
+COMPARE = {'=': operator.eq, '!=': operator.ne, '<': operator.lt,
+           '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+ARITHMETIC = {'+': operator.add, '-': operator.sub, '*': operator.mul}
+
+
+def _divide(x, y):
+    return x / y if y else NAN
+
+
+def _modulo(x, y):
+    return math.fmod(x, y) if y else NAN
+
+
+class Batch:
+    """A slice of the input as columns: key -> (kind, values)"""
+    __slots__ = ('size', 'columns')
+
+    def __init__(self, size, columns):
+        self.size = size
+        self.columns = columns
+
+    def filter(self, mask):
+        return Batch(sum(mask), {key: (kind, self._compress(kind, values, mask))
+                                 for key, (kind, values) in self.columns.items()})
+
+    @staticmethod
+    def _compress(kind, values, mask):
+        picked = compress(values, mask)
+        return array('d', picked) if kind == 'num' else list(picked)
+
+
+class Compiler:
+    """Turns expression trees into functions of a Batch.
+
+    resolve(node) may claim a node (a column, or in grouped queries a group
+    key or aggregate) and return the Batch key holding its values.
+    """
+
+    def __init__(self, resolve):
+        self.resolve = resolve
+
+    def compile(self, node):
+        key = self.resolve(node)
+        if key is not None:
+            return lambda batch: batch.columns[key]
+        method = getattr(self, '_' + node[0], None)
+        if method is None:
+            raise QueryError(f"'{node}' cannot be used here")
+        return method(node)
+
+    def _num(self, node):
+        value = node[1]
+        return lambda batch: ('num', array('d', [value]) * batch.size)
+
+    def _str(self, node):
+        value = node[1]
+        return lambda batch: ('text', [value] * batch.size)
+
+    def _null(self, node):
+        return lambda batch: ('text', [''] * batch.size)
+
+    def _col(self, node):
+        raise QueryError(f"unknown column '{node[1]}'")
+
+    def _pos(self, node):
+        raise QueryError(f"no column ${node[1] + 1}")
+
+    def _agg(self, node):
+        raise QueryError(f"aggregate {node[1]}() is not allowed here")
+
+    def _star(self, node):
+        raise QueryError("* is only allowed on its own in SELECT")
+
+    def _and(self, node):
+        left, right = self.compile(node[1]), self.compile(node[2])
+        return lambda batch: ('bool', list(map(operator.and_, as_bools(*left(batch)), as_bools(*right(batch)))))
+
+    def _or(self, node):
+        left, right = self.compile(node[1]), self.compile(node[2])
+        return lambda batch: ('bool', list(map(operator.or_, as_bools(*left(batch)), as_bools(*right(batch)))))
+
+    def _not(self, node):
+        inner = self.compile(node[1])
+        return lambda batch: ('bool', [not v for v in as_bools(*inner(batch))])
+
+    def _neg(self, node):
+        inner = self.compile(node[1])
+        return lambda batch: ('num', array('d', map(operator.neg, as_numbers(*inner(batch)))))
+
+    def _arith(self, node):
+        op, left, right = node[1], self.compile(node[2]), self.compile(node[3])
+        func = ARITHMETIC.get(op) or (_divide if op == '/' else _modulo)
+        return lambda batch: ('num', array('d', map(func, as_numbers(*left(batch)), as_numbers(*right(batch)))))
+
+    def _concat(self, node):
+        left, right = self.compile(node[1]), self.compile(node[2])
+        return lambda batch: ('text', list(map(operator.add, as_text(*left(batch)), as_text(*right(batch)))))
+
+    def _cmp(self, node):
+        op, left, right = COMPARE[node[1]], self.compile(node[2]), self.compile(node[3])
+        numeric = node[2][0] == 'num' or node[3][0] == 'num'
+        not_equal = node[1] == '!='
+
+        def compare(batch):
+            left_kind, left_values = left(batch)
+            right_kind, right_values = right(batch)
+            if numeric or 'num' in (left_kind, right_kind):
+                xs = as_numbers(left_kind, left_values)
+                ys = as_numbers(right_kind, right_values)
+                if not_equal:
+                    # NaN != x is true in Python, but NULL never compares
+                    return 'bool', [x == x and y == y and x != y for x, y in zip(xs, ys)]
+                return 'bool', list(map(op, xs, ys))
+            xs = as_text(left_kind, left_values)
+            ys = as_text(right_kind, right_values)
+            return 'bool', [_compare_text(op, x, y) for x, y in zip(xs, ys)]
+        return compare
+
+    def _isnull(self, node):
+        inner, negate = self.compile(node[1]), node[2]
+
+        def is_null(batch):
+            kind, values = inner(batch)
+            if kind == 'num':
+                return 'bool', [(x != x) != negate for x in values]
+            return 'bool', [(v == '') != negate for v in as_text(kind, values)]
+        return is_null
+
+    def _like(self, node):
+        inner, negate = self.compile(node[1]), node[3]
+        regex = re.compile(''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c)
+                                   for c in node[2]), re.S)
+        match = regex.fullmatch
+
+        def like(batch):
+            return 'bool', [(match(v) is not None) != negate for v in as_text(*inner(batch))]
+        return like
+
+    def _in(self, node):
+        inner, items, negate = self.compile(node[1]), node[2], node[3]
+        numbers = {item for item in items if isinstance(item, float)}
+        strings = {item for item in items if isinstance(item, str)}
+
+        def member(batch):
+            kind, values = inner(batch)
+            text = as_text(kind, values)
+            if numbers:
+                nums = as_numbers(kind, values)
+                return 'bool', [(n in numbers or t in strings) != negate for n, t in zip(nums, text)]
+            return 'bool', [(t in strings) != negate for t in text]
+        return member
+
+    def _call(self, node):
+        name, args = node[1], [self.compile(arg) for arg in node[2]]
+        spec = FUNCTIONS.get(name)
+        if spec is None:
+            raise QueryError(f"unknown function '{name}'")
+        kind, arity, func = spec
+        if len(args) not in arity:
+            raise QueryError(f"wrong number of arguments to {name}()")
+        if name == 'coalesce':
+            def coalesce(batch):
+                columns = [as_text(*arg(batch)) for arg in args]
+                return 'text', [next((v for v in row if v != ''), '') for row in zip(*columns)]
+            return coalesce
+        convert = as_numbers if kind == 'num' else as_text
+        if name == 'substr':
+            convert_args = (as_text, as_numbers, as_numbers)
+        elif name == 'length':
+            convert_args = (as_text,)
+        else:
+            convert_args = (convert,) * len(args)
+
+        def call(batch):
+            columns = [conv(*arg(batch)) for conv, arg in zip(convert_args, args)]
+            values = list(map(func, *columns))
+            return ('num', array('d', values)) if kind == 'num' else ('text', values)
+        return call
+
+
+def _compare_text(op, x, y):
+    """Compare CSV values: NULL never matches, numbers compare numerically"""
+    if x == '' or y == '':
+        return False
+    try:
+        return op(float(x), float(y))
+    except ValueError:
+        return op(x, y)
+
+
+def _round(x, digits=0.0):
+    return round(x, int(digits)) if x == x else NAN
+
+
+def _substr(text, start, length=None):
+    """1-based substring, as in SQL"""
+    begin = max(int(start) - 1, 0) if start == start else 0
+    if length is None:
+        return text[begin:]
+    return text[begin:begin + max(int(length), 0)] if length == length else ''
+
+
+def _length(text):
+    return float(len(text)) if text != '' else NAN
+
+
+# name -> (result kind, allowed argument counts, function applied per row)
+FUNCTIONS = {
+    'lower': ('text', (1,), str.lower),
+    'upper': ('text', (1,), str.upper),
+    'trim': ('text', (1,), str.strip),
+    'length': ('num', (1,), _length),
+    'abs': ('num', (1,), abs),
+    'round': ('num', (1, 2), _round),
+    'substr': ('text', (2, 3), _substr),
+    'coalesce': ('text', range(1, 64), None),
+}
+
+
+# ---------------- Aggregation ----------------
+
+class Accumulator:
+    """Running per-group state behind one or more aggregates, in array('d') buffers indexed by group id.
+
+    kind is 'rows' (count(*)), 'present' (count of non-NULL values),
+    'sums' (sum and count of numeric values, shared by sum and avg), 'min'
+    or 'max'. With NumPy available, counts and sums are updated with
+    bincount on the same buffers viewed as ndarrays.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.sums = array('d')
+        self.counts = array('d')
+        self.extremes = []
+        self.textual = False
+
+    def grow(self, groups):
+        missing = groups - len(self.counts)
+        if missing > 0:
+            self.sums.extend(array('d', bytes(8 * missing)))
+            self.counts.extend(array('d', bytes(8 * missing)))
+            self.extremes.extend([None] * missing)
+
+    def add(self, gids, groups, column, numbers, size):
+        """Fold one batch in.
+
+        gids[i] is the group of row i, or gids is None when there is a single
+        group. column is the argument's (kind, values) and numbers its
+        values as floats, both None for count(*).
+        """
+        self.grow(groups)
+        kind = self.kind
+        if kind == 'rows':
+            self._count(gids, None, size)
+        elif kind == 'present':
+            values = column[1]
+            if column[0] == 'text':
+                self._count(gids, [v != '' for v in values], size)
+            else:
+                self._count(gids, [x == x for x in numbers], size)
+        elif kind == 'sums':
+            self._sum(gids, numbers)
+        else:
+            self._extreme(gids, column, numbers, size)
+
+    def _count(self, gids, present, size):
+        counts = self.counts
+        if gids is None:
+            counts[0] += size if present is None else sum(present)
+        elif numpy is not None:
+            if present is not None:
+                gids = gids[numpy.array(present, dtype=bool)]
+            numpy.frombuffer(counts, dtype=numpy.float64)[:] += numpy.bincount(gids, minlength=len(counts))
+        elif present is None:
+            for g in gids:
+                counts[g] += 1
+        else:
+            for g in compress(gids, present):
+                counts[g] += 1
+
+    def _sum(self, gids, numbers):
+        sums, counts = self.sums, self.counts
+        if gids is None:
+            present = [x for x in numbers if x == x]
+            counts[0] += len(present)
+            sums[0] += math.fsum(present)
+        elif numpy is not None:
+            vector = numpy.frombuffer(numbers, dtype=numpy.float64)
+            valid = ~numpy.isnan(vector)
+            gids = gids[valid]
+            numpy.frombuffer(counts, dtype=numpy.float64)[:] += numpy.bincount(gids, minlength=len(counts))
+            numpy.frombuffer(sums, dtype=numpy.float64)[:] += numpy.bincount(
+                gids, weights=vector[valid], minlength=len(sums))
+        else:
+            for g, x in zip(gids, numbers):
+                if x == x:
+                    sums[g] += x
+                    counts[g] += 1
+
+    def _extreme(self, gids, column, numbers, size):
+        """min/max compare numerically until a value turns out not to be a number"""
+        kind, values = column
+        if not self.textual and kind == 'text':
+            if sum(1 for x in numbers if x != x) != values.count(''):
+                # Switch to text comparison for good, converting what was seen so far
+                self.textual = True
+                self.extremes = [None if v is None else format_number(v) for v in self.extremes]
+        items = as_text(kind, values) if self.textual else numbers
+        better = operator.lt if self.kind == 'min' else operator.gt
+        extremes = self.extremes
+        for g, v in zip(gids if gids is not None else [0] * size, items):
+            if v == '' or v != v:
+                continue
+            current = extremes[g]
+            if current is None or better(v, current):
+                extremes[g] = v
+
+    def result(self, function, groups):
+        """(kind, values) of function (count, sum, avg, min or max) for every group"""
+        self.grow(groups)
+        counts = self.counts[:groups]
+        if function == 'count':
+            return 'num', array('d', counts)
+        if function == 'sum':
+            return 'num', array('d', (s if c else NAN for s, c in zip(self.sums, counts)))
+        if function == 'avg':
+            return 'num', array('d', (s / c if c else NAN for s, c in zip(self.sums, counts)))
+        if self.textual:
+            return 'text', [v or '' for v in self.extremes[:groups]]
+        return 'num', array('d', (NAN if v is None else v for v in self.extremes[:groups]))
+
+
+def _state_kind(aggregate):
+    """Which Accumulator kind an aggregate node reads from"""
+    function, argument = aggregate[1], aggregate[2]
+    if argument is None:
+        return 'rows'
+    if function == 'count':
+        return 'present'
+    return 'sums' if function in ('sum', 'avg') else function
+
+
+def _walk(node):
+    """Yield node and all its sub-expressions"""
+    yield node
+    for child in node[1:]:
+        if isinstance(child, tuple) and child and isinstance(child[0], str):
+            yield from _walk(child)
+        elif isinstance(child, tuple):
+            for item in child:
+                if isinstance(item, tuple):
+                    yield from _walk(item)
+
+
+def _replace(node, substitute):
+    """Return node with each sub-expression that substitute() maps to a node swapped for it"""
+    new = substitute(node)
+    if new is not None:
+        return new
+    parts = [node[0]]
+    for child in node[1:]:
+        if isinstance(child, tuple) and child and isinstance(child[0], str):
+            child = _replace(child, substitute)
+        elif isinstance(child, tuple):
+            child = tuple(_replace(item, substitute) if isinstance(item, tuple) else item for item in child)
+        parts.append(child)
+    return tuple(parts)
+
+
+def _aggregates_in(node):
+    return [n for n in _walk(node) if n[0] == 'agg']
+
+
+# ---------------- Queries ----------------
+
+class Query:
+    """A parsed query; run() binds column names to a header and evaluates it"""
+
+    def __init__(self):
+        self.select = []
+        self.source = None
+        self.where = None
+        self.group_by = []
+        self.having = None
+        self.order_by = []
+        self.limit = None
+
+    @property
+    def grouped(self):
+        if self.group_by or self.having is not None:
+            return True
+        return any(_aggregates_in(node) for node, _ in self.select if node[0] != 'star')
+
+    def run(self, rows, header=None):
+        """Evaluate over an iterator of rows (lists of strings).
+
+        header names the columns; when None the first row is used. Returns
+        (column names, result rows as lists of strings).
+        """
+        rows = iter(rows)
+        if header is None:
+            header = next(rows, [])
+        index = {}
+        for i, name in enumerate(header):
+            index.setdefault(name, i)
+            index.setdefault(name.lower(), i)
+
+        def column(node):
+            if node[0] == 'col':
+                i = index.get(node[1], index.get(node[1].lower()))
+                if i is None:
+                    raise QueryError(f"unknown column '{node[1]}'")
+                return i
+            if node[0] == 'pos':
+                return node[1]
+            return None
+
+        select = []
+        for node, name in self.select:
+            if node[0] == 'star':
+                select.extend((('pos', i), col) for i, col in enumerate(header))
+            else:
+                select.append((node, name))
+        names = [name for _, name in select]
+
+        # ORDER BY may name an output column, give its position, or be any expression
+        order = []
+        for node, descending in self.order_by:
+            if node[0] == 'num' and node[1].is_integer() and 1 <= node[1] <= len(select):
+                order.append((select[int(node[1]) - 1][0], descending))
+            elif node[0] == 'col' and node[1] in names:
+                order.append((select[names.index(node[1])][0], descending))
+            else:
+                order.append((node, descending))
+
+        # HAVING may also name an output column, as long as no input column has that name
+        having = self.having
+        if having is not None:
+            def output(node):
+                if node[0] == 'col' and node[1] in names and index.get(node[1], index.get(node[1].lower())) is None:
+                    return select[names.index(node[1])][0]
+                return None
+            having = _replace(having, output)
+
+        needed = sorted({column(n) for node, _ in select for n in _walk(node) if column(n) is not None} |
+                        {column(n) for node, _ in order for n in _walk(node) if column(n) is not None} |
+                        {column(n) for node in [self.where] + self.group_by + [having]
+                         if node is not None for n in _walk(node) if column(n) is not None})
+        row_compiler = Compiler(column)
+        where = row_compiler.compile(self.where) if self.where is not None else None
+        batches = self._batches(rows, needed, where)
+
+        if self.grouped:
+            batch = self._aggregate(batches, select, order, having, row_compiler)
+            outputs = [node for node, _ in select] + [node for node, _ in order]
+
+            def grouped(node):
+                if node in batch.columns:
+                    return node
+                if column(node) is not None:
+                    name = node[1] if node[0] == 'col' else f"${node[1] + 1}"
+                    raise QueryError(f"column '{name}' must appear in GROUP BY or an aggregate")
+                return None
+            compiler = Compiler(grouped)
+            if having is not None:
+                keep = as_bools(*compiler.compile(having)(batch))
+                batch = batch.filter(keep)
+            return names, self._finish([batch], outputs, len(select), compiler, order)
+
+        outputs = [node for node, _ in select] + [node for node, _ in order]
+        return names, self._finish(batches, outputs, len(select), row_compiler, order)
+
+    @staticmethod
+    def _batches(rows, needed, where):
+        """Read rows BATCH_ROWS at a time into columns, keeping only rows matching where"""
+        while True:
+            chunk = list(islice(rows, BATCH_ROWS))
+            if not chunk:
+                return
+            columns = {}
+            for i in needed:
+                try:
+                    values = [row[i] for row in chunk]
+                except IndexError:
+                    values = [row[i] if i < len(row) else '' for row in chunk]
+                columns[i] = ('text', values)
+            batch = Batch(len(chunk), columns)
+            if where is not None:
+                mask = as_bools(*where(batch))
+                batch = batch.filter(mask)
+            yield batch
+
+    def _aggregate(self, batches, select, order, having, row_compiler):
+        """Fold every batch into per-group accumulators; returns one Batch with a row per group"""
+        keys = [row_compiler.compile(node) for node in self.group_by]
+        nodes = []
+        for node in [n for n, _ in select] + [n for n, _ in order] + ([having] if having else []):
+            for agg in _aggregates_in(node):
+                if agg not in nodes:
+                    nodes.append(agg)
+        # sum(x) and avg(x) share one accumulator, and each argument is evaluated once per batch
+        accumulators = {}
+        for agg in nodes:
+            accumulators.setdefault((_state_kind(agg), agg[2]), None)
+        for state in accumulators:
+            accumulators[state] = Accumulator(state[0])
+        arguments = {argument: row_compiler.compile(argument)
+                     for _, argument in accumulators if argument is not None}
+
+        group_ids = {} if keys else {(): 0}
+        key_kinds = ['text'] * len(keys)
+        for batch in batches:
+            gids = None
+            if keys:
+                key_columns = []
+                for k, key in enumerate(keys):
+                    kind, values = key(batch)
+                    key_kinds[k] = kind
+                    key_columns.append(values.tolist() if kind == 'num' else values)
+                setdefault = group_ids.setdefault
+                gids = [setdefault(k, len(group_ids)) for k in (key_columns[0] if len(keys) == 1 else zip(*key_columns))]
+                if numpy is not None:
+                    gids = numpy.array(gids, dtype=numpy.intp)
+            columns = {}
+            for argument, func in arguments.items():
+                kind, values = func(batch)
+                columns[argument] = (kind, values), as_numbers(kind, values)
+            for (_, argument), accumulator in accumulators.items():
+                column, numbers = columns.get(argument, (None, None))
+                accumulator.add(gids, len(group_ids), column, numbers, batch.size)
+
+        groups = len(group_ids)
+        columns = {}
+        group_keys = list(group_ids)
+        for k, node in enumerate(self.group_by):
+            values = group_keys if len(keys) == 1 else [key[k] for key in group_keys]
+            kind = key_kinds[k]
+            columns[node] = (kind, array('d', values) if kind == 'num' else list(values))
+        for agg in nodes:
+            columns[agg] = accumulators[(_state_kind(agg), agg[2])].result(agg[1], groups)
+        return Batch(groups, columns)
+
+    def _finish(self, batches, outputs, visible, compiler, order):
+        """Project, sort and limit; rows come back as lists of strings"""
+        functions = [compiler.compile(node) for node in outputs]
+        limit = self.limit
+        rows = []
+        for batch in batches:
+            columns = [func(batch) for func in functions]
+            text = [as_text(kind, values) for kind, values in columns[:visible]]
+            sort_columns = [values.tolist() if kind == 'num' else values for kind, values in columns[visible:]]
+            rows.extend(zip(*(text + sort_columns)) if columns else [()] * batch.size)
+            if not order and limit is not None and len(rows) >= limit:
+                break
+        for position in range(len(order) - 1, -1, -1):
+            descending = order[position][1]
+            column = visible + position
+            rows.sort(key=lambda row: sort_key(row[column], descending), reverse=descending)
+        if limit is not None:
+            rows = rows[:limit]
+        return [list(row[:visible]) for row in rows]
+
+
+def compile_query(text):
+    """Parse query text into a Query"""
+    return Parser(text).parse()
+
+
+def format_table(names, rows):
+    """Align result columns for the terminal, right-justifying numeric columns"""
+    widths = [len(name) for name in names]
+    numeric = [True] * len(names)
+    for row in rows:
+        for i, value in enumerate(row):
+            widths[i] = max(widths[i], len(value))
+            if numeric[i] and value != '' and not _looks_numeric(value):
+                numeric[i] = False
+    lines = ["  ".join(name.ljust(w) for name, w in zip(names, widths)).rstrip(),
+             "  ".join('-' * w for w in widths)]
+    for row in rows:
+        lines.append("  ".join(value.rjust(w) if num else value.ljust(w)
+                               for value, w, num in zip(row, widths, numeric)).rstrip())
+    return "\n".join(lines)
@@ -0,0 +1,217 @@
+# File Type Detection Implementation (magic numbers)
+import os
+import json
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Bytes read from the start of each file; enough for tar headers and text sniffing
+HEADER_SIZE = 8192
+MAX_MAGIC_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Bytes that may appear in text files; anything else marks a file as data
+TEXT_BYTES = bytes(range(0x20, 0x100)) + b"\t\n\r\f\b\x1b"
+
+
+def _elf(header):
+    bits = {1: '32-bit', 2: '64-bit'}.get(header[4:5][0] if len(header) > 4 else 0, '')
+    order = {1: 'LSB', 2: 'MSB'}.get(header[5:6][0] if len(header) > 5 else 0, '')
+    kind = ''
+    if len(header) >= 18 and order:
+        e_type = struct.unpack('<H' if order == 'LSB' else '>H', header[16:18])[0]
+        kind = {1: 'relocatable', 2: 'executable', 3: 'shared object', 4: 'core file'}.get(e_type, '')
+    return " ".join(part for part in ('ELF', bits, order, kind) if part)
+
+
+def _png(header):
+    if len(header) >= 24 and header[12:16] == b'IHDR':
+        width, height = struct.unpack('>II', header[16:24])
+        return f"PNG image data, {width} x {height}"
+    return "PNG image data"
+
+
+def _gif(header):
+    return f"GIF image data, version {header[3:6].decode('ascii')}"
+
+
+def _pdf(header):
+    version = header[5:8].decode('ascii', 'replace')
+    return f"PDF document, version {version}"
+
+
+def _riff(header):
+    kind = {b'WAVE': 'WAVE audio', b'AVI ': 'AVI video', b'WEBP': 'Web/P image'}.get(header[8:12])
+    return f"RIFF (little-endian) data, {kind}" if kind else "RIFF (little-endian) data"
+
+
+# Interpreter named on a #! line -> how scripts for it are described
+INTERPRETERS = {
+    'sh': 'POSIX shell', 'bash': 'Bourne-Again shell', 'zsh': 'Paul Falstad\'s zsh',
+    'python': 'Python', 'perl': 'Perl', 'ruby': 'Ruby', 'node': 'Node.js', 'awk': 'awk',
+}
+
+
+def _script(header):
+    line = header[2:header.find(b'\n') if b'\n' in header else 128].strip()
+    words = line.decode('utf-8', 'replace').split()
+    if not words:
+        return None
+    interpreter = os.path.basename(words[0])
+    if interpreter == 'env' and len(words) > 1:
+        interpreter = os.path.basename(words[1])
+    interpreter = interpreter.rstrip('0123456789.') or interpreter
+    kind = INTERPRETERS.get(interpreter, interpreter)
+    encoding = _text_encoding(header)
+    if encoding is None:
+        return None
+    return f"{kind} script, {encoding} text executable"
+
+
+# (magic bytes at offset 0, description or function(header) -> description).
+# A function may return None to fall through to shorter matches and text sniffing.
+SIGNATURES = (
+    (b'\x7fELF', _elf),
+    (b'\x89PNG\r\n\x1a\n', _png),
+    (b'GIF87a', _gif),
+    (b'GIF89a', _gif),
+    (b'\xff\xd8\xff', "JPEG image data"),
+    (b'%PDF-', _pdf),
+    (b'\x1f\x8b', "gzip compressed data"),
+    (b'BZh', "bzip2 compressed data"),
+    (b'\xfd7zXZ\x00', "XZ compressed data"),
+    (b'\x28\xb5\x2f\xfd', "Zstandard compressed data"),
+    (b'PK\x03\x04', "Zip archive data"),
+    (b'PK\x05\x06', "Zip archive data (empty)"),
+    (b'7z\xbc\xaf\x27\x1c', "7-zip archive data"),
+    (b'SQLite format 3\x00', "SQLite 3.x database"),
+    (b'\xca\xfe\xba\xbe', "compiled Java class data"),
+    (b'MZ', "MS-DOS executable"),
+    (b'\x00asm', "WebAssembly (wasm) binary module"),
+    (b'RIFF', _riff),
+    (b'OggS', "Ogg data"),
+    (b'fLaC', "FLAC audio bitstream data"),
+    (b'ID3', "Audio file with ID3 version 2"),
+    (b'#!', _script),
+    (b'\xef\xbb\xbf', "UTF-8 Unicode (with BOM) text"),
+    (b'\xff\xfe\x00\x00', "Unicode text, UTF-32, little-endian"),
+    (b'\xff\xfe', "Unicode text, UTF-16, little-endian"),
+    (b'\xfe\xff', "Unicode text, UTF-16, big-endian"),
+)
+
+# Signatures found at a fixed offset rather than at the start of the file
+OFFSET_SIGNATURES = (
+    (257, b'ustar  \x00', "GNU tar archive"),
+    (257, b'ustar\x00', "POSIX tar archive"),
+    (257, b'ustar', "tar archive"),
+)
+
+
+def _build_trie(signatures):
+    """Nested dicts keyed by byte value; the None key holds a signature's description"""
+    root = {}
+    for magic, description in signatures:
+        node = root
+        for byte in magic:
+            node = node.setdefault(byte, {})
+        node[None] = description
+    return root
+
+
+MAGIC_TRIE = _build_trie(SIGNATURES)
+
+
+def _trie_matches(header):
+    """Descriptions of every signature that prefixes header, longest first"""
+    matches = []
+    node = MAGIC_TRIE
+    for byte in header:
+        node = node.get(byte)
+        if node is None:
+            break
+        if None in node:
+            matches.append(node[None])
+    return reversed(matches)
+
+
+def _text_encoding(header):
+    """'ASCII' or 'UTF-8 Unicode' if header looks like text, else None"""
+    if header.translate(None, TEXT_BYTES):
+        # Control characters other than the usual whitespace
+        return None
+    if header.isascii():
+        return 'ASCII'
+    try:
+        header.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off at the end of the header is still text
+        if e.start < len(header) - 3 or e.reason != 'unexpected end of data':
+            return None
+    return 'UTF-8 Unicode'
+
+
+def _looks_like_json(header, complete):
+    text = header.lstrip()
+    if text[:1] not in (b'{', b'['):
+        return False
+    if complete:
+        try:
+            json.loads(header.decode('utf-8'))
+            return True
+        except ValueError:
+            return False
+    # Only the start of a large file was read: accept an object or array opening
+    return text[:1] == b'[' or text[1:].lstrip()[:1] in (b'"', b'}')
+
+
+def describe(header, complete=True):
+    """Describe file contents from their first bytes.
+
+    complete says whether header holds the whole file, which lets formats
+    such as JSON be validated rather than guessed.
+    """
+    if not header:
+        return "empty"
+    for description in _trie_matches(header):
+        if callable(description):
+            description = description(header)
+        if description:
+            return description
+    for offset, magic, description in OFFSET_SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            return description
+
+    encoding = _text_encoding(header)
+    if encoding is None:
+        return "data"
+    lowered = header.lstrip()[:64].lower()
+    if lowered.startswith(b'<?xml'):
+        kind = f"XML 1.0 document, {encoding} text"
+    elif lowered.startswith((b'<!doctype html', b'<html')):
+        kind = f"HTML document, {encoding} text"
+    elif _looks_like_json(header, complete):
+        kind = "JSON text data"
+    else:
+        kind = f"{encoding} text"
+    if b'\r\n' in header:
+        kind += ", with CRLF line terminators"
+    return kind
+
+
+def describe_many(paths, read_header, workers=MAX_MAGIC_WORKERS):
+    """Classify many files on a thread pool.
+
+    read_header(path) returns (header, complete, error), opening and reading
+    each file once; an error is passed through as the description. Returns
+    (path, description, error) tuples in the order of paths.
+    """
+    def work(path):
+        header, complete, error = read_header(path)
+        if error:
+            return path, None, error
+        return path, describe(header, complete), ""
+
+    paths = list(paths)
+    if len(paths) <= 1:
+        return [work(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        return list(pool.map(work, paths))
@@ -1,307 +1,248 @@
 # Local File System Implementation
 import os
+import json
+import stat
+import time
+import errno
+import shutil
 import datetime
+import tempfile
+import posixpath
+from copy_engine import CopyEngine
+from sync_engine import SyncEngine
+import journal
+from journal import Journal, JournalError, read_snapshot, write_snapshot
+from vfs import VirtualFileSystem, MemoryFileSystem, ArchiveFileSystem, Inode, vfs_error
+from fsimage import ImageFileSystem, is_image
+from path_resolver import PathResolver
+from watcher import FileWatcher, inotify_available
 
 
-class LocalFileSystem:
+# Sample tree loaded by MockFileSystem
+MOCK_FILESYSTEM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mock_filesystem.json')
+# MockFileSystem's state files, and how large its journal may grow before compaction
+SNAPSHOT_FILE = 'snapshot.bin'
+JOURNAL_FILE = 'journal.log'
+COMPACT_MIN_BYTES = 1024 * 1024
+
+
+class AtomicFile:
+    """Text file written under a temporary name and renamed over its target on commit.
+
+    Readers never see a half-written file, and an aborted write leaves the
+    original untouched. Use as a context manager: leaving the block normally
+    commits, an exception aborts.
+    """
+
+    def __init__(self, real_path):
+        self.real_path = real_path
+        directory, name = os.path.split(real_path)
+        fd, self.temp_path = tempfile.mkstemp(prefix=f".{name}.", suffix='.tmp', dir=directory)
+        self.file = os.fdopen(fd, 'w', encoding='utf-8', newline='')
+        self.write = self.file.write
+
+    def commit(self):
+        self.file.close()
+        try:
+            mode = stat.S_IMODE(os.stat(self.real_path).st_mode)
+        except OSError:
+            mode = 0o666 & ~_current_umask()
+        os.chmod(self.temp_path, mode)
+        os.replace(self.temp_path, self.real_path)
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
+def _current_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+class LocalFileSystem(VirtualFileSystem):
     """Local file system implementation using real filesystem operations"""
     
-    def __init__(self, base_path):
+    def __init__(self, base_path, watch=False):
         """
         Initialize local filesystem with a base path.
         All operations are restricted to this base path.
+        With watch, changes made outside the terminal are tracked from the start (see watch()).
         """
+        super().__init__()
         self.base_path = os.path.abspath(base_path)
-        self.current_path = "/"
         
         # Ensure base path exists
         if not os.path.exists(self.base_path):
             raise ValueError(f"Base path does not exist: {self.base_path}")
         if not os.path.isdir(self.base_path):
             raise ValueError(f"Base path is not a directory: {self.base_path}")
+        self.resolver = PathResolver(self.base_path)
+        self.watcher = None
+        if watch:
+            self.watch()
     
-    def _get_real_path(self, virtual_path):
-        """Convert virtual path to real filesystem path, ensuring it stays within base_path"""
-        if virtual_path.startswith('/'):
-            # Absolute virtual path
-            path = virtual_path[1:]
-        else:
-            # Relative path - combine with current_path
-            current = self.current_path.strip('/')
-            if current:
-                path = os.path.join(current, virtual_path)
-            else:
-                path = virtual_path
-        
-        # Join with base path
-        real_path = os.path.join(self.base_path, path)
-        real_path = os.path.abspath(real_path)
-        
-        # Security check: ensure path is within base_path
-        base_abs = os.path.abspath(self.base_path)
-        if not real_path.startswith(base_abs):
-            return None
-        
-        return real_path
-    
-    def normalize_path(self, path):
-        """Normalize a path (resolve .. and . components)"""
-        if not path.startswith('/'):
-            # Relative path
-            path = self.current_path + '/' + path
-        
-        # Split path and resolve . and ..
-        parts = [p for p in path.split('/') if p]
-        normalized = []
-        
-        for part in parts:
-            if part == '.':
-                continue
-            elif part == '..':
-                if normalized:
-                    normalized.pop()
-            else:
-                normalized.append(part)
+    def _get_real_path(self, virtual_path, follow=True, write=False):
+        """Convert virtual path to real filesystem path, or None if it (or a link on it) leaves base_path.
         
-        result = '/' + '/'.join(normalized) if normalized else '/'
-        return result
-    
-    def list_directory(self, path=None):
-        """List directory contents"""
-        if path is None:
-            path = self.current_path
-        
-        real_path = self._get_real_path(path)
-        if not real_path or not os.path.exists(real_path):
-            return None
-        
-        if not os.path.isdir(real_path):
-            return None
+        Earlier resolutions are reused only for reads, and only while kernel
+        notifications would have invalidated them after a change from outside.
+        """
+        watcher = self.watcher
+        cached = (not write and watcher is not None and not watcher.polling
+                  and watcher.ready.is_set() and watcher.error is None)
+        return self.resolver.resolve(self.current_path, virtual_path, follow, cached)
         
+    def _is_inside_base(self, real_path):
+        """Return True if the real path real_path lies within base_path"""
         try:
-            return sorted(os.listdir(real_path))
-        except PermissionError:
-            return None
+            return os.path.commonpath([self.base_path, os.path.abspath(real_path)]) == self.base_path
+        except ValueError:
+            # Paths on different drives (Windows)
+            return False
+        
+    def real_path(self, path):
+        """Host path backing a virtual path"""
+        return self._get_real_path(self.normalize_path(path))
+
+    def contains(self, path):
+        """True if path, with every symbolic link on disk resolved, stays inside base_path"""
+        return self._get_real_path(self.normalize_path(path)) is not None
+
+    def watch(self):
+        """Start (once) and return the FileWatcher for everything under base_path"""
+        if self.watcher is None:
+            self.watcher = FileWatcher(self.base_path)
+            self.watcher.subscribe(self._changed_outside)
+        return self.watcher
+
+    def _changed_outside(self, events):
+        # Only new, removed or moved entries can turn a path into (or out of) a link
+        if any(event.kind not in ('MODIFY', 'ATTRIB') for event in events):
+            self.resolver.invalidate()
+
+    def _real(self, path, follow=True, write=False):
+        real_path = self._get_real_path(path, follow, write)
+        if not real_path:
+            raise vfs_error(errno.EACCES, path)
+        return real_path
     
-    def change_directory(self, path):
-        """Change current directory"""
-        if path == '~':
-            path = '/'
-        
-        target_path = self.normalize_path(path)
-        real_path = self._get_real_path(target_path)
+    # ---------------- Storage primitives ----------------
+    def _lstat(self, path):
+        return os.lstat(self._real(path, follow=False))
         
-        if not real_path or not os.path.exists(real_path):
-            return False, f"cd: {path}: No such file or directory"
+    def _stat(self, path):
+        return os.stat(self._real(path))
         
-        if not os.path.isdir(real_path):
-            return False, f"cd: {path}: Not a directory"
+    def _listdir(self, path):
+        return os.listdir(self._real(path))
         
-        self.current_path = target_path
-        return True, ""
+    def _open(self, path, mode, buffering=-1):
+        return open(self._real(path, write=any(c in mode for c in 'wax+')), mode, buffering=buffering)
     
-    def read_file(self, path):
-        """Read file contents"""
-        real_path = self._get_real_path(path)
-        if not real_path or not os.path.exists(real_path):
-            return None, f"cat: {path}: No such file or directory"
+    def _mkdir(self, path):
+        os.mkdir(self._real(path, follow=False, write=True))
         
-        if os.path.isdir(real_path):
-            return None, f"cat: {path}: Is a directory"
+    def _rmdir(self, path):
+        os.rmdir(self._real(path, follow=False, write=True))
+        self.resolver.invalidate()
         
-        try:
-            with open(real_path, 'r', encoding='utf-8', errors='ignore') as f:
-                return f.read(), ""
-        except PermissionError:
-            return None, f"cat: {path}: Permission denied"
-        except Exception as e:
-            return None, f"cat: {path}: {e}"
-    
-    def create_file(self, path, content=""):
-        """Create a new file"""
-        real_path = self._get_real_path(path)
-        if not real_path:
-            return False, f"touch: cannot touch '{path}': Access denied"
+    def _remove(self, path):
+        os.remove(self._real(path, follow=False, write=True))
+        self.resolver.invalidate()
         
-        try:
-            # Create parent directories if needed
-            os.makedirs(os.path.dirname(real_path), exist_ok=True)
-            # Touch the file
-            with open(real_path, 'a'):
-                os.utime(real_path, None)
-            return True, ""
-        except Exception as e:
-            return False, f"touch: {path}: {e}"
-    
-    def remove_file(self, path):
-        """Remove a file"""
-        real_path = self._get_real_path(path)
+    def _rename(self, src, dst):
+        os.replace(self._real(src, follow=False, write=True), self._real(dst, follow=False, write=True))
+        self.resolver.invalidate()
+
+    def _chmod(self, path, mode):
+        os.chmod(self._real(path, write=True), mode)
+
+    def _chown(self, path, uid, gid):
+        if hasattr(os, 'chown'):
+            os.chown(self._real(path, write=True), uid, gid)
+
+    def _utime(self, path, mtime=None):
+        os.utime(self._real(path, write=True), None if mtime is None else (mtime, mtime))
+
+    def _symlink(self, target, path):
+        real_link = self._real(path, follow=False, write=True)
+        if target.startswith('/'):
+            # Store absolute virtual targets relative to the link so they stay inside base_path
+            target = os.path.relpath(self._real(self.normalize_path(target)), os.path.dirname(real_link))
+        os.symlink(target, real_link)
+        self.resolver.invalidate()
+
+    def _link(self, src, dst):
+        os.link(self._real(src, write=True), self._real(dst, follow=False, write=True))
+
+    def _readlink(self, path):
+        target = os.readlink(self._real(path, follow=False))
+        if os.path.isabs(target) and self._is_inside_base(target):
+            return self._to_virtual_path(target)
+        return target.replace(os.sep, '/')
+
+    def _disk_usage(self):
+        if os.name == 'nt':  # Windows
+            import ctypes
+            free_bytes = ctypes.c_ulonglong(0)
+            total_bytes = ctypes.c_ulonglong(0)
+            ctypes.windll.kernel32.GetDiskFreeSpaceExW(
+                ctypes.c_wchar_p(self.base_path),
+                None,
+                ctypes.pointer(total_bytes),
+                ctypes.pointer(free_bytes)
+            )
+            return total_bytes.value, free_bytes.value
+        st = os.statvfs(self.base_path)
+        return st.f_blocks * st.f_frsize, st.f_bavail * st.f_frsize
+
+    def open_atomic(self, path):
+        """Open path for an atomic rewrite. Returns (AtomicFile, error)."""
+        real_path = self._get_real_path(self.normalize_path(path), write=True)
         if not real_path:
-            return False, f"rm: cannot remove '{path}': Access denied"
-        
-        if not os.path.exists(real_path):
-            return False, f"rm: cannot remove '{path}': No such file or directory"
-        
+            return None, f"{path}: Access denied"
         if os.path.isdir(real_path):
-            return False, f"rm: cannot remove '{path}': Is a directory"
-        
-        try:
-            os.remove(real_path)
-            return True, ""
-        except Exception as e:
-            return False, f"rm: {path}: {e}"
-    
-    def get_detailed_listing(self, path=None):
-        """Get detailed directory listing (for ls -l)"""
-        if path is None:
-            path = self.current_path
-        
-        real_path = self._get_real_path(path)
-        if not real_path or not os.path.exists(real_path):
-            return None
-        
-        if not os.path.isdir(real_path):
-            return None
-        
-        items = []
+            return None, f"{path}: Is a directory"
         try:
-            for name in sorted(os.listdir(real_path)):
-                entry_path = os.path.join(real_path, name)
-                try:
-                    stat = os.stat(entry_path)
-                    
-                    if os.path.isdir(entry_path):
-                        permissions = 'drwxr-xr-x'
-                        size = '-'
-                    else:
-                        permissions = '-rw-r--r--'
-                        size = str(stat.st_size)
-                    
-                    mtime = datetime.datetime.fromtimestamp(stat.st_mtime)
-                    modified = mtime.strftime('%Y-%m-%d %H:%M:%S')
-                    
-                    items.append({
-                        'name': name,
-                        'permissions': permissions,
-                        'size': size,
-                        'modified': modified,
-                        'type': 'directory' if os.path.isdir(entry_path) else 'file'
-                    })
-                except Exception:
-                    continue
+            return AtomicFile(real_path), ""
         except PermissionError:
-            return None
-        
-        return items
-    
-    def create_directory(self, path, parents=False):
-        """Create a new directory. If parents is True, create intermediate directories."""
-        real_path = self._get_real_path(path)
-        if not real_path:
-            return False, f"mkdir: cannot create directory '{path}': Access denied"
-        
-        if os.path.exists(real_path):
-            if os.path.isdir(real_path):
-                return False, f"mkdir: cannot create directory '{path}': File exists"
-            else:
-                return False, f"mkdir: cannot create directory '{path}': File exists"
-        
-        try:
-            if parents:
-                os.makedirs(real_path, exist_ok=True)
-            else:
-                os.mkdir(real_path)
-            return True, ""
-        except FileExistsError:
-            return False, f"mkdir: cannot create directory '{path}': File exists"
-        except Exception as e:
-            return False, f"mkdir: {path}: {e}"
-    
-    def remove_directory(self, path):
-        """Remove an empty directory."""
-        real_path = self._get_real_path(path)
-        if not real_path:
-            return False, f"rmdir: failed to remove '{path}': Access denied"
-        
-        if not os.path.exists(real_path):
-            return False, f"rmdir: failed to remove '{path}': No such file or directory"
-        
-        if not os.path.isdir(real_path):
-            return False, f"rmdir: failed to remove '{path}': Not a directory"
-        
-        try:
-            os.rmdir(real_path)
-            return True, ""
+            return None, f"{path}: Permission denied"
         except OSError as e:
-            return False, f"rmdir: {path}: {e}"
+            return None, f"{path}: {e.strerror or e}"
     
-    def remove_recursive(self, path):
-        """Remove a file or directory tree recursively."""
-        real_path = self._get_real_path(path)
-        if not real_path:
-            return False, f"rm: cannot remove '{path}': Access denied"
-        
-        if not os.path.exists(real_path):
-            return False, f"rm: cannot remove '{path}': No such file or directory"
-        
+    def _remove_tree(self, path):
+        real_path = self._real(path, follow=False, write=True)
         try:
-            if os.path.isdir(real_path):
-                import shutil
+            if os.path.isdir(real_path) and not os.path.islink(real_path):
                 shutil.rmtree(real_path)
             else:
                 os.remove(real_path)
-            return True, ""
-        except Exception as e:
-            return False, f"rm: {path}: {e}"
-    
-    def write_file(self, path, content):
-        """Create or overwrite a file with content."""
-        real_path = self._get_real_path(path)
-        if not real_path:
-            return False, f"redirect: cannot write to '{path}': Access denied"
-        
-        try:
-            os.makedirs(os.path.dirname(real_path), exist_ok=True)
-            with open(real_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            return True, ""
-        except Exception as e:
-            return False, f"redirect: {path}: {e}"
-    
-    def append_file(self, path, content):
-        """Append content to a file, creating it if missing."""
-        real_path = self._get_real_path(path)
-        if not real_path:
-            return False, f"redirect: cannot write to '{path}': Access denied"
-        
-        if os.path.exists(real_path) and not os.path.isfile(real_path):
-            return False, f"redirect: '{path}': Is a directory"
-        
-        try:
-            os.makedirs(os.path.dirname(real_path), exist_ok=True)
-            with open(real_path, 'a', encoding='utf-8') as f:
-                f.write(content)
-            return True, ""
-        except Exception as e:
-            return False, f"redirect: {path}: {e}"
+        finally:
+            self.resolver.invalidate()
     
-    def get_node(self, path):
-        """Get filesystem node info (for compatibility)"""
-        real_path = self._get_real_path(path)
-        if not real_path or not os.path.exists(real_path):
-            return None
-        
-        if os.path.isdir(real_path):
-            return {'type': 'directory'}
-        else:
-            return {'type': 'file'}
-    
-    def copy_path(self, src, dst, recursive=False):
-        """Copy file or directory from src to dst. For directories, recursive must be True."""
-        import shutil
+    def copy_path(self, src, dst, recursive=False, reflink='auto', progress=None):
+        """Copy file or directory from src to dst. For directories, recursive must be True.
         
+        Data is copied by CopyEngine (reflink, copy_file_range or sendfile where available).
+        progress, if given, is called periodically with the engine's CopyStats.
+        """
         src_real = self._get_real_path(src)
-        dst_real = self._get_real_path(dst)
+        dst_real = self._get_real_path(dst, write=True)
         
         if not src_real or not dst_real:
             return False, f"cp: Access denied"
@@ -309,41 +250,100 @@ class LocalFileSystem:
         if not os.path.exists(src_real):
             return False, f"cp: cannot stat '{src}': No such file or directory"
         
+        engine = CopyEngine(reflink=reflink, progress=progress)
         try:
             if os.path.isdir(src_real):
                 if not recursive:
                     return False, f"cp: -r not specified; omitting directory '{src}'"
                 if os.path.exists(dst_real) and os.path.isdir(dst_real):
                     dst_real = os.path.join(dst_real, os.path.basename(src_real))
-                shutil.copytree(src_real, dst_real, dirs_exist_ok=True)
+                if os.path.commonpath([src_real, dst_real]) == src_real:
+                    return False, f"cp: cannot copy a directory, '{src}', into itself, '{dst}'"
+                errors = engine.copy_tree(src_real, dst_real)
+                if errors:
+                    return False, "\n".join(
+                        f"cp: cannot copy '{self._to_virtual_path(path)}': {getattr(e, 'strerror', None) or e}"
+                        for path, e in errors)
             else:
-                if os.path.isdir(dst_real):
-                    dst_real = os.path.join(dst_real, os.path.basename(src_real))
-                shutil.copy2(src_real, dst_real)
+                engine.copy(src_real, dst_real)
             return True, ""
+        except shutil.SameFileError:
+            # Its message names the host paths, which must stay hidden
+            return False, f"cp: '{src}' and '{dst}' are the same file"
+        except OSError as e:
+            return False, f"cp: cannot copy '{src}' to '{dst}': {e.strerror or e}"
         except Exception as e:
             return False, f"cp: {e}"
+        finally:
+            # Copied trees may bring symbolic links along
+            self.resolver.invalidate()
+    
+    def sync_path(self, src, dst, recursive=False, checksum=False, delete=False, dry_run=False):
+        """Incrementally copy src to dst, transferring only what changed (rsync-like).
+
+        As with rsync, a directory src ending in '/' syncs its contents into dst,
+        otherwise into dst/basename(src). Returns (SyncStats, error).
+        """
+        src_real = self._get_real_path(src)
+        dst_real = self._get_real_path(dst, write=True)
+
+        if not src_real or not dst_real:
+            return None, "rsync: Access denied"
+
+        if not os.path.lexists(src_real):
+            return None, f"rsync: link_stat '{src}' failed: No such file or directory"
+
+        engine = SyncEngine(checksum=checksum, delete=delete, dry_run=dry_run)
+        try:
+            if os.path.isdir(src_real) and not os.path.islink(src_real):
+                if not recursive:
+                    return engine.stats, f"rsync: skipping directory {src}"
+                if not src.endswith('/'):
+                    dst_real = os.path.join(dst_real, os.path.basename(src_real))
+                if os.path.commonpath([src_real, dst_real]) == src_real:
+                    return None, f"rsync: cannot sync '{src}' into itself"
+                if not dry_run:
+                    os.makedirs(dst_real, exist_ok=True)
+                errors = engine.sync_tree(src_real, dst_real)
+                if errors:
+                    return engine.stats, "\n".join(
+                        f"rsync: '{self._to_virtual_path(path)}': {getattr(e, 'strerror', None) or e}"
+                        for path, e in errors)
+            else:
+                if os.path.isdir(dst_real) or dst.endswith('/'):
+                    if not dry_run:
+                        os.makedirs(dst_real, exist_ok=True)
+                    dst_real = os.path.join(dst_real, os.path.basename(src_real))
+                if engine.sync_file(src_real, dst_real):
+                    engine.stats.changed.append(os.path.basename(src_real))
+            return engine.stats, ""
+        except OSError as e:
+            return None, f"rsync: '{src}': {e.strerror or e}"
+        finally:
+            self.resolver.invalidate()
     
     def move_path(self, src, dst):
         """Move/rename a file or directory."""
-        import shutil
-        
-        src_real = self._get_real_path(src)
-        dst_real = self._get_real_path(dst)
+        # A link is moved itself, wherever it points
+        src_real = self._get_real_path(src, follow=False, write=True)
+        dst_real = self._get_real_path(dst, write=True)
         
         if not src_real or not dst_real:
             return False, f"mv: Access denied"
         
-        if not os.path.exists(src_real):
+        if not os.path.lexists(src_real):
             return False, f"mv: cannot stat '{src}': No such file or directory"
         
         try:
             if os.path.isdir(dst_real):
                 dst_real = os.path.join(dst_real, os.path.basename(src_real))
-            shutil.move(src_real, dst_real)
+            # Same-device moves are a rename; otherwise data goes through the copy engine
+            shutil.move(src_real, dst_real, copy_function=CopyEngine().copy_file)
             return True, ""
         except Exception as e:
             return False, f"mv: {e}"
+        finally:
+            self.resolver.invalidate()
     
     def walk(self, start_path=None):
         """Yield (path, node) for all nodes under start_path (inclusive)."""
@@ -372,9 +372,223 @@ class LocalFileSystem:
                 file_path = virtual_root.rstrip('/') + '/' + name
                 yield file_path, {'type': 'file'}
     
-    def _get_parent_and_name(self, path):
-        """Helper to get parent directory and name"""
-        normalized = self.normalize_path(path)
-        dir_path = '/'.join(normalized.split('/')[:-1]) or '/'
-        name = normalized.split('/')[-1] if normalized != '/' else ''
-        return dir_path, name
+    def _to_virtual_path(self, real_path):
+        """Convert a real path under base_path back to its virtual path"""
+        rel = os.path.relpath(real_path, self.base_path)
+        return '/' if rel == '.' else '/' + rel.replace('\\', '/')
+
+
+class MockFileSystem(MemoryFileSystem):
+    """In-memory file system seeded from the sample tree in mock_filesystem.json.
+
+    The JSON file nests {"type": "directory", "contents": {...}} and
+    {"type": "file", "content": "...", "modified": "YYYY-MM-DD HH:MM:SS"}
+    nodes under "/". It is only read: changes go to a write-ahead journal in
+    state_dir, one fsync'ed record per operation, which is folded into a
+    binary snapshot once it outgrows it. Startup loads the snapshot (or the
+    JSON seed if there is none) and replays the journal.
+    """
+
+    base_path = 'mock'
+    home = '/home/student'
+
+    def __init__(self, fs_file=MOCK_FILESYSTEM_FILE, state_dir=None, sync=True):
+        self.fs_file = fs_file
+        self.state_dir = state_dir or os.path.splitext(fs_file)[0] + '.state'
+        self.snapshot_path = os.path.join(self.state_dir, SNAPSHOT_FILE)
+        self.journal = Journal(os.path.join(self.state_dir, JOURNAL_FILE), sync)
+        self.sync = sync
+        self.generation = 0
+        self.snapshot_size = 0
+        self.loading = True
+        super().__init__()
+        try:
+            self._load_snapshot()
+        except FileNotFoundError:
+            self._load_seed()
+        except (OSError, JournalError) as e:
+            print(f"Error loading filesystem snapshot: {e}")
+            self._load_seed()
+        for op, timestamp, fields in self.journal.replay(self.generation):
+            try:
+                self._apply(op, timestamp, fields)
+            except (OSError, ValueError):
+                continue  # an operation that failed when it was made fails again; skip it
+        self.makedirs(self.home)
+        self.current_path = self.home
+        self.loading = False
+
+    # ---------------- Loading ----------------
+    def _load_seed(self):
+        try:
+            with open(self.fs_file, 'r', encoding='utf-8') as f:
+                tree = json.load(f)
+        except (OSError, ValueError):
+            tree = {'/': {'type': 'directory', 'contents': {}}}
+        self._load_node('/', tree.get('/', {'type': 'directory', 'contents': {}}))
+
+    def _load_node(self, path, node):
+        mtime = _parse_modified(node.get('modified'))
+        if node.get('type') == 'directory':
+            if path != '/':
+                self._mkdir(path)
+            for name, child in node.get('contents', {}).items():
+                self._load_node(posixpath.join(path, name), child)
+        else:
+            with self._open(path, 'wb') as f:
+                f.write(node.get('content', '').encode('utf-8'))
+        if mtime is not None:
+            self._utime(path, mtime)
+
+    def _load_snapshot(self):
+        self.generation, entries = read_snapshot(self.snapshot_path)
+        self.snapshot_size = os.path.getsize(self.snapshot_path)
+        for kind, mode, mtime, path, payload in entries:
+            if path == '/':
+                node = self.root
+                node.mode = stat.S_IFDIR | mode
+            elif kind == journal.DIRECTORY:
+                node = self._add(path, Inode(stat.S_IFDIR | mode, {}))
+            elif kind == journal.FILE:
+                node = self._add(path, Inode(stat.S_IFREG | mode, bytearray(payload)))
+            elif kind == journal.HARDLINK:
+                node = self._add(path, self._lookup(_text(payload), follow=False))
+            else:
+                node = self._add(path, Inode(stat.S_IFLNK | mode, _text(payload)))
+            node.mtime = mtime
+
+    def _apply(self, op, timestamp, fields):
+        """Redo one journaled operation"""
+        path = _text(fields[0])
+        if op == 'write':
+            with self._open(path, 'wb') as f:
+                f.write(fields[1])
+        elif op == 'append':
+            payload = self._lookup(path).payload
+            del payload[int(fields[1]):]
+            payload += fields[2]
+        elif op == 'mkdir':
+            self._mkdir(path)
+        elif op == 'rmdir':
+            self._rmdir(path)
+        elif op == 'remove':
+            self._remove(path)
+        elif op == 'rename':
+            self._rename(path, _text(fields[1]))
+        elif op == 'chmod':
+            self._chmod(path, int(fields[1]))
+        elif op == 'symlink':
+            self._symlink(_text(fields[1]), path)
+        elif op == 'link':
+            self._link(path, _text(fields[1]))
+        if op in ('write', 'append', 'mkdir', 'utime', 'symlink'):
+            self._lookup(path, follow=op != 'symlink').mtime = timestamp
+
+    # ---------------- Persistence ----------------
+    def _changed(self, op, path, *args):
+        """Journal one operation: O(1) I/O, plus the bytes a write changed"""
+        if self.loading:
+            return
+        timestamp = time.time()
+        if op == 'write':
+            payload = self._lookup(path).payload
+            start = args[0] if args else 0
+            if start:
+                # Only the bytes from start on changed (an append, usually); replay keeps the rest
+                op, fields = 'append', (path, str(start), payload[start:])
+            else:
+                fields = (path, payload)
+        elif op == 'utime':
+            timestamp = self._lookup(path).mtime
+            fields = (path,)
+        elif op == 'chmod':
+            fields = (path, str(args[0]))
+        else:
+            fields = (path,) + args
+        try:
+            self.journal.append(self.generation, op, timestamp, *fields)
+            if self.journal.size > max(COMPACT_MIN_BYTES, self.snapshot_size):
+                self.compact()
+        except OSError as e:
+            print(f"Error saving filesystem: {e}")
+
+    def _snapshot_entries(self):
+        """The tree as snapshot entries, parents first.
+
+        Further names of a hard-linked inode become HARDLINK entries naming
+        the first, so loading the snapshot links them again.
+        """
+        pending = [('/', self.root)]
+        first_paths = {}
+        while pending:
+            path, node = pending.pop()
+            payload = node.payload
+            if type(payload) is dict:
+                yield journal.DIRECTORY, stat.S_IMODE(node.mode), node.mtime, path, b''
+                pending.extend((posixpath.join(path, name), child) for name, child in payload.items())
+                continue
+            first = first_paths.setdefault(id(node), path)
+            if first != path:
+                yield journal.HARDLINK, stat.S_IMODE(node.mode), node.mtime, path, first
+            elif type(payload) is str:
+                yield journal.SYMLINK, stat.S_IMODE(node.mode), node.mtime, path, payload
+            else:
+                yield journal.FILE, stat.S_IMODE(node.mode), node.mtime, path, payload
+
+    def compact(self):
+        """Fold the journal into a new snapshot and start an empty journal.
+
+        The snapshot is renamed into place before the journal is reset; a
+        crash in between leaves a journal of the old generation, which is
+        then ignored because the snapshot already contains it.
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        write_snapshot(self.snapshot_path, self.generation + 1, self._snapshot_entries(), self.sync)
+        self.generation += 1
+        self.snapshot_size = os.path.getsize(self.snapshot_path)
+        self.journal.reset(self.generation)
+
+    def _dump_node(self, path):
+        st = self._lstat(path)
+        modified = datetime.datetime.fromtimestamp(st.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+        if stat.S_ISDIR(st.st_mode):
+            contents = {name: self._dump_node(posixpath.join(path, name)) for name in sorted(self._listdir(path))}
+            return {'type': 'directory', 'contents': contents}
+        with self._open(self._resolve(path), 'rb') as f:
+            content = f.read().decode('utf-8', errors='ignore')
+        return {'type': 'file', 'content': content, 'size': len(content), 'modified': modified}
+
+    def save_filesystem(self, path=None):
+        """Export the whole tree as JSON in the seed format (to fs_file unless path is given)"""
+        try:
+            with open(path or self.fs_file, 'w', encoding='utf-8') as f:
+                json.dump({'/': self._dump_node('/')}, f, indent=2)
+        except OSError as e:
+            print(f"Error saving filesystem: {e}")
+
+    def close(self):
+        self.journal.close()
+
+
+def _text(field):
+    return bytes(field).decode('utf-8', errors='surrogateescape')
+
+
+def _parse_modified(text):
+    try:
+        return time.mktime(time.strptime(text, '%Y-%m-%d %H:%M:%S'))
+    except (TypeError, ValueError):
+        return None
+
+
+def open_filesystem(location):
+    """File system for a location: a directory, an image from mkimage, a zip or tar archive, or ':memory:'"""
+    if location == ':memory:':
+        return MemoryFileSystem()
+    if is_image(location):
+        return ImageFileSystem(location)
+    if os.path.isfile(location):
+        return ArchiveFileSystem(location)
+    # Kernel notifications are cheap enough to keep caches fresh from the start;
+    # a polling watcher only starts when a command asks for one
+    return LocalFileSystem(location, watch=inotify_available())
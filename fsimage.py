@@ -0,0 +1,235 @@
+# File System Image Implementation (compact, memory-mapped, read-only trees)
+import os
+import io
+import mmap
+import stat
+import errno
+import struct
+import posixpath
+from collections import deque
+from vfs import VirtualFileSystem, VfsStat, BufferReader, vfs_error, MAX_SYMLINK_HOPS
+
+
+# Layout: MAGIC | content blob | entry table | names blob | trailer.
+# The trailer at the end lets the image be written in one streaming pass.
+IMAGE_MAGIC = b'VFSIMG01'
+IMAGE_VERSION = 1
+# Entry: name offset and length (into the names blob), st_mode, mtime, and two
+# values whose meaning depends on the kind: first child index and child count
+# for a directory, content offset and size for a file or a link's target.
+_ENTRY = struct.Struct('<IIIdQQ')
+# Trailer: table offset, entry count, names offset, names size, version, magic
+_TRAILER = struct.Struct('<QQQQI8s')
+# Directory paths remembered by lookups before the cache is emptied
+LOOKUP_CACHE_SIZE = 65536
+COPY_BLOCK_SIZE = 1024 * 1024
+
+
+def is_image(path):
+    """True if the host file at path starts like a file system image"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(IMAGE_MAGIC)) == IMAGE_MAGIC
+    except OSError:
+        return False
+
+
+def build_image(fs, source, out, skip=None):
+    """Write the tree under source on the VirtualFileSystem fs to the binary stream out.
+
+    Entries are numbered breadth-first, so the children of every directory
+    are contiguous; they are sorted by their UTF-8 names, which lets readers
+    binary-search them. Hard-linked files share one copy of their content.
+    skip(path) may return True to leave a path out.
+
+    Returns (entries, files, content bytes).
+    """
+    out.write(IMAGE_MAGIC)
+    position = len(IMAGE_MAGIC)
+    names = []
+    names_size = 0
+    files = 0
+    shared = {}
+
+    st = fs.stat(source)
+    if not stat.S_ISDIR(st.st_mode):
+        raise vfs_error(errno.ENOTDIR, source)
+    entries = [[0, 0, st.st_mode, st.st_mtime, 0, 0]]
+    pending = deque([(0, fs.normalize_path(source))])
+    while pending:
+        index, directory = pending.popleft()
+        children = sorted((name.encode('utf-8', errors='surrogateescape'), name) for name in fs.listdir(directory))
+        first = len(entries)
+        for encoded, name in children:
+            path = posixpath.join(directory, name)
+            if skip and skip(path):
+                continue
+            st = fs.lstat(path)
+            entry = [names_size, len(encoded), st.st_mode, st.st_mtime, 0, 0]
+            names.append(encoded)
+            names_size += len(encoded)
+            if stat.S_ISDIR(st.st_mode):
+                pending.append((len(entries), path))
+            elif stat.S_ISLNK(st.st_mode):
+                target = fs.readlink(path).encode('utf-8', errors='surrogateescape')
+                out.write(target)
+                entry[4:] = [position, len(target)]
+                position += len(target)
+            else:
+                files += 1
+                key = (getattr(st, 'st_dev', 0), getattr(st, 'st_ino', 0))
+                if key in shared and st.st_nlink > 1:
+                    entry[4:] = shared[key]
+                else:
+                    stream, error = fs.open_stream(path, 'rb')
+                    if error:
+                        raise OSError(errno.EIO, error.split(': ', 1)[-1], path)
+                    size = 0
+                    with stream:
+                        while True:
+                            block = stream.read(COPY_BLOCK_SIZE)
+                            if not block:
+                                break
+                            out.write(block)
+                            size += len(block)
+                    entry[4:] = [position, size]
+                    position += size
+                    if key[1] and st.st_nlink > 1:
+                        shared[key] = entry[4:]
+            entries.append(entry)
+        entries[index][4:] = [first, len(entries) - first]
+
+    table_offset = position
+    for start in range(0, len(entries), 4096):
+        out.write(b''.join(_ENTRY.pack(*entry) for entry in entries[start:start + 4096]))
+    names_offset = table_offset + len(entries) * _ENTRY.size
+    out.write(b''.join(names))
+    out.write(_TRAILER.pack(table_offset, len(entries), names_offset, names_size, IMAGE_VERSION, IMAGE_MAGIC))
+    return len(entries), files, table_offset - len(IMAGE_MAGIC)
+
+
+class ImageFileSystem(VirtualFileSystem):
+    """Read-only file system served from a memory-mapped image built by build_image.
+
+    Opening an image only reads its trailer; entries and names are decoded
+    when a path is looked up, and file contents are read straight from the
+    mapping. Every terminal mapping the same image shares its pages.
+    """
+
+    read_only = True
+
+    def __init__(self, image_path):
+        super().__init__()
+        self.base_path = os.path.abspath(image_path)
+        self.file = open(image_path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self.map) < len(IMAGE_MAGIC) + _TRAILER.size or self.map[:len(IMAGE_MAGIC)] != IMAGE_MAGIC:
+                raise ValueError(f"Not a file system image: {image_path}")
+            (self.table_offset, self.count, self.names_offset, self.names_size,
+             version, magic) = _TRAILER.unpack_from(self.map, len(self.map) - _TRAILER.size)
+            if magic != IMAGE_MAGIC or version != IMAGE_VERSION:
+                raise ValueError(f"Unsupported file system image: {image_path}")
+        except Exception:
+            self.file.close()
+            raise
+        self.view = memoryview(self.map)
+        # path -> entry index for directories already looked up
+        self.lookups = {'/': 0}
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+    # ---------------- Decoding ----------------
+    def _entry(self, index):
+        return _ENTRY.unpack_from(self.map, self.table_offset + index * _ENTRY.size)
+
+    def _name(self, entry):
+        start = self.names_offset + entry[0]
+        return self.map[start:start + entry[1]]
+
+    def _child(self, directory, name):
+        """Index of the entry called name in directory, or None (binary search)"""
+        first, count = directory[4], directory[5]
+        wanted = name.encode('utf-8', errors='surrogateescape')
+        low, high = first, first + count
+        while low < high:
+            middle = (low + high) // 2
+            found = self._name(self._entry(middle))
+            if found < wanted:
+                low = middle + 1
+            elif found > wanted:
+                high = middle
+            else:
+                return middle
+        return None
+
+    def _locate(self, path, follow=True, hops=0):
+        """Entry index of path, following links in parent components (and the last, if follow)"""
+        index = self.lookups.get(path)
+        if index is not None:
+            return index
+        directory, name = posixpath.split(path)
+        parent = self._entry(self._locate(directory, True, hops))
+        if not stat.S_ISDIR(parent[2]):
+            raise vfs_error(errno.ENOTDIR, path)
+        index = self._child(parent, name)
+        if index is None:
+            raise vfs_error(errno.ENOENT, path)
+        entry = self._entry(index)
+        if follow and stat.S_ISLNK(entry[2]):
+            if hops >= MAX_SYMLINK_HOPS:
+                raise vfs_error(errno.ELOOP, path)
+            target = self.map[entry[4]:entry[4] + entry[5]].decode('utf-8', errors='surrogateescape')
+            target = '/' + posixpath.normpath(posixpath.join(directory, target)).lstrip('/')
+            return self._locate(target, True, hops + 1)
+        if stat.S_ISDIR(entry[2]):
+            if len(self.lookups) >= LOOKUP_CACHE_SIZE:
+                self.lookups = {'/': 0}
+            self.lookups[path] = index
+        return index
+
+    # ---------------- Storage primitives ----------------
+    def _entry_stat(self, index):
+        _, _, mode, mtime, a, b = self._entry(index)
+        if stat.S_ISDIR(mode):
+            return VfsStat(mode, 0, mtime, b + 2)
+        return VfsStat(mode, b, mtime, 1)
+
+    def _lstat(self, path):
+        return self._entry_stat(self._locate(path, follow=False))
+
+    def _stat(self, path):
+        return self._entry_stat(self._locate(path))
+
+    def _listdir(self, path):
+        entry = self._entry(self._locate(path))
+        if not stat.S_ISDIR(entry[2]):
+            raise vfs_error(errno.ENOTDIR, path)
+        return [self._name(self._entry(index)).decode('utf-8', errors='surrogateescape')
+                for index in range(entry[4], entry[4] + entry[5])]
+
+    def _open(self, path, mode, buffering=-1):
+        if mode != 'rb':
+            raise vfs_error(errno.EROFS, path)
+        entry = self._entry(self._locate(path))
+        if stat.S_ISDIR(entry[2]):
+            raise vfs_error(errno.EISDIR, path)
+        raw = BufferReader(self.view[entry[4]:entry[4] + entry[5]])
+        return raw if buffering == 0 else io.BufferedReader(raw)
+
+    def _readlink(self, path):
+        entry = self._entry(self._locate(path, follow=False))
+        if not stat.S_ISLNK(entry[2]):
+            raise vfs_error(errno.EINVAL, path)
+        return self.map[entry[4]:entry[4] + entry[5]].decode('utf-8', errors='surrogateescape')
+
+    def _read_only(self, *args):
+        raise vfs_error(errno.EROFS)
+
+    _mkdir = _rmdir = _remove = _rename = _chmod = _utime = _symlink = _link = _read_only
+
+    def _disk_usage(self):
+        return len(self.map), 0
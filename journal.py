@@ -0,0 +1,229 @@
+# Write-Ahead Journal Implementation (append-only log compacted into binary snapshots)
+import os
+import struct
+import zlib
+
+
+JOURNAL_MAGIC = b'VFSJRNL1'
+SNAPSHOT_MAGIC = b'VFSSNAP1'
+
+# File header: magic, generation. A journal only applies to the snapshot of
+# the same generation; an older one was already folded into the snapshot.
+_HEADER = struct.Struct('<8sQ')
+# Journal record: body length, CRC-32 of the body; the body is an opcode,
+# a timestamp and length-prefixed fields
+_RECORD = struct.Struct('<II')
+_BODY = struct.Struct('<Bd')
+_FIELD = struct.Struct('<I')
+# Snapshot entry: kind, permission bits, mtime, then path and payload fields
+_ENTRY = struct.Struct('<BId')
+
+# New operations go last so existing journals keep their opcodes
+OPS = ('write', 'mkdir', 'rmdir', 'remove', 'rename', 'chmod', 'utime', 'symlink', 'link', 'append')
+OPCODES = {name: code for code, name in enumerate(OPS)}
+
+# Snapshot entry kinds; a HARDLINK's payload is the path of an earlier entry it shares
+DIRECTORY, FILE, SYMLINK, HARDLINK = 0, 1, 2, 3
+
+
+class JournalError(Exception):
+    """Raised when a snapshot is damaged or of an unknown format"""
+
+
+def _encode(value):
+    return value.encode('utf-8', errors='surrogateescape') if isinstance(value, str) else bytes(value)
+
+
+def _pack_fields(fields):
+    parts = []
+    for field in fields:
+        data = _encode(field)
+        parts.append(_FIELD.pack(len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def _unpack_fields(buffer, offset, end):
+    fields = []
+    while offset < end:
+        (size,) = _FIELD.unpack_from(buffer, offset)
+        offset += _FIELD.size
+        fields.append(bytes(buffer[offset:offset + size]))
+        offset += size
+    return fields
+
+
+def _fsync_directory(path):
+    """Make a rename in path durable (a no-op where directories cannot be opened)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _replace_atomically(path, chunks, sync=True):
+    """Write chunks to a temporary sibling, then rename it over path"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    if sync:
+        _fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+
+class Journal:
+    """Append-only log of file system operations.
+
+    Each record is checksummed, so a record torn by a crash is detected on
+    replay and cut off; everything before it is kept. With sync on, every
+    append is fsync'ed before it returns.
+    """
+
+    def __init__(self, path, sync=True):
+        self.path = path
+        self.sync = sync
+        self.file = None
+        self.size = 0
+
+    def replay(self, generation):
+        """Yield (op, timestamp, fields) for the records made since snapshot generation.
+
+        A journal of another generation is stale and yields nothing.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if len(data) < _HEADER.size:
+            return
+        magic, journal_generation = _HEADER.unpack_from(data, 0)
+        if magic != JOURNAL_MAGIC or journal_generation != generation:
+            return
+        offset = _HEADER.size
+        view = memoryview(data)
+        while offset + _RECORD.size <= len(data):
+            length, crc = _RECORD.unpack_from(data, offset)
+            start = offset + _RECORD.size
+            end = start + length
+            if length < _BODY.size or end > len(data) or zlib.crc32(view[start:end]) != crc:
+                break
+            code, timestamp = _BODY.unpack_from(data, start)
+            if code >= len(OPS):
+                break
+            yield OPS[code], timestamp, _unpack_fields(view, start + _BODY.size, end)
+            offset = end
+        if offset < len(data):
+            # Torn tail from a crash mid-append: drop it so new records follow good ones
+            with open(self.path, 'r+b') as f:
+                f.truncate(offset)
+
+    def append(self, generation, op, timestamp, *fields):
+        """Add one record, creating the journal for generation if it does not exist yet"""
+        if self.file is None:
+            self._open(generation)
+        body = _BODY.pack(OPCODES[op], timestamp) + _pack_fields(fields)
+        self.file.write(_RECORD.pack(len(body), zlib.crc32(body)) + body)
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+        self.size += _RECORD.size + len(body)
+
+    def _open(self, generation):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        try:
+            with open(self.path, 'rb') as f:
+                header = f.read(_HEADER.size)
+        except FileNotFoundError:
+            header = b''
+        if header != _HEADER.pack(JOURNAL_MAGIC, generation):
+            self.reset(generation)
+        self.file = open(self.path, 'ab')
+        self.size = self.file.tell()
+
+    def reset(self, generation):
+        """Atomically replace the journal with an empty one for generation"""
+        self.close()
+        _replace_atomically(self.path, [_HEADER.pack(JOURNAL_MAGIC, generation)], self.sync)
+        self.size = _HEADER.size
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def write_snapshot(path, generation, entries, sync=True):
+    """Atomically write entries of (kind, mode, mtime, path, payload) as the snapshot for generation.
+
+    Parents must come before their children. A CRC-32 of everything written
+    ends the file.
+    """
+    def chunks():
+        crc = 0
+        header = _HEADER.pack(SNAPSHOT_MAGIC, generation)
+        crc = zlib.crc32(header, crc)
+        yield header
+        batch = []
+        batch_size = 0
+        for kind, mode, mtime, entry_path, payload in entries:
+            record = _ENTRY.pack(kind, mode, mtime) + _pack_fields((entry_path, payload))
+            batch.append(record)
+            batch_size += len(record)
+            if batch_size >= 1024 * 1024:
+                block = b''.join(batch)
+                crc = zlib.crc32(block, crc)
+                yield block
+                batch, batch_size = [], 0
+        block = b''.join(batch)
+        crc = zlib.crc32(block, crc)
+        yield block
+        yield struct.pack('<I', crc)
+
+    _replace_atomically(path, chunks(), sync)
+
+
+def read_snapshot(path):
+    """Read a snapshot. Returns (generation, list of (kind, mode, mtime, path, payload)).
+
+    Raises FileNotFoundError if there is none and JournalError if it is damaged.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _HEADER.size + 4 or zlib.crc32(memoryview(data)[:-4]) != struct.unpack('<I', data[-4:])[0]:
+        raise JournalError(f"{path}: damaged snapshot")
+    magic, generation = _HEADER.unpack_from(data, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise JournalError(f"{path}: not a snapshot")
+    entries = []
+    view = memoryview(data)
+    offset = _HEADER.size
+    end = len(data) - 4
+    while offset < end:
+        kind, mode, mtime = _ENTRY.unpack_from(data, offset)
+        offset += _ENTRY.size
+        fields = []
+        for _ in range(2):
+            (size,) = _FIELD.unpack_from(data, offset)
+            offset += _FIELD.size
+            fields.append(view[offset:offset + size])
+            offset += size
+        entries.append((kind, mode, mtime, bytes(fields[0]).decode('utf-8', errors='surrogateescape'), fields[1]))
+    return generation, entries
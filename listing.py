@@ -0,0 +1,150 @@
+# Directory Listing Implementation (sorted indexes, column layout and long format for ls)
+import stat
+import math
+import datetime
+import posixpath
+from collections import OrderedDict
+
+
+# Directories whose sorted index is kept for paging through them
+LISTING_CACHE_SIZE = 8
+# Gap between columns of the short format
+COLUMN_GAP = 2
+
+
+class DirectoryIndex:
+    """Entries of one directory in listing order, built once and paged through many times.
+
+    names is sorted; stats holds each entry's lstat result (None if it
+    could not be read) when the order needed them. mtime is the directory's
+    own modification time when the index was built, to notice entries added
+    or removed since.
+    """
+
+    def __init__(self, fs, directory, show_all=False, sort='name', reverse=False):
+        self.directory = directory
+        self.mtime = fs.stat(directory).st_mtime
+        names = fs.listdir(directory)
+        if not show_all:
+            names = [name for name in names if not name.startswith('.')]
+        names.sort()
+        self.stats = None
+        if sort != 'name':
+            stats = [lstat_or_none(fs, posixpath.join(directory, name)) for name in names]
+            field = 'st_size' if sort == 'size' else 'st_mtime'
+            # Largest or newest first; sorted() is stable, so equal keys stay in name order
+            order = sorted(range(len(names)), key=lambda i: -getattr(stats[i], field, 0))
+            names = [names[i] for i in order]
+            self.stats = [stats[i] for i in order]
+        if reverse:
+            names.reverse()
+            if self.stats:
+                self.stats.reverse()
+        self.names = names
+        self.longest = max(map(len, names), default=0)
+
+    def __len__(self):
+        return len(self.names)
+
+
+class ListingCache:
+    """A few DirectoryIndex objects, dropped when their directory changes.
+
+    An index is rebuilt when the directory's mtime moves on. Where the file
+    system has a watcher running, its events also drop the indexes of the
+    directories they touch, which catches files that merely grew or were
+    touched (and so changed a -S or -t order without changing the directory).
+    """
+
+    def __init__(self, size=LISTING_CACHE_SIZE):
+        self.size = size
+        self.indexes = OrderedDict()
+        self.watched = set()
+
+    def get(self, fs, directory, show_all=False, sort='name', reverse=False):
+        key = (id(fs), directory, show_all, sort, reverse)
+        index = self.indexes.get(key)
+        # Without a watcher, a file growing or being touched goes unnoticed, so
+        # only the name order (which just depends on the entries) is reused
+        reusable = sort == 'name' or fs.watcher is not None
+        if index is not None and reusable and index.mtime == fs.stat(directory).st_mtime:
+            self.indexes.move_to_end(key)
+            return index
+        index = DirectoryIndex(fs, directory, show_all, sort, reverse)
+        self.indexes[key] = index
+        if len(self.indexes) > self.size:
+            self.indexes.popitem(last=False)
+        if fs.watcher is not None and id(fs) not in self.watched:
+            self.watched.add(id(fs))
+            fs.watcher.subscribe(lambda events, fs_id=id(fs): self._changed(fs_id, events))
+        return index
+
+    def _changed(self, fs_id, events):
+        # Runs on the watcher's thread: build the survivors, then swap them in
+        directories = set(posixpath.dirname(event.path) for event in events)
+        overflow = any(event.kind == 'OVERFLOW' for event in events)
+        self.indexes = OrderedDict(
+            (key, index) for key, index in list(self.indexes.items())
+            if key[0] != fs_id or not (overflow or key[1] in directories))
+
+
+def lstat_or_none(fs, path):
+    try:
+        return fs.lstat(path)
+    except OSError:
+        return None
+
+
+def human_size(size):
+    """Size the way ls -h prints it: 999, 1.0K, 12K, 3.4M"""
+    if size < 1024:
+        return str(size)
+    for unit in 'KMGTPE':
+        size /= 1024.0
+        if size < 10:
+            return f"{math.ceil(size * 10) / 10:.1f}{unit}"
+        if size < 1024 or unit == 'E':
+            return f"{math.ceil(size)}{unit}"
+
+
+def long_line(name, st, owner, human=False, target=None):
+    """One line of ls -l for an entry with lstat result st"""
+    if st is None:
+        return f"?????????? ? {owner} {owner} {'?':>8} {'?':>12} {name}"
+    size = human_size(st.st_size) if human else str(st.st_size)
+    when = datetime.datetime.fromtimestamp(st.st_mtime).strftime('%b %d %H:%M')
+    line = f"{stat.filemode(st.st_mode)} {st.st_nlink} {owner} {owner} {size:>8} {when} {name}"
+    return line + f" -> {target}" if target is not None else line
+
+
+def column_lines(names, width, rows=None):
+    """Lay names out in columns filled top to bottom, as few rows as fit in width.
+
+    With rows given, use exactly that many rows instead.
+    """
+    if not names:
+        return []
+    count = len(names)
+    if rows is None:
+        rows = count
+        most = max(1, min(count, width // (1 + COLUMN_GAP)))
+        for columns in range(most, 0, -1):
+            candidate = -(-count // columns)
+            if _layout_width(names, candidate) <= width:
+                rows = candidate
+                break
+    widths = [max(map(len, names[start:start + rows])) + COLUMN_GAP for start in range(0, count, rows)]
+    lines = []
+    for row in range(rows):
+        cells = []
+        for column, start in enumerate(range(row, count, rows)):
+            cells.append(names[start].ljust(widths[column]))
+        lines.append("".join(cells).rstrip())
+    return lines
+
+
+def _layout_width(names, rows):
+    total = 0
+    for start in range(0, len(names), rows):
+        total += max(map(len, names[start:start + rows])) + COLUMN_GAP
+    return total - COLUMN_GAP
@@ -1,13 +1,14 @@
 # Unix-Linux-terminal - Main Entry Point
 
+import sys
 import tkinter as tk
 from terminal_ui import TerminalUI
 
 
 def main():
-    """Main application entry point"""
+    """Main application entry point: main.py [DIRECTORY | IMAGE | ARCHIVE | :memory:]"""
     root = tk.Tk()
-    app = TerminalUI(root)
+    app = TerminalUI(root, sys.argv[1] if len(sys.argv) > 1 else None)
     
     try:
         root.mainloop()
@@ -0,0 +1,397 @@
+# Overlay File System Implementation (copy-on-write upper layer over a read-only lower one)
+import os
+import stat
+import errno
+import posixpath
+from vfs import VirtualFileSystem, MemoryFileSystem, READ_CHUNK_SIZE, MAX_SYMLINK_HOPS, vfs_error
+
+
+def _join(directory, name):
+    return directory + name if directory == '/' else directory + '/' + name
+
+
+def _parent(path):
+    return path[:path.rfind('/')] or '/'
+
+
+class OverlayFileSystem(VirtualFileSystem):
+    """Merged view of a lower file system that is never written and a writable upper one.
+
+    Reads come from the upper layer when it has the path and from the lower
+    one otherwise. The first change to a lower file or directory copies it up;
+    deleting something that exists below records a whiteout, which hides that
+    path and everything under it in the lower layer. A directory that is
+    deleted and made again therefore starts out empty.
+
+    commit() applies the upper layer and the whiteouts to the lower file
+    system; discard() drops them. whiteout_file, when given, keeps the
+    whiteouts across sessions alongside an upper layer stored on disk.
+    """
+
+    def __init__(self, lower, upper=None, whiteout_file=None):
+        super().__init__()
+        self.lower = lower
+        self.upper = upper if upper is not None else MemoryFileSystem()
+        self.base_path = lower.base_path
+        self.home = lower.home
+        self.current_path = lower.current_path
+        self.whiteout_file = whiteout_file
+        self.whiteouts = set()
+        if whiteout_file and os.path.exists(whiteout_file):
+            with open(whiteout_file, encoding='utf-8', errors='surrogateescape') as f:
+                self.whiteouts = set(line.rstrip('\n') for line in f if line.strip())
+        # directory path -> the same path with every symbolic link resolved
+        self.directories = {}
+
+    # ---------------- Layers ----------------
+    def _hidden(self, path):
+        """True if a whiteout covers path or one of its parents"""
+        if not self.whiteouts:
+            return False
+        while path != '/':
+            if path in self.whiteouts:
+                return True
+            path = _parent(path)
+        return False
+
+    def _upper_lstat(self, path):
+        try:
+            return self.upper._lstat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+    def _in_lower(self, path):
+        if self._hidden(path):
+            return False
+        try:
+            self.lower._lstat(path)
+            return True
+        except (FileNotFoundError, NotADirectoryError):
+            return False
+
+    def _layer(self, path):
+        """(layer, lstat) of the layer that supplies path, which must be canonical"""
+        st = self._upper_lstat(path)
+        if st is not None:
+            return self.upper, st
+        if self._hidden(path):
+            raise vfs_error(errno.ENOENT, path)
+        return self.lower, self.lower._lstat(path)
+
+    def _canonical(self, path):
+        """path with symbolic links in its parent directories resolved through the merged view"""
+        if path == '/':
+            return path
+        parent = _parent(path)
+        if parent == '/':
+            return path
+        return _join(self._canonical_directory(parent), path[path.rfind('/') + 1:])
+
+    def _canonical_directory(self, path):
+        """path with every symbolic link, including the last component, resolved"""
+        canonical = self.directories.get(path)
+        if canonical is not None:
+            return canonical
+        canonical = self._canonical(path)
+        for _ in range(MAX_SYMLINK_HOPS):
+            try:
+                layer, st = self._layer(canonical)
+            except (FileNotFoundError, NotADirectoryError):
+                break
+            if not stat.S_ISLNK(st.st_mode):
+                break
+            target = posixpath.join(_parent(canonical), layer._readlink(canonical))
+            canonical = self._canonical('/' + posixpath.normpath(target).lstrip('/'))
+        else:
+            raise vfs_error(errno.ELOOP, path)
+        self.directories[path] = canonical
+        return canonical
+
+    def _changed(self):
+        self.directories.clear()
+
+    def _whiteout(self, path):
+        """Hide path in the lower layer"""
+        self.whiteouts.add(path)
+        if self.whiteout_file:
+            with open(self.whiteout_file, 'a', encoding='utf-8', errors='surrogateescape') as f:
+                f.write(path + '\n')
+
+    # ---------------- Copy-up ----------------
+    def _copy_up_parents(self, path):
+        """Give path's directory a counterpart in the upper layer"""
+        directory = _parent(path)
+        if directory == '/':
+            return
+        st = self._upper_lstat(directory)
+        if st is not None:
+            if not stat.S_ISDIR(st.st_mode):
+                raise vfs_error(errno.ENOTDIR, path)
+            return
+        self._copy_up(directory)
+
+    def _copy_up(self, path, content=True):
+        """Copy path from the lower layer into the upper one, unless it is already there"""
+        if self._upper_lstat(path) is not None:
+            return
+        st = self._layer(path)[1]
+        self._copy_up_parents(path)
+        if stat.S_ISDIR(st.st_mode):
+            self.upper._mkdir(path)
+        elif stat.S_ISLNK(st.st_mode):
+            self.upper._symlink(self.lower._readlink(path), path)
+            return
+        else:
+            with self.upper._open(path, 'wb') as dst:
+                if content:
+                    with self.lower._open(path, 'rb') as src:
+                        while True:
+                            chunk = src.read(READ_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            dst.write(chunk)
+        try:
+            self.upper._chmod(path, stat.S_IMODE(st.st_mode))
+            self.upper._utime(path, st.st_mtime)
+        except OSError:
+            pass  # metadata is best effort, as in _copy_file
+
+    def _copy_up_tree(self, path):
+        self._copy_up(path)
+        if stat.S_ISDIR(self.upper._lstat(path).st_mode):
+            for name in self._listdir(path):
+                self._copy_up_tree(_join(path, name))
+
+    def _target(self, path):
+        """Canonical path of what path refers to, following a symbolic link at the end"""
+        path = self._canonical(path)
+        try:
+            return self._canonical(self._resolve(path))
+        except FileNotFoundError:
+            return path
+
+    def _must_not_exist(self, path):
+        try:
+            self._layer(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        raise vfs_error(errno.EEXIST, path)
+
+    # ---------------- Storage primitives ----------------
+    def _lstat(self, path):
+        return self._layer(self._canonical(path))[1]
+
+    def _listdir(self, path):
+        path = self._canonical_directory(path)
+        layer, st = self._layer(path)
+        if not stat.S_ISDIR(st.st_mode):
+            raise vfs_error(errno.ENOTDIR, path)
+        if layer is self.lower:
+            names = self.lower._listdir(path)
+            if not self.whiteouts:
+                return names
+            return [name for name in names if _join(path, name) not in self.whiteouts]
+        names = self.upper._listdir(path)
+        if self._in_lower(path) and stat.S_ISDIR(self.lower._lstat(path).st_mode):
+            seen = set(names)
+            names.extend(name for name in self.lower._listdir(path)
+                         if name not in seen and _join(path, name) not in self.whiteouts)
+        return names
+
+    def _open(self, path, mode, buffering=-1):
+        path = self._target(path)
+        try:
+            layer, st = self._layer(path)
+        except FileNotFoundError:
+            if mode == 'rb' or mode == 'r+b':
+                raise
+            self._copy_up_parents(path)
+            return self.upper._open(path, mode, buffering)
+        if stat.S_ISDIR(st.st_mode):
+            raise vfs_error(errno.EISDIR, path)
+        if mode == 'rb':
+            return layer._open(path, mode, buffering)
+        if layer is self.lower:
+            self._copy_up(path, content=mode != 'wb')
+        return self.upper._open(path, mode, buffering)
+
+    def _mkdir(self, path):
+        path = self._canonical(path)
+        self._must_not_exist(path)
+        self._copy_up_parents(path)
+        self.upper._mkdir(path)
+        self._changed()
+
+    def _rmdir(self, path):
+        path = self._canonical(path)
+        layer, st = self._layer(path)
+        if not stat.S_ISDIR(st.st_mode):
+            raise vfs_error(errno.ENOTDIR, path)
+        if self._listdir(path):
+            raise vfs_error(errno.ENOTEMPTY, path)
+        if layer is self.upper:
+            self.upper._rmdir(path)
+        if self._in_lower(path):
+            self._whiteout(path)
+        self._changed()
+
+    def _remove(self, path):
+        path = self._canonical(path)
+        layer, st = self._layer(path)
+        if stat.S_ISDIR(st.st_mode):
+            raise vfs_error(errno.EISDIR, path)
+        if layer is self.upper:
+            self.upper._remove(path)
+        if self._in_lower(path):
+            self._whiteout(path)
+        self._changed()
+
+    def _rename(self, src, dst):
+        src = self._canonical(src)
+        dst = self._canonical(dst)
+        st = self._layer(src)[1]
+        if stat.S_ISDIR(st.st_mode) and (dst + '/').startswith(src + '/'):
+            raise vfs_error(errno.EINVAL, dst)
+        try:
+            existing = self._layer(dst)[1]
+        except (FileNotFoundError, NotADirectoryError):
+            existing = None
+        if existing is not None and stat.S_ISDIR(existing.st_mode) and self._listdir(dst):
+            raise vfs_error(errno.ENOTEMPTY, dst)
+        self._copy_up_tree(src)
+        self._copy_up_parents(dst)
+        self.upper._rename(src, dst)
+        if self._in_lower(dst):
+            self._whiteout(dst)
+        if self._in_lower(src):
+            self._whiteout(src)
+        self._changed()
+
+    def _chmod(self, path, mode):
+        path = self._target(path)
+        self._copy_up(path)
+        self.upper._chmod(path, mode)
+
+    def _chown(self, path, uid, gid):
+        path = self._target(path)
+        self._copy_up(path)
+        self.upper._chown(path, uid, gid)
+
+    def _utime(self, path, mtime=None):
+        path = self._target(path)
+        self._copy_up(path)
+        self.upper._utime(path, mtime)
+
+    def _symlink(self, target, path):
+        path = self._canonical(path)
+        self._must_not_exist(path)
+        self._copy_up_parents(path)
+        self.upper._symlink(target, path)
+        self._changed()
+
+    def _link(self, src, dst):
+        src = self._target(src)
+        dst = self._canonical(dst)
+        self._must_not_exist(dst)
+        self._copy_up(src)
+        self._copy_up_parents(dst)
+        self.upper._link(src, dst)
+
+    def _readlink(self, path):
+        path = self._canonical(path)
+        return self._layer(path)[0]._readlink(path)
+
+    def _disk_usage(self):
+        return self.lower._disk_usage()
+
+    # ---------------- Upper layer ----------------
+    def changes(self):
+        """Sorted (status, path) pairs: 'A' added, 'M' modified or replaced, 'D' deleted"""
+        found = {}
+        for path in self.whiteouts:
+            # A whiteout under another one only hid what the outer one hides now
+            if self._hidden(_parent(path)):
+                continue
+            found[path] = 'M' if self._upper_lstat(path) is not None else 'D'
+        for path, st in self._upper_entries('/'):
+            if path in found:
+                continue
+            try:
+                below = self.lower._lstat(path)
+            except (FileNotFoundError, NotADirectoryError):
+                below = None
+            if below is None or self._hidden(path):
+                found[path] = 'A'
+            elif not stat.S_ISDIR(st.st_mode):
+                found[path] = 'M'
+        return sorted((status, path) for path, status in found.items())
+
+    def _upper_entries(self, directory):
+        """Yield (path, lstat) for everything in the upper layer under directory"""
+        for name in self.upper._listdir(directory):
+            path = _join(directory, name)
+            st = self.upper._lstat(path)
+            yield path, st
+            if stat.S_ISDIR(st.st_mode):
+                yield from self._upper_entries(path)
+
+    def commit(self):
+        """Write the upper layer and the whiteouts through to the lower file system, then discard them.
+
+        Returns (paths written, paths removed).
+        """
+        removed = 0
+        for path in sorted(self.whiteouts):
+            try:
+                self.lower._lstat(path)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            self.lower._remove_tree(path)
+            removed += 1
+        written = self._commit_directory('/')
+        self.discard()
+        return written, removed
+
+    def _commit_directory(self, directory):
+        written = 0
+        for name in sorted(self.upper._listdir(directory)):
+            path = _join(directory, name)
+            st = self.upper._lstat(path)
+            try:
+                below = self.lower._lstat(path)
+            except (FileNotFoundError, NotADirectoryError):
+                below = None
+            if below is not None and (stat.S_ISLNK(st.st_mode) or
+                                      stat.S_ISDIR(st.st_mode) != stat.S_ISDIR(below.st_mode)):
+                self.lower._remove_tree(path)
+                below = None
+            if stat.S_ISDIR(st.st_mode):
+                if below is None:
+                    self.lower._mkdir(path)
+                written += self._commit_directory(path)
+            elif stat.S_ISLNK(st.st_mode):
+                self.lower._symlink(self.upper._readlink(path), path)
+            else:
+                with self.upper._open(path, 'rb') as src, self.lower._open(path, 'wb') as dst:
+                    while True:
+                        chunk = src.read(READ_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+            if not stat.S_ISLNK(st.st_mode):
+                try:
+                    self.lower._chmod(path, stat.S_IMODE(st.st_mode))
+                    self.lower._utime(path, st.st_mtime)
+                except OSError:
+                    pass
+            written += 1
+        return written
+
+    def discard(self):
+        """Drop every change: empty the upper layer and forget the whiteouts"""
+        for name in self.upper._listdir('/'):
+            self.upper._remove_tree(_join('/', name))
+        self.whiteouts = set()
+        if self.whiteout_file and os.path.exists(self.whiteout_file):
+            os.remove(self.whiteout_file)
+        self._changed()
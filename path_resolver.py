@@ -0,0 +1,89 @@
+# Path Resolution Implementation (virtual paths to host paths, confined to a base directory)
+import os
+from collections import OrderedDict
+from vfs import normalize_virtual
+
+
+# Resolved (current directory, path, follow) keys kept before the oldest is dropped
+RESOLVE_CACHE_SIZE = 8192
+
+
+class PathResolver:
+    """Maps virtual paths onto host paths under base_path and refuses any that leave it.
+
+    A normalized virtual path can never climb above '/', so its host path
+    always lies under base_path; what can still escape is a symbolic link on
+    disk. Each path is therefore checked after os.path.realpath, against the
+    base directory with its own links resolved, using os.path.commonpath so
+    that a sibling such as '/base_evil' does not pass for '/base'.
+
+    Results are remembered in an LRU keyed on (current directory, path,
+    follow); the file system calls invalidate() whenever it may have created,
+    moved or removed a link. A remembered result is only as good as the news
+    of changes made from outside, so callers pass cached=False when nothing
+    reports those, and for anything that writes.
+    """
+
+    def __init__(self, base_path, cache_size=RESOLVE_CACHE_SIZE):
+        self.base = os.path.abspath(base_path)
+        self.real_base = os.path.realpath(self.base)
+        # Host paths are the base followed by the virtual path ('/' has no prefix left)
+        self.prefix = self.base.rstrip(os.sep)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+    def to_host(self, virtual):
+        """Host path of a normalized virtual path, without any checks"""
+        if virtual == '/':
+            return self.base
+        if os.sep != '/':
+            virtual = virtual.replace('/', os.sep)
+        return self.prefix + virtual
+
+    def inside(self, real):
+        """True if the fully resolved host path real lies within the base directory"""
+        if real == self.real_base:
+            return True
+        try:
+            return os.path.commonpath([self.real_base, real]) == self.real_base
+        except ValueError:
+            # Paths on different drives (Windows)
+            return False
+
+    def resolve(self, current, path, follow=True, cached=True):
+        """Host path for path (relative to the virtual directory current), or None if it escapes.
+
+        With follow off, a symbolic link in the last component is not
+        followed, so the link itself can be examined, renamed or removed
+        wherever it points. With cached off, the path is checked on disk
+        again and the cache is neither read nor filled.
+        """
+        key = (current, path, follow)
+        cache = self.cache
+        if cached:
+            try:
+                result = cache[key]
+                cache.move_to_end(key)
+                return result
+            except KeyError:
+                pass
+        virtual = normalize_virtual(current, path)
+        host = self.to_host(virtual)
+        if follow or virtual == '/':
+            checked = os.path.realpath(host)
+        else:
+            checked = os.path.join(os.path.realpath(os.path.dirname(host)), os.path.basename(host))
+        result = host if self.inside(checked) else None
+        if cached:
+            cache[key] = result
+            if len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return result
+
+    def invalidate(self):
+        """Forget every resolution; called when links may have changed.
+
+        Safe to call from another thread (a FileWatcher's): a resolve running
+        meanwhile finishes on the old cache.
+        """
+        self.cache = OrderedDict()
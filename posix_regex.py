@@ -0,0 +1,176 @@
+# POSIX Regular Expression Translation (BRE/ERE -> Python re)
+import re
+
+
+# Bracket classes, which Python's re does not know
+POSIX_CLASSES = {
+    'alpha': 'a-zA-Z', 'digit': '0-9', 'alnum': 'a-zA-Z0-9',
+    'upper': 'A-Z', 'lower': 'a-z', 'space': ' \\t\\n\\r\\f\\v',
+    'blank': ' \\t', 'xdigit': '0-9A-Fa-f', 'cntrl': '\\x00-\\x1f\\x7f',
+    'print': '\\x20-\\x7e', 'graph': '\\x21-\\x7e',
+    'punct': '!-/:-@\\[-`{-~',
+}
+
+# Escapes shared by both flavours (GNU extensions included)
+COMMON_ESCAPES = {
+    'n': '\\n', 't': '\\t', 'w': '\\w', 'W': '\\W', 's': '\\s', 'S': '\\S',
+    'b': '\\b', 'B': '\\B', '<': '\\b', '>': '\\b', '`': '\\A', "'": '\\Z',
+}
+
+
+def _bracket(source, i):
+    """Translate the bracket expression starting at source[i] == '['. Returns (text, next index)."""
+    out = ['[']
+    j = i + 1
+    if j < len(source) and source[j] == '^':
+        out.append('^')
+        j += 1
+    if j < len(source) and source[j] == ']':
+        out.append('\\]')
+        j += 1
+    while j < len(source) and source[j] != ']':
+        c = source[j]
+        if source.startswith('[:', j):
+            end = source.find(':]', j + 2)
+            name = source[j + 2:end] if end >= 0 else None
+            if name not in POSIX_CLASSES:
+                raise re.error(f"invalid character class '{name}'")
+            out.append(POSIX_CLASSES[name])
+            j = end + 2
+            continue
+        if c == '\\':
+            # Backslash is literal inside brackets, except for the usual GNU escapes
+            nxt = source[j + 1:j + 2]
+            if nxt in ('n', 't', '\\', ']'):
+                out.append({'n': '\\n', 't': '\\t', '\\': '\\\\', ']': '\\]'}[nxt])
+                j += 2
+            else:
+                out.append('\\\\')
+                j += 1
+            continue
+        out.append('\\' + c if c in '[&~|' else c)
+        j += 1
+    if j >= len(source):
+        raise re.error("unterminated [")
+    out.append(']')
+    return ''.join(out), j + 1
+
+
+def translate_bre(source):
+    """Translate a POSIX basic regular expression (with GNU extensions) to Python syntax.
+
+    In a BRE, ( ) { } | + ? are literal and their backslashed forms are
+    operators; * is literal at the start of an expression or group; ^ and $
+    are anchors only at the ends.
+    """
+    out = []
+    i = 0
+    n = len(source)
+    at_start = True
+    while i < n:
+        c = source[i]
+        was_start, at_start = at_start, False
+        if c == '\\' and i + 1 < n:
+            d = source[i + 1]
+            i += 2
+            if d == '(':
+                out.append('(')
+                at_start = True
+            elif d == ')':
+                out.append(')')
+            elif d == '|':
+                out.append('|')
+                at_start = True
+            elif d == '{':
+                end = source.find('\\}', i)
+                if end < 0:
+                    raise re.error("unmatched \\{")
+                out.append('{' + source[i:end] + '}')
+                i = end + 2
+            elif d in '+?':
+                out.append(d)
+            elif d.isdigit():
+                out.append('\\' + d)
+            elif d in COMMON_ESCAPES:
+                out.append(COMMON_ESCAPES[d])
+            else:
+                out.append(re.escape(d))
+            continue
+        if c == '[':
+            text, i = _bracket(source, i)
+            out.append(text)
+            continue
+        if c == '*':
+            out.append('\\*' if was_start else '*')
+        elif c == '^':
+            out.append('^' if was_start else '\\^')
+            at_start = was_start
+        elif c == '$':
+            at_end = i == n - 1 or source.startswith(('\\)', '\\|'), i + 1)
+            out.append('\\Z' if at_end else '\\$')
+        elif c == '.':
+            out.append('.')
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+def translate_ere(source):
+    """Translate a POSIX extended regular expression to Python syntax"""
+    out = []
+    i = 0
+    n = len(source)
+    while i < n:
+        c = source[i]
+        if c == '\\' and i + 1 < n:
+            d = source[i + 1]
+            out.append(COMMON_ESCAPES.get(d, '\\' + d if d.isdigit() else re.escape(d)))
+            i += 2
+            continue
+        if c == '[':
+            text, i = _bracket(source, i)
+            out.append(text)
+            continue
+        out.append('\\Z' if c == '$' else c)
+        i += 1
+    return ''.join(out)
+
+
+def posix_finditer(pattern, string):
+    """Matches of the compiled pattern in string, as sed and awk find them.
+
+    Python also reports an empty match right where the previous match
+    ended ('a*' on 'ab' matches 'a', then '' before 'b'); POSIX tools
+    skip it, so it is dropped here.
+    """
+    end = -1
+    for m in pattern.finditer(string):
+        if m.start() == m.end() == end:
+            continue
+        end = m.end()
+        yield m
+
+
+def substitute(pattern, repl, string, first=1, count=0):
+    """Replace matches of pattern in string, starting with the first-th.
+
+    repl(match) returns the replacement text; at most count matches are
+    replaced (all of them with 0). Returns (new string, replacements made).
+    """
+    pieces = []
+    last = 0
+    made = 0
+    for seen, m in enumerate(posix_finditer(pattern, string), 1):
+        if seen < first:
+            continue
+        pieces.append(string[last:m.start()])
+        pieces.append(repl(m))
+        last = m.end()
+        made += 1
+        if made == count:
+            break
+    if not made:
+        return string, 0
+    pieces.append(string[last:])
+    return ''.join(pieces), made
@@ -0,0 +1,694 @@
+# Sed Implementation (scripts compiled to an instruction list)
+import re
+
+from posix_regex import translate_bre, translate_ere, substitute
+
+
+class SedError(Exception):
+    """Raised for invalid scripts and unsupported commands"""
+
+
+# Commands taking no argument
+SIMPLE_COMMANDS = set('=dDgGhHlnNpPxz}')
+# Commands that may not have addresses
+NO_ADDRESS = set(':}')
+# Commands allowing at most one address
+ONE_ADDRESS = set('=aiqQr')
+
+
+class Command:
+    """One compiled sed command"""
+    __slots__ = ('index', 'name', 'addr1', 'addr2', 'negate', 'pattern', 'replacement',
+                 'count', 'print_', 'target', 'text', 'table', 'label', 'filename')
+
+    def __init__(self, index, name, addr1=None, addr2=None, negate=False):
+        self.index = index
+        self.name = name
+        self.addr1 = addr1
+        self.addr2 = addr2
+        self.negate = negate
+        self.target = None
+
+
+class _ScriptParser:
+    """Parses sed source into a flat list of Commands"""
+
+    def __init__(self, source, extended):
+        self.src = source
+        self.pos = 0
+        self.extended = extended
+        self.commands = []
+        self.blocks = []
+        self.labels = {}
+
+    def error(self, message):
+        raise SedError(f"-e expression #1, char {self.pos}: {message}")
+
+    def peek(self):
+        return self.src[self.pos] if self.pos < len(self.src) else ''
+
+    def skip_spaces(self):
+        while self.peek() in (' ', '\t') and self.peek():
+            self.pos += 1
+
+    def compile_regex(self, text, flags=0):
+        if text == '':
+            return None  # the empty regex reuses the last one applied
+        try:
+            source = translate_ere(text) if self.extended else translate_bre(text)
+            return re.compile(source, flags)
+        except re.error as e:
+            self.error(f"invalid regex: {e}")
+
+    def delimited(self, delim, what="`s' command"):
+        """Read up to an unescaped delim; '\\delim' stands for delim itself"""
+        out = []
+        while True:
+            c = self.peek()
+            if not c:
+                self.error(f"unterminated {what}")
+            self.pos += 1
+            if c == delim:
+                return ''.join(out)
+            if c == '\\':
+                nxt = self.peek()
+                self.pos += 1
+                if nxt == delim:
+                    out.append(delim)
+                elif nxt == 'n' and delim != 'n':
+                    out.append('\\n')
+                else:
+                    out.append('\\' + nxt)
+            elif c == '\n' and delim != '\n':
+                self.error(f"unterminated {what}")
+            else:
+                out.append(c)
+
+    def address(self):
+        c = self.peek()
+        if c.isdigit():
+            start = self.pos
+            while self.peek().isdigit():
+                self.pos += 1
+            number = int(self.src[start:self.pos])
+            if self.peek() == '~':
+                self.pos += 1
+                start = self.pos
+                while self.peek().isdigit():
+                    self.pos += 1
+                return ('step', number, int(self.src[start:self.pos] or 0))
+            return ('zero',) if number == 0 else ('line', number)
+        if c == '$':
+            self.pos += 1
+            return ('last',)
+        if c in ('/', '\\'):
+            self.pos += 1
+            if c == '\\':
+                c = self.peek()
+                self.pos += 1
+            text = self.delimited(c, 'address regex')
+            flags = 0
+            while self.peek() in ('I', 'M') and self.peek():
+                flags |= re.I if self.peek() == 'I' else re.M
+                self.pos += 1
+            return ('regex', self.compile_regex(text, flags))
+        return None
+
+    def second_address(self):
+        c = self.peek()
+        if c in ('+', '~'):
+            self.pos += 1
+            start = self.pos
+            while self.peek().isdigit():
+                self.pos += 1
+            if start == self.pos:
+                self.error("expected a number")
+            return ('plus' if c == '+' else 'mult', int(self.src[start:self.pos]))
+        addr = self.address()
+        if addr is None:
+            self.error("unexpected `,'")
+        if addr[0] == 'zero':
+            self.error("invalid usage of line address 0")
+        return addr
+
+    def text_argument(self):
+        """Text of a, i and c: the one-line GNU form or the classic backslash-newline form"""
+        self.skip_spaces()
+        if self.peek() == '\\':
+            self.pos += 1
+            if self.peek() == '\n':
+                self.pos += 1
+            else:
+                self.skip_spaces()
+        out = []
+        while self.pos < len(self.src):
+            c = self.src[self.pos]
+            self.pos += 1
+            if c == '\\' and self.pos < len(self.src):
+                out.append(self.src[self.pos])
+                self.pos += 1
+            elif c == '\n':
+                break
+            else:
+                out.append(c)
+        return ''.join(out)
+
+    def word_argument(self, stop=';\n'):
+        """Label or file name: the rest of the command up to a terminator"""
+        self.skip_spaces()
+        start = self.pos
+        while self.peek() and self.peek() not in stop:
+            self.pos += 1
+        return self.src[start:self.pos].rstrip()
+
+    def end_of_command(self):
+        self.skip_spaces()
+        c = self.peek()
+        if c in (';', '\n'):
+            self.pos += 1
+        elif c == '#':
+            while self.peek() not in ('\n', ''):
+                self.pos += 1
+        elif c not in ('}', ''):
+            self.error("extra characters after command")
+
+    def parse(self):
+        while True:
+            while self.peek() in (' ', '\t', '\n', ';') and self.peek():
+                self.pos += 1
+            if not self.peek():
+                break
+            if self.peek() == '#':
+                while self.peek() not in ('\n', ''):
+                    self.pos += 1
+                continue
+            self.command()
+        if self.blocks:
+            self.error("unmatched `{'")
+        for command in self.commands:
+            if command.name in 'btT':
+                if command.label and command.label not in self.labels:
+                    raise SedError(f"can't find label for jump to `{command.label}'")
+                command.target = self.labels[command.label] if command.label else len(self.commands)
+        return self.commands
+
+    def command(self):
+        addr1 = self.address()
+        addr2 = None
+        if addr1 is not None:
+            self.skip_spaces()
+            if self.peek() == ',':
+                self.pos += 1
+                self.skip_spaces()
+                addr2 = self.second_address()
+        if addr1 is not None and addr1[0] == 'zero' and (addr2 is None or addr2[0] != 'regex'):
+            self.error("invalid usage of line address 0")
+        self.skip_spaces()
+        negate = False
+        while self.peek() == '!':
+            negate = True
+            self.pos += 1
+            self.skip_spaces()
+        name = self.peek()
+        if not name:
+            self.error("missing command")
+        self.pos += 1
+        if name in NO_ADDRESS and addr1 is not None:
+            self.error(": doesn't want any addresses" if name == ':' else "unexpected `}'")
+        if name in ONE_ADDRESS and addr2 is not None:
+            self.error("command only uses one address")
+
+        command = Command(len(self.commands), name, addr1, addr2, negate)
+        if name == '{':
+            self.blocks.append(command)
+            self.commands.append(command)
+            return
+        if name == '}':
+            if not self.blocks:
+                self.error("unexpected `}'")
+            # The opening brace jumps past its block when its address does not match
+            self.blocks.pop().target = len(self.commands) + 1
+        elif name in SIMPLE_COMMANDS:
+            pass
+        elif name == 's':
+            self.substitute(command)
+        elif name == 'y':
+            self.transliterate(command)
+        elif name in 'aic':
+            command.text = self.text_argument()
+            self.commands.append(command)
+            return
+        elif name == ':':
+            label = self.word_argument()
+            if not label:
+                self.error("\":\" lacks a label")
+            self.labels[label] = len(self.commands)
+        elif name in 'btT':
+            command.label = self.word_argument(';\n}')
+        elif name in 'qQ':
+            # An exit code may follow; the shell has no exit status to set
+            self.skip_spaces()
+            while self.peek().isdigit():
+                self.pos += 1
+        elif name in 'rw':
+            command.filename = self.word_argument('\n')
+            if not command.filename:
+                self.error("missing filename in r/R/w/W commands")
+            self.commands.append(command)
+            return
+        else:
+            self.error(f"unknown command: `{name}'")
+        self.commands.append(command)
+        self.end_of_command()
+
+    def substitute(self, command):
+        delim = self.peek()
+        if not delim or delim in '\n\\':
+            self.error("unterminated `s' command")
+        self.pos += 1
+        pattern = self.delimited(delim)
+        replacement = self.delimited(delim)
+        command.count = 1
+        command.print_ = False
+        command.filename = None
+        global_ = False
+        flags = 0
+        while True:
+            c = self.peek()
+            if not c:
+                break
+            if c == 'g':
+                global_ = True
+            elif c == 'p':
+                command.print_ = True
+            elif c in 'iI':
+                flags |= re.I
+            elif c in 'mM':
+                flags |= re.M
+            elif c.isdigit():
+                start = self.pos
+                while self.peek().isdigit():
+                    self.pos += 1
+                command.count = int(self.src[start:self.pos])
+                if command.count == 0:
+                    self.error("number option to `s' command may not be zero")
+                continue
+            elif c == 'w':
+                self.pos += 1
+                command.filename = self.word_argument('\n')
+                break
+            elif c == 'e':
+                self.error("the `e' flag is not supported")
+            else:
+                break
+            self.pos += 1
+        # count 0 means every match from the count-th on
+        command.target = 0 if global_ else command.count
+        command.pattern = self.compile_regex(pattern, flags)
+        command.replacement = _parse_replacement(replacement)
+
+    def transliterate(self, command):
+        delim = self.peek()
+        self.pos += 1
+        source = _unescape_y(self.delimited(delim, "`y' command"))
+        dest = _unescape_y(self.delimited(delim, "`y' command"))
+        if len(source) != len(dest):
+            self.error("strings for `y' command are different lengths")
+        command.table = str.maketrans(source, dest)
+
+
+def _unescape_y(text):
+    return re.sub(r'\\(.)', lambda m: {'n': '\n', 't': '\t'}.get(m.group(1), m.group(1)), text)
+
+
+# GNU case conversion escapes in replacements: \U \L until \E, \u \l for one character
+CASE_ESCAPES = set('ULEul')
+
+
+def _parse_replacement(text):
+    """Compile an s/// replacement into a function of the match.
+
+    The text is split into literal strings, group numbers (0 for &) and
+    case conversion markers, so nothing is re-parsed per substitution.
+    """
+    pieces = []
+    literal = []
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == '\\' and i + 1 < len(text):
+            d = text[i + 1]
+            i += 2
+            if d.isdigit() or d in CASE_ESCAPES:
+                if literal:
+                    pieces.append(''.join(literal))
+                    literal = []
+                pieces.append(int(d) if d.isdigit() else ('case', d))
+            else:
+                literal.append({'n': '\n', 't': '\t'}.get(d, d))
+            continue
+        if c == '&':
+            if literal:
+                pieces.append(''.join(literal))
+                literal = []
+            pieces.append(0)
+        else:
+            literal.append(c)
+        i += 1
+    if literal:
+        pieces.append(''.join(literal))
+    if all(isinstance(p, str) for p in pieces):
+        constant = ''.join(pieces)
+        return lambda m: constant
+    if not any(isinstance(p, tuple) for p in pieces):
+        def expand(m):
+            return ''.join(p if isinstance(p, str) else (m.group(p) or '') for p in pieces)
+        return expand
+
+    def expand_with_case(m):
+        out = []
+        mode = None
+        once = None
+        for p in pieces:
+            if isinstance(p, tuple):
+                if p[1] in 'ul':
+                    once = p[1]
+                else:
+                    mode = None if p[1] == 'E' else p[1]
+                    once = None
+                continue
+            s = p if isinstance(p, str) else (m.group(p) or '')
+            if mode == 'U':
+                s = s.upper()
+            elif mode == 'L':
+                s = s.lower()
+            if once and s:
+                s = (s[0].upper() if once == 'u' else s[0].lower()) + s[1:]
+                once = None
+            out.append(s)
+        return ''.join(out)
+    return expand_with_case
+
+
+class _Reader:
+    """Input lines with one line of lookahead, so '$' can be recognised"""
+
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.line_number = 0
+        self.missing_newline = False
+        self.pending = self._fetch()
+
+    def _fetch(self):
+        return next(self.lines, None)
+
+    @property
+    def is_last(self):
+        return self.pending is None
+
+    def read(self):
+        line = self.pending
+        if line is None:
+            return None
+        self.pending = self._fetch()
+        self.line_number += 1
+        self.missing_newline = not line.endswith('\n')
+        return line if self.missing_newline else line[:-1]
+
+
+class _Output:
+    """Writes lines, holding back the newline after a last input line that had none"""
+
+    def __init__(self, write):
+        self.write = write
+        self.owed_newline = False
+
+    def emit(self, text, newline=True):
+        if self.owed_newline:
+            self.write('\n')
+        self.write(text)
+        if newline:
+            self.write('\n')
+        self.owed_newline = not newline
+
+
+class State:
+    """What persists between cycles: hold space, open ranges, the last regex"""
+
+    def __init__(self):
+        self.hold = ''
+        self.ranges = {}
+        self.zero_ranges_started = set()
+        self.last_regex = None
+        self.quit = False
+        self.line_offset = 0
+
+
+class Script:
+    """A compiled sed script"""
+
+    def __init__(self, source, extended=False, quiet=False):
+        self.commands = _ScriptParser(source, extended).parse()
+        self.quiet = quiet
+
+    # ---------------- Addresses ----------------
+    def _regex(self, pattern, state):
+        if pattern is None:
+            if state.last_regex is None:
+                raise SedError("no previous regular expression")
+            return state.last_regex
+        state.last_regex = pattern
+        return pattern
+
+    def _match(self, addr, ps, reader, state):
+        kind = addr[0]
+        if kind == 'line':
+            return reader.line_number + state.line_offset == addr[1]
+        if kind == 'regex':
+            return self._regex(addr[1], state).search(ps) is not None
+        if kind == 'last':
+            return reader.is_last
+        if kind == 'step':
+            line = reader.line_number + state.line_offset
+            first, step = addr[1], addr[2]
+            return line == first if step <= 0 else line >= first and (line - first) % step == 0
+        return False
+
+    def _selected(self, command, ps, reader, state):
+        if command.addr1 is None:
+            return True
+        if command.addr2 is None:
+            return self._match(command.addr1, ps, reader, state) != command.negate
+        return self._in_range(command, ps, reader, state) != command.negate
+
+    def _in_range(self, command, ps, reader, state):
+        line = reader.line_number + state.line_offset
+        end = state.ranges.get(command.index)
+        addr2 = command.addr2
+        if end is not None:
+            kind = end[0]
+            if kind == 'line':
+                if line >= end[1]:
+                    del state.ranges[command.index]
+                    return line <= end[1]
+                return True
+            if kind == 'mult':
+                finished = line % end[1] == 0
+            elif kind == 'last':
+                finished = reader.is_last
+            else:
+                finished = self._regex(addr2[1], state).search(ps) is not None
+            if finished:
+                del state.ranges[command.index]
+            return True
+
+        if command.addr1[0] == 'zero':
+            # 0,/re/ is open before the first line, so line 1 can already close it
+            if command.index in state.zero_ranges_started:
+                return False
+            state.zero_ranges_started.add(command.index)
+            if self._regex(addr2[1], state).search(ps) is None:
+                state.ranges[command.index] = ('regex',)
+            return True
+        if not self._match(command.addr1, ps, reader, state):
+            return False
+        kind = addr2[0]
+        if kind == 'line':
+            if addr2[1] > line:
+                state.ranges[command.index] = ('line', addr2[1])
+        elif kind == 'plus':
+            if addr2[1] > 0:
+                state.ranges[command.index] = ('line', line + addr2[1])
+        elif kind == 'mult':
+            if addr2[1] > 0 and line % addr2[1]:
+                state.ranges[command.index] = ('mult', addr2[1])
+        elif kind == 'last':
+            if not reader.is_last:
+                state.ranges[command.index] = ('last',)
+        elif kind == 'step':
+            state.ranges[command.index] = ('line', addr2[1]) if addr2[1] > line else None
+            if state.ranges[command.index] is None:
+                del state.ranges[command.index]
+        else:
+            state.ranges[command.index] = ('regex',)
+        return True
+
+    # ---------------- Execution ----------------
+    def _substitute(self, command, ps, state):
+        # target is 0 with g (the count-th match and all after it), else count
+        return substitute(self._regex(command.pattern, state), command.replacement, ps,
+                          command.count, 1 if command.target else 0)
+
+    def run(self, lines, write, state=None, read_file=None, files=None):
+        """Run the script over an iterable of input lines.
+
+        write(text) receives the output. read_file(name) returns the contents
+        of a file for 'r', and files collects 'w' output by file name. Pass
+        the same State to several runs to carry hold space and line numbers
+        over. Returns the State.
+        """
+        state = state or State()
+        reader = _Reader(lines)
+        out = _Output(write)
+        commands = self.commands
+        total = len(commands)
+        restart = False
+        ps = ''
+        while not state.quit:
+            if not restart:
+                line = reader.read()
+                if line is None:
+                    break
+                ps = line
+            restart = False
+            substituted = False
+            appended = []
+            autoprint = not self.quiet
+            pc = 0
+            while pc < total:
+                command = commands[pc]
+                pc += 1
+                if not self._selected(command, ps, reader, state):
+                    if command.name == '{':
+                        pc = command.target
+                    continue
+                name = command.name
+                if name == 's':
+                    ps, made = self._substitute(command, ps, state)
+                    if made:
+                        substituted = True
+                        if command.print_:
+                            out.emit(ps, not reader.missing_newline)
+                        if command.filename is not None and files is not None:
+                            files.setdefault(command.filename, []).append(ps + '\n')
+                elif name in '{}:':
+                    pass
+                elif name == 'p':
+                    out.emit(ps, not reader.missing_newline)
+                elif name == 'd':
+                    autoprint = False
+                    break
+                elif name == 'D':
+                    autoprint = False
+                    if '\n' in ps:
+                        ps = ps[ps.index('\n') + 1:]
+                        restart = True
+                    break
+                elif name in 'nN':
+                    if reader.is_last:
+                        # GNU behaviour: print the pattern space and stop
+                        state.quit = True
+                        break
+                    if name == 'n':
+                        if not self.quiet:
+                            out.emit(ps)
+                        self._flush(appended, out)
+                        ps = reader.read()
+                    else:
+                        self._flush(appended, out)
+                        ps = ps + '\n' + reader.read()
+                elif name == 'P':
+                    out.emit(ps.split('\n', 1)[0])
+                elif name == 'h':
+                    state.hold = ps
+                elif name == 'H':
+                    state.hold = state.hold + '\n' + ps
+                elif name == 'g':
+                    ps = state.hold
+                elif name == 'G':
+                    ps = ps + '\n' + state.hold
+                elif name == 'x':
+                    ps, state.hold = state.hold, ps
+                elif name == 'z':
+                    ps = ''
+                elif name == 'y':
+                    ps = ps.translate(command.table)
+                elif name == '=':
+                    out.emit(str(reader.line_number + state.line_offset))
+                elif name == 'i':
+                    out.emit(command.text)
+                elif name == 'a':
+                    appended.append(command.text + '\n')
+                elif name == 'r':
+                    if read_file is not None:
+                        content = read_file(command.filename)
+                        if content:
+                            appended.append(content if content.endswith('\n') else content + '\n')
+                elif name == 'w':
+                    if files is not None:
+                        files.setdefault(command.filename, []).append(ps + '\n')
+                elif name == 'c':
+                    # In a range the text replaces the whole range, so print it at the end
+                    if command.addr2 is None or command.negate or command.index not in state.ranges:
+                        out.emit(command.text)
+                    autoprint = False
+                    break
+                elif name == 'l':
+                    out.emit(_unambiguous(ps))
+                elif name == 'b':
+                    pc = command.target
+                elif name == 't':
+                    if substituted:
+                        substituted = False
+                        pc = command.target
+                elif name == 'T':
+                    if not substituted:
+                        pc = command.target
+                    else:
+                        substituted = False
+                elif name == 'q':
+                    state.quit = True
+                    break
+                elif name == 'Q':
+                    state.quit = True
+                    autoprint = False
+                    appended = []
+                    break
+            if autoprint:
+                out.emit(ps, not reader.missing_newline)
+            self._flush(appended, out)
+        state.line_offset += reader.line_number
+        return state
+
+    @staticmethod
+    def _flush(appended, out):
+        for text in appended:
+            out.emit(text[:-1])
+        appended.clear()
+
+
+def _unambiguous(text, width=70):
+    """Pattern space as printed by 'l': escapes visible and lines folded, ending with $"""
+    escapes = {'\\': '\\\\', '\a': '\\a', '\b': '\\b', '\f': '\\f', '\n': '\\n',
+               '\r': '\\r', '\t': '\\t', '\v': '\\v'}
+    chars = [escapes.get(c) or (c if c.isprintable() else ''.join(f'\\{b:03o}' for b in c.encode('utf-8')))
+             for c in text]
+    lines = []
+    current = ''
+    for piece in chars:
+        if len(current) + len(piece) > width - 1:
+            lines.append(current + '\\')
+            current = ''
+        current += piece
+    lines.append(current + '$')
+    return '\n'.join(lines)
@@ -0,0 +1,307 @@
+# Snapshot Store Implementation (content-addressed, deduplicated)
+import os
+import re
+import json
+import stat
+import time
+import zlib
+import shutil
+import hashlib
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Directory (relative to the snapshotted tree) holding the store
+STORE_DIR = '.snapshots'
+# Files are split into chunks of this size; each distinct chunk is stored once
+CHUNK_SIZE = 1024 * 1024
+MAX_SNAPSHOT_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+# Stored chunks start with a tag byte saying how the rest is encoded
+RAW_TAG = b'R'
+ZLIB_TAG = b'Z'
+
+SNAPSHOT_NAME = re.compile(r'^[A-Za-z0-9._-]+$')
+
+
+class SnapshotError(Exception):
+    """Raised for invalid snapshot operations (unknown name, bad name, ...)"""
+
+
+class SnapshotStore:
+    """Point-in-time snapshots of a directory tree, stored inside the tree.
+
+    Files are cut into fixed-size chunks stored under objects/ by their SHA-256,
+    so identical data is kept once across files and snapshots. A manifest per
+    snapshot records each file's chunk list and metadata. When creating a
+    snapshot, files whose size and mtime match the previous snapshot reuse its
+    chunk list without being read, so unchanged trees snapshot in one stat pass.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.store = os.path.join(self.root, STORE_DIR)
+        self.objects = os.path.join(self.store, 'objects')
+        self.manifests = os.path.join(self.store, 'manifests')
+        # Chunks written (or being written) by this store, shared by worker threads
+        self._known = set()
+        self._lock = threading.Lock()
+
+    # ---------------- Objects ----------------
+    def _object_path(self, digest):
+        return os.path.join(self.objects, digest[:2], digest[2:])
+
+    def _put_chunk(self, data):
+        """Store a chunk if not already present. Returns (digest, bytes written)."""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if digest in self._known:
+                return digest, 0
+            self._known.add(digest)
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+        packed = zlib.compress(data, 1)
+        payload = ZLIB_TAG + packed if len(packed) < len(data) else RAW_TAG + data
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp, path)
+        return digest, len(payload)
+
+    def _get_chunk(self, digest):
+        with open(self._object_path(digest), 'rb') as f:
+            payload = f.read()
+        return zlib.decompress(payload[1:]) if payload[:1] == ZLIB_TAG else payload[1:]
+
+    def _store_file(self, real_path):
+        """Chunk and store one file. Returns (chunk digests, bytes written)."""
+        chunks = []
+        written = 0
+        with open(real_path, 'rb') as f:
+            while True:
+                data = f.read(CHUNK_SIZE)
+                if not data:
+                    break
+                digest, n = self._put_chunk(data)
+                chunks.append(digest)
+                written += n
+        return chunks, written
+
+    def _file_chunks(self, real_path):
+        """Chunk digests of a file without storing anything"""
+        chunks = []
+        with open(real_path, 'rb') as f:
+            for data in iter(lambda: f.read(CHUNK_SIZE), b''):
+                chunks.append(hashlib.sha256(data).hexdigest())
+        return chunks
+
+    # ---------------- Manifests ----------------
+    def _manifest_path(self, name):
+        return os.path.join(self.manifests, name + '.json')
+
+    def load(self, name):
+        """Load the manifest of snapshot name"""
+        try:
+            with open(self._manifest_path(name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise SnapshotError(f"no such snapshot: {name}")
+
+    def names(self):
+        """Snapshot names, oldest first"""
+        if not os.path.isdir(self.manifests):
+            return []
+        manifests = [n[:-5] for n in os.listdir(self.manifests) if n.endswith('.json')]
+        return sorted(manifests, key=lambda n: os.path.getmtime(self._manifest_path(n)))
+
+    def _scan(self):
+        """Walk the tree. Returns (dirs, symlinks, files) keyed by relative path."""
+        dirs, links, files = {}, {}, {}
+        for root, subdirs, names in os.walk(self.root):
+            rel_root = os.path.relpath(root, self.root)
+            if rel_root == '.':
+                subdirs[:] = [d for d in subdirs if d != STORE_DIR]
+                rel_root = ''
+            for name in list(subdirs):
+                rel = (rel_root + '/' + name).lstrip('/')
+                full = os.path.join(root, name)
+                if os.path.islink(full):
+                    subdirs.remove(name)
+                    links[rel] = os.readlink(full)
+                else:
+                    dirs[rel] = stat.S_IMODE(os.lstat(full).st_mode)
+            for name in names:
+                rel = (rel_root + '/' + name).lstrip('/')
+                full = os.path.join(root, name)
+                st = os.lstat(full)
+                if stat.S_ISLNK(st.st_mode):
+                    links[rel] = os.readlink(full)
+                elif stat.S_ISREG(st.st_mode):
+                    files[rel] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                                  'mode': stat.S_IMODE(st.st_mode)}
+        return dirs, links, files
+
+    @staticmethod
+    def _unchanged(entry, previous):
+        return (previous is not None and previous['size'] == entry['size']
+                and previous['mtime_ns'] == entry['mtime_ns'])
+
+    # ---------------- Operations ----------------
+    def create(self, name=None):
+        """Take a snapshot of the tree. Returns its manifest."""
+        if name is None:
+            name = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        if not SNAPSHOT_NAME.match(name):
+            raise SnapshotError(f"invalid snapshot name: {name}")
+        if os.path.exists(self._manifest_path(name)):
+            raise SnapshotError(f"snapshot already exists: {name}")
+
+        start = time.monotonic()
+        existing = self.names()
+        previous = self.load(existing[-1])['files'] if existing else {}
+        dirs, links, files = self._scan()
+
+        to_store = []
+        for rel, entry in files.items():
+            prev = previous.get(rel)
+            if self._unchanged(entry, prev):
+                entry['chunks'] = prev['chunks']
+            else:
+                to_store.append(rel)
+
+        written = 0
+        with ThreadPoolExecutor(max_workers=MAX_SNAPSHOT_WORKERS) as pool:
+            results = pool.map(lambda rel: self._store_file(os.path.join(self.root, rel)), to_store)
+            for rel, (chunks, n) in zip(to_store, results):
+                files[rel]['chunks'] = chunks
+                written += n
+
+        manifest = {
+            'name': name,
+            'created': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'dirs': dirs,
+            'symlinks': links,
+            'files': files,
+            'stored_bytes': written,
+            'read_files': len(to_store),
+            'seconds': round(time.monotonic() - start, 3),
+        }
+        os.makedirs(self.manifests, exist_ok=True)
+        tmp = self._manifest_path(name) + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, separators=(',', ':'))
+        os.replace(tmp, self._manifest_path(name))
+        return manifest
+
+    def restore(self, name):
+        """Make the tree match snapshot name. Returns (written, removed) file counts."""
+        manifest = self.load(name)
+        dirs, links, files = self._scan()
+
+        removed = 0
+        # Remove what the snapshot doesn't have, deepest paths first
+        for rel in sorted(set(files) - set(manifest['files']), reverse=True):
+            os.remove(os.path.join(self.root, rel))
+            removed += 1
+        for rel in sorted(set(links) - set(manifest['symlinks']), reverse=True):
+            os.remove(os.path.join(self.root, rel))
+            removed += 1
+        for rel in sorted(set(dirs) - set(manifest['dirs']), reverse=True):
+            shutil.rmtree(os.path.join(self.root, rel), ignore_errors=True)
+            removed += 1
+
+        for rel in sorted(manifest['dirs']):
+            path = os.path.join(self.root, rel)
+            if os.path.lexists(path) and not os.path.isdir(path):
+                os.remove(path)
+            os.makedirs(path, exist_ok=True)
+
+        written = 0
+        for rel, entry in manifest['files'].items():
+            if self._unchanged(entry, files.get(rel)):
+                continue
+            path = os.path.join(self.root, rel)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.restore")
+            with open(tmp, 'wb') as f:
+                for digest in entry['chunks']:
+                    f.write(self._get_chunk(digest))
+            os.chmod(tmp, entry['mode'])
+            os.utime(tmp, ns=(entry['mtime_ns'], entry['mtime_ns']))
+            os.replace(tmp, path)
+            written += 1
+
+        for rel, target in manifest['symlinks'].items():
+            path = os.path.join(self.root, rel)
+            if os.path.islink(path) and os.readlink(path) == target:
+                continue
+            if os.path.lexists(path):
+                if os.path.isdir(path) and not os.path.islink(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            os.symlink(target, path)
+            written += 1
+
+        for rel, mode in manifest['dirs'].items():
+            os.chmod(os.path.join(self.root, rel), mode)
+        return written, removed
+
+    def diff(self, name, other=None):
+        """Compare snapshot name with snapshot other, or with the current tree.
+
+        Returns a sorted list of (status, path) with status 'A', 'D' or 'M'.
+        """
+        old = self.load(name)
+        old_files = dict(old['files'])
+        old_files.update({rel: {'link': t} for rel, t in old['symlinks'].items()})
+        if other is not None:
+            new = self.load(other)
+            new_files = dict(new['files'])
+            new_files.update({rel: {'link': t} for rel, t in new['symlinks'].items()})
+        else:
+            _, links, new_files = self._scan()
+            new_files.update({rel: {'link': t} for rel, t in links.items()})
+
+        changes = []
+        for rel in old_files.keys() - new_files.keys():
+            changes.append(('D', rel))
+        for rel in new_files.keys() - old_files.keys():
+            changes.append(('A', rel))
+        for rel in old_files.keys() & new_files.keys():
+            a, b = old_files[rel], new_files[rel]
+            if 'link' in a or 'link' in b:
+                if a.get('link') != b.get('link'):
+                    changes.append(('M', rel))
+            elif self._unchanged(b, a):
+                continue
+            elif a['size'] != b['size']:
+                changes.append(('M', rel))
+            else:
+                chunks = b.get('chunks') or self._file_chunks(os.path.join(self.root, rel))
+                if chunks != a['chunks']:
+                    changes.append(('M', rel))
+        return sorted(changes, key=lambda c: c[1])
+
+    def delete(self, name):
+        """Delete snapshot name and any chunks no other snapshot uses. Returns bytes freed."""
+        self.load(name)
+        os.remove(self._manifest_path(name))
+        referenced = set()
+        for other in self.names():
+            for entry in self.load(other)['files'].values():
+                referenced.update(entry['chunks'])
+        freed = 0
+        if os.path.isdir(self.objects):
+            for prefix in os.listdir(self.objects):
+                folder = os.path.join(self.objects, prefix)
+                for rest in os.listdir(folder):
+                    if prefix + rest not in referenced:
+                        path = os.path.join(folder, rest)
+                        freed += os.path.getsize(path)
+                        os.remove(path)
+        return freed
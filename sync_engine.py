@@ -0,0 +1,212 @@
+# Incremental Sync Implementation (rsync-like)
+import os
+import hashlib
+import shutil
+import time
+
+from copy_engine import CopyEngine
+
+
+# Block size used when comparing an existing destination file against its source
+SYNC_BLOCK_SIZE = 128 * 1024
+# Files smaller than this are simply recopied instead of compared block by block
+DELTA_THRESHOLD = 4 * SYNC_BLOCK_SIZE
+# Suffix of the temporary file a new file is written to before being renamed
+PARTIAL_SUFFIX = '.partial'
+
+
+class SyncStats:
+    """Totals reported at the end of a sync"""
+
+    def __init__(self):
+        self.files = 0
+        self.transferred = 0
+        self.up_to_date = 0
+        self.deleted = 0
+        self.literal_bytes = 0
+        self.matched_bytes = 0
+        self.start = time.monotonic()
+        self.changed = []
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.start
+
+
+def partial_path(dst):
+    """Path of the temporary file used while dst is being transferred"""
+    head, tail = os.path.split(dst)
+    return os.path.join(head, f".{tail}{PARTIAL_SUFFIX}")
+
+
+def file_digest(path, block_size=SYNC_BLOCK_SIZE):
+    """MD5 of a file's contents, read in fixed-size blocks"""
+    h = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.digest()
+
+
+class SyncEngine:
+    """Brings a destination tree up to date with a source tree.
+
+    Files whose size and modification time match are skipped (or, with
+    checksum=True, whose contents hash the same). Large changed files are
+    compared block by block and only differing blocks are rewritten in place,
+    so an interrupted sync picks up where it stopped. New files are written to
+    a hidden '.NAME.partial' file and renamed into place when complete; a
+    partial file left by an interrupted run is reused the same way.
+    """
+
+    def __init__(self, checksum=False, delete=False, dry_run=False,
+                 block_size=SYNC_BLOCK_SIZE, reflink='auto'):
+        self.checksum = checksum
+        self.delete = delete
+        self.dry_run = dry_run
+        self.block_size = block_size
+        self.copier = CopyEngine(reflink=reflink)
+        self.stats = SyncStats()
+
+    # ---------------- Decisions ----------------
+    def _up_to_date(self, src, dst, src_stat):
+        try:
+            dst_stat = os.stat(dst)
+        except OSError:
+            return False
+        if dst_stat.st_size != src_stat.st_size:
+            return False
+        if self.checksum:
+            return file_digest(src, self.block_size) == file_digest(dst, self.block_size)
+        # Whole-second comparison, as filesystems differ in timestamp precision
+        return int(dst_stat.st_mtime) == int(src_stat.st_mtime)
+
+    # ---------------- Transfers ----------------
+    def _delta_update(self, src, dst, size):
+        """Rewrite only the blocks of dst that differ from src, then fix its length"""
+        block_size = self.block_size
+        with open(src, 'rb') as fsrc, open(dst, 'r+b') as fdst:
+            offset = 0
+            while offset < size:
+                block = fsrc.read(block_size)
+                if not block:
+                    break
+                old = fdst.read(len(block))
+                if old == block:
+                    self.stats.matched_bytes += len(block)
+                else:
+                    fdst.seek(offset)
+                    fdst.write(block)
+                    self.stats.literal_bytes += len(block)
+                offset += len(block)
+            fdst.truncate(offset)
+
+    def _transfer_new(self, src, dst, size):
+        partial = partial_path(dst)
+        if os.path.isfile(partial) and size >= DELTA_THRESHOLD:
+            # Resume an interrupted transfer, keeping the blocks already written
+            self._delta_update(src, partial, size)
+        else:
+            self.copier.copy_file(src, partial)
+            self.stats.literal_bytes += size
+        shutil.copystat(src, partial)
+        os.replace(partial, dst)
+
+    def sync_file(self, src, dst):
+        """Bring the single file dst up to date with src. Returns True if anything changed."""
+        self.stats.files += 1
+        if os.path.islink(src):
+            target = os.readlink(src)
+            if os.path.islink(dst) and os.readlink(dst) == target:
+                self.stats.up_to_date += 1
+                return False
+            self.stats.transferred += 1
+            if not self.dry_run:
+                if os.path.lexists(dst):
+                    os.remove(dst)
+                os.symlink(target, dst)
+            return True
+
+        src_stat = os.stat(src)
+        if self._up_to_date(src, dst, src_stat):
+            self.stats.up_to_date += 1
+            if self.checksum and not self.dry_run:
+                shutil.copystat(src, dst)
+            return False
+
+        self.stats.transferred += 1
+        if self.dry_run:
+            return True
+        size = src_stat.st_size
+        if os.path.isfile(dst) and not os.path.islink(dst) and size >= DELTA_THRESHOLD:
+            self._delta_update(src, dst, size)
+            shutil.copystat(src, dst)
+        else:
+            if os.path.isdir(dst) and not os.path.islink(dst):
+                shutil.rmtree(dst)
+            self._transfer_new(src, dst, size)
+        return True
+
+    def _remove(self, path, display):
+        self.stats.deleted += 1
+        self.stats.changed.append(f"deleting {display}")
+        if self.dry_run:
+            return
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+    def sync_tree(self, src, dst):
+        """Bring the directory dst up to date with the directory src.
+
+        Returns a list of (path, exception) pairs for entries that failed.
+        """
+        errors = []
+        synced_dirs = []
+        for root, dirs, files in os.walk(src):
+            rel = os.path.relpath(root, src)
+            target_root = dst if rel == '.' else os.path.join(dst, rel)
+            if not os.path.isdir(target_root):
+                if not self.dry_run:
+                    try:
+                        if os.path.lexists(target_root):
+                            os.remove(target_root)
+                        os.makedirs(target_root)
+                    except OSError as e:
+                        errors.append((root, e))
+                        dirs[:] = []
+                        continue
+            synced_dirs.append((root, target_root))
+
+            entries = []
+            for name in list(dirs):
+                if os.path.islink(os.path.join(root, name)):
+                    dirs.remove(name)
+                    entries.append(name)
+            entries.extend(files)
+            for name in sorted(entries):
+                path = os.path.join(root, name)
+                try:
+                    if self.sync_file(path, os.path.join(target_root, name)):
+                        self.stats.changed.append(os.path.join(rel, name) if rel != '.' else name)
+                except OSError as e:
+                    errors.append((path, e))
+
+            if self.delete and os.path.isdir(target_root):
+                wanted = set(entries) | set(dirs)
+                for name in os.listdir(target_root):
+                    if name not in wanted and not (name.startswith('.') and name.endswith(PARTIAL_SUFFIX)):
+                        try:
+                            self._remove(os.path.join(target_root, name),
+                                         name if rel == '.' else os.path.join(rel, name))
+                        except OSError as e:
+                            errors.append((os.path.join(target_root, name), e))
+
+        if not self.dry_run:
+            for root, target_root in reversed(synced_dirs):
+                try:
+                    shutil.copystat(root, target_root)
+                except OSError as e:
+                    errors.append((root, e))
+        return errors
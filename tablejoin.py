@@ -0,0 +1,118 @@
+# Relational Join Implementation (sort-merge with a hash-join fallback)
+
+
+class UnsortedInput(Exception):
+    """Raised by merge_join when an input is not sorted on its join key"""
+
+    def __init__(self, side):
+        super().__init__(f"file {side} is not in sorted order")
+        self.side = side
+
+
+def split_fields(line, separator=None):
+    """Fields of a line: split on separator, or on runs of blanks when it is None"""
+    return line.split(separator) if separator is not None else line.split()
+
+
+def keyed(lines, field, separator=None, ignore_case=False):
+    """Turn lines into (key, fields) records, splitting each line once"""
+    for line in lines:
+        line = line.rstrip('\n')
+        fields = split_fields(line, separator)
+        key = fields[field] if field < len(fields) else ''
+        yield (key.lower() if ignore_case else key), fields
+
+
+def _groups(records, side):
+    """Runs of records with equal keys, as (key, [fields, ...]); checks the input is sorted"""
+    key = None
+    group = []
+    for record_key, fields in records:
+        if group and record_key == key:
+            group.append(fields)
+            continue
+        if group:
+            if record_key < key:
+                raise UnsortedInput(side)
+            yield key, group
+        key, group = record_key, [fields]
+    if group:
+        yield key, group
+
+
+def merge_join(left, right):
+    """Join two record streams sorted on their keys.
+
+    Yields (left_fields, right_fields) for every matching pair, with None on
+    the side that has no match. Only one run of equal keys per input is held
+    in memory. Raises UnsortedInput as soon as either input goes out of order.
+    """
+    left_groups = _groups(left, 1)
+    right_groups = _groups(right, 2)
+    a = next(left_groups, None)
+    b = next(right_groups, None)
+    while a is not None and b is not None:
+        if a[0] < b[0]:
+            for fields in a[1]:
+                yield fields, None
+            a = next(left_groups, None)
+        elif a[0] > b[0]:
+            for fields in b[1]:
+                yield None, fields
+            b = next(right_groups, None)
+        else:
+            for left_fields in a[1]:
+                for right_fields in b[1]:
+                    yield left_fields, right_fields
+            a = next(left_groups, None)
+            b = next(right_groups, None)
+    while a is not None:
+        for fields in a[1]:
+            yield fields, None
+        a = next(left_groups, None)
+    while b is not None:
+        for fields in b[1]:
+            yield None, fields
+        b = next(right_groups, None)
+
+
+def hash_join(build, probe, build_is_left=True):
+    """Join unsorted record streams by hashing build and streaming probe past it.
+
+    Pass the smaller input as build: only it is held in memory. Pairs come
+    out in probe order; unmatched build records follow at the end. Yields
+    (left_fields, right_fields) like merge_join.
+    """
+    table = {}
+    for key, fields in build:
+        table.setdefault(key, []).append(fields)
+    matched = set()
+    for key, fields in probe:
+        partners = table.get(key)
+        if partners is None:
+            yield (None, fields) if build_is_left else (fields, None)
+            continue
+        matched.add(key)
+        for other in partners:
+            yield (other, fields) if build_is_left else (fields, other)
+    for key, group in table.items():
+        if key not in matched:
+            for fields in group:
+                yield (fields, None) if build_is_left else (None, fields)
+
+
+def parse_format(spec):
+    """Parse a -o list such as '0,1.2,2.1' into (file, field) pairs; file 0 is the join key.
+
+    Returns (pairs, error).
+    """
+    pairs = []
+    for item in spec.replace(' ', ',').split(','):
+        if item == '0':
+            pairs.append((0, 0))
+            continue
+        side, dot, field = item.partition('.')
+        if side not in ('1', '2') or not dot or not field.isdigit() or int(field) < 1:
+            return None, f"invalid field specifier: '{item}'"
+        pairs.append((int(side), int(field) - 1))
+    return pairs, ""
@@ -1,12 +1,18 @@
 # Terminal User Interface Implementation
+import queue
+import threading
 import tkinter as tk
 from tkinter import scrolledtext, font, filedialog, messagebox
-from filesystem import LocalFileSystem
-from command_parser import CommandParser
+from filesystem import open_filesystem
+from command_parser import CommandParser, BackgroundJob
+
+
+# Milliseconds between checks for output from a command running in the background
+JOB_POLL_INTERVAL = 50
 
 
 class TerminalUI:
-    def __init__(self, root):
+    def __init__(self, root, location=None):
         self.root = root
         self.root.title("Unix Terminal By RXS Studios")
         self.root.geometry("900x700")
@@ -29,13 +35,16 @@ class TerminalUI:
         self.error_color = '#ff0000'
         self.info_color = '#00aaff'
         
-        # Prompt for working directory selection
-        messagebox.showinfo(
-            "Select Working Directory",
-            "Please select a working directory.\n\nAll commands will operate only within this directory."
-        )
-        
-        base_directory = filedialog.askdirectory(title="Select Working Directory")
+        # Prompt for working directory selection, unless a location was given
+        # (a directory, an image from mkimage, a zip or tar archive, or ':memory:')
+        base_directory = location
+        if base_directory is None:
+            messagebox.showinfo(
+                "Select Working Directory",
+                "Please select a working directory.\n\nAll commands will operate only within this directory."
+            )
+            
+            base_directory = filedialog.askdirectory(title="Select Working Directory")
         if not base_directory:
             # User cancelled - exit
             root.quit()
@@ -43,7 +52,7 @@ class TerminalUI:
         
         # Initialize filesystem with selected directory
         try:
-            self.filesystem = LocalFileSystem(base_directory)
+            self.filesystem = open_filesystem(base_directory)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to initialize filesystem: {e}")
             root.quit()
@@ -65,6 +74,9 @@ class TerminalUI:
         self.input_frame = None
         self.input_entry = None
         self.prompt_label = None
+        # Command running in the background (a BackgroundJob) and the output it has sent
+        self.job = None
+        self.job_output = queue.Queue()
         
         # Initialize UI
         self.setup_ui()
@@ -175,6 +187,18 @@ Type 'exit' to quit.
         self.terminal_display.config(state=tk.DISABLED)
         self.terminal_display.see(tk.END)  # Auto-scroll to bottom
     
+    def terminal_size(self):
+        """(columns, rows) of text that fit in the terminal display"""
+        display = self.terminal_display
+        if display.winfo_width() <= 1:
+            # Not drawn yet: the size it was created with
+            return int(display.cget('width')), int(display.cget('height'))
+        measure = font.Font(font=display.cget('font'))
+        inset = 2 * (int(display.cget('borderwidth')) + int(display.cget('padx')) + int(display.cget('highlightthickness')))
+        columns = (display.winfo_width() - inset) // measure.measure('0')
+        rows = (display.winfo_height() - inset) // measure.metrics('linespace')
+        return max(20, columns), max(5, rows)
+    
     def show_prompt(self):
         """Display the command prompt"""
         if self.inline_input:
@@ -191,7 +215,7 @@ Type 'exit' to quit.
         """Process the entered command"""
         command = self.input_entry.get().strip()
         
-        if not command:
+        if not command or self.job is not None:
             return
         
         # Add to history
@@ -210,8 +234,9 @@ Type 'exit' to quit.
         # Execute
         self.execute_command(command)
         
-        # Update prompt in case directory changed
-        self.show_prompt()
+        # Update prompt in case directory changed (a background command does it when it ends)
+        if self.job is None:
+            self.show_prompt()
     
     def tab_completion(self, event):
         """Basic tab completion for file/directory names"""
@@ -260,7 +285,11 @@ Type 'exit' to quit.
                 self.input_entry.delete(0, tk.END)
     
     def clear_input(self, event):
-        """Clear the input field (Ctrl+C)"""
+        """Clear the input field (Ctrl+C), or stop the command running in the background"""
+        if self.job is not None:
+            self.job.cancel()
+            self.print_to_terminal("^C\n", 'output')
+            return "break"
         if self.inline_input:
             # Move cursor to end and clear current input region
             if self.input_start_index is not None:
@@ -358,6 +387,8 @@ Type 'exit' to quit.
         self.terminal_display.see(tk.END)
 
     def inline_return(self, event):
+        if self.job is not None:
+            return "break"
         command = self.get_current_inline_input().strip()
         # Echo newline
         self.terminal_display.insert(tk.END, "\n")
@@ -365,8 +396,9 @@ Type 'exit' to quit.
         if command:
             pass
         self.execute_command(command)
-        # New prompt
-        self.show_prompt()
+        # New prompt (a background command shows it when it ends)
+        if self.job is None:
+            self.show_prompt()
         return "break"
 
     def inline_backspace(self, event):
@@ -442,9 +474,49 @@ Type 'exit' to quit.
         # Run
         try:
             output = self.command_parser.parse_command(command)
-            if output:
+            if isinstance(output, BackgroundJob):
+                self.start_job(output)
+            elif output:
                 self.print_to_terminal(f"{output}\n", 'output')
                 self.session_log.append(output)
         except Exception as e:
             self.print_to_terminal(f"Error: {str(e)}\n", 'error')
             self.session_log.append(f"Error: {str(e)}")
+
+    # ---------------- Background commands ----------------
+    def start_job(self, job):
+        """Run a BackgroundJob on a worker thread, showing its output as it comes; Ctrl+C cancels it"""
+        self.job = job
+        # No typing into the output while it runs
+        self.terminal_display.config(state=tk.DISABLED)
+        if self.input_entry is not None:
+            self.input_entry.config(state=tk.DISABLED)
+        threading.Thread(target=self._run_job, args=(job,), name='terminal-job', daemon=True).start()
+        self.root.after(JOB_POLL_INTERVAL, self._poll_job)
+
+    def _run_job(self, job):
+        # Worker thread: Tk may only be used from the main thread, so output goes through a queue
+        try:
+            job.run(self.job_output.put)
+        except Exception as e:
+            self.job_output.put(f"Error: {str(e)}\n")
+        finally:
+            self.job_output.put(None)
+
+    def _poll_job(self):
+        while True:
+            try:
+                text = self.job_output.get_nowait()
+            except queue.Empty:
+                self.root.after(JOB_POLL_INTERVAL, self._poll_job)
+                return
+            if text is None:
+                break
+            self.print_to_terminal(text, 'output')
+            self.session_log.append(text.rstrip('\n'))
+        self.job = None
+        if self.input_entry is not None:
+            self.input_entry.config(state=tk.NORMAL)
+            if not self.inline_input:
+                self.input_entry.focus_set()
+        self.show_prompt()
@@ -0,0 +1,1053 @@
+# Virtual File System Interface (base class, in-memory and archive backends)
+import io
+import os
+import sys
+import stat
+import time
+import errno
+import zipfile
+import tarfile
+import datetime
+import posixpath
+from collections import namedtuple
+
+
+# Default size of the blocks yielded by iter_chunks
+READ_CHUNK_SIZE = 1024 * 1024
+# Symbolic links followed while resolving one path before giving up with ELOOP
+MAX_SYMLINK_HOPS = 40
+
+
+# Minimal stat result shared by all backends; field names match os.stat_result
+VfsStat = namedtuple('VfsStat', 'st_mode st_size st_mtime st_nlink', defaults=(0, 0.0, 1))
+
+
+def vfs_error(code, path=None):
+    """An OSError (of the matching subclass) for errno code, like the os module raises"""
+    return OSError(code, os.strerror(code), path)
+
+
+def normalize_virtual(current, path):
+    """Absolute form of a virtual path relative to current, with no '.', '..' or empty components"""
+    if path[:1] != '/':
+        path = current + '/' + path if path else current
+    if '//' in path or '/.' in path or (path[-1] == '/' and path != '/'):
+        path = posixpath.normpath(path)
+        if path[:2] == '//':
+            path = '/' + path.lstrip('/')
+    return path
+
+
+def node_type(st):
+    """'directory', 'symlink' or 'file' for a stat result"""
+    if stat.S_ISDIR(st.st_mode):
+        return 'directory'
+    if stat.S_ISLNK(st.st_mode):
+        return 'symlink'
+    return 'file'
+
+
+class VirtualFileSystem:
+    """Common interface of every file system the terminal can run on.
+
+    Paths given to the public methods are virtual: absolute ('/docs/a.txt') or
+    relative to current_path. Backends only implement the storage primitives
+    (_lstat, _listdir, _open, _mkdir, _rmdir, _remove, _rename and, where the
+    storage supports them, _chmod, _utime, _symlink, _link, _readlink); they
+    receive normalized absolute paths and raise OSError like the os module.
+
+    Two styles of public method sit on top. The os-style ones (stat, listdir,
+    chmod, symlink, ...) raise OSError. The command-style ones (read_file,
+    create_directory, copy_path, ...) return (value, error) with the error
+    already worded for the terminal.
+    """
+
+    # Shown to the user as the file system's location
+    base_path = '/'
+    # Directory that '~' and a bare 'cd' lead to
+    home = '/'
+    read_only = False
+    # FileWatcher reporting outside changes, once watch() has started one
+    watcher = None
+
+    def __init__(self):
+        self.current_path = self.home
+
+    # ---------------- Paths ----------------
+    def normalize_path(self, path):
+        """Normalize a path (resolve .. and . components)"""
+        return normalize_virtual(self.current_path, path)
+
+    def _get_parent_and_name(self, path):
+        """Helper to get parent directory and name"""
+        normalized = self.normalize_path(path)
+        dir_path = '/'.join(normalized.split('/')[:-1]) or '/'
+        name = normalized.split('/')[-1] if normalized != '/' else ''
+        return dir_path, name
+
+    def real_path(self, path):
+        """Host path backing a virtual path, or None when the backend is not on disk"""
+        return None
+
+    def contains(self, path):
+        """True if path resolves to a place inside this file system (see LocalFileSystem)"""
+        return True
+
+    def watch(self):
+        """FileWatcher reporting changes made to the storage from outside, or None if there is none"""
+        return None
+
+    def change_directory(self, path):
+        """Change current directory"""
+        if path == '~':
+            path = self.home
+
+        target_path = self.normalize_path(path)
+        try:
+            st = self._stat(target_path)
+        except OSError:
+            return False, f"cd: {path}: No such file or directory"
+
+        if not stat.S_ISDIR(st.st_mode):
+            return False, f"cd: {path}: Not a directory"
+
+        self.current_path = target_path
+        return True, ""
+
+    # ---------------- Storage primitives ----------------
+    def _lstat(self, path):
+        raise NotImplementedError
+
+    def _listdir(self, path):
+        raise NotImplementedError
+
+    def _open(self, path, mode, buffering=-1):
+        """Open a binary stream; mode is one of 'rb', 'wb', 'ab', 'r+b'"""
+        raise NotImplementedError
+
+    def _mkdir(self, path):
+        raise NotImplementedError
+
+    def _rmdir(self, path):
+        raise NotImplementedError
+
+    def _remove(self, path):
+        raise NotImplementedError
+
+    def _rename(self, src, dst):
+        raise NotImplementedError
+
+    def _chmod(self, path, mode):
+        raise vfs_error(errno.ENOTSUP, path)
+
+    def _chown(self, path, uid, gid):
+        pass  # ownership is not modelled outside the local backend
+
+    def _utime(self, path, mtime=None):
+        raise vfs_error(errno.ENOTSUP, path)
+
+    def _symlink(self, target, path):
+        raise vfs_error(errno.ENOTSUP, path)
+
+    def _link(self, src, dst):
+        raise vfs_error(errno.ENOTSUP, dst)
+
+    def _readlink(self, path):
+        raise vfs_error(errno.EINVAL, path)
+
+    def _disk_usage(self):
+        """(total, available) bytes; by default the size of everything stored"""
+        used = sum(self._lstat(path).st_size for path, node in self.walk('/') if node['type'] == 'file')
+        return used, 0
+
+    def _resolve(self, path):
+        """Follow symbolic links in the last component of path"""
+        for _ in range(MAX_SYMLINK_HOPS):
+            if not stat.S_ISLNK(self._lstat(path).st_mode):
+                return path
+            target = posixpath.join(posixpath.dirname(path), self._readlink(path))
+            path = '/' + posixpath.normpath(target).lstrip('/')
+        raise vfs_error(errno.ELOOP, path)
+
+    def _stat(self, path):
+        """lstat, following symbolic links in the last component"""
+        return self._lstat(self._resolve(path))
+
+    # ---------------- os-style interface ----------------
+    def stat(self, path):
+        return self._stat(self.normalize_path(path))
+
+    def lstat(self, path):
+        return self._lstat(self.normalize_path(path))
+
+    def exists(self, path):
+        try:
+            self._stat(self.normalize_path(path))
+            return True
+        except OSError:
+            return False
+
+    def is_dir(self, path):
+        try:
+            return stat.S_ISDIR(self._stat(self.normalize_path(path)).st_mode)
+        except OSError:
+            return False
+
+    def listdir(self, path):
+        return self._listdir(self.normalize_path(path))
+
+    def chmod(self, path, mode):
+        self._chmod(self.normalize_path(path), mode)
+
+    def chown(self, path, uid=-1, gid=-1):
+        self._chown(self.normalize_path(path), uid, gid)
+
+    def utime(self, path, mtime=None):
+        self._utime(self.normalize_path(path), mtime)
+
+    def symlink(self, target, path):
+        """Create a symbolic link at path pointing to target (stored as given)"""
+        self._symlink(target, self.normalize_path(path))
+
+    def link(self, src, dst):
+        self._link(self.normalize_path(src), self.normalize_path(dst))
+
+    def readlink(self, path):
+        return self._readlink(self.normalize_path(path))
+
+    def makedirs(self, path):
+        """Create a directory and any missing parents; an existing directory is fine"""
+        path = self.normalize_path(path)
+        missing = []
+        while path != '/':
+            try:
+                if stat.S_ISDIR(self._stat(path).st_mode):
+                    break
+                raise vfs_error(errno.ENOTDIR, path)
+            except FileNotFoundError:
+                missing.append(path)
+                path = posixpath.dirname(path)
+        for directory in reversed(missing):
+            self._mkdir(directory)
+
+    def disk_usage(self):
+        """(total, used, available) bytes of the storage behind the file system"""
+        total, available = self._disk_usage()
+        if total < available:
+            total = available
+        return total, total - available, available
+
+    # ---------------- Command interface ----------------
+    def get_node(self, path):
+        """Get filesystem node info (for compatibility)"""
+        try:
+            st = self._stat(self.normalize_path(path))
+        except OSError:
+            return None
+        return {'type': 'directory' if stat.S_ISDIR(st.st_mode) else 'file'}
+
+    def list_directory(self, path=None):
+        """List directory contents"""
+        try:
+            return sorted(self._listdir(self.normalize_path(path or self.current_path)))
+        except OSError:
+            return None
+
+    def get_detailed_listing(self, path=None):
+        """Get detailed directory listing (for ls -l)"""
+        directory = self.normalize_path(path or self.current_path)
+        try:
+            names = sorted(self._listdir(directory))
+        except OSError:
+            return None
+
+        items = []
+        for name in names:
+            try:
+                st = self._stat(posixpath.join(directory, name))
+            except OSError:
+                continue
+            is_dir = stat.S_ISDIR(st.st_mode)
+            items.append({
+                'name': name,
+                'permissions': 'drwxr-xr-x' if is_dir else '-rw-r--r--',
+                'size': '-' if is_dir else str(st.st_size),
+                'modified': datetime.datetime.fromtimestamp(st.st_mtime).strftime('%Y-%m-%d %H:%M:%S'),
+                'type': 'directory' if is_dir else 'file'
+            })
+        return items
+
+    def read_file(self, path):
+        """Read file contents"""
+        data, error = self.read_bytes(path)
+        if error:
+            return None, f"cat: {error}"
+        return data.decode('utf-8', errors='ignore'), ""
+
+    def open_stream(self, path, mode='r', buffering=-1):
+        """Open a file for streaming. Returns (file_object, error).
+
+        Binary modes ('rb', 'wb', ...) pass bytes through untouched; text modes
+        decode as UTF-8 like read_file. The caller must close the stream.
+        """
+        target = self.normalize_path(path)
+        try:
+            if stat.S_ISDIR(self._stat(target).st_mode):
+                return None, f"{path}: Is a directory"
+        except FileNotFoundError:
+            # Write modes may create the file, but not its directory
+            if 'r' in mode or not self.is_dir(posixpath.dirname(target)):
+                return None, f"{path}: No such file or directory"
+        except OSError as e:
+            return None, f"{path}: {e.strerror or e}"
+
+        binary_mode = mode.replace('b', '').replace('t', '') + 'b'
+        try:
+            stream = self._open(target, binary_mode, buffering if 'b' in mode else -1)
+        except OSError as e:
+            return None, f"{path}: {e.strerror or e}"
+        if 'b' in mode:
+            return stream, ""
+        return io.TextIOWrapper(stream, encoding='utf-8', errors='ignore'), ""
+
+    def read_bytes(self, path):
+        """Read a whole file without decoding. Returns (bytes, error)."""
+        stream, error = self.open_stream(path, 'rb', buffering=0)
+        if error:
+            return None, error
+        try:
+            with stream:
+                return stream.read(), ""
+        except OSError as e:
+            return None, f"{path}: {e.strerror or e}"
+
+    def iter_chunks(self, path, chunk_size=READ_CHUNK_SIZE):
+        """Iterate over a file as raw byte blocks. Returns (iterator, error).
+
+        The file is opened immediately, so a missing file is reported here
+        rather than while iterating, and closed once iteration finishes.
+        """
+        stream, error = self.open_stream(path, 'rb', buffering=0)
+        if error:
+            return None, error
+
+        def chunks():
+            with stream:
+                while True:
+                    chunk = stream.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        return chunks(), ""
+
+    def open_atomic(self, path):
+        """Open path for an atomic rewrite. Returns (AtomicWriter, error)."""
+        target = self.normalize_path(path)
+        if self.is_dir(target):
+            return None, f"{path}: Is a directory"
+        try:
+            return AtomicWriter(self, target), ""
+        except OSError as e:
+            return None, f"{path}: {e.strerror or e}"
+
+    def create_file(self, path, content=""):
+        """Create a new file, or update the modification time of an existing one"""
+        target = self.normalize_path(path)
+        try:
+            self.makedirs(posixpath.dirname(target))
+            if self.exists(target):
+                self._utime(target)
+            else:
+                with self._open(target, 'ab') as f:
+                    f.write(content.encode('utf-8'))
+            return True, ""
+        except OSError as e:
+            return False, f"touch: {path}: {e.strerror or e}"
+
+    def write_file(self, path, content):
+        """Create or overwrite a file with content."""
+        return self._write_text(path, content, 'wb')
+
+    def append_file(self, path, content):
+        """Append content to a file, creating it if missing."""
+        if self.exists(path) and self.is_dir(path):
+            return False, f"redirect: '{path}': Is a directory"
+        return self._write_text(path, content, 'ab')
+
+    def _write_text(self, path, content, mode):
+        target = self.normalize_path(path)
+        try:
+            self.makedirs(posixpath.dirname(target))
+            with self._open(target, mode) as f:
+                f.write(content.encode('utf-8'))
+            return True, ""
+        except OSError as e:
+            return False, f"redirect: {path}: {e.strerror or e}"
+
+    def remove_file(self, path):
+        """Remove a file"""
+        target = self.normalize_path(path)
+        try:
+            st = self._lstat(target)
+        except OSError:
+            return False, f"rm: cannot remove '{path}': No such file or directory"
+        if stat.S_ISDIR(st.st_mode):
+            return False, f"rm: cannot remove '{path}': Is a directory"
+        try:
+            self._remove(target)
+            return True, ""
+        except OSError as e:
+            return False, f"rm: {path}: {e.strerror or e}"
+
+    def create_directory(self, path, parents=False):
+        """Create a new directory. If parents is True, create intermediate directories."""
+        target = self.normalize_path(path)
+        if self.exists(target):
+            return False, f"mkdir: cannot create directory '{path}': File exists"
+        try:
+            if parents:
+                self.makedirs(target)
+            else:
+                self._mkdir(target)
+            return True, ""
+        except FileExistsError:
+            return False, f"mkdir: cannot create directory '{path}': File exists"
+        except OSError as e:
+            return False, f"mkdir: {path}: {e.strerror or e}"
+
+    def remove_directory(self, path):
+        """Remove an empty directory."""
+        target = self.normalize_path(path)
+        try:
+            st = self._lstat(target)
+        except OSError:
+            return False, f"rmdir: failed to remove '{path}': No such file or directory"
+        if not stat.S_ISDIR(st.st_mode):
+            return False, f"rmdir: failed to remove '{path}': Not a directory"
+        try:
+            self._rmdir(target)
+            return True, ""
+        except OSError as e:
+            return False, f"rmdir: {path}: {e.strerror or e}"
+
+    def remove_recursive(self, path):
+        """Remove a file or directory tree recursively."""
+        target = self.normalize_path(path)
+        try:
+            self._lstat(target)
+        except OSError:
+            return False, f"rm: cannot remove '{path}': No such file or directory"
+        try:
+            self._remove_tree(target)
+            return True, ""
+        except OSError as e:
+            return False, f"rm: {path}: {e.strerror or e}"
+
+    def _remove_tree(self, path):
+        if not stat.S_ISDIR(self._lstat(path).st_mode):
+            self._remove(path)
+            return
+        for name in self._listdir(path):
+            self._remove_tree(posixpath.join(path, name))
+        self._rmdir(path)
+
+    def copy_path(self, src, dst, recursive=False, reflink='auto', progress=None):
+        """Copy file or directory from src to dst. For directories, recursive must be True.
+
+        reflink and progress are accepted for compatibility with the local
+        backend, which copies through CopyEngine.
+        """
+        source = self.normalize_path(src)
+        target = self.normalize_path(dst)
+        try:
+            st = self._stat(source)
+        except OSError:
+            return False, f"cp: cannot stat '{src}': No such file or directory"
+
+        try:
+            if stat.S_ISDIR(st.st_mode):
+                if not recursive:
+                    return False, f"cp: -r not specified; omitting directory '{src}'"
+                if self.is_dir(target):
+                    target = posixpath.join(target, posixpath.basename(source))
+                if target == source or target.startswith(source.rstrip('/') + '/'):
+                    return False, f"cp: cannot copy a directory, '{src}', into itself, '{dst}'"
+                self._copy_tree(source, target)
+            else:
+                self._copy_file(source, target, st)
+            return True, ""
+        except OSError as e:
+            return False, f"cp: cannot copy '{src}' to '{dst}': {e.strerror or e}"
+
+    def _copy_file(self, source, target, st=None):
+        if self.is_dir(target):
+            target = posixpath.join(target, posixpath.basename(source))
+        with self._open(source, 'rb') as src, self._open(target, 'wb') as dst:
+            while True:
+                chunk = src.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        st = st or self._stat(source)
+        try:
+            self._chmod(target, stat.S_IMODE(st.st_mode))
+            self._utime(target, st.st_mtime)
+        except OSError:
+            pass  # metadata is best effort, as with cp -p on a foreign file system
+
+    def _copy_tree(self, source, target):
+        if not self.is_dir(target):
+            self._mkdir(target)
+        for name in self._listdir(source):
+            path = posixpath.join(source, name)
+            st = self._lstat(path)
+            if stat.S_ISDIR(st.st_mode):
+                self._copy_tree(path, posixpath.join(target, name))
+            elif stat.S_ISLNK(st.st_mode):
+                self._symlink(self._readlink(path), posixpath.join(target, name))
+            else:
+                self._copy_file(path, posixpath.join(target, name), st)
+
+    def move_path(self, src, dst):
+        """Move/rename a file or directory."""
+        source = self.normalize_path(src)
+        target = self.normalize_path(dst)
+        try:
+            self._lstat(source)
+        except OSError:
+            return False, f"mv: cannot stat '{src}': No such file or directory"
+        if self.is_dir(target):
+            target = posixpath.join(target, posixpath.basename(source))
+        try:
+            self._rename(source, target)
+            return True, ""
+        except OSError as e:
+            return False, f"mv: {e.strerror or e}"
+
+    def sync_path(self, src, dst, recursive=False, checksum=False, delete=False, dry_run=False):
+        """Incremental copies need the local backend's SyncEngine"""
+        return None, "rsync: not supported on this file system"
+
+    def walk(self, start_path=None):
+        """Yield (path, node) for all nodes under start_path (inclusive)."""
+        start = self.normalize_path(start_path or self.current_path)
+        try:
+            if not stat.S_ISDIR(self._stat(start).st_mode):
+                return
+        except OSError:
+            return
+        pending = [start]
+        while pending:
+            directory = pending.pop()
+            yield directory, {'type': 'directory'}
+            try:
+                names = sorted(self._listdir(directory))
+            except OSError:
+                continue
+            subdirs = []
+            for name in names:
+                path = posixpath.join(directory, name)
+                try:
+                    is_dir = stat.S_ISDIR(self._lstat(path).st_mode)
+                except OSError:
+                    continue
+                if is_dir:
+                    subdirs.append(path)
+                else:
+                    yield path, {'type': 'file'}
+            pending.extend(reversed(subdirs))
+
+
+class AtomicWriter:
+    """Binary-to-text writer that replaces its target in one rename on commit.
+
+    The backend-neutral counterpart of filesystem.AtomicFile: the new content
+    goes to a hidden sibling and is renamed over the target when the block
+    exits normally; on an exception the sibling is removed instead.
+    """
+
+    def __init__(self, fs, path):
+        self.fs = fs
+        self.path = path
+        directory, name = posixpath.split(path)
+        self.temp_path = posixpath.join(directory, f".{name}.{os.getpid()}.{time.monotonic_ns()}.tmp")
+        self.file = io.TextIOWrapper(fs._open(self.temp_path, 'wb'), encoding='utf-8', newline='')
+        self.write = self.file.write
+
+    def commit(self):
+        self.file.close()
+        try:
+            mode = stat.S_IMODE(self.fs._stat(self.path).st_mode)
+            self.fs._chmod(self.temp_path, mode)
+        except OSError:
+            pass
+        self.fs._rename(self.temp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        try:
+            self.fs._remove(self.temp_path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+
+# ============ IN-MEMORY BACKEND ============
+
+def _join(directory, name):
+    """posixpath.join for a normalized absolute directory and a plain name, minus its overhead"""
+    return (directory if directory != '/' else '') + '/' + name
+
+
+class Inode:
+    """One file, directory or symbolic link of a MemoryFileSystem.
+
+    payload is a bytearray for files, a {name: Inode} dict for directories and
+    the target string for symbolic links; the kind is also in mode. Slots keep
+    an inode to a few dozen bytes, so millions of them fit in memory.
+    """
+    __slots__ = ('mode', 'mtime', 'payload')
+
+    def __init__(self, mode, payload):
+        self.mode = mode
+        self.mtime = time.time()
+        self.payload = payload
+
+    def stat(self):
+        payload = self.payload
+        if type(payload) is dict:
+            return VfsStat(self.mode, 0, self.mtime, len(payload) + 2)
+        return VfsStat(self.mode, len(payload), self.mtime)
+
+
+class BufferReader(io.RawIOBase):
+    """Reads a bytes-like buffer (an inode's bytearray, a slice of a mapped image) in place"""
+
+    def __init__(self, data):
+        super().__init__()
+        self.data = data
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        start = self.position
+        end = min(start + len(buffer), len(self.data))
+        if end <= start:
+            return 0
+        with memoryview(self.data) as view:
+            buffer[:end - start] = view[start:end]
+        self.position = end
+        return end - start
+
+    def readall(self):
+        chunk = bytes(self.data[self.position:])
+        self.position += len(chunk)
+        return chunk
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = (0, self.position, len(self.data))[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+class _InodeWriter(BufferReader):
+    """Writes straight into a file inode's bytearray; the file system hears of it on close.
+
+    changed_from is the offset of the first byte written or truncated, so an
+    append can be persisted without the bytes that were already there.
+    """
+
+    def __init__(self, fs, path, node, append):
+        super().__init__(node.payload)
+        self.fs = fs
+        self.path = path
+        self.node = node
+        self.append = append
+        self.changed_from = len(self.data)
+        if append:
+            self.position = len(self.data)
+
+    def writable(self):
+        return True
+
+    def write(self, buffer):
+        data = self.data
+        if self.append:
+            self.position = len(data)
+        start = self.position
+        self.changed_from = min(self.changed_from, start, len(data))
+        with memoryview(buffer) as view:
+            size = view.nbytes
+            if start == len(data):
+                data += view.cast('B')
+            else:
+                if start > len(data):
+                    data.extend(bytes(start - len(data)))
+                data[start:start + size] = view.cast('B')
+        self.position = start + size
+        return size
+
+    def truncate(self, size=None):
+        size = self.position if size is None else size
+        self.changed_from = min(self.changed_from, size)
+        del self.data[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.node.mtime = time.time()
+            super().close()
+            self.fs._changed('write', self.path, self.changed_from)
+
+
+class MemoryFileSystem(VirtualFileSystem):
+    """File system held entirely in memory, for fixtures, demos and benchmarks.
+
+    Every inode is also kept in a path -> Inode index, so looking a path up is
+    one dict access instead of a walk from the root; only paths that pass
+    through a symbolic link fall back to walking. files optionally seeds the
+    tree with {path: str or bytes}; missing parent directories are created.
+    """
+
+    base_path = ':memory:'
+
+    def __init__(self, files=None):
+        super().__init__()
+        self.root = Inode(stat.S_IFDIR | 0o755, {})
+        self.index = {'/': self.root}
+        for path, content in (files or {}).items():
+            path = self.normalize_path(path)
+            self.makedirs(posixpath.dirname(path))
+            with self._open(path, 'wb') as f:
+                f.write(content.encode('utf-8') if isinstance(content, str) else content)
+
+    def _changed(self, op, path, *args):
+        """Called after every change to the tree; subclasses persist or publish it"""
+
+    # ---------------- Lookup ----------------
+    def _locate(self, path, follow=True, hops=0):
+        """Find path, following links in parent components (and the last, if follow).
+
+        Returns (canonical path, inode).
+        """
+        node = self.index.get(path)
+        if node is not None and (not follow or type(node.payload) is not str):
+            return path, node
+        # Not indexed under this name: the path is missing or goes through a link
+        cut = path.rfind('/')
+        parent = self.index.get(path[:cut] or '/')
+        if parent is not None and type(parent.payload) is dict and path[cut + 1:] not in parent.payload:
+            raise vfs_error(errno.ENOENT, path)
+        node = self.root
+        canonical = '/'
+        parts = [p for p in path.split('/') if p]
+        for position, part in enumerate(parts):
+            children = node.payload
+            if type(children) is not dict:
+                raise vfs_error(errno.ENOTDIR, path)
+            child = children.get(part)
+            if child is None:
+                raise vfs_error(errno.ENOENT, path)
+            if type(child.payload) is str and (follow or position < len(parts) - 1):
+                if hops >= MAX_SYMLINK_HOPS:
+                    raise vfs_error(errno.ELOOP, path)
+                target = posixpath.normpath(posixpath.join(canonical, child.payload))
+                canonical, child = self._locate('/' + target.lstrip('/'), True, hops + 1)
+            else:
+                canonical = _join(canonical, part)
+            node = child
+        return canonical, node
+
+    def _lookup(self, path, follow=True):
+        return self._locate(path, follow)[1]
+
+    def _parent(self, path):
+        """Canonical path, inode and children of the directory holding path, and the entry name"""
+        cut = path.rfind('/')
+        directory, name = path[:cut] or '/', path[cut + 1:]
+        if not name:
+            raise vfs_error(errno.EEXIST, path)
+        directory, parent = self._locate(directory)
+        if type(parent.payload) is not dict:
+            raise vfs_error(errno.ENOTDIR, path)
+        return directory, parent, parent.payload, name
+
+    def _add(self, path, node):
+        directory, parent, children, name = self._parent(path)
+        if name in children:
+            raise vfs_error(errno.EEXIST, path)
+        children[sys.intern(name)] = node
+        self.index[_join(directory, name)] = node
+        parent.mtime = time.time()
+        return node
+
+    def _unlink(self, path, want_dir):
+        directory, parent, children, name = self._parent(path)
+        node = children.get(name)
+        if node is None:
+            raise vfs_error(errno.ENOENT, path)
+        is_dir = type(node.payload) is dict
+        if is_dir != want_dir:
+            raise vfs_error(errno.ENOTDIR if want_dir else errno.EISDIR, path)
+        if is_dir and node.payload:
+            raise vfs_error(errno.ENOTEMPTY, path)
+        del children[name]
+        del self.index[_join(directory, name)]
+        parent.mtime = time.time()
+
+    def _reindex(self, old, new, node):
+        """Move the index entries of node and everything below it from old to new"""
+        del self.index[old]
+        self.index[new] = node
+        if type(node.payload) is dict:
+            for name, child in node.payload.items():
+                self._reindex(_join(old, name), _join(new, name), child)
+
+    # ---------------- Storage primitives ----------------
+    def _lstat(self, path):
+        return self._lookup(path, follow=False).stat()
+
+    def _stat(self, path):
+        return self._lookup(path).stat()
+
+    def _listdir(self, path):
+        children = self._lookup(path).payload
+        if type(children) is not dict:
+            raise vfs_error(errno.ENOTDIR, path)
+        return list(children)
+
+    def _open(self, path, mode, buffering=-1):
+        try:
+            node = self._lookup(path)
+        except FileNotFoundError:
+            if mode == 'rb' or mode == 'r+b':
+                raise
+            node = self._add(path, Inode(stat.S_IFREG | 0o644, bytearray()))
+        if type(node.payload) is not bytearray:
+            raise vfs_error(errno.EISDIR, path)
+        if mode == 'rb':
+            raw = BufferReader(node.payload)
+            return raw if buffering == 0 else io.BufferedReader(raw)
+        if mode == 'wb':
+            del node.payload[:]
+        raw = _InodeWriter(self, path, node, mode == 'ab')
+        if buffering == 0:
+            return raw
+        return io.BufferedRandom(raw) if mode == 'r+b' else io.BufferedWriter(raw)
+
+    def _mkdir(self, path):
+        self._add(path, Inode(stat.S_IFDIR | 0o755, {}))
+        self._changed('mkdir', path)
+
+    def _rmdir(self, path):
+        self._unlink(path, True)
+        self._changed('rmdir', path)
+
+    def _remove(self, path):
+        self._unlink(path, False)
+        self._changed('remove', path)
+
+    def _rename(self, src, dst):
+        src_dir, src_parent, src_children, src_name = self._parent(src)
+        node = src_children.get(src_name)
+        if node is None:
+            raise vfs_error(errno.ENOENT, src)
+        src = _join(src_dir, src_name)
+        dst_dir, dst_parent, dst_children, dst_name = self._parent(dst)
+        dst = _join(dst_dir, dst_name)
+        if type(node.payload) is dict and (dst + '/').startswith(src + '/'):
+            raise vfs_error(errno.EINVAL, dst)
+        existing = dst_children.get(dst_name)
+        if existing is not None:
+            if type(existing.payload) is dict and existing.payload:
+                raise vfs_error(errno.ENOTEMPTY, dst)
+            del self.index[dst]
+        del src_children[src_name]
+        dst_children[sys.intern(dst_name)] = node
+        self._reindex(src, dst, node)
+        src_parent.mtime = dst_parent.mtime = time.time()
+        self._changed('rename', src, dst)
+
+    def _chmod(self, path, mode):
+        node = self._lookup(path)
+        node.mode = stat.S_IFMT(node.mode) | stat.S_IMODE(mode)
+        self._changed('chmod', path, mode)
+
+    def _utime(self, path, mtime=None):
+        self._lookup(path).mtime = time.time() if mtime is None else mtime
+        self._changed('utime', path, mtime)
+
+    def _symlink(self, target, path):
+        self._add(path, Inode(stat.S_IFLNK | 0o777, target))
+        self._changed('symlink', path, target)
+
+    def _link(self, src, dst):
+        node = self._lookup(src)
+        if type(node.payload) is dict:
+            raise vfs_error(errno.EPERM, src)
+        self._add(dst, node)
+        self._changed('link', src, dst)
+
+    def _readlink(self, path):
+        target = self._lookup(path, follow=False).payload
+        if type(target) is not str:
+            raise vfs_error(errno.EINVAL, path)
+        return target
+
+    def _disk_usage(self):
+        used = sum(len(node.payload) for node in self.index.values() if type(node.payload) is bytearray)
+        return used, 0
+
+    def walk(self, start_path=None):
+        """Yield (path, node) for all nodes under start_path (inclusive), straight from the inode tree"""
+        try:
+            start, node = self._locate(self.normalize_path(start_path or self.current_path))
+        except OSError:
+            return
+        if type(node.payload) is not dict:
+            return
+        pending = [(start, node)]
+        while pending:
+            directory, node = pending.pop()
+            yield directory, {'type': 'directory'}
+            subdirs = []
+            for name in sorted(node.payload):
+                child = node.payload[name]
+                path = _join(directory, name)
+                if type(child.payload) is dict:
+                    subdirs.append((path, child))
+                else:
+                    yield path, {'type': 'file'}
+            pending.extend(reversed(subdirs))
+
+
+# ============ ARCHIVE BACKEND ============
+
+class ArchiveFileSystem(VirtualFileSystem):
+    """Read-only view of a zip or tar archive (compressed tar included).
+
+    The member table is read once when the archive is opened; file data is
+    only decompressed when a file is opened.
+    """
+
+    read_only = True
+
+    def __init__(self, archive_path):
+        super().__init__()
+        self.base_path = os.path.abspath(archive_path)
+        # path -> (VfsStat, member or None, link target or None)
+        self.entries = {'/': (VfsStat(stat.S_IFDIR | 0o555), None, None)}
+        self.children = {'/': set()}
+        if zipfile.is_zipfile(archive_path):
+            self.archive = zipfile.ZipFile(archive_path)
+            self._index_zip()
+        else:
+            try:
+                self.archive = tarfile.open(archive_path, 'r:*')
+            except tarfile.TarError as e:
+                raise ValueError(f"Not a zip or tar archive: {archive_path} ({e})")
+            self._index_tar()
+
+    def close(self):
+        self.archive.close()
+
+    def _add_entry(self, name, st, member=None, target=None):
+        path = '/' + posixpath.normpath(name.strip('/')).lstrip('/')
+        if path == '/' or path.startswith('/..'):
+            return
+        self._add_parents(path)
+        self.entries[path] = (st, member, target)
+        if stat.S_ISDIR(st.st_mode):
+            self.children.setdefault(path, set())
+
+    def _add_parents(self, path):
+        child = path
+        parent = posixpath.dirname(child)
+        while True:
+            self.children.setdefault(parent, set()).add(posixpath.basename(child))
+            if parent in self.entries:
+                break
+            self.entries[parent] = (VfsStat(stat.S_IFDIR | 0o555), None, None)
+            child, parent = parent, posixpath.dirname(parent)
+
+    def _index_zip(self):
+        for info in self.archive.infolist():
+            mtime = datetime.datetime(*info.date_time).timestamp()
+            mode = info.external_attr >> 16
+            if info.is_dir():
+                self._add_entry(info.filename, VfsStat(stat.S_IFDIR | 0o555, 0, mtime))
+            elif stat.S_ISLNK(mode):
+                target = self.archive.read(info).decode('utf-8', errors='replace')
+                self._add_entry(info.filename, VfsStat(stat.S_IFLNK | 0o777, len(target), mtime), target=target)
+            else:
+                perms = stat.S_IMODE(mode) & 0o555 or 0o444
+                self._add_entry(info.filename, VfsStat(stat.S_IFREG | perms, info.file_size, mtime), info)
+
+    def _index_tar(self):
+        for member in self.archive:
+            perms = member.mode & 0o555
+            if member.isdir():
+                self._add_entry(member.name, VfsStat(stat.S_IFDIR | perms, 0, member.mtime))
+            elif member.issym():
+                self._add_entry(member.name, VfsStat(stat.S_IFLNK | 0o777, len(member.linkname), member.mtime),
+                                target=member.linkname)
+            elif member.isfile() or member.islnk():
+                self._add_entry(member.name, VfsStat(stat.S_IFREG | perms, member.size, member.mtime), member)
+
+    def _entry(self, path):
+        entry = self.entries.get(path)
+        if entry is None:
+            raise vfs_error(errno.ENOENT, path)
+        return entry
+
+    def _lstat(self, path):
+        return self._entry(path)[0]
+
+    def _listdir(self, path):
+        path = self._resolve(path)
+        if not stat.S_ISDIR(self._lstat(path).st_mode):
+            raise vfs_error(errno.ENOTDIR, path)
+        return list(self.children[path])
+
+    def _open(self, path, mode, buffering=-1):
+        if mode != 'rb':
+            raise vfs_error(errno.EROFS, path)
+        path = self._resolve(path)
+        st, member, _ = self._entry(path)
+        if stat.S_ISDIR(st.st_mode):
+            raise vfs_error(errno.EISDIR, path)
+        if isinstance(member, zipfile.ZipInfo):
+            return self.archive.open(member)
+        return self.archive.extractfile(member)
+
+    def _readlink(self, path):
+        target = self._entry(path)[2]
+        if target is None:
+            raise vfs_error(errno.EINVAL, path)
+        return target
+
+    def _read_only(self, *args):
+        raise vfs_error(errno.EROFS)
+
+    _mkdir = _rmdir = _remove = _rename = _chmod = _utime = _symlink = _link = _read_only
+
+    def _disk_usage(self):
+        return os.path.getsize(self.base_path), 0
@@ -0,0 +1,270 @@
+# File Watcher Implementation (inotify through ctypes on Linux, polling elsewhere)
+import os
+import stat
+import errno
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+from collections import namedtuple
+
+
+# Seconds between scans of the polling backend, and the longest a read blocks
+POLL_INTERVAL = 2.0
+READ_BUFFER_SIZE = 64 * 1024
+
+# A change below the watched root. kind is an inotifywait event name (CREATE,
+# MODIFY, ATTRIB, DELETE, MOVED_FROM, MOVED_TO) or OVERFLOW when events were
+# lost and everything must be assumed changed; path is virtual ('/docs/a.txt').
+WatchEvent = namedtuple('WatchEvent', 'kind path is_dir')
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct('iIII')
+_KINDS = ((IN_CREATE, 'CREATE'), (IN_MODIFY, 'MODIFY'), (IN_ATTRIB, 'ATTRIB'), (IN_DELETE, 'DELETE'),
+          (IN_MOVED_FROM, 'MOVED_FROM'), (IN_MOVED_TO, 'MOVED_TO'))
+
+
+def _load_libc():
+    """libc with the inotify calls declared, or None where inotify is unavailable"""
+    if not hasattr(os, 'uname') or os.uname().sysname != 'Linux':
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+_libc = _load_libc()
+
+
+def inotify_available():
+    """True if change notifications come from the kernel rather than from polling"""
+    return _libc is not None
+
+
+class InotifyBackend:
+    """Kernel notifications for every directory under root (one inotify watch each)"""
+
+    kind = 'inotify'
+
+    def __init__(self, root):
+        self.root = root
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        # watch descriptor -> virtual directory path, and back
+        self.paths = {}
+        self.watches = {}
+        self._add_tree('/')
+
+    def _add_tree(self, directory):
+        """Watch directory and every directory below it"""
+        pending = [directory]
+        while pending:
+            path = pending.pop()
+            real_path = self.root if path == '/' else os.path.join(self.root, path[1:].replace('/', os.sep))
+            wd = _libc.inotify_add_watch(self.fd, os.fsencode(real_path), _WATCH_MASK | IN_ONLYDIR | IN_DONT_FOLLOW)
+            if wd < 0:
+                if ctypes.get_errno() == errno.ENOSPC:
+                    raise OSError(errno.ENOSPC, "inotify watch limit reached (fs.inotify.max_user_watches)")
+                continue  # vanished or unreadable meanwhile
+            self.paths[wd] = path
+            self.watches[path] = wd
+            try:
+                with os.scandir(real_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            pending.append(path.rstrip('/') + '/' + entry.name)
+            except OSError:
+                pass
+
+    def _forget_tree(self, directory):
+        prefix = directory + '/'
+        for path in [p for p in self.watches if p == directory or p.startswith(prefix)]:
+            wd = self.watches.pop(path)
+            self.paths.pop(wd, None)
+            _libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout):
+        """Events that arrive within timeout seconds (an empty list if none do)"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, READ_BUFFER_SIZE)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0'))
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                events.append(WatchEvent('OVERFLOW', '/', True))
+                continue
+            directory = self.paths.get(wd)
+            if mask & IN_IGNORED:
+                if directory is not None:
+                    self.watches.pop(directory, None)
+                    del self.paths[wd]
+                continue
+            if directory is None or not name:
+                continue
+            path = directory.rstrip('/') + '/' + name
+            is_dir = bool(mask & IN_ISDIR)
+            if is_dir and mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_tree(path)
+            elif is_dir and mask & IN_MOVED_FROM:
+                self._forget_tree(path)
+            for flag, kind in _KINDS:
+                if mask & flag:
+                    events.append(WatchEvent(kind, path, is_dir))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingBackend:
+    """Finds changes by rescanning the tree under root and comparing stat results"""
+
+    kind = 'polling'
+
+    def __init__(self, root, interval=POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.state = self._scan()
+
+    def _scan(self):
+        """virtual path -> (is_dir, mtime_ns, size, mode, inode) for everything under root"""
+        state = {}
+        pending = [(self.root, '')]
+        while pending:
+            real_path, path = pending.pop()
+            try:
+                with os.scandir(real_path) as entries:
+                    for entry in entries:
+                        try:
+                            st = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        child = path + '/' + entry.name
+                        is_dir = stat.S_ISDIR(st.st_mode)
+                        state[child] = (is_dir, st.st_mtime_ns, st.st_size, st.st_mode, st.st_ino)
+                        if is_dir:
+                            pending.append((entry.path, child))
+            except OSError:
+                pass
+        return state
+
+    def read(self, timeout):
+        if self.stopped.wait(min(timeout, self.interval)):
+            return []
+        old, new = self.state, self._scan()
+        self.state = new
+        events = []
+        for path, info in new.items():
+            before = old.get(path)
+            if before is None:
+                events.append(WatchEvent('CREATE', path, info[0]))
+            elif before[4] != info[4] or before[0] != info[0]:
+                events.append(WatchEvent('DELETE', path, before[0]))
+                events.append(WatchEvent('CREATE', path, info[0]))
+            elif before[3] != info[3]:
+                events.append(WatchEvent('ATTRIB', path, info[0]))
+            elif before[1:3] != info[1:3] and not info[0]:
+                events.append(WatchEvent('MODIFY', path, False))
+        for path, info in old.items():
+            if path not in new:
+                events.append(WatchEvent('DELETE', path, info[0]))
+        return events
+
+    def close(self):
+        self.stopped.set()
+
+
+class FileWatcher:
+    """Background service that publishes changes under root to its subscribers.
+
+    Subscribers are callables taking a list of WatchEvent; caches subscribe
+    to drop what the events make stale. They are called from the watcher's
+    thread, so they must only do quick, thread-safe work such as clearing a
+    dict. The inotify backend is used where the kernel offers it, polling
+    otherwise (or when polling is requested).
+    """
+
+    def __init__(self, root, polling=False, interval=POLL_INTERVAL):
+        self.root = os.path.abspath(root)
+        self.polling = polling or not inotify_available()
+        self.interval = interval
+        self.subscribers = []
+        self.backend = None
+        self.error = None
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='file-watcher', daemon=True)
+        self.thread.start()
+
+    @property
+    def kind(self):
+        return 'polling' if self.polling else 'inotify'
+
+    def subscribe(self, callback):
+        self.subscribers = self.subscribers + [callback]
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers = [s for s in self.subscribers if s is not callback]
+
+    def _run(self):
+        # Setting the watches up walks the whole tree, so it happens here rather than in __init__
+        try:
+            if self.polling:
+                self.backend = PollingBackend(self.root, self.interval)
+            else:
+                self.backend = InotifyBackend(self.root)
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            return
+        self.ready.set()
+        try:
+            while not self.stopped.is_set():
+                events = self.backend.read(self.interval)
+                if not events:
+                    continue
+                for callback in self.subscribers:
+                    try:
+                        callback(events)
+                    except Exception:
+                        pass  # a broken subscriber must not stop the others
+        finally:
+            self.backend.close()
+
+    def close(self):
+        self.stopped.set()
+        if self.backend is not None and self.backend.kind == 'polling':
+            self.backend.close()
+        self.thread.join(self.interval + 1)